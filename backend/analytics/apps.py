@@ -5,3 +5,7 @@ class AnalyticsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'analytics'
     verbose_name = 'Analytics & Metrics'
+    
+    def ready(self):
+        """Import signals when the app is ready"""
+        import analytics.signals
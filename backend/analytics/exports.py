@@ -0,0 +1,18 @@
+"""
+Flat column projection for streaming analytics event exports (see utils.exports)
+"""
+
+ANALYTICS_EVENT_EXPORT_COLUMNS = [
+    ('id', 'id', 'int'),
+    ('created_at', 'created_at', 'datetime'),
+    ('event_type', 'event_type', 'str'),
+    ('user_id', 'user_id', 'int'),
+    ('content_type', 'content_type__model', 'str'),
+    ('object_id', 'object_id', 'int'),
+    ('session_id', 'session_id', 'str'),
+    ('ip_address', 'ip_address', 'str'),
+    ('latitude', 'latitude', 'float'),
+    ('longitude', 'longitude', 'float'),
+    ('user_agent', 'user_agent', 'str'),
+    ('event_data', 'event_data', 'json'),
+]
@@ -0,0 +1,212 @@
+"""
+Buffered analytics ingestion
+
+Tracking endpoints never write to the database on the request thread. Each
+validated event (or search) is serialized to JSON and appended to a Redis list
+per kind; Celery drains the lists with bulk_create:
+1. Size: when a push takes a list past ANALYTICS_BUFFER_FLUSH_SIZE, a flush task
+   is queued (at most one every few seconds per kind)
+2. Time: celery beat flushes every buffer every few seconds, so quiet periods
+   are still written promptly
+
+A flush takes a batch off the head of the list with LRANGE + LTRIM in one
+MULTI, so concurrent flushers never see the same record. A batch rejected by
+the database (e.g. an event for a user deleted meanwhile) is retried row by row
+and only the offending rows are dropped; a batch that fails for any other
+reason is pushed back and retried on the next flush. When Redis itself is
+unreachable the records are inserted directly, trading latency for not losing them.
+"""
+
+import json
+import logging
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DataError, IntegrityError, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+BUFFERS = {
+    'events': ('analytics:buffer:events', 'analytics.models.AnalyticsEvent'),
+    'searches': ('analytics:buffer:searches', 'analytics.models.SearchAnalytics'),
+}
+
+# Seconds between size-triggered flush tasks for one kind
+FLUSH_DEBOUNCE_SECONDS = 5
+
+
+def _redis():
+    from utils.redis_client import get_redis
+
+    return get_redis(settings.ANALYTICS_BUFFER_URL)
+
+
+def _flush_size():
+    return getattr(settings, 'ANALYTICS_BUFFER_FLUSH_SIZE', 500)
+
+
+def _encode(record):
+    return json.dumps(record, default=str, separators=(',', ':'))
+
+
+def _instances(kind, records):
+    model = import_string(BUFFERS[kind][1])
+    instances = []
+    for record in records:
+        record = dict(record)
+        if isinstance(record.get('created_at'), str):
+            record['created_at'] = parse_datetime(record['created_at'])
+        instances.append(model(**record))
+    return model, instances
+
+
+def _insert(kind, records):
+    model, instances = _instances(kind, records)
+    model.objects.bulk_create(instances, batch_size=_flush_size())
+    return len(instances)
+
+
+def _insert_individually(kind, records):
+    model, instances = _instances(kind, records)
+    written = 0
+    for instance in instances:
+        try:
+            with transaction.atomic():
+                model.objects.bulk_create([instance])
+            written += 1
+        except (IntegrityError, DataError) as e:
+            logger.error(f"Dropping {kind} record rejected by the database: {str(e)}")
+    return written
+
+
+def event_record(data, user=None, user_agent=None, ip_address=None, created_at=None):
+    """
+    Buffer record for one validated EventTrackingSerializer payload
+    """
+    return {
+        'event_type': data['event_type'],
+        'user_id': user.pk if user is not None and user.is_authenticated else None,
+        'content_type_id': data.get('content_type'),
+        'object_id': data.get('object_id'),
+        'event_data': data.get('event_data') or {},
+        'session_id': data.get('session_id'),
+        'user_agent': user_agent,
+        'ip_address': ip_address,
+        'latitude': data.get('latitude'),
+        'longitude': data.get('longitude'),
+        'created_at': (created_at or timezone.now()).isoformat(),
+    }
+
+
+def client_ip(request):
+    forwarded_for = request.META.get('HTTP_X_FORWARDED_FOR')
+    if forwarded_for:
+        return forwarded_for.split(',')[0].strip()
+    return request.META.get('REMOTE_ADDR')
+
+
+def request_event_records(request, events):
+    """
+    Buffer records for validated events received in one request
+    """
+    user_agent = (request.META.get('HTTP_USER_AGENT') or '')[:500] or None
+    ip_address = client_ip(request)
+    received_at = timezone.now()
+    return [event_record(event, request.user, user_agent, ip_address, received_at) for event in events]
+
+
+def search_record(data, user=None):
+    """
+    Buffer record for one validated SearchAnalyticsSerializer payload
+    """
+    record = {key: value for key, value in data.items() if key != 'user'}
+    user = data.get('user') or user
+    record['user_id'] = user.pk if user is not None and user.is_authenticated else None
+    record['created_at'] = timezone.now().isoformat()
+    return record
+
+
+def buffer_records(kind, records):
+    """
+    Append records to the `kind` buffer; returns how many were accepted
+    """
+    if not records:
+        return 0
+    key = BUFFERS[kind][0]
+    try:
+        length = _redis().rpush(key, *[_encode(record) for record in records])
+    except Exception as e:
+        logger.warning(f"Analytics buffer unavailable, writing {len(records)} {kind} directly: {str(e)}")
+        return _insert(kind, records)
+
+    if length >= _flush_size():
+        _schedule_flush(kind)
+    return len(records)
+
+
+def _schedule_flush(kind):
+    from .tasks import flush_analytics_buffers
+
+    if not cache.add(f'analytics:flush-scheduled:{kind}', 1, timeout=FLUSH_DEBOUNCE_SECONDS):
+        return
+
+    def enqueue():
+        try:
+            flush_analytics_buffers.delay(kind)
+        except Exception as e:
+            logger.warning(f"Could not enqueue analytics buffer flush for {kind}: {str(e)}")
+
+    transaction.on_commit(enqueue)
+
+
+def _take_batch(client, key, size):
+    with client.pipeline(transaction=True) as pipe:
+        pipe.lrange(key, 0, size - 1)
+        pipe.ltrim(key, size, -1)
+        raw, _trimmed = pipe.execute()
+    return raw
+
+
+def flush(kind, max_batches=None):
+    """
+    Drain the `kind` buffer into the database in bulk_create batches.
+    Returns the number of rows written.
+    """
+    key = BUFFERS[kind][0]
+    client = _redis()
+    size = _flush_size()
+    written = 0
+    batches = 0
+
+    while max_batches is None or batches < max_batches:
+        raw = _take_batch(client, key, size)
+        if not raw:
+            break
+        batches += 1
+
+        records = []
+        for item in raw:
+            try:
+                records.append(json.loads(item))
+            except ValueError:
+                logger.error(f"Dropping malformed {kind} record from analytics buffer: {item[:200]!r}")
+        try:
+            written += _insert(kind, records)
+        except (IntegrityError, DataError):
+            written += _insert_individually(kind, records)
+        except Exception:
+            # Back onto the head so it is retried first on the next flush
+            client.lpush(key, *reversed(raw))
+            raise
+
+        if len(raw) < size:
+            break
+
+    return written
+
+
+def buffered_count(kind):
+    return _redis().llen(BUFFERS[kind][0])
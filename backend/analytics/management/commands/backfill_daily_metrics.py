@@ -0,0 +1,57 @@
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from analytics.rollups import materialize_range, today
+
+
+class Command(BaseCommand):
+    help = 'Materialize daily analytics rollups (OrderMetrics, ProductMetrics, ...) for a date range'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--start',
+            help='First day to materialize (YYYY-MM-DD). Defaults to the first order date.',
+        )
+        parser.add_argument(
+            '--end',
+            help='Last day to materialize (YYYY-MM-DD). Defaults to yesterday.',
+        )
+        parser.add_argument(
+            '--chunk-days',
+            type=int,
+            default=31,
+            help='Number of days aggregated and written per transaction',
+        )
+
+    def handle(self, *args, **options):
+        from orders.models import Order
+
+        try:
+            end_day = date.fromisoformat(options['end']) + timedelta(days=1) if options['end'] else today()
+            if options['start']:
+                start_day = date.fromisoformat(options['start'])
+            else:
+                first_order = Order.objects.order_by('created_at').values_list('created_at', flat=True).first()
+                if not first_order:
+                    self.stdout.write(self.style.SUCCESS('No orders found, nothing to backfill.'))
+                    return
+                # Rollup days are local days
+                start_day = timezone.localdate(first_order)
+        except ValueError as e:
+            raise CommandError(f'Invalid date: {e}')
+
+        end_day = min(end_day, today())
+        chunk_days = max(options['chunk_days'], 1)
+        self.stdout.write(f'Backfilling analytics rollups from {start_day} to {end_day - timedelta(days=1)}...')
+
+        total = 0
+        chunk_start = start_day
+        while chunk_start < end_day:
+            chunk_end = min(chunk_start + timedelta(days=chunk_days), end_day)
+            total += materialize_range(chunk_start, chunk_end)
+            self.stdout.write(f'  {chunk_start} .. {chunk_end - timedelta(days=1)} done')
+            chunk_start = chunk_end
+
+        self.stdout.write(self.style.SUCCESS(f'Materialized {total} day(s)'))
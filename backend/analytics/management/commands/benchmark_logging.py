@@ -0,0 +1,140 @@
+import logging
+import os
+import tempfile
+import time
+
+from django.core.management.base import BaseCommand
+
+from utils.log import JsonFormatter, QueueListenerHandler, RequestIdFilter, request_id_var
+
+USER = {'id': 42, 'email': 'customer@example.com', 'user_type': 'customer'}
+PAYMENT = {'amount': '25000.00', 'currency': 'UGX', 'payment_method': 'card', 'card_number': '4242424242424242'}
+
+
+class SlowStream:
+    """A console stream whose writes take `latency` seconds (a busy log collector)"""
+
+    def __init__(self, stream, latency):
+        self.stream = stream
+        self.latency = latency
+
+    def write(self, text):
+        if self.latency:
+            time.sleep(self.latency)
+        return self.stream.write(text)
+
+    def flush(self):
+        self.stream.flush()
+
+
+def log_request_inline(logger, number):
+    # What an authenticated checkout used to log: everything at INFO, built eagerly
+    logger.info("Request: POST /api/v1/orders/checkout/")
+    logger.info(f"[MOBILE-ANDROID] Auth attempt - App: 2.3.1, Device: device-{number}")
+    logger.info(f"[MOBILE-ANDROID] User-Agent: {'Dart/3.1 (dart:io) ' * 8}...")
+    logger.info("[MOBILE-ANDROID] Auth header present: True")
+    logger.info("[MOBILE-ANDROID] Token format valid - Length: 1024")
+    logger.info(f"[MOBILE-ANDROID] Token verified - UID: uid-{number}")
+    logger.info(f"[MOBILE-ANDROID] Existing mobile user found: {USER['email']} (ID: {USER['id']})")
+    logger.info(f"Checkout request from user: {USER} (type: {USER['user_type']})")
+    logger.info(f"DEBUG: Received payment data: {PAYMENT}")
+    logger.info(f"Order created successfully: ORD-{number:08d}")
+    logger.info("Response: 201 - 0.05s")
+
+
+def log_request_queued(logger, number):
+    # The same request now: DEBUG detail filtered by level, one access line
+    request_id_var.set(f'{number:032x}')
+    logger.debug(
+        "[MOBILE-%s] Auth attempt - App: %s, Device: %s, Auth header present: %s, User-Agent: %.150s",
+        'android', '2.3.1', f'device-{number}', True, 'Dart/3.1 (dart:io) ' * 8,
+    )
+    logger.debug(
+        "[MOBILE-%s] Token verified - UID: %s, Anonymous: %s, Auth time: %s, Exp time: %s",
+        'android', f'uid-{number}', False, 0, 0,
+    )
+    logger.debug("[MOBILE-%s] Existing mobile user found (ID: %s)", 'android', USER['id'])
+    logger.debug("Processing checkout for user %s with %s items", USER['id'], 3)
+    logger.debug("Payment initiation with fields %s", sorted(PAYMENT))
+    logger.info("Order %s created for user %s", f'ORD-{number:08d}', USER['id'])
+    logger.info("%s %s %s %.1fms", 'POST', '/api/v1/orders/checkout/', 201, 50.0)
+    request_id_var.set(None)
+
+
+class Command(BaseCommand):
+    help = (
+        'Log what one checkout request logs, through synchronous console and file handlers with eager '
+        'f-strings and through the queued, level-filtered pipeline of utils.log, and compare the time '
+        'spent on the request thread'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=5000, help='Requests simulated per pipeline')
+        parser.add_argument('--sink-latency-ms', type=float, default=0.0, help='Added to every console write')
+
+    def build_handlers(self, directory, name, latency):
+        stream = open(os.devnull, 'w')
+        self.streams.append(stream)
+        console = logging.StreamHandler(SlowStream(stream, latency))
+        console.setFormatter(logging.Formatter('{levelname} [{request_id}] {message}', style='{'))
+        console.addFilter(RequestIdFilter())
+        file_handler = logging.FileHandler(os.path.join(directory, f'{name}.log'))
+        file_handler.setFormatter(JsonFormatter())
+        file_handler.addFilter(RequestIdFilter())
+        return console, file_handler
+
+    def build_logger(self, name, handlers, level):
+        logger = logging.getLogger(f'benchmark_logging.{name}')
+        logger.handlers = list(handlers)
+        logger.setLevel(level)
+        logger.propagate = False
+        return logger
+
+    def handle(self, *args, **options):
+        latency = options['sink_latency_ms'] / 1000
+        rows = []
+        self.streams = []
+        with tempfile.TemporaryDirectory() as directory:
+            # Before: console and file handlers write on the request thread
+            handlers = self.build_handlers(directory, 'inline', latency)
+            logger = self.build_logger('inline', handlers, logging.INFO)
+            started = time.perf_counter()
+            for number in range(options['requests']):
+                log_request_inline(logger, number)
+            elapsed = time.perf_counter() - started
+            rows.append(('inline, INFO', elapsed, 0.0, 0))
+            for handler in handlers:
+                handler.close()
+
+            # After: records are queued and written by the listener thread
+            console, file_handler = self.build_handlers(directory, 'queued', latency)
+            console.set_name('benchmark_logging.console')
+            file_handler.set_name('benchmark_logging.file')
+            queued = QueueListenerHandler([console.name, file_handler.name], queue_size=options['requests'] * 2)
+            queued.addFilter(RequestIdFilter())
+            logger = self.build_logger('queued', [queued], logging.INFO)
+            started = time.perf_counter()
+            for number in range(options['requests']):
+                log_request_queued(logger, number)
+            elapsed = time.perf_counter() - started
+            queued.close()  # waits for the listener to write what is queued
+            drained = time.perf_counter() - started
+            rows.append(('queued, DEBUG off', elapsed, drained, queued.dropped))
+            for handler in (console, file_handler):
+                handler.close()
+        for stream in self.streams:
+            stream.close()
+
+        self.stdout.write('\n' + '='*50)
+        self.stdout.write(f"{'pipeline':<20}{'us/request':>12}{'drained s':>10}{'dropped':>8}")
+        for label, elapsed, drained, dropped in rows:
+            self.stdout.write(
+                f"{label:<20}{elapsed / options['requests'] * 1e6:>12.1f}"
+                f"{(f'{drained:.2f}' if drained else '-'):>10}{dropped:>8}"
+            )
+        self.stdout.write('='*50)
+        self.stdout.write(
+            f"{options['requests']} requests, {options['sink_latency_ms']:.2f}ms per console write; "
+            f"us/request is time spent on the request thread"
+        )
+        self.stdout.write(self.style.SUCCESS('Logging benchmark complete'))
@@ -0,0 +1,93 @@
+import os
+import subprocess
+import sys
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# What a fresh process imports before it can do its work
+TARGETS = {
+    # Every manage.py command, Celery worker and beat
+    'setup': 'import django; django.setup()',
+    # A web worker ready to route its first request
+    'urls': (
+        'import django; django.setup(); '
+        'from django.urls import get_resolver; get_resolver().url_patterns'
+    ),
+    # A Celery worker with every app's tasks loaded
+    'celery': (
+        'import django; django.setup(); '
+        'from tanna_backend.celery import app; app.loader.import_default_modules()'
+    ),
+}
+
+
+def parse_importtime(stderr):
+    """
+    [(module, self_us, cumulative_us, depth)] from `python -X importtime` output
+    """
+    imports = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        fields = line[len('import time:'):].split('|')
+        if len(fields) != 3 or not fields[0].strip().isdigit():
+            continue  # header line
+        name = fields[2].rstrip()
+        stripped = name.lstrip()
+        depth = (len(name) - len(stripped) - 1) // 2
+        imports.append((stripped, int(fields[0]), int(fields[1]), depth))
+    return imports
+
+
+class Command(BaseCommand):
+    help = (
+        'Start a fresh interpreter with python -X importtime, report the slowest imports of a cold start '
+        'and optionally fail when the start takes longer than a budget'
+    )
+    requires_system_checks = []
+
+    def add_arguments(self, parser):
+        parser.add_argument('--target', choices=sorted(TARGETS), default='urls', help='Startup to profile')
+        parser.add_argument('--limit', type=int, default=25, help='Number of imports listed')
+        parser.add_argument('--sort', choices=['cumulative', 'self'], default='cumulative')
+        parser.add_argument('--runs', type=int, default=3, help='Starts measured; the fastest is reported')
+        parser.add_argument('--budget-ms', type=float, help='Fail when the fastest start exceeds this many milliseconds')
+
+    def start(self, code):
+        env = dict(os.environ)
+        env.setdefault('DJANGO_SETTINGS_MODULE', 'tanna_backend.settings')
+        started = time.perf_counter()
+        process = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', code],
+            cwd=settings.BASE_DIR, env=env, capture_output=True, text=True,
+        )
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        if process.returncode != 0:
+            raise CommandError(f'Startup failed:\n{process.stderr[-3000:]}')
+        return elapsed_ms, parse_importtime(process.stderr)
+
+    def handle(self, *args, **options):
+        code = TARGETS[options['target']]
+        runs = [self.start(code) for _ in range(max(1, options['runs']))]
+        elapsed_ms, imports = min(runs, key=lambda run: run[0])
+
+        total_us = sum(cumulative for _name, _self_us, cumulative, depth in imports if depth == 0)
+        index = 1 if options['sort'] == 'self' else 2
+        slowest = sorted(imports, key=lambda entry: entry[index], reverse=True)[:options['limit']]
+
+        self.stdout.write('\n' + '='*50)
+        self.stdout.write(f"{'module':<40}{'self ms':>10}{'cumul. ms':>12}")
+        for name, self_us, cumulative_us, _depth in slowest:
+            self.stdout.write(f"{name[:39]:<40}{self_us / 1000:>10.1f}{cumulative_us / 1000:>12.1f}")
+        self.stdout.write('='*50)
+        self.stdout.write(
+            f"Target '{options['target']}': {len(imports)} modules, {total_us / 1000:.0f}ms importing, "
+            f"{elapsed_ms:.0f}ms process start (fastest of {len(runs)})"
+        )
+
+        budget = options['budget_ms']
+        if budget is not None and elapsed_ms > budget:
+            raise CommandError(f'Cold start took {elapsed_ms:.0f}ms, over the {budget:.0f}ms budget')
+        self.stdout.write(self.style.SUCCESS('Import profile complete'))
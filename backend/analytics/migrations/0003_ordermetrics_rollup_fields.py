@@ -0,0 +1,43 @@
+# Generated by Django 4.2.7 on 2026-10-16 09:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analytics', '0002_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ordermetrics',
+            name='gross_order_value',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=12),
+        ),
+        migrations.AddField(
+            model_name='ordermetrics',
+            name='paid_orders',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='ordermetrics',
+            name='paid_revenue',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=12),
+        ),
+        migrations.AddField(
+            model_name='ordermetrics',
+            name='revenue_orders',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='ordermetrics',
+            name='status_counts',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+        migrations.AddField(
+            model_name='ordermetrics',
+            name='city_breakdown',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
@@ -0,0 +1,93 @@
+# Generated by Django 4.2.7 on 2026-10-17 10:05
+
+from datetime import date, datetime, timezone
+
+from django.db import migrations
+
+TABLE = 'analytics_events'
+LEGACY = 'analytics_events_legacy'
+SEQUENCE = 'analytics_events_partitioned_id_seq'
+
+
+def _add_months(day, months):
+    index = day.year * 12 + day.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def _utc(day):
+    return datetime(day.year, day.month, day.day, tzinfo=timezone.utc).isoformat()
+
+
+def partition_analytics_events(apps, schema_editor):
+    """
+    Turn analytics_events into a table range-partitioned by month on created_at
+    without copying rows: the existing table becomes the partition for everything
+    up to the start of next month, and new monthly partitions follow it.
+    The primary key becomes (id, created_at), as PostgreSQL requires the partition
+    key in unique constraints; ids keep coming from one sequence.
+    """
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+
+    AnalyticsEvent = apps.get_model('analytics', 'AnalyticsEvent')
+    execute = schema_editor.execute
+
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT indexname FROM pg_indexes WHERE schemaname = current_schema() AND tablename = %s",
+            [TABLE],
+        )
+        index_names = [row[0] for row in cursor.fetchall()]
+        cursor.execute(f"SELECT COALESCE(MAX(id), 0) + 1 FROM {TABLE}")
+        next_id = cursor.fetchone()[0]
+
+    # Free the table and index names for the partitioned parent
+    execute(f"ALTER TABLE {TABLE} RENAME TO {LEGACY}")
+    for name in index_names:
+        execute(f'ALTER INDEX "{name}" RENAME TO "{name[:56]}_legacy"')
+    # Partitions cannot have their own identity column; ids come from the parent's sequence
+    execute(f"ALTER TABLE {LEGACY} ALTER COLUMN id DROP IDENTITY IF EXISTS")
+    execute(f"ALTER TABLE {LEGACY} ALTER COLUMN id DROP DEFAULT")
+
+    execute(
+        f"CREATE TABLE {TABLE} (LIKE {LEGACY} INCLUDING DEFAULTS INCLUDING CONSTRAINTS INCLUDING STORAGE) "
+        f"PARTITION BY RANGE (created_at)"
+    )
+    execute(f"CREATE SEQUENCE {SEQUENCE} START WITH {next_id}")
+    execute(f"ALTER TABLE {TABLE} ALTER COLUMN id SET DEFAULT nextval('{SEQUENCE}')")
+    execute(f"ALTER SEQUENCE {SEQUENCE} OWNED BY {TABLE}.id")
+    execute(f"ALTER TABLE {TABLE} ADD CONSTRAINT {TABLE}_pkey PRIMARY KEY (id, created_at)")
+
+    # Same index and constraint names Django created on the original table
+    for index in AnalyticsEvent._meta.indexes:
+        execute(index.create_sql(AnalyticsEvent, schema_editor))
+    for field_name in ('user', 'content_type'):
+        field = AnalyticsEvent._meta.get_field(field_name)
+        execute(schema_editor._create_index_sql(AnalyticsEvent, fields=[field]))
+        execute(schema_editor._create_fk_sql(AnalyticsEvent, field, '_fk_%(to_table)s_%(to_column)s'))
+
+    # Matching indexes and foreign keys on the old table are reused rather than rebuilt
+    next_month = _add_months(datetime.now(timezone.utc).date().replace(day=1), 1)
+    execute(
+        f"ALTER TABLE {TABLE} ATTACH PARTITION {LEGACY} "
+        f"FOR VALUES FROM (MINVALUE) TO ('{_utc(next_month)}')"
+    )
+    for offset in (0, 1):
+        month = _add_months(next_month, offset)
+        execute(
+            f"CREATE TABLE {TABLE}_p{month.year:04d}_{month.month:02d} PARTITION OF {TABLE} "
+            f"FOR VALUES FROM ('{_utc(month)}') TO ('{_utc(_add_months(month, 1))}')"
+        )
+    execute(f"CREATE TABLE {TABLE}_default PARTITION OF {TABLE} DEFAULT")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analytics', '0003_ordermetrics_rollup_fields'),
+        ('contenttypes', '0002_remove_content_type_name'),
+    ]
+
+    operations = [
+        migrations.RunPython(partition_analytics_events),
+    ]
@@ -68,6 +68,7 @@ class AnalyticsEvent(models.Model):
     created_at = models.DateTimeField(default=timezone.now)
     
     class Meta:
+        # Range-partitioned by month on created_at; see analytics.partitions
         db_table = 'analytics_events'
         ordering = ['-created_at']
         indexes = [
@@ -169,6 +170,14 @@ class OrderMetrics(models.Model):
     # Conversion
     conversion_rate = models.DecimalField(max_digits=5, decimal_places=2, default=0)  # percentage
     
+    # Rollup detail used by the dashboard (see analytics.rollups)
+    gross_order_value = models.DecimalField(max_digits=12, decimal_places=2, default=0)  # all orders placed
+    paid_orders = models.IntegerField(default=0)  # payment settled
+    paid_revenue = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    revenue_orders = models.IntegerField(default=0)  # settled or delivered (counted in total_revenue)
+    status_counts = models.JSONField(default=dict, blank=True)  # {status: count}
+    city_breakdown = models.JSONField(default=dict, blank=True)  # {city: {orders, revenue}}
+    
     created_at = models.DateTimeField(default=timezone.now)
     updated_at = models.DateTimeField(auto_now=True)
     
@@ -288,3 +297,18 @@ class SearchAnalytics(models.Model):
     
     def __str__(self):
         return f"Search: {self.query[:50]}... - {self.created_at}"
+
+
+class RollupDirtyDay(models.Model):
+    """
+    Closed day whose rollups are stale: an order, payment or delivery request
+    created that day changed after the daily rollup lookback window moved past it
+    """
+    date = models.DateField(unique=True)
+    marked_at = models.DateTimeField(default=timezone.now)
+    
+    class Meta:
+        db_table = 'analytics_rollup_dirty_days'
+    
+    def __str__(self):
+        return f"Dirty rollup day {self.date}"
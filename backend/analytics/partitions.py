@@ -0,0 +1,182 @@
+"""
+Monthly partitions of analytics_events
+
+analytics_events is range-partitioned on created_at (see migration
+0004_partition_analytics_events). Partitions are named analytics_events_pYYYY_MM
+and cover one calendar month in UTC; analytics_events_legacy holds everything
+from before partitioning and analytics_events_default catches rows outside
+every range (it should stay empty).
+
+ensure_partitions() creates the current month and the next
+ANALYTICS_PARTITIONS_AHEAD months so inserts never land in the default
+partition. drop_expired_partitions() enforces ANALYTICS_EVENT_RETENTION_MONTHS:
+a partition entirely older than the cutoff is dropped (a metadata-only
+operation, unlike DELETE) once every day it covers has been rolled up into the
+daily metrics tables, since product views and user activity are computed from
+raw events.
+"""
+
+import logging
+import re
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Max, Min
+
+logger = logging.getLogger(__name__)
+
+PARENT_TABLE = 'analytics_events'
+LEGACY_PARTITION = 'analytics_events_legacy'
+DEFAULT_PARTITION = 'analytics_events_default'
+
+_BOUND_RE = re.compile(r"FROM \((?P<lower>[^)]*)\) TO \((?P<upper>[^)]*)\)")
+
+
+def month_start(day):
+    return date(day.year, day.month, 1)
+
+
+def add_months(day, months):
+    index = day.year * 12 + day.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(month):
+    return f'{PARENT_TABLE}_p{month.year:04d}_{month.month:02d}'
+
+
+def _utc_midnight(day):
+    return datetime(day.year, day.month, day.day, tzinfo=dt_timezone.utc)
+
+
+def _parse_bound(value):
+    value = value.strip()
+    if value.upper() in ('MINVALUE', 'MAXVALUE'):
+        return None
+    return datetime.fromisoformat(value.strip("'")).astimezone(dt_timezone.utc)
+
+
+def is_partitioned():
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT EXISTS (SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass(%s))",
+            [PARENT_TABLE],
+        )
+        return cursor.fetchone()[0]
+
+
+def list_partitions():
+    """
+    [(name, lower, upper)] for the range partitions, with None for MINVALUE/MAXVALUE
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(
+            """
+            SELECT child.relname, pg_get_expr(child.relpartbound, child.oid)
+            FROM pg_inherits
+            JOIN pg_class child ON child.oid = pg_inherits.inhrelid
+            WHERE pg_inherits.inhparent = %s::regclass
+            ORDER BY child.relname
+            """,
+            [PARENT_TABLE],
+        )
+        rows = cursor.fetchall()
+
+    partitions = []
+    for name, bound in rows:
+        match = _BOUND_RE.search(bound)
+        if match is None:
+            # DEFAULT partition
+            continue
+        partitions.append((name, _parse_bound(match.group('lower')), _parse_bound(match.group('upper'))))
+    return partitions
+
+
+def _covered(partitions, moment):
+    for _name, lower, upper in partitions:
+        if (lower is None or lower <= moment) and (upper is None or moment < upper):
+            return True
+    return False
+
+
+def create_partition_sql(month):
+    lower = _utc_midnight(month).isoformat()
+    upper = _utc_midnight(add_months(month, 1)).isoformat()
+    return (
+        f"CREATE TABLE IF NOT EXISTS {partition_name(month)} PARTITION OF {PARENT_TABLE} "
+        f"FOR VALUES FROM ('{lower}') TO ('{upper}')"
+    )
+
+
+def ensure_partitions(months_ahead=None, today=None):
+    """
+    Create missing monthly partitions from the current month through months_ahead.
+    Returns the names of the partitions created.
+    """
+    if months_ahead is None:
+        months_ahead = getattr(settings, 'ANALYTICS_PARTITIONS_AHEAD', 2)
+    current = month_start(today or datetime.now(dt_timezone.utc).date())
+
+    partitions = list_partitions()
+    created = []
+    for offset in range(months_ahead + 1):
+        month = add_months(current, offset)
+        if _covered(partitions, _utc_midnight(month)):
+            continue
+        with connection.cursor() as cursor:
+            cursor.execute(create_partition_sql(month))
+        created.append(partition_name(month))
+        partitions.append((partition_name(month), _utc_midnight(month), _utc_midnight(add_months(month, 1))))
+
+    if created:
+        logger.info(f"Created analytics event partitions: {', '.join(created)}")
+    return created
+
+
+def _ensure_rolled_up(name, lower, upper):
+    """
+    Materialize any day in the partition that the daily rollups are missing
+    """
+    from .models import AnalyticsEvent, UserMetrics
+    from .rollups import _missing_days, backfill
+
+    events = AnalyticsEvent.objects.filter(created_at__lt=upper)
+    if lower is not None:
+        events = events.filter(created_at__gte=lower)
+    span = events.aggregate(first=Min('created_at'), last=Max('created_at'))
+    if span['first'] is None:
+        return
+
+    start_day = span['first'].date()
+    end_day = span['last'].date() + timedelta(days=1)
+    missing = _missing_days(UserMetrics, start_day, end_day)
+    if missing:
+        logger.info(f"Rolling up {len(missing)} day(s) of {name} before it is dropped")
+        backfill(missing[0], missing[-1] + timedelta(days=1))
+
+
+def drop_expired_partitions(retention_months=None, today=None):
+    """
+    Drop partitions whose whole range is older than the retention window.
+    Returns the names of the partitions dropped.
+    """
+    if retention_months is None:
+        retention_months = getattr(settings, 'ANALYTICS_EVENT_RETENTION_MONTHS', 13)
+    current = month_start(today or datetime.now(dt_timezone.utc).date())
+    cutoff = _utc_midnight(add_months(current, -retention_months))
+
+    dropped = []
+    for name, lower, upper in list_partitions():
+        if upper is None or upper > cutoff:
+            continue
+        _ensure_rolled_up(name, lower, upper)
+        with transaction.atomic():
+            with connection.cursor() as cursor:
+                cursor.execute(f"ALTER TABLE {PARENT_TABLE} DETACH PARTITION {name}")
+                cursor.execute(f"DROP TABLE {name}")
+        dropped.append(name)
+
+    if dropped:
+        logger.info(f"Dropped expired analytics event partitions: {', '.join(dropped)}")
+    return dropped
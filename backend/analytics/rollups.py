@@ -0,0 +1,587 @@
+"""
+Daily analytics rollups
+
+Materializes OrderMetrics, ProductMetrics, UserMetrics, DeliveryMetrics and
+daily RevenueMetrics from the raw orders, order_items, payment_transactions,
+delivery_requests and analytics_events tables.
+
+Every compute_* function aggregates a whole [start_day, end_day) range with
+one GROUP BY per table, so materializing a chunk of days costs the same number
+of queries as materializing a single day. Rows are replaced per day inside a
+transaction, which makes re-running any range idempotent.
+
+Dashboard readers combine the materialized closed days with a live computation
+for today (and for any closed day that has not been materialized yet).
+
+Rows are bucketed by the local day they were created, but orders keep changing
+(payments settle, deliveries complete) long after that day closed. The daily
+task re-materializes the last ANALYTICS_ROLLUP_LOOKBACK_DAYS days anyway; a
+change to an older order, payment or delivery request marks its day dirty
+(analytics.signals) and the next run re-materializes the dirty days.
+"""
+
+import logging
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Avg, Count, DecimalField, F, Q, Sum, Value
+from django.db.models.functions import Coalesce, TruncDate
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+ZERO = Decimal('0')
+MONEY = DecimalField(max_digits=12, decimal_places=2)
+
+
+# Date helpers
+
+def today():
+    return timezone.localdate()
+
+
+def day_range(start_day, end_day):
+    """Yield each date in [start_day, end_day)"""
+    day = start_day
+    while day < end_day:
+        yield day
+        day += timedelta(days=1)
+
+
+def _bounds(start_day, end_day):
+    tz = timezone.get_current_timezone()
+    return (
+        timezone.make_aware(datetime.combine(start_day, time.min), tz),
+        timezone.make_aware(datetime.combine(end_day, time.min), tz),
+    )
+
+
+# Paid-order predicates shared with the dashboard
+
+def orders_with_paid_total(queryset):
+    """
+    Annotate orders with paid_total: the sum of their settled payment
+    transactions, as stored on the order by payments.ledger
+    """
+    return queryset.annotate(paid_total=F('amount_paid'))
+
+
+# Orders whose payment has settled (sales and revenue charts)
+SETTLED_Q = Q(payment_status__in=['paid', 'completed', 'done']) | Q(paid_total__gte=F('total_amount'))
+
+# Orders recognized as revenue (revenue totals and top products): settled or delivered
+RECOGNIZED_Q = Q(payment_status='paid') | Q(status='delivered') | Q(paid_total__gte=F('total_amount'))
+
+
+# Computation
+
+def compute_order_metrics(start_day, end_day):
+    """
+    Order metrics per day for [start_day, end_day), keyed by date
+    """
+    from orders.models import Order
+
+    start, end = _bounds(start_day, end_day)
+    orders = orders_with_paid_total(
+        Order.objects.filter(created_at__gte=start, created_at__lt=end)
+    ).annotate(day=TruncDate('created_at'))
+
+    results = {day: _empty_order_metrics() for day in day_range(start_day, end_day)}
+
+    rows = orders.values('day').annotate(
+        total_orders=Count('id'),
+        new_orders=Count('id', filter=Q(status='pending')),
+        completed_orders=Count('id', filter=Q(status='delivered')),
+        cancelled_orders=Count('id', filter=Q(status='cancelled')),
+        gross_order_value=Coalesce(Sum('total_amount'), Value(0), output_field=MONEY),
+        paid_orders=Count('id', filter=SETTLED_Q),
+        paid_revenue=Coalesce(Sum('total_amount', filter=SETTLED_Q), Value(0), output_field=MONEY),
+        revenue_orders=Count('id', filter=RECOGNIZED_Q),
+        total_revenue=Coalesce(Sum('total_amount', filter=RECOGNIZED_Q), Value(0), output_field=MONEY),
+        product_revenue=Coalesce(Sum('subtotal', filter=RECOGNIZED_Q), Value(0), output_field=MONEY),
+        delivery_revenue=Coalesce(Sum('delivery_fee', filter=RECOGNIZED_Q), Value(0), output_field=MONEY),
+        cash_payments=Count('id', filter=Q(payment_method='cash')),
+        card_payments=Count('id', filter=Q(payment_method='card')),
+        mobile_money_payments=Count('id', filter=Q(payment_method='mobile_money')),
+        wallet_payments=Count('id', filter=Q(payment_method='wallet')),
+    )
+    for row in rows:
+        day = row.pop('day')
+        metrics = results[day]
+        metrics.update(row)
+        if metrics['revenue_orders']:
+            metrics['avg_order_value'] = (metrics['total_revenue'] / metrics['revenue_orders']).quantize(Decimal('0.01'))
+        if metrics['total_orders']:
+            metrics['conversion_rate'] = Decimal(metrics['paid_orders'] * 100 / metrics['total_orders']).quantize(Decimal('0.01'))
+
+    for row in orders.values('day', 'status').annotate(count=Count('id')):
+        results[row['day']]['status_counts'][row['status']] = row['count']
+
+    for row in orders.values('day', 'city').annotate(
+        orders_count=Count('id'),
+        revenue=Coalesce(Sum('total_amount'), Value(0), output_field=MONEY),
+    ):
+        results[row['day']]['city_breakdown'][row['city'] or 'Unknown'] = {
+            'orders': row['orders_count'],
+            'revenue': str(row['revenue']),
+        }
+
+    return results
+
+
+def _empty_order_metrics():
+    return {
+        'total_orders': 0,
+        'new_orders': 0,
+        'completed_orders': 0,
+        'cancelled_orders': 0,
+        'gross_order_value': ZERO,
+        'paid_orders': 0,
+        'paid_revenue': ZERO,
+        'revenue_orders': 0,
+        'total_revenue': ZERO,
+        'avg_order_value': ZERO,
+        'product_revenue': ZERO,
+        'delivery_revenue': ZERO,
+        'cash_payments': 0,
+        'card_payments': 0,
+        'mobile_money_payments': 0,
+        'wallet_payments': 0,
+        'conversion_rate': ZERO,
+        'status_counts': {},
+        'city_breakdown': {},
+    }
+
+
+def compute_product_metrics(start_day, end_day):
+    """
+    Product metrics per (day, product_id) for [start_day, end_day)
+    """
+    from django.contrib.contenttypes.models import ContentType
+    from orders.models import Order, OrderItem, Review
+    from products.models import Product
+    from .models import AnalyticsEvent
+
+    start, end = _bounds(start_day, end_day)
+    results = defaultdict(lambda: {
+        'views': 0,
+        'unique_views': 0,
+        'add_to_cart_count': 0,
+        'purchase_count': 0,
+        'revenue': ZERO,
+        'new_reviews': 0,
+        'avg_rating': None,
+    })
+
+    recognized_orders = orders_with_paid_total(
+        Order.objects.filter(created_at__gte=start, created_at__lt=end)
+    ).filter(RECOGNIZED_Q).values('id')
+
+    for row in OrderItem.objects.filter(order_id__in=recognized_orders).annotate(
+        day=TruncDate('order__created_at')
+    ).values('day', 'product_id').annotate(
+        quantity=Sum('quantity'),
+        sales=Coalesce(Sum('total_price'), Value(0), output_field=MONEY),
+    ):
+        metrics = results[(row['day'], row['product_id'])]
+        metrics['purchase_count'] = row['quantity'] or 0
+        metrics['revenue'] = row['sales']
+
+    product_type = ContentType.objects.get_for_model(Product)
+    product_events = Q(event_type='product_view')
+    for row in AnalyticsEvent.objects.filter(
+        content_type=product_type,
+        object_id__isnull=False,
+        event_type__in=['product_view', 'product_add_to_cart'],
+        created_at__gte=start,
+        created_at__lt=end,
+    ).annotate(day=TruncDate('created_at')).values('day', 'object_id').annotate(
+        views=Count('id', filter=product_events),
+        unique_views=Count('user', filter=product_events, distinct=True),
+        add_to_cart_count=Count('id', filter=Q(event_type='product_add_to_cart')),
+    ):
+        metrics = results[(row['day'], row['object_id'])]
+        metrics['views'] = row['views']
+        metrics['unique_views'] = row['unique_views']
+        metrics['add_to_cart_count'] = row['add_to_cart_count']
+
+    for row in Review.objects.filter(created_at__gte=start, created_at__lt=end).annotate(
+        day=TruncDate('created_at')
+    ).values('day', 'product_id').annotate(new_reviews=Count('id'), avg_rating=Avg('rating')):
+        metrics = results[(row['day'], row['product_id'])]
+        metrics['new_reviews'] = row['new_reviews']
+        metrics['avg_rating'] = Decimal(str(row['avg_rating'])).quantize(Decimal('0.01'))
+
+    # Events can reference products that have since been deleted
+    existing = set(Product.objects.filter(
+        id__in={product_id for _, product_id in results}
+    ).values_list('id', flat=True))
+    return {key: value for key, value in results.items() if key[1] in existing}
+
+
+def compute_user_metrics(start_day, end_day):
+    """
+    User metrics per day for [start_day, end_day)
+    """
+    from users.models import User
+    from .models import AnalyticsEvent
+
+    start, end = _bounds(start_day, end_day)
+    results = {}
+
+    # Running totals start from everything that joined before the range
+    baseline = User.objects.filter(date_joined__lt=start).aggregate(
+        total=Count('id'),
+        customers=Count('id', filter=Q(user_type='customer')),
+        drivers=Count('id', filter=Q(user_type='driver')),
+        admins=Count('id', filter=Q(user_type='admin')),
+    )
+
+    joined = {
+        row['day']: row for row in User.objects.filter(date_joined__gte=start, date_joined__lt=end).annotate(
+            day=TruncDate('date_joined')
+        ).values('day').annotate(
+            new_users=Count('id'),
+            customers=Count('id', filter=Q(user_type='customer')),
+            drivers=Count('id', filter=Q(user_type='driver')),
+            admins=Count('id', filter=Q(user_type='admin')),
+        )
+    }
+    activity = {
+        row['day']: row for row in AnalyticsEvent.objects.filter(created_at__gte=start, created_at__lt=end).annotate(
+            day=TruncDate('created_at')
+        ).values('day').annotate(
+            active_users=Count('user', distinct=True),
+            total_sessions=Count('session_id', distinct=True),
+        )
+    }
+
+    running = dict(baseline)
+    for day in day_range(start_day, end_day):
+        new = joined.get(day, {})
+        running['total'] += new.get('new_users', 0)
+        running['customers'] += new.get('customers', 0)
+        running['drivers'] += new.get('drivers', 0)
+        running['admins'] += new.get('admins', 0)
+        active_users = activity.get(day, {}).get('active_users', 0)
+        results[day] = {
+            'total_users': running['total'],
+            'new_users': new.get('new_users', 0),
+            'active_users': active_users,
+            'returning_users': max(active_users - new.get('new_users', 0), 0),
+            'customers': running['customers'],
+            'drivers': running['drivers'],
+            'admins': running['admins'],
+            'total_sessions': activity.get(day, {}).get('total_sessions', 0),
+        }
+    return results
+
+
+def compute_delivery_metrics(start_day, end_day):
+    """
+    Delivery metrics per day for [start_day, end_day)
+    """
+    from deliveries.models import DeliveryRequest, DeliveryRating
+
+    start, end = _bounds(start_day, end_day)
+    results = {day: {
+        'total_deliveries': 0,
+        'new_deliveries': 0,
+        'completed_deliveries': 0,
+        'cancelled_deliveries': 0,
+        'avg_delivery_time': ZERO,
+        'avg_delivery_distance': ZERO,
+        'total_delivery_fees': ZERO,
+        'avg_delivery_fee': ZERO,
+        'active_drivers': 0,
+        'avg_driver_rating': ZERO,
+    } for day in day_range(start_day, end_day)}
+
+    for row in DeliveryRequest.objects.filter(created_at__gte=start, created_at__lt=end).annotate(
+        day=TruncDate('created_at')
+    ).values('day').annotate(
+        total_deliveries=Count('id'),
+        new_deliveries=Count('id', filter=Q(status='pending')),
+        completed_deliveries=Count('id', filter=Q(status='delivered')),
+        cancelled_deliveries=Count('id', filter=Q(status='cancelled')),
+        avg_delivery_time=Coalesce(Avg('actual_time'), Value(0), output_field=MONEY),
+        avg_delivery_distance=Coalesce(Avg('distance'), Value(0), output_field=MONEY),
+        total_delivery_fees=Coalesce(Sum('delivery_fee'), Value(0), output_field=MONEY),
+        avg_delivery_fee=Coalesce(Avg('delivery_fee'), Value(0), output_field=MONEY),
+        active_drivers=Count('driver', distinct=True),
+    ):
+        day = row.pop('day')
+        results[day].update({
+            key: value.quantize(Decimal('0.01')) if isinstance(value, Decimal) else value
+            for key, value in row.items()
+        })
+
+    for row in DeliveryRating.objects.filter(created_at__gte=start, created_at__lt=end).annotate(
+        day=TruncDate('created_at')
+    ).values('day').annotate(avg_rating=Avg('rating')):
+        results[row['day']]['avg_driver_rating'] = Decimal(str(row['avg_rating'])).quantize(Decimal('0.01'))
+
+    return results
+
+
+def compute_costs(start_day, end_day):
+    """
+    Expense totals per day for [start_day, end_day)
+    """
+    from expenses.models import Expense
+
+    return {
+        row['date']: row['total'] for row in Expense.objects.filter(
+            date__gte=start_day, date__lt=end_day
+        ).values('date').annotate(total=Sum('amount'))
+    }
+
+
+# Materialization
+
+def materialize_range(start_day, end_day):
+    """
+    Recompute and store every rollup for the closed days in [start_day, end_day).
+    Safe to re-run: each day's rows are replaced atomically.
+    """
+    from .models import OrderMetrics, ProductMetrics, UserMetrics, DeliveryMetrics, RevenueMetrics
+
+    end_day = min(end_day, today())
+    if start_day >= end_day:
+        return 0
+
+    order_metrics = compute_order_metrics(start_day, end_day)
+    product_metrics = compute_product_metrics(start_day, end_day)
+    user_metrics = compute_user_metrics(start_day, end_day)
+    delivery_metrics = compute_delivery_metrics(start_day, end_day)
+    costs = compute_costs(start_day, end_day)
+
+    # Growth compares against the day before the range
+    previous_day = start_day - timedelta(days=1)
+    previous = OrderMetrics.objects.filter(date=previous_day).values('total_revenue', 'total_orders').first()
+
+    days = list(day_range(start_day, end_day))
+    order_rows, revenue_rows = [], []
+    for day in days:
+        metrics = dict(order_metrics[day])
+        product_revenue = metrics.pop('product_revenue')
+        delivery_revenue = metrics.pop('delivery_revenue')
+        order_rows.append(OrderMetrics(date=day, **metrics))
+
+        total_costs = costs.get(day) or ZERO
+        gross_profit = metrics['total_revenue'] - total_costs
+        revenue_rows.append(RevenueMetrics(
+            period_type='daily',
+            period_start=day,
+            period_end=day,
+            total_revenue=metrics['total_revenue'],
+            product_revenue=product_revenue,
+            delivery_revenue=delivery_revenue,
+            total_costs=total_costs,
+            gross_profit=gross_profit,
+            profit_margin=_percentage(gross_profit, metrics['total_revenue']),
+            revenue_growth=_growth(metrics['total_revenue'], previous and previous['total_revenue']),
+            order_growth=_growth(metrics['total_orders'], previous and previous['total_orders']),
+        ))
+        previous = {'total_revenue': metrics['total_revenue'], 'total_orders': metrics['total_orders']}
+
+    with transaction.atomic():
+        OrderMetrics.objects.filter(date__in=days).delete()
+        OrderMetrics.objects.bulk_create(order_rows)
+
+        RevenueMetrics.objects.filter(period_type='daily', period_start__in=days).delete()
+        RevenueMetrics.objects.bulk_create(revenue_rows)
+
+        UserMetrics.objects.filter(date__in=days).delete()
+        UserMetrics.objects.bulk_create([UserMetrics(date=day, **user_metrics[day]) for day in days])
+
+        DeliveryMetrics.objects.filter(date__in=days).delete()
+        DeliveryMetrics.objects.bulk_create([DeliveryMetrics(date=day, **delivery_metrics[day]) for day in days])
+
+        ProductMetrics.objects.filter(date__in=days).delete()
+        ProductMetrics.objects.bulk_create(
+            [ProductMetrics(date=day, product_id=product_id, **metrics)
+             for (day, product_id), metrics in product_metrics.items()],
+            batch_size=1000
+        )
+
+    logger.info(f"Materialized analytics rollups for {start_day} to {end_day - timedelta(days=1)}")
+    return len(days)
+
+
+def backfill(start_day, end_day, chunk_days=31):
+    """
+    Materialize [start_day, end_day) in chunks so years of history never
+    hold one long transaction or one huge result set
+    """
+    materialized = 0
+    chunk_start = start_day
+    while chunk_start < end_day:
+        chunk_end = min(chunk_start + timedelta(days=chunk_days), end_day)
+        materialized += materialize_range(chunk_start, chunk_end)
+        chunk_start = chunk_end
+    return materialized
+
+
+# Dirty days
+
+def lookback_start():
+    """First day the daily task re-materializes on every run"""
+    return today() - timedelta(days=getattr(settings, 'ANALYTICS_ROLLUP_LOOKBACK_DAYS', 3))
+
+
+def mark_dirty(created_at):
+    """
+    Queue the local day of `created_at` for re-materialization if the daily
+    task no longer recomputes it. Runs in the caller's transaction.
+    """
+    from .models import RollupDirtyDay
+
+    if created_at is None:
+        return
+    day = timezone.localdate(created_at)
+    if day >= lookback_start():
+        return
+    # A day marked again while it is being re-materialized keeps its newer mark
+    RollupDirtyDay.objects.bulk_create(
+        [RollupDirtyDay(date=day, marked_at=timezone.now())],
+        update_conflicts=True, unique_fields=['date'], update_fields=['marked_at'],
+    )
+
+
+def rematerialize_dirty_days():
+    """
+    Re-materialize every dirty day, consecutive days as one range; returns how many
+    """
+    from .models import RollupDirtyDay
+
+    started = timezone.now()
+    days = sorted(RollupDirtyDay.objects.filter(marked_at__lte=started).values_list('date', flat=True))
+    if not days:
+        return 0
+
+    run_start = previous = days[0]
+    for day in days[1:] + [None]:
+        if day is not None and day == previous + timedelta(days=1):
+            previous = day
+            continue
+        backfill(run_start, previous + timedelta(days=1))
+        run_start = previous = day
+
+    # Days marked again since `started` stay dirty for the next run
+    RollupDirtyDay.objects.filter(date__in=days, marked_at__lte=started).delete()
+    return len(days)
+
+
+def _percentage(part, whole):
+    if not whole:
+        return ZERO
+    value = (Decimal(part) * 100 / Decimal(whole)).quantize(Decimal('0.01'))
+    # Percentage columns are max_digits=5
+    return max(min(value, Decimal('999.99')), Decimal('-999.99'))
+
+
+def _growth(current, previous):
+    if not previous:
+        return ZERO
+    return _percentage(Decimal(current) - Decimal(previous), previous)
+
+
+# Readers
+
+def _missing_days(model, start_day, end_day, date_field='date', **filters):
+    materialized = set(model.objects.filter(
+        **{f'{date_field}__gte': start_day, f'{date_field}__lt': end_day}, **filters
+    ).values_list(date_field, flat=True))
+    return [day for day in day_range(start_day, end_day) if day not in materialized]
+
+
+def daily_order_metrics(start_day):
+    """
+    Order metrics per day from start_day through today: materialized closed
+    days plus a live computation for today and any unmaterialized day
+    """
+    from .models import OrderMetrics
+
+    end_day = today()
+    fields = list(_empty_order_metrics().keys())
+    fields.remove('product_revenue')
+    fields.remove('delivery_revenue')
+
+    results = {
+        row.pop('date'): row
+        for row in OrderMetrics.objects.filter(date__gte=start_day, date__lt=end_day).values('date', *fields)
+    }
+
+    missing = _missing_days(OrderMetrics, start_day, end_day)
+    live_start = min(missing) if missing else end_day
+    for day, metrics in compute_order_metrics(live_start, end_day + timedelta(days=1)).items():
+        if day not in results:
+            results[day] = metrics
+
+    return [dict(results[day], date=day) for day in sorted(results)]
+
+
+def status_totals(order_days):
+    """
+    Order counts per status summed over daily_order_metrics() rows, largest first
+    """
+    totals = defaultdict(int)
+    for day in order_days:
+        for status, count in day['status_counts'].items():
+            totals[status] += count
+    return [
+        {'status': status, 'count': count}
+        for status, count in sorted(totals.items(), key=lambda item: -item[1])
+    ]
+
+
+def product_totals(start_day):
+    """
+    Revenue and quantity per product from start_day through today
+    """
+    from .models import ProductMetrics, OrderMetrics
+
+    end_day = today()
+    totals = defaultdict(lambda: {'revenue': ZERO, 'quantity': 0})
+
+    for row in ProductMetrics.objects.filter(date__gte=start_day, date__lt=end_day).values('product_id').annotate(
+        revenue=Sum('revenue'), quantity=Sum('purchase_count')
+    ):
+        totals[row['product_id']]['revenue'] += row['revenue'] or ZERO
+        totals[row['product_id']]['quantity'] += row['quantity'] or 0
+
+    # ProductMetrics has no row for days without sales, so OrderMetrics marks what was materialized
+    missing = _missing_days(OrderMetrics, start_day, end_day)
+    live_start = min(missing) if missing else end_day
+    for (day, product_id), metrics in compute_product_metrics(live_start, end_day + timedelta(days=1)).items():
+        if day in missing or day == end_day:
+            totals[product_id]['revenue'] += metrics['revenue']
+            totals[product_id]['quantity'] += metrics['purchase_count']
+
+    return totals
+
+
+def delivery_totals(start_day):
+    """
+    Delivery counts from start_day through today
+    """
+    from .models import DeliveryMetrics
+
+    end_day = today()
+    totals = DeliveryMetrics.objects.filter(date__gte=start_day, date__lt=end_day).aggregate(
+        total=Coalesce(Sum('total_deliveries'), 0),
+        completed=Coalesce(Sum('completed_deliveries'), 0),
+    )
+
+    missing = _missing_days(DeliveryMetrics, start_day, end_day)
+    live_start = min(missing) if missing else end_day
+    for day, metrics in compute_delivery_metrics(live_start, end_day + timedelta(days=1)).items():
+        if day in missing or day == end_day:
+            totals['total'] += metrics['total_deliveries']
+            totals['completed'] += metrics['completed_deliveries']
+
+    return totals
@@ -1,3 +1,5 @@
+from django.conf import settings
+from django.contrib.contenttypes.models import ContentType
 from rest_framework import serializers
 from .models import (
     AnalyticsEvent, UserMetrics, ProductMetrics, OrderMetrics,
@@ -205,8 +207,29 @@ class TopSearchTermsSerializer(serializers.Serializer):
 
 class EventTrackingSerializer(serializers.Serializer):
     """Serializer for event tracking"""
-    event_type = serializers.CharField()
+    event_type = serializers.ChoiceField(choices=AnalyticsEvent.EVENT_TYPE_CHOICES)
     event_data = serializers.JSONField(required=False)
-    session_id = serializers.CharField(required=False)
+    session_id = serializers.CharField(max_length=100, required=False)
+    content_type = serializers.IntegerField(required=False)
+    object_id = serializers.IntegerField(min_value=0, required=False)
     latitude = serializers.DecimalField(max_digits=9, decimal_places=6, required=False)
-    longitude = serializers.DecimalField(max_digits=9, decimal_places=6, required=False) 
\ No newline at end of file
+    longitude = serializers.DecimalField(max_digits=9, decimal_places=6, required=False)
+
+    def validate_content_type(self, value):
+        # get_for_id is served from the content type cache, so batches cost no queries
+        try:
+            ContentType.objects.get_for_id(value)
+        except ContentType.DoesNotExist:
+            raise serializers.ValidationError(f"Unknown content type {value}")
+        return value
+
+
+class EventBatchSerializer(serializers.Serializer):
+    """Serializer for a batch of tracked events"""
+    events = EventTrackingSerializer(many=True, allow_empty=False)
+
+    def validate_events(self, value):
+        max_events = getattr(settings, 'ANALYTICS_MAX_BATCH_EVENTS', 200)
+        if len(value) > max_events:
+            raise serializers.ValidationError(f"At most {max_events} events per batch")
+        return value
@@ -0,0 +1,34 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from deliveries.models import DeliveryRequest
+from orders.models import Order
+from payments.models import PaymentTransaction
+from .rollups import mark_dirty
+
+
+@receiver(post_save, sender=Order)
+@receiver(post_delete, sender=Order)
+@receiver(post_save, sender=DeliveryRequest)
+@receiver(post_delete, sender=DeliveryRequest)
+def mark_rollup_day_dirty(sender, instance, **kwargs):
+    """
+    Status, payment and delivery changes reach the rollups of the day the row was created
+    """
+    if kwargs.get('raw'):
+        return
+    mark_dirty(instance.created_at)
+
+
+@receiver(post_save, sender=PaymentTransaction)
+@receiver(post_delete, sender=PaymentTransaction)
+def mark_order_rollup_day_dirty(sender, instance, **kwargs):
+    """
+    A payment changes the paid totals of its order, which count on the order's day
+    """
+    if kwargs.get('raw') or not instance.order_id:
+        return
+    if PaymentTransaction.order.is_cached(instance) and instance.order is not None:
+        created_at = instance.order.created_at
+    else:
+        created_at = Order.objects.filter(pk=instance.order_id).values_list('created_at', flat=True).first()
+    mark_dirty(created_at)
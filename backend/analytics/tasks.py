@@ -0,0 +1,99 @@
+from celery import shared_task
+from django.conf import settings
+from datetime import timedelta
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+@shared_task
+def materialize_daily_metrics(lookback_days=None):
+    """
+    Celery task to materialize analytics rollups for recently closed days
+    Recent days are re-materialized on every run because payments and
+    deliveries keep changing an order's paid/delivered state after the day closes;
+    older days are re-materialized when such a change marked them dirty.
+    """
+    try:
+        from .models import OrderMetrics
+        from .rollups import materialize_range, backfill, rematerialize_dirty_days, today
+
+        if lookback_days is None:
+            lookback_days = getattr(settings, 'ANALYTICS_ROLLUP_LOOKBACK_DAYS', 3)
+
+        end_day = today()
+        start_day = end_day - timedelta(days=lookback_days)
+
+        # Catch up on any gap left by downtime before the lookback window
+        latest = OrderMetrics.objects.order_by('-date').values_list('date', flat=True).first()
+        if latest and latest + timedelta(days=1) < start_day:
+            backfill(latest + timedelta(days=1), start_day)
+
+        days = materialize_range(start_day, end_day)
+        dirty_days = rematerialize_dirty_days()
+
+        logger.info(f"Materialized {days} day(s) of analytics rollups and {dirty_days} dirty day(s)")
+        return {
+            'success': True,
+            'days_materialized': days,
+            'dirty_days_materialized': dirty_days
+        }
+
+    except Exception as e:
+        logger.error(f"Error materializing analytics rollups: {e}")
+        return {
+            'success': False,
+            'error': str(e)
+        }
+
+
+@shared_task(ignore_result=True)
+def flush_analytics_buffers(kind=None):
+    """
+    Celery task to bulk-insert buffered analytics events and searches
+    Runs on a short beat interval and whenever a buffer reaches ANALYTICS_BUFFER_FLUSH_SIZE.
+    """
+    from .ingest import BUFFERS, flush
+
+    written = {}
+    for buffer_kind in ([kind] if kind else BUFFERS):
+        try:
+            written[buffer_kind] = flush(buffer_kind)
+        except Exception as e:
+            logger.error(f"Error flushing analytics {buffer_kind} buffer: {e}")
+
+    if any(written.values()):
+        logger.info(f"Flushed analytics buffers: {written}")
+    return written
+
+
+@shared_task
+def maintain_event_partitions():
+    """
+    Celery task to create upcoming analytics_events partitions and drop expired ones
+    Expired partitions are rolled up into the daily metrics before they are dropped.
+    """
+    try:
+        from .partitions import drop_expired_partitions, ensure_partitions, is_partitioned
+
+        if not is_partitioned():
+            return {
+                'success': False,
+                'error': 'analytics_events is not partitioned'
+            }
+
+        created = ensure_partitions()
+        dropped = drop_expired_partitions()
+
+        return {
+            'success': True,
+            'created': created,
+            'dropped': dropped
+        }
+
+    except Exception as e:
+        logger.error(f"Error maintaining analytics event partitions: {e}")
+        return {
+            'success': False,
+            'error': str(e)
+        }
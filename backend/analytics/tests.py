@@ -1,3 +1,85 @@
-from django.test import TestCase
+from datetime import timedelta
+from decimal import Decimal
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from orders.models import Order
+from payments.models import PaymentTransaction
+
+from .models import OrderMetrics, RollupDirtyDay
+from .rollups import materialize_range, rematerialize_dirty_days
+from .views import user_account_stats
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class UserStatsTests(TestCase):
+    """
+    User stats are one conditional aggregate over users
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        User = get_user_model()
+        User.objects.create_user(username='new', email='new@example.com', password='x')
+        User.objects.create_user(username='driver', email='driver@example.com', password='x', user_type='driver',
+                                 date_joined=timezone.now() - timedelta(days=3))
+        User.objects.create_user(username='old', email='old@example.com', password='x', user_type='admin',
+                                 is_active=False, date_joined=timezone.now() - timedelta(days=30))
+
+    def setUp(self):
+        cache.clear()
+
+    def test_one_query(self):
+        with self.assertNumQueries(1):
+            stats = user_account_stats()
+        self.assertEqual((stats['total_users'], stats['active_users']), (3, 2))
+        self.assertEqual((stats['new_users_today'], stats['new_users_week']), (1, 2))
+        self.assertEqual(stats['user_types'], {'customers': 1, 'drivers': 1, 'admins': 1})
+
+
+class DirtyRollupDayTests(TestCase):
+    """
+    Changes to orders older than the lookback window re-materialize their day
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.customer = get_user_model().objects.create_user(username='late', email='late@example.com', password='x')
+        order = Order.objects.create(
+            customer=cls.customer, customer_name='Late', customer_email='late@example.com', customer_phone='1',
+            delivery_fee=Decimal('25.00'),
+        )
+        cls.day = timezone.localdate() - timedelta(days=10)
+        Order.objects.filter(pk=order.pk).update(created_at=timezone.now() - timedelta(days=10))
+        materialize_range(cls.day, cls.day + timedelta(days=1))
+
+    def setUp(self):
+        self.order = Order.objects.get()
+
+    def test_status_change_is_rematerialized(self):
+        self.assertEqual(OrderMetrics.objects.get(date=self.day).completed_orders, 0)
+        self.order.status = 'delivered'
+        self.order.save(update_fields=['status', 'updated_at'])
+        self.assertTrue(RollupDirtyDay.objects.filter(date=self.day).exists())
+
+        self.assertEqual(rematerialize_dirty_days(), 1)
+        self.assertEqual(OrderMetrics.objects.get(date=self.day).completed_orders, 1)
+        self.assertFalse(RollupDirtyDay.objects.exists())
+
+    def test_payment_marks_the_order_day(self):
+        PaymentTransaction.objects.create(
+            transaction_type='order', amount=Decimal('25.00'), status='successful', order=self.order,
+            customer=self.customer, customer_email='late@example.com', customer_name='Late',
+        )
+        self.assertEqual(list(RollupDirtyDay.objects.values_list('date', flat=True)), [self.day])
+        rematerialize_dirty_days()
+        self.assertEqual(OrderMetrics.objects.get(date=self.day).paid_orders, 1)
+
+    def test_recent_changes_are_not_marked(self):
+        Order.objects.create(
+            customer=self.customer, customer_name='Late', customer_email='late@example.com', customer_phone='1',
+        )
+        self.assertFalse(RollupDirtyDay.objects.exists())
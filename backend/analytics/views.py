@@ -1,8 +1,7 @@
 from rest_framework import viewsets, status, permissions
 from rest_framework.decorators import action, permission_classes
 from rest_framework.response import Response
-from django.db.models import Count, Sum, Avg, Q, F, OuterRef, Subquery, Value
-from django.db.models import DecimalField
+from django.db.models import Count, Sum, Avg, Max, Q, Value
 from django.db.models.functions import Coalesce
 from django.utils import timezone
 from datetime import datetime, timedelta
@@ -19,8 +18,9 @@ from .serializers import (
     OrderMetricsSerializer, DeliveryMetricsSerializer, RevenueMetricsSerializer,
     SearchAnalyticsSerializer, AnalyticsFilterSerializer, DashboardStatsSerializer,
     RevenueChartSerializer, ProductPerformanceSerializer, TopSearchTermsSerializer,
-    EventTrackingSerializer
+    EventTrackingSerializer, EventBatchSerializer
 )
+from utils.stats import cached_stats
 
 
 class AnalyticsEventViewSet(viewsets.ModelViewSet):
@@ -88,43 +88,93 @@ class AnalyticsEventViewSet(viewsets.ModelViewSet):
 
     @swagger_auto_schema(
         tags=['analytics'],
-        operation_description="Track a new analytics event"
+        operation_description="Stream analytics events as CSV, NDJSON or Parquet with the list filters (Admin only)"
+    )
+    @action(detail=False, methods=['get'])
+    def export(self, request):
+        """
+        Stream analytics events matching the list filters (export_format=csv|ndjson|parquet)
+        """
+        from utils.exports import ExportError, apply_export_filters, export_response
+        from .exports import ANALYTICS_EVENT_EXPORT_COLUMNS
+
+        if not request.user.is_staff:
+            return Response(
+                {'error': 'Admin permissions required'},
+                status=status.HTTP_403_FORBIDDEN
+            )
+
+        try:
+            # get_queryset already applies event_type, user_id and date filters
+            queryset = apply_export_filters(
+                self.get_queryset(), request.query_params, customer_field='user', status_field=None, dates=False
+            )
+            return export_response(
+                'analytics-events', queryset, ANALYTICS_EVENT_EXPORT_COLUMNS,
+                request.query_params.get('export_format', 'csv')
+            )
+        except ExportError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+    @swagger_auto_schema(
+        tags=['analytics'],
+        operation_description="Track a new analytics event (buffered, answered with 202)"
     )
     @action(detail=False, methods=['post'])
     def track_event(self, request):
         """
         Track a new analytics event
         """
+        from .ingest import buffer_records, request_event_records
+
         serializer = EventTrackingSerializer(data=request.data)
         if serializer.is_valid():
-            event = serializer.save()
-            return Response(
-                AnalyticsEventSerializer(event).data,
-                status=status.HTTP_201_CREATED
-            )
+            accepted = buffer_records('events', request_event_records(request, [serializer.validated_data]))
+            return Response({'accepted': accepted}, status=status.HTTP_202_ACCEPTED)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
     @swagger_auto_schema(
         tags=['analytics'],
-        operation_description="Get summary of events by type"
+        request_body=EventBatchSerializer,
+        operation_description="Track a batch of analytics events (buffered, answered with 202)"
+    )
+    @action(detail=False, methods=['post'])
+    def track_events(self, request):
+        """
+        Track a batch of analytics events, sent as {"events": [...]} or a bare list
+        """
+        from .ingest import buffer_records, request_event_records
+
+        data = {'events': request.data} if isinstance(request.data, list) else request.data
+        serializer = EventBatchSerializer(data=data)
+        if serializer.is_valid():
+            accepted = buffer_records('events', request_event_records(request, serializer.validated_data['events']))
+            return Response({'accepted': accepted}, status=status.HTTP_202_ACCEPTED)
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+    @swagger_auto_schema(
+        tags=['analytics'],
+        operation_description="Get summary of events by type (start_date/end_date as YYYY-MM-DD, default last 30 days)"
     )
     @action(detail=False, methods=['get'])
     def event_summary(self, request):
         """
         Get summary of events by type
         """
-        events = AnalyticsEvent.objects.all()
-        
-        # Filter by date range if provided
-        start_date = request.query_params.get('start_date', None)
-        end_date = request.query_params.get('end_date', None)
-        
-        if start_date:
-            events = events.filter(created_at__gte=start_date)
-        if end_date:
-            events = events.filter(created_at__lte=end_date)
+        # Explicit created_at bounds let PostgreSQL scan only the matching monthly partitions
+        try:
+            start, end = _event_window(
+                request.query_params.get('start_date'), request.query_params.get('end_date')
+            )
+        except ValueError:
+            return Response(
+                {'error': 'start_date and end_date must be YYYY-MM-DD'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
         
-        summary = events.values('event_type').annotate(
+        summary = AnalyticsEvent.objects.filter(
+            created_at__gte=start, created_at__lt=end
+        ).values('event_type').annotate(
             count=Count('id'),
             unique_users=Count('user', distinct=True)
         ).order_by('-count')
@@ -151,18 +201,68 @@ class AnalyticsEventViewSet(viewsets.ModelViewSet):
         
         # Get events from last 30 days
         thirty_days_ago = timezone.now() - timedelta(days=30)
-        recent_events = events.filter(created_at__gte=thirty_days_ago)
+        recent = Q(created_at__gte=thirty_days_ago)
+        
+        # One pass over the (user, created_at) index of each partition
+        totals = events.aggregate(
+            total_events=Count('id'),
+            recent_events=Count('id', filter=recent),
+            last_activity=Max('created_at'),
+        )
+        # Only the partitions of the last 30 days
+        event_types = events.filter(recent).order_by().values_list('event_type', flat=True).distinct()
         
         activity_summary = {
-            'total_events': events.count(),
-            'recent_events': recent_events.count(),
-            'event_types': list(recent_events.values_list('event_type', flat=True).distinct()),
-            'last_activity': events.order_by('-created_at').first().created_at if events.exists() else None
+            'total_events': totals['total_events'],
+            'recent_events': totals['recent_events'],
+            'event_types': list(event_types),
+            'last_activity': totals['last_activity']
         }
         
         return Response(activity_summary)
 
 
+def _event_window(start_date, end_date, default_days=30):
+    """
+    [start, end) datetimes for inclusive YYYY-MM-DD bounds, defaulting to the last default_days days
+    """
+    def start_of(day):
+        return timezone.make_aware(datetime.combine(day, datetime.min.time()))
+
+    end_day = datetime.strptime(end_date, '%Y-%m-%d').date() if end_date else timezone.localdate()
+    if start_date:
+        start_day = datetime.strptime(start_date, '%Y-%m-%d').date()
+    else:
+        start_day = end_day - timedelta(days=default_days - 1)
+    return start_of(start_day), start_of(end_day + timedelta(days=1))
+
+
+def user_account_stats():
+    """User counts, new sign-ups and the type breakdown in one scan of users"""
+    from users.models import User
+    
+    stats = User.objects.aggregate(
+        total_users=Count('id'),
+        active_users=Count('id', filter=Q(is_active=True)),
+        new_users_today=Count('id', filter=Q(date_joined__date=timezone.localdate())),
+        new_users_week=Count('id', filter=Q(date_joined__gte=timezone.now() - timedelta(days=7))),
+        customers=Count('id', filter=Q(user_type='customer')),
+        drivers=Count('id', filter=Q(user_type='driver')),
+        admins=Count('id', filter=Q(user_type='admin')),
+    )
+    return {
+        'total_users': stats['total_users'],
+        'active_users': stats['active_users'],
+        'new_users_today': stats['new_users_today'],
+        'new_users_week': stats['new_users_week'],
+        'user_types': {
+            'customers': stats['customers'],
+            'drivers': stats['drivers'],
+            'admins': stats['admins']
+        }
+    }
+
+
 class UserMetricsViewSet(viewsets.ModelViewSet):
     """
     ViewSet for user metrics
@@ -204,33 +304,7 @@ class UserMetricsViewSet(viewsets.ModelViewSet):
         """
         Get comprehensive user statistics
         """
-        from users.models import User
-        
-        total_users = User.objects.count()
-        active_users = User.objects.filter(is_active=True).count()
-        new_users_today = User.objects.filter(
-            date_joined__date=timezone.now().date()
-        ).count()
-        new_users_week = User.objects.filter(
-            date_joined__gte=timezone.now() - timedelta(days=7)
-        ).count()
-        
-        # User types breakdown
-        customers = User.objects.filter(user_type='customer').count()
-        drivers = User.objects.filter(user_type='driver').count()
-        admins = User.objects.filter(user_type='admin').count()
-        
-        stats = {
-            'total_users': total_users,
-            'active_users': active_users,
-            'new_users_today': new_users_today,
-            'new_users_week': new_users_week,
-            'user_types': {
-                'customers': customers,
-                'drivers': drivers,
-                'admins': admins
-            }
-        }
+        stats = cached_stats('users', user_account_stats)
         
         return Response(stats)
 
@@ -628,23 +702,84 @@ class SearchAnalyticsViewSet(viewsets.ModelViewSet):
 
     @swagger_auto_schema(
         tags=['analytics'],
-        operation_description="Track search analytics"
+        operation_description="Track search analytics (buffered, answered with 202)"
     )
     @action(detail=False, methods=['post'])
     def track_search(self, request):
         """
         Track a search event
         """
+        from .ingest import buffer_records, search_record
+
         serializer = SearchAnalyticsSerializer(data=request.data)
         if serializer.is_valid():
-            search = serializer.save()
-            return Response(
-                SearchAnalyticsSerializer(search).data,
-                status=status.HTTP_201_CREATED
-            )
+            accepted = buffer_records('searches', [search_record(serializer.validated_data, request.user)])
+            return Response({'accepted': accepted}, status=status.HTTP_202_ACCEPTED)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
+def dashboard_stats_for(days):
+    """
+    Dashboard statistics over the last `days` days: one aggregate each over
+    users and products, order and delivery figures from the daily rollups
+    """
+    from users.models import User
+    from products.models import Product
+    from orders.models import Order
+    from deliveries.models import DeliveryRequest
+    
+    start_date = timezone.now() - timedelta(days=days)
+    
+    # User stats
+    users = User.objects.aggregate(
+        total=Count('id'),
+        new=Count('id', filter=Q(date_joined__gte=start_date)),
+    )
+    
+    # Product stats
+    products = Product.objects.aggregate(
+        total=Count('id'),
+        low_stock=Count('id', filter=Q(stock__lt=10)),
+    )
+    
+    # Order and delivery stats come from the daily rollups
+    from .rollups import daily_order_metrics, delivery_totals
+    order_days = daily_order_metrics(start_date.date())
+    total_orders = sum(day['total_orders'] for day in order_days)
+    total_revenue = sum(day['gross_order_value'] for day in order_days)
+    avg_order_value = (total_revenue / total_orders) if total_orders else 0
+    
+    delivery_stats = delivery_totals(start_date.date())
+    total_deliveries = delivery_stats['total']
+    completed_deliveries = delivery_stats['completed']
+    
+    # Recent activity
+    recent_orders = Order.objects.order_by('-created_at')[:5]
+    recent_deliveries = DeliveryRequest.objects.order_by('-created_at')[:5]
+    
+    from orders.serializers import OrderSerializer
+    from deliveries.serializers import DeliveryRequestSerializer
+    
+    return {
+        'users': users,
+        'products': products,
+        'orders': {
+            'total': total_orders,
+            'revenue': total_revenue,
+            'avg_value': avg_order_value
+        },
+        'deliveries': {
+            'total': total_deliveries,
+            'completed': completed_deliveries,
+            'completion_rate': (completed_deliveries / total_deliveries * 100) if total_deliveries > 0 else 0
+        },
+        'recent_activity': {
+            'orders': OrderSerializer(recent_orders, many=True).data,
+            'deliveries': DeliveryRequestSerializer(recent_deliveries, many=True).data
+        }
+    }
+
+
 class DashboardViewSet(viewsets.ViewSet):
     """
     ViewSet for dashboard analytics
@@ -665,65 +800,8 @@ class DashboardViewSet(viewsets.ViewSet):
         """
         Get comprehensive dashboard statistics
         """
-        from users.models import User
-        from products.models import Product
-        from orders.models import Order
-        from deliveries.models import DeliveryRequest
-        
-        # Get date range
         days = int(request.query_params.get('days', 30))
-        start_date = timezone.now() - timedelta(days=days)
-        
-        # User stats
-        total_users = User.objects.count()
-        new_users = User.objects.filter(date_joined__gte=start_date).count()
-        
-        # Product stats
-        total_products = Product.objects.count()
-        low_stock_products = Product.objects.filter(stock__lt=10).count()
-        
-        # Order stats
-        orders = Order.objects.filter(created_at__gte=start_date)
-        total_orders = orders.count()
-        total_revenue = orders.aggregate(total=Sum('total_amount'))['total'] or 0
-        avg_order_value = orders.aggregate(avg=Avg('total_amount'))['avg'] or 0
-        
-        # Delivery stats
-        deliveries = DeliveryRequest.objects.filter(created_at__gte=start_date)
-        total_deliveries = deliveries.count()
-        completed_deliveries = deliveries.filter(status='completed').count()
-        
-        # Recent activity
-        recent_orders = Order.objects.order_by('-created_at')[:5]
-        recent_deliveries = DeliveryRequest.objects.order_by('-created_at')[:5]
-        
-        from orders.serializers import OrderSerializer
-        from deliveries.serializers import DeliveryRequestSerializer
-        
-        dashboard_stats = {
-            'users': {
-                'total': total_users,
-                'new': new_users
-            },
-            'products': {
-                'total': total_products,
-                'low_stock': low_stock_products
-            },
-            'orders': {
-                'total': total_orders,
-                'revenue': total_revenue,
-                'avg_value': avg_order_value
-            },
-            'deliveries': {
-                'total': total_deliveries,
-                'completed': completed_deliveries,
-                'completion_rate': (completed_deliveries / total_deliveries * 100) if total_deliveries > 0 else 0
-            },
-            'recent_activity': {
-                'orders': OrderSerializer(recent_orders, many=True).data,
-                'deliveries': DeliveryRequestSerializer(recent_deliveries, many=True).data
-            }
-        }
+        dashboard_stats = cached_stats('dashboard', lambda: dashboard_stats_for(days), vary=[days])
         
         return Response(dashboard_stats)
 
@@ -743,55 +821,18 @@ class DashboardViewSet(viewsets.ViewSet):
         days = int(request.query_params.get('days', 30))
         start_date = timezone.now() - timedelta(days=days)
         
-        # Consider orders as paid if:
-        # 1) payment_status='paid' OR
-        # 2) status indicates completion (delivered) OR
-        # 3) sum of successful/paid/done transactions >= order total (in case status hasn't synced yet)
-        from payments.models import PaymentTransaction
-        paid_sum_subquery = PaymentTransaction.objects.filter(
-            order_id=OuterRef('pk'),
-            status__in=['successful', 'paid', 'done']
-        ).values('order').annotate(
-            s=Coalesce(
-                Sum('amount'),
-                Value(0),
-                output_field=DecimalField(max_digits=12, decimal_places=2)
-            )
-        ).values('s')[:1]
-
-        paid_orders = (
-            Order.objects
-            .filter(created_at__gte=start_date)
-            .annotate(
-                paid_total=Coalesce(
-                    Subquery(
-                        paid_sum_subquery,
-                        output_field=DecimalField(max_digits=12, decimal_places=2)
-                    ),
-                    Value(0),
-                    output_field=DecimalField(max_digits=12, decimal_places=2)
-                )
-            )
-            .filter(
-                Q(payment_status__in=['paid', 'completed', 'done']) |
-                Q(paid_total__gte=F('total_amount'))
-            )
-        )
-
-        # Revenue chart data from paid orders
-        revenue_data = paid_orders.extra(
-            select={'day': 'date(created_at)'}
-        ).values('day').annotate(
-            revenue=Sum('total_amount'),
-            orders=Count('id')
-        ).order_by('day')
+        # Revenue from paid orders and status breakdown come from the daily rollups.
+        # Orders count as paid if payment_status is paid/completed/done or their
+        # successful transactions cover the order total (see analytics.rollups).
+        from .rollups import daily_order_metrics, status_totals
+        order_days = daily_order_metrics(start_date.date())
         
-        # Order status chart
-        order_status_data = Order.objects.filter(
-            created_at__gte=start_date
-        ).values('status').annotate(
-            count=Count('id')
-        ).order_by('-count')
+        revenue_data = [
+            {'day': day['date'], 'revenue': day['paid_revenue'], 'orders': day['paid_orders']}
+            for day in order_days if day['paid_orders']
+        ]
+        
+        order_status_data = status_totals(order_days)
         
         # Product category performance
         category_data = Order.objects.filter(
@@ -822,20 +863,17 @@ class DashboardViewSet(viewsets.ViewSet):
         """
         Group orders by city and compute revenue, order counts, and share
         """
-        from orders.models import Order
-
         days = int(request.query_params.get('days', 30))
         start_date = timezone.now() - timedelta(days=days)
 
-        qs = (
-            Order.objects.filter(created_at__gte=start_date)
-            .values('city')
-            .annotate(
-                orders=Count('id'),
-                revenue=Coalesce(Sum('total_amount'), Value(0))
-            )
-            .order_by('-revenue')
-        )
+        from .rollups import daily_order_metrics
+        cities = {}
+        for day in daily_order_metrics(start_date.date()):
+            for city, values in day['city_breakdown'].items():
+                entry = cities.setdefault(city, {'city': city, 'orders': 0, 'revenue': 0.0})
+                entry['orders'] += values['orders']
+                entry['revenue'] += float(values['revenue'])
+        qs = sorted(cities.values(), key=lambda r: -r['revenue'])
 
         total_revenue = sum(float(r['revenue']) for r in qs) or 0.0
         results = []
@@ -947,51 +985,16 @@ class DashboardViewSet(viewsets.ViewSet):
         """
         Get sales data for dashboard
         """
-        from orders.models import Order
-        
         # Get date range
         days = int(request.query_params.get('days', 30))
         start_date = timezone.now() - timedelta(days=days)
         
-        # Build paid orders queryset for this window
-        from payments.models import PaymentTransaction
-        paid_sum_subquery = PaymentTransaction.objects.filter(
-            order_id=OuterRef('pk'),
-            status__in=['successful', 'paid', 'done']
-        ).values('order').annotate(
-            s=Coalesce(
-                Sum('amount'),
-                Value(0),
-                output_field=DecimalField(max_digits=12, decimal_places=2)
-            )
-        ).values('s')[:1]
-
-        paid_orders = (
-            Order.objects
-            .filter(created_at__gte=start_date)
-            .annotate(
-                paid_total=Coalesce(
-                    Subquery(
-                        paid_sum_subquery,
-                        output_field=DecimalField(max_digits=12, decimal_places=2)
-                    ),
-                    Value(0),
-                    output_field=DecimalField(max_digits=12, decimal_places=2)
-                )
-            )
-            .filter(
-                Q(payment_status__in=['paid', 'completed', 'done']) |
-                Q(paid_total__gte=F('total_amount'))
-            )
-        )
-
-        # Sales data by date for paid orders
-        sales_data = paid_orders.extra(
-            select={'date': 'date(created_at)'}
-        ).values('date').annotate(
-            amount=Sum('total_amount'),
-            count=Count('id')
-        ).order_by('date')
+        # Sales data by date for paid orders, from the daily rollups
+        from .rollups import daily_order_metrics
+        sales_data = [
+            {'date': day['date'], 'amount': day['paid_revenue'], 'count': day['paid_orders']}
+            for day in daily_order_metrics(start_date.date()) if day['paid_orders']
+        ]
         
         # Convert to list format expected by frontend
         sales_list = []
@@ -1014,18 +1017,13 @@ class DashboardViewSet(viewsets.ViewSet):
         """
         Get order status data for dashboard
         """
-        from orders.models import Order
-        
         # Get date range
         days = int(request.query_params.get('days', 30))
         start_date = timezone.now() - timedelta(days=days)
         
-        # Order status data
-        order_status_data = Order.objects.filter(
-            created_at__gte=start_date
-        ).values('status').annotate(
-            count=Count('id')
-        ).order_by('-count')
+        # Order status data from the daily rollups
+        from .rollups import daily_order_metrics, status_totals
+        order_status_data = status_totals(daily_order_metrics(start_date.date()))
         
         # Convert to list format expected by frontend
         status_list = []
@@ -1047,51 +1045,20 @@ class DashboardViewSet(viewsets.ViewSet):
         """
         Get revenue data for dashboard
         """
-        from orders.models import Order
-        
         # Get date range
         days = int(request.query_params.get('days', 30))
         start_date = timezone.now() - timedelta(days=days)
         
-        # Build paid orders queryset for this window
-        from payments.models import PaymentTransaction
-        paid_sum_subquery = PaymentTransaction.objects.filter(
-            order_id=OuterRef('pk'),
-            status__in=['successful', 'paid', 'done']
-        ).values('order').annotate(
-            s=Coalesce(
-                Sum('amount'),
-                Value(0),
-                output_field=DecimalField(max_digits=12, decimal_places=2)
-            )
-        ).values('s')[:1]
-
-        paid_orders = (
-            Order.objects
-            .filter(created_at__gte=start_date)
-            .annotate(
-                paid_total=Coalesce(
-                    Subquery(
-                        paid_sum_subquery,
-                        output_field=DecimalField(max_digits=12, decimal_places=2)
-                    ),
-                    Value(0),
-                    output_field=DecimalField(max_digits=12, decimal_places=2)
-                )
-            )
-            .filter(
-                Q(payment_status='paid') |
-                Q(status='delivered') |
-                Q(paid_total__gte=F('total_amount'))
-            )
-        )
-
-        # Revenue aggregates from paid orders
-        revenue_data = paid_orders.aggregate(
-            total_revenue=Sum('total_amount'),
-            total_orders=Count('id'),
-            avg_order_value=Avg('total_amount')
-        )
+        # Revenue aggregates from paid or delivered orders, from the daily rollups
+        from .rollups import daily_order_metrics
+        order_days = daily_order_metrics(start_date.date())
+        total_revenue = sum(day['total_revenue'] for day in order_days)
+        total_orders = sum(day['revenue_orders'] for day in order_days)
+        revenue_data = {
+            'total_revenue': total_revenue,
+            'total_orders': total_orders,
+            'avg_order_value': (total_revenue / total_orders) if total_orders else 0
+        }
         
         return Response({
             'total_revenue': float(revenue_data['total_revenue'] or 0),
@@ -1108,56 +1075,26 @@ class DashboardViewSet(viewsets.ViewSet):
         """
         Get top performing products for dashboard
         """
-        from orders.models import Order, OrderItem
         from products.models import Product
         
         # Get date range
         days = int(request.query_params.get('days', 30))
         start_date = timezone.now() - timedelta(days=days)
         
-        # Build paid orders queryset for this window
-        from payments.models import PaymentTransaction
-        paid_sum_subquery = PaymentTransaction.objects.filter(
-            order_id=OuterRef('pk'),
-            status__in=['successful', 'paid', 'done']
-        ).values('order').annotate(
-            s=Coalesce(
-                Sum('amount'),
-                Value(0),
-                output_field=DecimalField(max_digits=12, decimal_places=2)
-            )
-        ).values('s')[:1]
-
-        paid_orders = (
-            Order.objects
-            .filter(created_at__gte=start_date)
-            .annotate(
-                paid_total=Coalesce(
-                    Subquery(
-                        paid_sum_subquery,
-                        output_field=DecimalField(max_digits=12, decimal_places=2)
-                    ),
-                    Value(0),
-                    output_field=DecimalField(max_digits=12, decimal_places=2)
-                )
-            )
-            .filter(
-                Q(payment_status='paid') |
-                Q(status='delivered') |
-                Q(paid_total__gte=F('total_amount'))
-            )
-        )
-
-        # Top products by sales from paid orders
-        top_products = OrderItem.objects.filter(
-            order__in=paid_orders
-        ).values(
-            'product__name',
-            'product__id'
-        ).annotate(
-            total_sales=Sum('total_price'),
-            total_quantity=Sum('quantity')
-        ).order_by('-total_sales')[:10]
+        # Top products by sales from paid or delivered orders, from the daily rollups
+        from .rollups import product_totals
+        totals = product_totals(start_date.date())
+        top_ids = sorted(totals, key=lambda product_id: -totals[product_id]['revenue'])[:10]
+        names = dict(Product.objects.filter(id__in=top_ids).values_list('id', 'name'))
+        top_products = [
+            {
+                'product__id': product_id,
+                'product__name': names.get(product_id),
+                'total_sales': totals[product_id]['revenue'],
+                'total_quantity': totals[product_id]['quantity'],
+            }
+            for product_id in top_ids
+        ]
         
         # Convert to list format
         products_list = []
@@ -5,3 +5,7 @@ class DeliveriesConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'deliveries'
     verbose_name = 'Delivery Management'
+    
+    def ready(self):
+        """Import signals when the app is ready"""
+        import deliveries.signals
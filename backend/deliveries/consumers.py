@@ -0,0 +1,81 @@
+import json
+from channels.generic.websocket import AsyncWebsocketConsumer
+from channels.db import database_sync_to_async
+
+from .locations import delivery_group, latest_position, order_group
+
+
+class TrackingConsumer(AsyncWebsocketConsumer):
+    """
+    Pushes the driver's position to a customer tracking a delivery.
+    Subclasses resolve the URL to (group name, driver id) for users allowed to track it.
+    """
+
+    async def connect(self):
+        self.user = self.scope["user"]
+        if self.user.is_anonymous:
+            await self.close()
+            return
+
+        target = await self.resolve_target()
+        if target is None:
+            await self.close()
+            return
+
+        self.group_name, driver_id = target
+        await self.channel_layer.group_add(
+            self.group_name,
+            self.channel_name
+        )
+        await self.accept()
+
+        # Start from the latest known position instead of waiting for the next ping
+        if driver_id:
+            position = await database_sync_to_async(latest_position)(driver_id)
+            if position:
+                await self.location_update({'data': position})
+
+    async def disconnect(self, close_code):
+        if hasattr(self, 'group_name'):
+            await self.channel_layer.group_discard(
+                self.group_name,
+                self.channel_name
+            )
+
+    async def location_update(self, event):
+        await self.send(text_data=json.dumps({
+            'type': 'location_update',
+            'data': event['data']
+        }))
+
+    async def resolve_target(self):
+        raise NotImplementedError
+
+
+class OrderTrackingConsumer(TrackingConsumer):
+
+    @database_sync_to_async
+    def resolve_target(self):
+        from orders.models import Order
+
+        order = Order.objects.filter(
+            order_number=self.scope['url_route']['kwargs']['order_number'],
+            is_pickup=False
+        ).values('id', 'customer_id', 'delivery_person_id').first()
+        if order is None or (order['customer_id'] != self.user.id and not self.user.is_staff):
+            return None
+        return order_group(order['id']), order['delivery_person_id']
+
+
+class DeliveryTrackingConsumer(TrackingConsumer):
+
+    @database_sync_to_async
+    def resolve_target(self):
+        from .models import DeliveryRequest
+
+        delivery = DeliveryRequest.objects.filter(
+            pk=self.scope['url_route']['kwargs']['delivery_id']
+        ).values('id', 'customer_id', 'driver_id').first()
+        if delivery is None or (delivery['customer_id'] != self.user.id and not self.user.is_staff):
+            return None
+        return delivery_group(delivery['id']), delivery['driver_id']
@@ -0,0 +1,262 @@
+"""
+Driver dispatch
+
+Ranks drivers for a pickup point:
+1. k-nearest drivers come from the drivers:positions GEO set kept by
+   deliveries.locations (GEOSEARCH, sorted by distance), starting at
+   DISPATCH_SEARCH_RADIUS_KM and doubling up to DISPATCH_MAX_RADIUS_KM until
+   enough drivers qualify. Only drivers that reported within
+   DRIVER_LOCATION_TTL are in the set.
+2. A driver qualifies when they are an active driver with an available
+   DriverSchedule slot covering now, and carry fewer than
+   DISPATCH_MAX_ACTIVE_DELIVERIES active deliveries (accepted delivery
+   requests plus orders out for delivery). Both checks are one query each for
+   the whole candidate list.
+3. Qualified drivers are ordered by distance plus DISPATCH_LOAD_PENALTY_KM per
+   active delivery, so an idle driver slightly further away beats a busy one.
+
+offer_to_drivers() notifies the top drivers of a job in one call; the first
+to accept takes it through the existing accept/assign endpoints.
+"""
+
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count
+from django.utils import timezone
+
+from .locations import (
+    ACTIVE_DELIVERY_STATUSES, ACTIVE_ORDER_STATUSES, POSITIONS_KEY, _redis, distance_meters
+)
+
+logger = logging.getLogger(__name__)
+
+# Nearest drivers fetched per qualifying driver wanted, to survive filtering
+OVERSAMPLE = 4
+MAX_FETCHED = 500
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def nearest_drivers(latitude, longitude, radius_km, count, key=POSITIONS_KEY):
+    """
+    [(driver_id, distance_km)] of up to `count` drivers within radius_km, nearest first
+    """
+    results = _redis().geosearch(
+        key, longitude=float(longitude), latitude=float(latitude),
+        radius=radius_km, unit='km', sort='ASC', count=count, withdist=True,
+    )
+    return [(int(member), float(distance)) for member, distance in results]
+
+
+def _nearest_drivers_from_database(latitude, longitude, radius_km, count):
+    """
+    Fallback when Redis is unreachable: latest stored position of each driver
+    seen within DRIVER_LOCATION_TTL
+    """
+    from .models import DriverLocation
+
+    since = timezone.now() - timedelta(seconds=settings.DRIVER_LOCATION_TTL)
+    latest = DriverLocation.objects.filter(timestamp__gte=since).order_by(
+        'driver_id', '-timestamp'
+    ).distinct('driver_id').values_list('driver_id', 'latitude', 'longitude')
+
+    nearby = []
+    for driver_id, driver_lat, driver_lng in latest:
+        distance_km = distance_meters(latitude, longitude, driver_lat, driver_lng) / 1000
+        if distance_km <= radius_km:
+            nearby.append((driver_id, distance_km))
+    nearby.sort(key=lambda item: item[1])
+    return nearby[:count]
+
+
+def available_driver_ids(driver_ids, at=None):
+    """
+    Subset of driver_ids that are active drivers scheduled to work at `at` (default now)
+    """
+    from users.models import User
+
+    if not driver_ids:
+        return set()
+    at = timezone.localtime(at or timezone.now())
+    drivers = User.objects.filter(
+        id__in=driver_ids, user_type='driver', is_active=True
+    )
+    if _setting('DISPATCH_REQUIRE_SCHEDULE', True):
+        drivers = drivers.filter(
+            schedules__date=at.date(),
+            schedules__start_time__lte=at.time(),
+            schedules__end_time__gte=at.time(),
+            schedules__is_available=True,
+        )
+    return set(drivers.values_list('id', flat=True).distinct())
+
+
+def active_loads(driver_ids):
+    """
+    {driver_id: number of deliveries in progress} for the given drivers
+    """
+    from orders.models import Order
+    from .models import DeliveryRequest
+
+    loads = dict.fromkeys(driver_ids, 0)
+    if not driver_ids:
+        return loads
+    for row in DeliveryRequest.objects.filter(
+        driver_id__in=driver_ids, status__in=ACTIVE_DELIVERY_STATUSES
+    ).order_by().values('driver_id').annotate(active=Count('id')):
+        loads[row['driver_id']] += row['active']
+    for row in Order.objects.filter(
+        delivery_person_id__in=driver_ids, status__in=ACTIVE_ORDER_STATUSES
+    ).order_by().values('delivery_person_id').annotate(active=Count('id')):
+        loads[row['delivery_person_id']] += row['active']
+    return loads
+
+
+def rank_drivers(latitude, longitude, limit=5, exclude=(), at=None):
+    """
+    Best drivers for a pickup at (latitude, longitude), best first:
+    [{'driver_id', 'distance_km', 'active_deliveries', 'score'}]
+    """
+    radius_km = _setting('DISPATCH_SEARCH_RADIUS_KM', 5)
+    max_radius_km = _setting('DISPATCH_MAX_RADIUS_KM', 40)
+    max_load = _setting('DISPATCH_MAX_ACTIVE_DELIVERIES', 2)
+    load_penalty_km = _setting('DISPATCH_LOAD_PENALTY_KM', 2)
+    exclude = set(exclude)
+    count = limit * OVERSAMPLE + len(exclude)
+
+    while True:
+        try:
+            nearby = nearest_drivers(latitude, longitude, radius_km, count)
+        except Exception as e:
+            logger.warning(f"Driver position store unavailable, ranking drivers from the database: {str(e)}")
+            nearby = _nearest_drivers_from_database(latitude, longitude, radius_km, count)
+        fetched = len(nearby)
+        nearby = [(driver_id, distance_km) for driver_id, distance_km in nearby if driver_id not in exclude]
+
+        driver_ids = [driver_id for driver_id, _distance in nearby]
+        available = available_driver_ids(driver_ids, at=at)
+        loads = active_loads([driver_id for driver_id in driver_ids if driver_id in available])
+
+        candidates = [
+            {
+                'driver_id': driver_id,
+                'distance_km': round(distance_km, 2),
+                'active_deliveries': loads[driver_id],
+                'score': round(distance_km + loads[driver_id] * load_penalty_km, 2),
+            }
+            for driver_id, distance_km in nearby
+            if driver_id in available and loads[driver_id] < max_load
+        ]
+        if len(candidates) >= limit:
+            break
+        # Widen whichever bound cut the search short: the count, then the radius
+        if fetched >= count and count < MAX_FETCHED:
+            count = min(count * 2, MAX_FETCHED)
+        elif radius_km < max_radius_km:
+            radius_km = min(radius_km * 2, max_radius_km)
+        else:
+            break
+
+    candidates.sort(key=lambda candidate: (candidate['score'], candidate['distance_km']))
+    return candidates[:limit]
+
+
+def describe_candidates(candidates):
+    """
+    Add driver name, phone, vehicle and rating to ranked candidates (one query)
+    """
+    from users.models import User
+
+    drivers = {
+        driver.id: driver for driver in User.objects.filter(
+            id__in=[candidate['driver_id'] for candidate in candidates]
+        ).only('id', 'first_name', 'last_name', 'email', 'phone_number', 'vehicle_type', 'rating')
+    }
+    described = []
+    for candidate in candidates:
+        driver = drivers.get(candidate['driver_id'])
+        if driver is None:
+            continue
+        described.append(dict(
+            candidate,
+            name=driver.get_full_name(),
+            phone_number=driver.phone_number,
+            vehicle_type=driver.vehicle_type,
+            rating=driver.rating,
+        ))
+    return described
+
+
+def offer_to_drivers(candidates, title, message, data):
+    """
+    Notify each candidate driver of a job once the surrounding transaction commits
+    """
+    from notifications.tasks import send_notification_to_user
+
+    driver_ids = [candidate['driver_id'] for candidate in candidates]
+
+    def enqueue():
+        for driver_id in driver_ids:
+            try:
+                send_notification_to_user.delay(driver_id, title, message, 'delivery_update', data)
+            except Exception as e:
+                logger.warning(f"Could not enqueue dispatch offer for driver {driver_id}: {str(e)}")
+
+    transaction.on_commit(enqueue)
+    return driver_ids
+
+
+def offer_order(order, count):
+    """
+    Offer a delivery order to the `count` best drivers for the store pickup; returns the candidates offered
+    """
+    candidates = rank_drivers(*order_pickup_point(), limit=count)
+    offer_to_drivers(
+        candidates,
+        'New delivery available',
+        f"Order {order.order_number} is ready for delivery to {order.delivery_address or 'the customer'}",
+        {'order_id': order.id, 'order_number': order.order_number},
+    )
+    return candidates
+
+
+def offer_delivery_request(delivery, count):
+    """
+    Offer a pending delivery request to the `count` best drivers for its pickup; returns the candidates offered
+    """
+    candidates = rank_drivers(delivery.pickup_latitude, delivery.pickup_longitude, limit=count)
+    offer_to_drivers(
+        candidates,
+        'New delivery request',
+        f"Pickup at {delivery.pickup_address}",
+        {'delivery_request_id': delivery.id, 'tracking_code': delivery.tracking_code},
+    )
+    return candidates
+
+
+def order_pickup_point():
+    """Orders are collected from the store"""
+    return settings.DISPATCH_PICKUP_LATITUDE, settings.DISPATCH_PICKUP_LONGITUDE
+
+
+def load_simulated_drivers(positions, key):
+    """
+    Write (driver_id, latitude, longitude) tuples to a GEO set; used by benchmark_dispatch
+    """
+    client = _redis()
+    client.delete(key)
+    batch = []
+    for driver_id, latitude, longitude in positions:
+        batch.extend((longitude, latitude, driver_id))
+        if len(batch) >= 3000:
+            client.geoadd(key, batch)
+            batch = []
+    if batch:
+        client.geoadd(key, batch)
+    return client.zcard(key)
+
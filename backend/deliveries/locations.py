@@ -0,0 +1,301 @@
+"""
+Driver locations
+
+GPS pings never touch the database on the request thread. Each ping:
+1. Replaces the driver's latest position in Redis: a JSON snapshot with a TTL
+   (DRIVER_LOCATION_TTL), plus the drivers:positions GEO set and the
+   drivers:seen sorted set used for radius queries and stale-driver pruning.
+   Current location is therefore one GET, whatever the size of driver_locations.
+2. Is appended to the trail of its delivery request only when it moved at
+   least DRIVER_TRAIL_MIN_DISTANCE_METERS or DRIVER_TRAIL_MIN_INTERVAL_SECONDS
+   passed since the last kept point. Kept points are buffered in Redis and
+   bulk-inserted into driver_locations by persist_driver_trails.
+3. Is pushed over Channels to everyone tracking the driver's active deliveries
+   (groups delivery_tracking_<delivery request id> and order_tracking_<order id>).
+
+When Redis is unreachable the ping is written straight to driver_locations,
+as before, and current location falls back to the newest stored row.
+"""
+
+import json
+import logging
+import time
+from math import asin, cos, radians, sin, sqrt
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+logger = logging.getLogger(__name__)
+
+POSITIONS_KEY = 'drivers:positions'
+SEEN_KEY = 'drivers:seen'
+PENDING_TRAILS_KEY = 'drivers:trails-pending'
+
+# Kept-point marker outlives any delivery; the trail itself is drained every flush
+TRAIL_STATE_TTL = 86400
+TRAIL_FLUSH_BATCH = 1000
+
+# Orders being delivered by a driver, looked up at most this often per driver
+TRACKING_GROUPS_TIMEOUT = 30
+
+ACTIVE_ORDER_STATUSES = ['ready_for_delivery', 'out_for_delivery']
+ACTIVE_DELIVERY_STATUSES = ['accepted', 'picked_up', 'in_transit']
+
+POSITION_FIELDS = ['latitude', 'longitude', 'accuracy', 'speed', 'heading', 'altitude']
+
+
+def _redis():
+    from utils.redis_client import get_redis
+
+    return get_redis(settings.DRIVER_LOCATION_URL)
+
+
+def _location_key(driver_id):
+    return f'drivers:location:{driver_id}'
+
+
+def _trail_key(delivery_request_id):
+    return f'drivers:trail:{delivery_request_id}'
+
+
+def _trail_state_key(delivery_request_id):
+    return f'drivers:trail-last:{delivery_request_id}'
+
+
+def distance_meters(lat1, lon1, lat2, lon2):
+    """Great-circle distance between two points"""
+    lat1, lon1, lat2, lon2 = map(radians, (float(lat1), float(lon1), float(lat2), float(lon2)))
+    a = sin((lat2 - lat1) / 2) ** 2 + cos(lat1) * cos(lat2) * sin((lon2 - lon1) / 2) ** 2
+    return 2 * 6371000 * asin(sqrt(a))
+
+
+def build_position(driver_id, data, timestamp=None):
+    """
+    Position snapshot for validated DriverLocationCreateSerializer data; numbers
+    are strings, as DRF renders decimals
+    """
+    delivery_request = data.get('delivery_request')
+    position = {
+        'driver': driver_id,
+        'delivery_request': getattr(delivery_request, 'pk', delivery_request),
+        'timestamp': (timestamp or timezone.now()).isoformat(),
+    }
+    for field in POSITION_FIELDS:
+        value = data.get(field)
+        position[field] = None if value is None else str(value)
+    return position
+
+
+def _keep_in_trail(position, last):
+    if last is None:
+        return True
+    elapsed = (parse_datetime(position['timestamp']) - parse_datetime(last['timestamp'])).total_seconds()
+    if elapsed >= settings.DRIVER_TRAIL_MIN_INTERVAL_SECONDS:
+        return True
+    moved = distance_meters(last['latitude'], last['longitude'], position['latitude'], position['longitude'])
+    return moved >= settings.DRIVER_TRAIL_MIN_DISTANCE_METERS
+
+
+def record_position(driver_id, data):
+    """
+    Store a driver's ping as their latest position, keep it in the delivery
+    trail if it passes downsampling and push it to trackers. Returns the position.
+    """
+    position = build_position(driver_id, data)
+    encoded = json.dumps(position)
+    delivery_request_id = position['delivery_request']
+
+    try:
+        client = _redis()
+        with client.pipeline(transaction=False) as pipe:
+            pipe.set(_location_key(driver_id), encoded, ex=settings.DRIVER_LOCATION_TTL)
+            pipe.geoadd(POSITIONS_KEY, (float(position['longitude']), float(position['latitude']), driver_id))
+            pipe.zadd(SEEN_KEY, {driver_id: time.time()})
+            if delivery_request_id:
+                pipe.get(_trail_state_key(delivery_request_id))
+            results = pipe.execute()
+
+        if delivery_request_id:
+            last = json.loads(results[-1]) if results[-1] else None
+            if _keep_in_trail(position, last):
+                with client.pipeline(transaction=True) as pipe:
+                    pipe.rpush(_trail_key(delivery_request_id), encoded)
+                    pipe.sadd(PENDING_TRAILS_KEY, delivery_request_id)
+                    pipe.set(_trail_state_key(delivery_request_id), encoded, ex=TRAIL_STATE_TTL)
+                    pipe.execute()
+    except Exception as e:
+        logger.warning(f"Driver location store unavailable, writing location for driver {driver_id}: {str(e)}")
+        _write_locations([position])
+
+    broadcast_position(position)
+    return position
+
+
+def _from_row(location):
+    position = {
+        'driver': location.driver_id,
+        'delivery_request': location.delivery_request_id,
+        'timestamp': location.timestamp.isoformat(),
+    }
+    for field in POSITION_FIELDS:
+        value = getattr(location, field)
+        position[field] = None if value is None else str(value)
+    return position
+
+
+def latest_position(driver_id):
+    """
+    Latest known position of a driver, or None
+    """
+    try:
+        cached = _redis().get(_location_key(driver_id))
+        if cached:
+            return json.loads(cached)
+    except Exception as e:
+        logger.warning(f"Driver location store unavailable, reading driver {driver_id} from the database: {str(e)}")
+
+    from .models import DriverLocation
+
+    location = DriverLocation.objects.filter(driver_id=driver_id).order_by('-timestamp').first()
+    return _from_row(location) if location else None
+
+
+def latest_positions(driver_ids):
+    """
+    {driver_id: position} for the drivers with a live position, in one round trip
+    """
+    driver_ids = list(driver_ids)
+    if not driver_ids:
+        return {}
+    values = _redis().mget([_location_key(driver_id) for driver_id in driver_ids])
+    return {driver_id: json.loads(value) for driver_id, value in zip(driver_ids, values) if value}
+
+
+# Trail persistence
+
+def _write_locations(positions):
+    from .models import DriverLocation
+
+    rows = []
+    for position in positions:
+        rows.append(DriverLocation(
+            driver_id=position['driver'],
+            delivery_request_id=position['delivery_request'],
+            timestamp=parse_datetime(position['timestamp']),
+            **{field: position[field] for field in POSITION_FIELDS},
+        ))
+    DriverLocation.objects.bulk_create(rows, batch_size=TRAIL_FLUSH_BATCH)
+    return len(rows)
+
+
+def _take_trail(client, delivery_request_id):
+    key = _trail_key(delivery_request_id)
+    with client.pipeline(transaction=True) as pipe:
+        pipe.lrange(key, 0, TRAIL_FLUSH_BATCH - 1)
+        pipe.ltrim(key, TRAIL_FLUSH_BATCH, -1)
+        raw, _trimmed = pipe.execute()
+    return raw
+
+
+def persist_trails():
+    """
+    Bulk-insert every buffered trail point into driver_locations.
+    Returns the number of rows written.
+    """
+    client = _redis()
+    written = 0
+    for member in client.smembers(PENDING_TRAILS_KEY):
+        delivery_request_id = int(member)
+        while True:
+            raw = _take_trail(client, delivery_request_id)
+            if not raw:
+                break
+            try:
+                written += _write_locations([json.loads(item) for item in raw])
+            except Exception:
+                client.lpush(_trail_key(delivery_request_id), *reversed(raw))
+                raise
+            if len(raw) < TRAIL_FLUSH_BATCH:
+                break
+
+        # A point pushed after the drain re-adds the member itself, one pushed
+        # before the SREM is still seen by the LLEN check
+        client.srem(PENDING_TRAILS_KEY, delivery_request_id)
+        if client.llen(_trail_key(delivery_request_id)):
+            client.sadd(PENDING_TRAILS_KEY, delivery_request_id)
+    return written
+
+
+def prune_stale_positions():
+    """
+    Drop drivers that stopped reporting from the GEO set; returns how many
+    """
+    client = _redis()
+    cutoff = time.time() - settings.DRIVER_LOCATION_TTL
+    stale = client.zrangebyscore(SEEN_KEY, '-inf', cutoff)
+    if not stale:
+        return 0
+    with client.pipeline(transaction=True) as pipe:
+        pipe.zrem(POSITIONS_KEY, *stale)
+        pipe.zrem(SEEN_KEY, *stale)
+        pipe.execute()
+    return len(stale)
+
+
+# Live fan-out
+
+def order_group(order_id):
+    return f'order_tracking_{order_id}'
+
+
+def delivery_group(delivery_request_id):
+    return f'delivery_tracking_{delivery_request_id}'
+
+
+def tracking_groups(driver_id, delivery_request_id=None):
+    """
+    Channel groups following this driver: their active delivery requests and
+    the orders they are delivering
+    """
+    cache_key = f'drivers:tracking-groups:{driver_id}'
+    groups = cache.get(cache_key)
+    if groups is None:
+        from orders.models import Order
+        from .models import DeliveryRequest
+
+        groups = [order_group(order_id) for order_id in Order.objects.filter(
+            delivery_person_id=driver_id, status__in=ACTIVE_ORDER_STATUSES
+        ).values_list('id', flat=True)]
+        groups += [delivery_group(request_id) for request_id in DeliveryRequest.objects.filter(
+            driver_id=driver_id, status__in=ACTIVE_DELIVERY_STATUSES
+        ).values_list('id', flat=True)]
+        cache.set(cache_key, groups, TRACKING_GROUPS_TIMEOUT)
+
+    if delivery_request_id and delivery_group(delivery_request_id) not in groups:
+        groups = groups + [delivery_group(delivery_request_id)]
+    return groups
+
+
+def forget_tracking_groups(driver_id):
+    """Call when a driver's deliveries change so pushes follow immediately"""
+    if driver_id:
+        cache.delete(f'drivers:tracking-groups:{driver_id}')
+
+
+def broadcast_position(position):
+    from asgiref.sync import async_to_sync
+    from channels.layers import get_channel_layer
+
+    try:
+        channel_layer = get_channel_layer()
+        if channel_layer is None:
+            return
+        for group in tracking_groups(position['driver'], position['delivery_request']):
+            async_to_sync(channel_layer.group_send)(group, {
+                'type': 'location_update',
+                'data': position,
+            })
+    except Exception as e:
+        logger.warning(f"Could not push location for driver {position['driver']}: {str(e)}")
@@ -0,0 +1,98 @@
+import random
+import statistics
+import time
+from math import cos, radians
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from deliveries.dispatch import load_simulated_drivers, nearest_drivers
+from deliveries.locations import _redis, distance_meters
+
+BENCHMARK_KEY = 'drivers:positions:benchmark'
+
+
+class Command(BaseCommand):
+    help = (
+        'Simulate a fleet in a separate GEO set and compare k-nearest driver lookups '
+        'with a scan over every driver position'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--drivers', type=int, default=5000, help='Number of simulated drivers')
+        parser.add_argument('--spread-km', type=float, default=30, help='Drivers are placed within this distance of the store')
+        parser.add_argument('--queries', type=int, default=200, help='Number of pickup points to rank drivers for')
+        parser.add_argument('--k', type=int, default=5, help='Drivers returned per query')
+        parser.add_argument('--radius-km', type=float, default=10, help='Search radius for the GEO lookup')
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--keep', action='store_true', help='Keep the simulated GEO set')
+
+    def random_point(self, rng, spread_km):
+        latitude = settings.DISPATCH_PICKUP_LATITUDE + rng.uniform(-1, 1) * spread_km / 111.32
+        longitude = settings.DISPATCH_PICKUP_LONGITUDE + rng.uniform(-1, 1) * spread_km / (
+            111.32 * cos(radians(settings.DISPATCH_PICKUP_LATITUDE))
+        )
+        return latitude, longitude
+
+    def scan(self, positions, latitude, longitude, radius_km, k):
+        # What ranking costs without a spatial index: measure every driver, then sort
+        nearby = []
+        for driver_id, driver_lat, driver_lng in positions:
+            distance_km = distance_meters(latitude, longitude, driver_lat, driver_lng) / 1000
+            if distance_km <= radius_km:
+                nearby.append((driver_id, distance_km))
+        nearby.sort(key=lambda item: item[1])
+        return nearby[:k]
+
+    def timed(self, function, *args):
+        started = time.perf_counter()
+        result = function(*args)
+        return result, (time.perf_counter() - started) * 1000
+
+    def handle(self, *args, **options):
+        try:
+            _redis().ping()
+        except Exception as e:
+            raise CommandError(f'The dispatch benchmark needs Redis at DRIVER_LOCATION_URL: {e}')
+
+        rng = random.Random(options['seed'])
+        k = options['k']
+        radius_km = options['radius_km']
+        positions = [
+            (driver_id, *self.random_point(rng, options['spread_km']))
+            for driver_id in range(1, options['drivers'] + 1)
+        ]
+
+        started = time.perf_counter()
+        loaded = load_simulated_drivers(positions, BENCHMARK_KEY)
+        self.stdout.write(f'Loaded {loaded} simulated drivers in {(time.perf_counter() - started) * 1000:.0f}ms')
+
+        scan_times, geo_times = [], []
+        mismatches = 0
+        try:
+            for _ in range(options['queries']):
+                latitude, longitude = self.random_point(rng, options['spread_km'])
+                scanned, scan_ms = self.timed(self.scan, positions, latitude, longitude, radius_km, k)
+                indexed, geo_ms = self.timed(nearest_drivers, latitude, longitude, radius_km, k, BENCHMARK_KEY)
+                scan_times.append(scan_ms)
+                geo_times.append(geo_ms)
+                # GEO distances are computed on a sphere of a slightly different radius
+                if [driver_id for driver_id, _ in scanned] != [driver_id for driver_id, _ in indexed]:
+                    mismatches += 1
+        finally:
+            if not options['keep']:
+                _redis().delete(BENCHMARK_KEY)
+
+        def p95(values):
+            return sorted(values)[int(len(values) * 0.95) - 1] if len(values) > 1 else values[0]
+
+        self.stdout.write('\n' + '='*50)
+        self.stdout.write(f"{'lookup':<12}{'median ms':>12}{'p95 ms':>12}")
+        self.stdout.write(f"{'scan':<12}{statistics.median(scan_times):>12.2f}{p95(scan_times):>12.2f}")
+        self.stdout.write(f"{'geosearch':<12}{statistics.median(geo_times):>12.2f}{p95(geo_times):>12.2f}")
+        self.stdout.write('='*50)
+        self.stdout.write(
+            f"{options['drivers']} drivers, {options['queries']} queries, k={k}, radius {radius_km}km; "
+            f"{mismatches} queries ranked differently (ties at the boundary)"
+        )
+        self.stdout.write(self.style.SUCCESS('Dispatch benchmark complete'))
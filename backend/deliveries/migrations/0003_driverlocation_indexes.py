@@ -0,0 +1,21 @@
+# Generated by Django 4.2.7 on 2026-10-17 11:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('deliveries', '0002_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='driverlocation',
+            index=models.Index(fields=['driver', 'timestamp'], name='driver_loc_driver_ts_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='driverlocation',
+            index=models.Index(fields=['delivery_request', 'timestamp'], name='driver_loc_request_ts_idx'),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 4.2.7 on 2026-10-17 12:40
+
+from django.db import migrations
+
+from utils.identifiers import create_sequence, drop_sequence
+
+
+def create_identifier_sequences(apps, schema_editor):
+    DeliveryRequest = apps.get_model('deliveries', 'DeliveryRequest')
+
+    # Tracking codes carry no date, so every existing code must be avoided
+    create_sequence(schema_editor, 'delivery', DeliveryRequest.objects.filter(
+        tracking_code__startswith='DEL-'
+    ).values_list('tracking_code', flat=True).iterator())
+
+
+def drop_identifier_sequences(apps, schema_editor):
+    drop_sequence(schema_editor, 'delivery')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('deliveries', '0003_driverlocation_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_identifier_sequences, drop_identifier_sequences),
+    ]
@@ -1,4 +1,4 @@
-from django.db import models
+from django.db import models, transaction
 from django.utils import timezone
 from django.core.validators import MinValueValidator
 from decimal import Decimal
@@ -81,17 +81,9 @@ class DeliveryRequest(models.Model):
         super().save(*args, **kwargs)
     
     def _generate_tracking_code(self):
-        """Generate unique tracking code"""
-        import random
-        import string
-        
-        while True:
-            # Format: DEL-XXXXXX
-            random_part = ''.join(random.choices(string.ascii_uppercase + string.digits, k=6))
-            tracking_code = f"DEL-{random_part}"
-            
-            if not DeliveryRequest.objects.filter(tracking_code=tracking_code).exists():
-                return tracking_code
+        """Generate unique tracking code (DEL-XXXXXX)"""
+        from utils.identifiers import allocate
+        return allocate('delivery')
     
     @property
     def total_amount(self):
@@ -132,7 +124,7 @@ class DeliveryRequest(models.Model):
 
 class DriverLocation(models.Model):
     """
-    Real-time driver location tracking
+    Driver location trail, downsampled and written in batches (see deliveries.locations)
     """
     driver = models.ForeignKey('users.User', on_delete=models.CASCADE, related_name='locations')
     delivery_request = models.ForeignKey(DeliveryRequest, on_delete=models.CASCADE, related_name='driver_locations', null=True, blank=True)
@@ -149,6 +141,10 @@ class DriverLocation(models.Model):
     class Meta:
         db_table = 'driver_locations'
         ordering = ['-timestamp']
+        indexes = [
+            models.Index(fields=['driver', 'timestamp'], name='driver_loc_driver_ts_idx'),
+            models.Index(fields=['delivery_request', 'timestamp'], name='driver_loc_request_ts_idx'),
+        ]
     
     def __str__(self):
         return f"Location for {self.driver.email} at {self.timestamp}"
@@ -203,11 +199,12 @@ class DeliveryZone(models.Model):
     
     def calculate_delivery_fee(self, distance_km):
         """Calculate delivery fee based on distance"""
+        distance_km = Decimal(str(distance_km))
         if distance_km <= 0:
             return self.base_delivery_fee
         
-        additional_fee = max(0, distance_km - self.radius_km) * self.additional_fee_per_km
-        return self.base_delivery_fee + additional_fee
+        additional_fee = max(Decimal('0'), distance_km - self.radius_km) * self.additional_fee_per_km
+        return (self.base_delivery_fee + additional_fee).quantize(Decimal('0.01'))
 
 
 class DriverSchedule(models.Model):
@@ -261,15 +258,46 @@ class DeliveryRating(models.Model):
     def __str__(self):
         return f"Rating {self.rating}/5 for delivery {self.delivery_request.tracking_code}"
     
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Rating as last persisted, so saves can apply only the difference
+        self._persisted_rating = self.__dict__.get('rating') if self.pk else None
+    
     def save(self, *args, **kwargs):
-        super().save(*args, **kwargs)
-        # Update driver's average rating
-        self._update_driver_rating()
-    
-    def _update_driver_rating(self):
-        """Update driver's average rating"""
-        ratings = self.driver.delivery_ratings_received.all()
-        if ratings.exists():
-            avg_rating = sum(rating.rating for rating in ratings) / ratings.count()
-            self.driver.rating = round(avg_rating, 2)
-            self.driver.save()
+        adding = self._state.adding
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            # Update driver's average rating
+            if adding:
+                self._update_driver_rating(self.rating, 1)
+            elif self._persisted_rating is not None and self.rating != self._persisted_rating:
+                self._update_driver_rating(self.rating - self._persisted_rating, 0)
+        self._persisted_rating = self.rating
+    
+    def delete(self, *args, **kwargs):
+        with transaction.atomic():
+            result = super().delete(*args, **kwargs)
+            self._update_driver_rating(-(self._persisted_rating or self.rating), -1)
+        return result
+    
+    def _update_driver_rating(self, sum_delta, count_delta):
+        """Apply this rating's change to the driver's running rating aggregates"""
+        from django.contrib.auth import get_user_model
+        from utils.ratings import apply_rating_delta
+
+        apply_rating_delta(
+            get_user_model(), self.driver_id, sum_delta, count_delta,
+            sum_field='rating_sum', count_field='rating_count', average_field='rating',
+        )
+    
+    @classmethod
+    def reconcile_driver_ratings(cls, batch_size=500):
+        """Recompute every driver's rating aggregates in one GROUP BY pass and repair drift"""
+        from django.contrib.auth import get_user_model
+        from utils.ratings import reconcile_rating_aggregates
+
+        return reconcile_rating_aggregates(
+            get_user_model(), cls, 'driver_id',
+            sum_field='rating_sum', count_field='rating_count', average_field='rating',
+            batch_size=batch_size,
+        )
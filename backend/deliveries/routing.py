@@ -0,0 +1,7 @@
+from django.urls import re_path
+from . import consumers
+
+websocket_urlpatterns = [
+    re_path(r'ws/tracking/orders/(?P<order_number>[\w-]+)/$', consumers.OrderTrackingConsumer.as_asgi()),
+    re_path(r'ws/tracking/deliveries/(?P<delivery_id>\d+)/$', consumers.DeliveryTrackingConsumer.as_asgi()),
+]
@@ -1,3 +1,4 @@
+from django.conf import settings
 from rest_framework import serializers
 from .models import DeliveryRequest, DriverLocation, DeliveryZone, DriverSchedule, DeliveryRating
 
@@ -58,8 +59,18 @@ class DeliveryRequestCreateSerializer(serializers.ModelSerializer):
         ]
     
     def create(self, validated_data):
+        from .zones import quote
+
         customer = self.context['request'].user
         validated_data['customer'] = customer
+        # Same quoting as calculate_fee, so the customer is charged what they were shown
+        trip = quote(
+            validated_data['pickup_latitude'], validated_data['pickup_longitude'],
+            validated_data['delivery_latitude'], validated_data['delivery_longitude'],
+            validated_data.get('amount') or 0
+        )
+        validated_data['distance'] = trip['distance_km']
+        validated_data['delivery_fee'] = trip['delivery_fee']
         return DeliveryRequest.objects.create(**validated_data)
 
 
@@ -221,4 +232,15 @@ class DeliveryFeeCalculatorSerializer(serializers.Serializer):
     pickup_longitude = serializers.DecimalField(max_digits=9, decimal_places=6)
     delivery_latitude = serializers.DecimalField(max_digits=9, decimal_places=6)
     delivery_longitude = serializers.DecimalField(max_digits=9, decimal_places=6)
-    order_amount = serializers.DecimalField(max_digits=10, decimal_places=2, required=False) 
\ No newline at end of file
+    order_amount = serializers.DecimalField(max_digits=10, decimal_places=2, required=False) 
+
+
+class DeliveryFeeBatchSerializer(serializers.Serializer):
+    """Serializer for quoting delivery fees for many trips at once"""
+    trips = DeliveryFeeCalculatorSerializer(many=True, allow_empty=False)
+
+    def validate_trips(self, value):
+        max_trips = getattr(settings, 'DELIVERY_QUOTE_MAX_TRIPS', 500)
+        if len(value) > max_trips:
+            raise serializers.ValidationError(f"At most {max_trips} trips per request")
+        return value
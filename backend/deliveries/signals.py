@@ -0,0 +1,14 @@
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from .models import DeliveryZone
+from .zones import invalidate_zone_index
+
+
+@receiver(post_save, sender=DeliveryZone)
+@receiver(post_delete, sender=DeliveryZone)
+def invalidate_zone_index_on_change(sender, instance, **kwargs):
+    """
+    Rebuild the zone index in every process once the change is committed
+    """
+    transaction.on_commit(invalidate_zone_index)
@@ -0,0 +1,59 @@
+from celery import shared_task
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+@shared_task
+def reconcile_driver_ratings():
+    """
+    Celery task to recompute driver rating aggregates from the delivery ratings table
+    Ratings keep the running sum/count up to date incrementally; this daily
+    pass repairs drift from deletes that bypass DeliveryRating.delete().
+    """
+    try:
+        from .models import DeliveryRating
+
+        result = DeliveryRating.reconcile_driver_ratings()
+
+        logger.info(f"Driver rating reconciliation checked {result['checked']}, repaired {len(result['repaired'])}")
+        return {
+            'success': True,
+            'checked': result['checked'],
+            'repaired': len(result['repaired'])
+        }
+
+    except Exception as e:
+        logger.error(f"Error reconciling driver ratings: {e}")
+        return {
+            'success': False,
+            'error': str(e)
+        }
+
+
+@shared_task
+def persist_driver_trails():
+    """
+    Celery task to bulk-insert buffered driver trail points into driver_locations
+    Also drops drivers that stopped reporting from the live position set.
+    """
+    try:
+        from .locations import persist_trails, prune_stale_positions
+
+        written = persist_trails()
+        pruned = prune_stale_positions()
+
+        if written or pruned:
+            logger.info(f"Persisted {written} driver trail point(s), pruned {pruned} stale driver(s)")
+        return {
+            'success': True,
+            'written': written,
+            'pruned': pruned
+        }
+
+    except Exception as e:
+        logger.error(f"Error persisting driver trails: {e}")
+        return {
+            'success': False,
+            'error': str(e)
+        }
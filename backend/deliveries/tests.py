@@ -1,3 +1,49 @@
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
 from django.test import TestCase
 
-# Create your tests here.
+from .models import DeliveryRequest
+from .views import delivery_stats
+
+
+class StatsQueryCountTests(TestCase):
+    """
+    Delivery requests and drivers are each scanned once
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        User = get_user_model()
+        customer = User.objects.create_user(username='sender', email='sender@example.com', password='x')
+        User.objects.create_user(username='driver1', email='driver1@example.com', password='x',
+                                 user_type='driver', rating=Decimal('4.50'))
+        User.objects.create_user(username='driver2', email='driver2@example.com', password='x',
+                                 user_type='driver', rating=Decimal('3.00'), is_active=False)
+        for delivery_status, fee, minutes, distance in [
+            ('delivered', '10.00', '30.00', '5.00'),
+            ('delivered', '20.00', '50.00', '15.00'),
+            ('pending', '5.00', None, None),
+            ('cancelled', '5.00', None, None),
+        ]:
+            DeliveryRequest.objects.create(
+                customer=customer, pickup_address='Store', delivery_address='Home',
+                pickup_latitude=0, pickup_longitude=0, delivery_latitude=0, delivery_longitude=0,
+                amount=Decimal('50.00'), status=delivery_status, delivery_fee=Decimal(fee),
+                actual_time=minutes and Decimal(minutes), distance=distance and Decimal(distance),
+            )
+
+    def test_delivery_stats(self):
+        with self.assertNumQueries(2):
+            stats = delivery_stats()
+        self.assertEqual(
+            (stats['total_deliveries'], stats['pending_deliveries'],
+             stats['completed_deliveries'], stats['cancelled_deliveries']),
+            (4, 1, 2, 1),
+        )
+        # Fees and times of delivered requests only
+        self.assertEqual(stats['total_delivery_fees'], Decimal('30.00'))
+        self.assertEqual(stats['avg_delivery_time'], Decimal('40.00'))
+        self.assertEqual(stats['avg_delivery_distance'], Decimal('10.00'))
+        self.assertEqual(stats['active_drivers'], 1)
+        self.assertEqual(stats['avg_driver_rating'], Decimal('3.75'))
@@ -6,17 +6,41 @@ from rest_framework.views import APIView
 from django.db.models import Q, Sum, Avg, Count
 from django.utils import timezone
 from datetime import timedelta
-from math import radians, cos, sin, asin, sqrt
 from drf_yasg.utils import swagger_auto_schema
 from drf_yasg import openapi
 from .models import DeliveryRequest, DriverLocation, DeliveryZone, DriverSchedule, DeliveryRating
+from .locations import forget_tracking_groups, latest_position, record_position
+from .zones import quote_batch, zones_containing
+from .dispatch import describe_candidates, offer_delivery_request
 from .serializers import (
     DeliveryRequestSerializer, DeliveryRequestDetailSerializer, DeliveryRequestCreateSerializer,
     DeliveryRequestUpdateSerializer, DriverLocationSerializer, DriverLocationCreateSerializer,
     DeliveryZoneSerializer, DriverScheduleSerializer, DriverScheduleCreateSerializer,
     DeliveryRatingSerializer, DeliveryRatingCreateSerializer, DeliveryRequestFilterSerializer,
-    DeliveryStatsSerializer, DeliveryZoneCheckSerializer, DeliveryFeeCalculatorSerializer
+    DeliveryStatsSerializer, DeliveryZoneCheckSerializer, DeliveryFeeCalculatorSerializer,
+    DeliveryFeeBatchSerializer
 )
+from utils.stats import cached_stats
+
+
+def delivery_stats():
+    """Delivery request and driver figures in one scan of each table"""
+    from users.models import User
+    
+    stats = DeliveryRequest.objects.aggregate(
+        total_deliveries=Count('id'),
+        pending_deliveries=Count('id', filter=Q(status='pending')),
+        completed_deliveries=Count('id', filter=Q(status='delivered')),
+        cancelled_deliveries=Count('id', filter=Q(status='cancelled')),
+        total_delivery_fees=Sum('delivery_fee', filter=Q(status='delivered')),
+        avg_delivery_time=Avg('actual_time', filter=Q(status='delivered', actual_time__isnull=False)),
+        avg_delivery_distance=Avg('distance', filter=Q(distance__isnull=False)),
+    )
+    stats.update(User.objects.filter(user_type='driver').aggregate(
+        active_drivers=Count('id', filter=Q(is_active=True)),
+        avg_driver_rating=Avg('rating', filter=Q(rating__isnull=False)),
+    ))
+    return {name: value or 0 for name, value in stats.items()}
 
 
 class DeliveryRequestViewSet(viewsets.ModelViewSet):
@@ -122,9 +146,35 @@ class DeliveryRequestViewSet(viewsets.ModelViewSet):
         delivery.status = 'accepted'
         delivery.accepted_at = timezone.now()
         delivery.save()
+        forget_tracking_groups(request.user.id)
         
         return Response({'message': 'Delivery request accepted successfully'})
     
+    @swagger_auto_schema(
+        tags=['deliveries'],
+        operation_description="Offer a pending delivery request to the nearest available drivers"
+    )
+    @action(detail=True, methods=['post'])
+    def offer_drivers(self, request, pk=None):
+        """Notify the best drivers for a pending delivery request; the first to accept takes it"""
+        delivery = self.get_object()
+        
+        if delivery.customer_id != request.user.id and not request.user.is_admin_user:
+            return Response(
+                {'error': 'You can only dispatch your own delivery requests'}, 
+                status=status.HTTP_403_FORBIDDEN
+            )
+        
+        if delivery.status != 'pending':
+            return Response(
+                {'error': 'Delivery request is not pending'}, 
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        count = min(max(int(request.data.get('count', 3)), 1), 10)
+        candidates = offer_delivery_request(delivery, count)
+        return Response({'offered': describe_candidates(candidates)})
+    
     @swagger_auto_schema(
         tags=['deliveries'],
         operation_description="Mark delivery as picked up (driver only)"
@@ -227,52 +277,7 @@ class DeliveryRequestViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_403_FORBIDDEN
             )
         
-        # Get delivery counts
-        total_deliveries = DeliveryRequest.objects.count()
-        pending_deliveries = DeliveryRequest.objects.filter(status='pending').count()
-        completed_deliveries = DeliveryRequest.objects.filter(status='delivered').count()
-        cancelled_deliveries = DeliveryRequest.objects.filter(status='cancelled').count()
-        
-        # Get delivery fees
-        total_delivery_fees = DeliveryRequest.objects.filter(
-            status='delivered'
-        ).aggregate(total=Sum('delivery_fee'))['total'] or 0
-        
-        # Get average delivery time
-        avg_delivery_time = DeliveryRequest.objects.filter(
-            status='delivered',
-            actual_time__isnull=False
-        ).aggregate(avg=Avg('actual_time'))['avg'] or 0
-        
-        # Get average delivery distance
-        avg_delivery_distance = DeliveryRequest.objects.filter(
-            distance__isnull=False
-        ).aggregate(avg=Avg('distance'))['avg'] or 0
-        
-        # Get active drivers
-        from users.models import User
-        active_drivers = User.objects.filter(
-            user_type='driver',
-            is_available=True
-        ).count()
-        
-        # Get average driver rating
-        avg_driver_rating = User.objects.filter(
-            user_type='driver',
-            rating__isnull=False
-        ).aggregate(avg=Avg('rating'))['avg'] or 0
-        
-        stats = {
-            'total_deliveries': total_deliveries,
-            'pending_deliveries': pending_deliveries,
-            'completed_deliveries': completed_deliveries,
-            'cancelled_deliveries': cancelled_deliveries,
-            'total_delivery_fees': total_delivery_fees,
-            'avg_delivery_time': avg_delivery_time,
-            'avg_delivery_distance': avg_delivery_distance,
-            'active_drivers': active_drivers,
-            'avg_driver_rating': avg_driver_rating,
-        }
+        stats = cached_stats('deliveries', delivery_stats)
         
         serializer = DeliveryStatsSerializer(stats)
         return Response(serializer.data)
@@ -348,8 +353,9 @@ class DriverLocationViewSet(viewsets.ModelViewSet):
         
         serializer = DriverLocationCreateSerializer(data=request.data, context={'request': request})
         if serializer.is_valid():
-            location = serializer.save()
-            return Response(DriverLocationSerializer(location).data)
+            # Latest position goes to Redis; the trail is downsampled and persisted in batches
+            position = record_position(request.user.id, serializer.validated_data)
+            return Response(position)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
     
     @swagger_auto_schema(
@@ -365,13 +371,10 @@ class DriverLocationViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_403_FORBIDDEN
             )
         
-        latest_location = DriverLocation.objects.filter(
-            driver=request.user
-        ).order_by('-timestamp').first()
+        position = latest_position(request.user.id)
         
-        if latest_location:
-            serializer = DriverLocationSerializer(latest_location)
-            return Response(serializer.data)
+        if position:
+            return Response(position)
         else:
             return Response({'error': 'No location data available'}, status=status.HTTP_404_NOT_FOUND)
 
@@ -432,15 +435,13 @@ class DeliveryZoneViewSet(viewsets.ModelViewSet):
             order_amount = serializer.validated_data.get('order_amount', 0)
             
             # Find matching zones
-            matching_zones = []
-            for zone in DeliveryZone.objects.filter(is_active=True):
-                if zone.is_within_zone(latitude, longitude):
-                    # Check minimum order amount
-                    if order_amount >= zone.minimum_order_amount:
-                        matching_zones.append({
-                            'zone': DeliveryZoneSerializer(zone).data,
-                            'delivery_fee': zone.base_delivery_fee
-                        })
+            matching_zones = [
+                {
+                    'zone': DeliveryZoneSerializer(zone).data,
+                    'delivery_fee': zone.base_delivery_fee
+                }
+                for zone in zones_containing(latitude, longitude, order_amount)
+            ]
             
             return Response({
                 'is_deliverable': len(matching_zones) > 0,
@@ -458,41 +459,42 @@ class DeliveryZoneViewSet(viewsets.ModelViewSet):
         """Calculate delivery fee based on coordinates"""
         serializer = DeliveryFeeCalculatorSerializer(data=request.data)
         if serializer.is_valid():
-            pickup_lat = serializer.validated_data['pickup_latitude']
-            pickup_lng = serializer.validated_data['pickup_longitude']
-            delivery_lat = serializer.validated_data['delivery_latitude']
-            delivery_lng = serializer.validated_data['delivery_longitude']
-            order_amount = serializer.validated_data.get('order_amount', 0)
-            
-            # Calculate distance
-            lat1, lon1 = radians(pickup_lat), radians(pickup_lng)
-            lat2, lon2 = radians(delivery_lat), radians(delivery_lng)
-            dlat = lat2 - lat1
-            dlon = lon2 - lon1
-            a = sin(dlat/2)**2 + cos(lat1) * cos(lat2) * sin(dlon/2)**2
-            c = 2 * asin(sqrt(a))
-            distance = 6371 * c  # Earth's radius in km
-            
-            # Find applicable zone
-            applicable_zone = None
-            for zone in DeliveryZone.objects.filter(is_active=True):
-                if zone.is_within_zone(delivery_lat, delivery_lng):
-                    if order_amount >= zone.minimum_order_amount:
-                        applicable_zone = zone
-                        break
-            
-            if applicable_zone:
-                delivery_fee = applicable_zone.calculate_delivery_fee(distance)
-            else:
-                delivery_fee = 0
+            trip = quote_batch([serializer.validated_data])[0]
+            applicable_zone = trip['zone']
             
             return Response({
-                'distance_km': round(distance, 2),
-                'delivery_fee': delivery_fee,
+                'distance_km': trip['distance_km'],
+                'delivery_fee': trip['delivery_fee'],
                 'applicable_zone': DeliveryZoneSerializer(applicable_zone).data if applicable_zone else None
             })
         
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+    
+    @swagger_auto_schema(
+        tags=['deliveries'],
+        request_body=DeliveryFeeBatchSerializer,
+        operation_description="Quote distance and delivery fee for many trips in one call"
+    )
+    @action(detail=False, methods=['post'])
+    def quote_fees(self, request):
+        """Quote delivery fees for a list of trips, in request order"""
+        serializer = DeliveryFeeBatchSerializer(data=request.data)
+        if serializer.is_valid():
+            quotes = quote_batch(serializer.validated_data['trips'])
+            return Response({
+                'quotes': [
+                    {
+                        'distance_km': trip['distance_km'],
+                        'delivery_fee': trip['delivery_fee'],
+                        'is_deliverable': trip['zone'] is not None,
+                        'zone_id': trip['zone'].id if trip['zone'] else None,
+                        'zone_name': trip['zone'].name if trip['zone'] else None
+                    }
+                    for trip in quotes
+                ]
+            })
+        
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
 class DriverScheduleViewSet(viewsets.ModelViewSet):
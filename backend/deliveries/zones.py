@@ -0,0 +1,257 @@
+"""
+Delivery zone lookup and fee quoting
+
+Active zones are loaded once per process into a ZoneIndex: a uniform grid of
+GRID_DEGREES cells, each listing the zones whose bounding box overlaps it, plus
+NumPy arrays of zone centers, radii and pricing. A lookup only measures the
+zones registered in the point's cell, and quoting many (pickup, dropoff) pairs
+computes every distance and fee in a few vectorized operations.
+
+Zone saves and deletes bump a version in the shared cache (see
+deliveries.signals); each process rebuilds its index when it notices a new
+version, checking at most every INDEX_RECHECK_SECONDS.
+
+Every fee in the API goes through quote_batch: calculate_fee, the batch
+quote_fees endpoint and DeliveryRequest creation. A dropoff is served by the
+active zone (lowest id first) that contains it and whose minimum order amount is
+met; the fee is the zone's base fee plus additional_fee_per_km for every
+kilometre of the trip beyond the zone radius. Without a zone the fee is 0.
+"""
+
+import logging
+import threading
+import time
+from collections import defaultdict
+from decimal import Decimal, ROUND_HALF_UP
+from math import cos, floor, radians
+
+from django.core.cache import cache
+
+logger = logging.getLogger(__name__)
+
+EARTH_RADIUS_KM = 6371.0
+KM_PER_DEGREE = 111.32
+
+GRID_DEGREES = 0.25
+# Zones covering more cells than this are checked for every point instead
+MAX_CELLS_PER_ZONE = 400
+
+VERSION_KEY = 'deliveries:zones:version'
+INDEX_RECHECK_SECONDS = 5
+
+CENTS = Decimal('0.01')
+
+
+def _cell(latitude, longitude):
+    return floor(latitude / GRID_DEGREES), floor(longitude / GRID_DEGREES)
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    """
+    Vectorized great-circle distance; arguments are arrays (or scalars) in radians
+    """
+    import numpy as np
+
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+def _money(value):
+    return Decimal(repr(float(value))).quantize(CENTS, rounding=ROUND_HALF_UP)
+
+
+class ZoneIndex:
+    """
+    Grid index and pricing arrays over a fixed list of zones
+    """
+
+    def __init__(self, zones):
+        import numpy as np
+
+        self.zones = list(zones)
+        self.latitudes = np.radians(np.array([float(zone.center_latitude) for zone in self.zones], dtype=float))
+        self.longitudes = np.radians(np.array([float(zone.center_longitude) for zone in self.zones], dtype=float))
+        self.radii = np.array([float(zone.radius_km) for zone in self.zones], dtype=float)
+        self.base_fees = np.array([float(zone.base_delivery_fee) for zone in self.zones], dtype=float)
+        self.fees_per_km = np.array([float(zone.additional_fee_per_km) for zone in self.zones], dtype=float)
+        self.minimum_amounts = np.array([float(zone.minimum_order_amount) for zone in self.zones], dtype=float)
+
+        self.cells = defaultdict(list)
+        self.everywhere = []
+        for index, zone in enumerate(self.zones):
+            latitude = float(zone.center_latitude)
+            longitude = float(zone.center_longitude)
+            lat_span = float(zone.radius_km) / KM_PER_DEGREE
+            lon_span = float(zone.radius_km) / (KM_PER_DEGREE * max(cos(radians(latitude)), 0.01))
+            low = _cell(latitude - lat_span, longitude - lon_span)
+            high = _cell(latitude + lat_span, longitude + lon_span)
+            if (high[0] - low[0] + 1) * (high[1] - low[1] + 1) > MAX_CELLS_PER_ZONE:
+                self.everywhere.append(index)
+                continue
+            for row in range(low[0], high[0] + 1):
+                for column in range(low[1], high[1] + 1):
+                    self.cells[(row, column)].append(index)
+
+    def candidates(self, latitude, longitude):
+        """Indexes of the zones that may contain the point (degrees)"""
+        return self.cells.get(_cell(latitude, longitude), []) + self.everywhere
+
+    def match(self, latitudes, longitudes, order_amounts):
+        """
+        For each point (degrees), the index of the first zone containing it whose
+        minimum order amount is met, or -1
+        """
+        import numpy as np
+
+        count = len(latitudes)
+        best = np.full(count, len(self.zones), dtype=np.int64)
+        point_indexes, zone_indexes = [], []
+        for point, (latitude, longitude) in enumerate(zip(latitudes, longitudes)):
+            for zone_index in self.candidates(latitude, longitude):
+                point_indexes.append(point)
+                zone_indexes.append(zone_index)
+
+        if point_indexes:
+            point_indexes = np.array(point_indexes, dtype=np.int64)
+            zone_indexes = np.array(zone_indexes, dtype=np.int64)
+            distances = haversine_km(
+                np.radians(np.asarray(latitudes, dtype=float))[point_indexes],
+                np.radians(np.asarray(longitudes, dtype=float))[point_indexes],
+                self.latitudes[zone_indexes],
+                self.longitudes[zone_indexes],
+            )
+            inside = (distances <= self.radii[zone_indexes]) & (
+                np.asarray(order_amounts, dtype=float)[point_indexes] >= self.minimum_amounts[zone_indexes]
+            )
+            # Zones are ordered by id, so the smallest index is the first zone
+            np.minimum.at(best, point_indexes[inside], zone_indexes[inside])
+
+        best[best == len(self.zones)] = -1
+        return best
+
+
+_index = None
+_index_version = None
+_index_checked_at = 0.0
+_index_lock = threading.Lock()
+
+
+def _current_version():
+    try:
+        version = cache.get(VERSION_KEY)
+        if version is None:
+            version = time.time_ns()
+            if not cache.add(VERSION_KEY, version, timeout=None):
+                version = cache.get(VERSION_KEY, version)
+        return version
+    except Exception as e:
+        logger.warning(f"Could not read delivery zone version: {str(e)}")
+        return _index_version
+
+
+def get_zone_index():
+    """
+    Process-wide index over the active zones, rebuilt when zones change
+    """
+    global _index, _index_version, _index_checked_at
+    now = time.monotonic()
+    if _index is not None and now - _index_checked_at < INDEX_RECHECK_SECONDS:
+        return _index
+
+    with _index_lock:
+        version = _current_version()
+        if _index is None or version != _index_version:
+            from .models import DeliveryZone
+
+            _index = ZoneIndex(DeliveryZone.objects.filter(is_active=True).order_by('id'))
+            _index_version = version
+        _index_checked_at = now
+        return _index
+
+
+def invalidate_zone_index():
+    """
+    Make every process rebuild its zone index (zones were saved or deleted)
+    """
+    global _index
+    try:
+        cache.set(VERSION_KEY, time.time_ns(), timeout=None)
+    except Exception as e:
+        logger.error(f"Failed to invalidate delivery zone index: {str(e)}")
+    with _index_lock:
+        _index = None
+
+
+def zones_containing(latitude, longitude, order_amount=0):
+    """
+    Active zones (lowest id first) containing the point whose minimum order amount is met
+    """
+    import numpy as np
+
+    index = get_zone_index()
+    candidates = index.candidates(float(latitude), float(longitude))
+    if not candidates:
+        return []
+    candidates = np.array(sorted(candidates), dtype=np.int64)
+    distances = haversine_km(
+        radians(float(latitude)), radians(float(longitude)),
+        index.latitudes[candidates], index.longitudes[candidates],
+    )
+    inside = (distances <= index.radii[candidates]) & (float(order_amount or 0) >= index.minimum_amounts[candidates])
+    return [index.zones[zone_index] for zone_index in candidates[inside]]
+
+
+def quote_batch(trips):
+    """
+    Distance and fee for many trips at once. Each trip is a mapping with
+    pickup_latitude, pickup_longitude, delivery_latitude, delivery_longitude
+    and optionally order_amount. Returns one dict per trip:
+    {'distance_km': Decimal, 'delivery_fee': Decimal, 'zone': DeliveryZone or None}
+    """
+    import numpy as np
+
+    trips = list(trips)
+    if not trips:
+        return []
+
+    pickup_lat = np.array([float(trip['pickup_latitude']) for trip in trips], dtype=float)
+    pickup_lng = np.array([float(trip['pickup_longitude']) for trip in trips], dtype=float)
+    delivery_lat = np.array([float(trip['delivery_latitude']) for trip in trips], dtype=float)
+    delivery_lng = np.array([float(trip['delivery_longitude']) for trip in trips], dtype=float)
+    amounts = np.array([float(trip.get('order_amount') or 0) for trip in trips], dtype=float)
+
+    distances = haversine_km(
+        np.radians(pickup_lat), np.radians(pickup_lng), np.radians(delivery_lat), np.radians(delivery_lng)
+    )
+
+    index = get_zone_index()
+    zone_indexes = index.match(delivery_lat, delivery_lng, amounts)
+    served = zone_indexes >= 0
+    safe_indexes = np.where(served, zone_indexes, 0)
+    if index.zones:
+        fees = index.base_fees[safe_indexes] + np.maximum(
+            distances - index.radii[safe_indexes], 0.0
+        ) * index.fees_per_km[safe_indexes]
+        fees = np.where(served, fees, 0.0)
+    else:
+        fees = np.zeros(len(trips))
+
+    return [
+        {
+            'distance_km': _money(distance),
+            'delivery_fee': _money(fee),
+            'zone': index.zones[zone_index] if zone_index >= 0 else None,
+        }
+        for distance, fee, zone_index in zip(distances, fees, zone_indexes)
+    ]
+
+
+def quote(pickup_latitude, pickup_longitude, delivery_latitude, delivery_longitude, order_amount=0):
+    """Distance and fee for one trip (see quote_batch)"""
+    return quote_batch([{
+        'pickup_latitude': pickup_latitude,
+        'pickup_longitude': pickup_longitude,
+        'delivery_latitude': delivery_latitude,
+        'delivery_longitude': delivery_longitude,
+        'order_amount': order_amount,
+    }])[0]
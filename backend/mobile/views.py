@@ -8,7 +8,7 @@ from products.serializers import ProductSerializer
 from orders.serializers import OrderSerializer
 
 class MobileProductViewSet(viewsets.ReadOnlyModelViewSet):
-    queryset = Product.objects.filter(status='active')
+    queryset = ProductSerializer.setup_eager_loading(Product.objects.filter(status='active'))
     serializer_class = ProductSerializer
     
     @action(detail=False, methods=['get'])
@@ -1,4 +1,3 @@
-from firebase_admin import messaging
 from django.contrib.auth import get_user_model
 from .tasks import send_notification_to_user, send_push_notification
 
@@ -1,4 +1,5 @@
 from celery import shared_task
+from tanna_backend.celery import InstrumentedTask
 from channels.layers import get_channel_layer
 from asgiref.sync import async_to_sync
 from django.contrib.auth import get_user_model
@@ -8,7 +9,7 @@ import json
 User = get_user_model()
 channel_layer = get_channel_layer()
 
-@shared_task
+@shared_task(base=InstrumentedTask)
 def send_notification_to_user(user_id, title, message, notification_type='system', data=None):
     """Send notification to a specific user"""
     try:
@@ -43,14 +44,16 @@ def send_notification_to_user(user_id, title, message, notification_type='system
     except User.DoesNotExist:
         return f"User {user_id} not found"
 
-@shared_task
+@shared_task(base=InstrumentedTask)
 def send_push_notification(user_id, title, message, data=None):
     """Send push notification to mobile device"""
     try:
         user = User.objects.get(id=user_id)
         if hasattr(user, 'push_token') and user.push_token:
-            # Import Firebase Admin SDK
-            from firebase_admin import messaging
+            # Firebase Admin SDK, initialized on first use
+            from utils.firebase import firebase_messaging
+            from utils.metrics import upstream
+            messaging = firebase_messaging()
             
             message = messaging.Message(
                 notification=messaging.Notification(
@@ -61,7 +64,8 @@ def send_push_notification(user_id, title, message, data=None):
                 token=user.push_token,
             )
             
-            response = messaging.send(message)
+            with upstream('firebase'):
+                response = messaging.send(message)
             return f"Push notification sent: {response}"
         else:
             return f"No push token for user {user_id}"
@@ -70,7 +74,7 @@ def send_push_notification(user_id, title, message, data=None):
     except Exception as e:
         return f"Error sending push notification: {str(e)}"
 
-@shared_task
+@shared_task(base=InstrumentedTask)
 def process_order_update(order_id, status):
     """Process order status updates and notify relevant users"""
     from orders.models import Order
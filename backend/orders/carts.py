@@ -0,0 +1,554 @@
+"""
+Cart engine
+
+The active cart of each user lives in one Redis hash (carts:<user id>), so
+reading a cart is one HGETALL and adding, updating or removing a line is two
+or three round trips, with no database work on the request thread:
+
+    cart            {"id": <carts row>, "created_at": ...}
+    updated_at      last change of the cart
+    line:<item id>  {"product": ..., "variant": ..., "created_at": ...}
+    qty:<item id>   quantity (HINCRBY, so concurrent adds both count)
+    upd:<item id>   last change of the line
+    ref:<product id>:<variant id or 0>  item id of that product's line
+
+- A cart missing from Redis is loaded from carts/cart_items on first use
+  and expires after CART_STORE_TTL seconds without activity.
+- Lines are priced from product snapshots (products.cache.product_snapshots),
+  so totals are computed in one pass without a query per line. Checkout
+  prices orders from the locked product rows, as before.
+- Changed carts are added to carts:dirty and written back to cart_items in
+  batches by persist_carts (Celery beat), and immediately on checkout.
+  Item ids come from the cart_items primary key sequence when a line is
+  created, so clients keep using the ids they were given after the write.
+
+When Redis is unreachable, or the database has no sequences to take item
+ids from (anything but PostgreSQL), carts are read and written in the
+database, as before.
+"""
+
+import json
+import logging
+import os
+import threading
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connection, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from rest_framework import serializers
+
+logger = logging.getLogger(__name__)
+
+DIRTY_KEY = 'carts:dirty'
+
+# Item ids fetched from the cart_items sequence per round trip
+ITEM_ID_BLOCK_SIZE = 20
+
+_item_ids = []
+_item_ids_pid = None
+_item_ids_lock = threading.Lock()
+
+
+class CartItemNotFound(Exception):
+    pass
+
+
+def _redis():
+    from utils.redis_client import get_redis
+
+    return get_redis(settings.CART_STORE_URL)
+
+
+def _cart_key(user_id):
+    return f'carts:{user_id}'
+
+
+def _ref(product_id, variant_id):
+    return f'ref:{product_id}:{variant_id or 0}'
+
+
+def _allocate_item_id():
+    """
+    Next cart_items primary key, from this process's block of sequence values
+    """
+    global _item_ids_pid
+    with _item_ids_lock:
+        if _item_ids_pid != os.getpid():
+            _item_ids.clear()
+            _item_ids_pid = os.getpid()
+        if not _item_ids:
+            if connection.vendor != 'postgresql':
+                # Ids drawn any other way could collide with rows persist_carts upserts
+                raise ImproperlyConfigured("Cart item ids come from the cart_items sequence, which needs PostgreSQL")
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    "SELECT nextval(pg_get_serial_sequence('cart_items', 'id')) FROM generate_series(1, %s)",
+                    [ITEM_ID_BLOCK_SIZE],
+                )
+                block = [row[0] for row in cursor.fetchall()]
+            _item_ids.extend(reversed(block))
+        return _item_ids.pop()
+
+
+# Cart state: {'id', 'user', 'created_at', 'updated_at', 'lines': {item id: line}}
+# line: {'product', 'variant', 'quantity', 'created_at', 'updated_at'}
+
+def _state_from_db(cart):
+    lines = {}
+    for item in cart.items.values('id', 'product_id', 'product_variant_id', 'quantity', 'created_at', 'updated_at'):
+        lines[item['id']] = {
+            'product': item['product_id'],
+            'variant': item['product_variant_id'],
+            'quantity': item['quantity'],
+            'created_at': item['created_at'],
+            'updated_at': item['updated_at'],
+        }
+    return {
+        'id': cart.pk,
+        'user': cart.user_id,
+        'created_at': cart.created_at,
+        'updated_at': cart.updated_at,
+        'lines': lines,
+    }
+
+
+def _encode(state):
+    mapping = {
+        'cart': json.dumps({'id': state['id'], 'created_at': state['created_at'].isoformat()}),
+        'updated_at': state['updated_at'].isoformat(),
+    }
+    for item_id, line in state['lines'].items():
+        mapping[f'line:{item_id}'] = json.dumps({
+            'product': line['product'],
+            'variant': line['variant'],
+            'created_at': line['created_at'].isoformat(),
+        })
+        mapping[f'qty:{item_id}'] = line['quantity']
+        mapping[f'upd:{item_id}'] = line['updated_at'].isoformat()
+        mapping[_ref(line['product'], line['variant'])] = item_id
+    return mapping
+
+
+def _decode(user_id, raw):
+    """State from HGETALL, or None when the cart is not loaded"""
+    fields = {key.decode(): value.decode() for key, value in raw.items()}
+    if 'cart' not in fields:
+        return None
+    meta = json.loads(fields['cart'])
+    lines = {}
+    for field, value in fields.items():
+        if not field.startswith('line:'):
+            continue
+        item_id = int(field[len('line:'):])
+        quantity = int(fields.get(f'qty:{item_id}', 0))
+        if quantity < 1:
+            continue
+        line = json.loads(value)
+        created_at = parse_datetime(line['created_at'])
+        lines[item_id] = {
+            'product': line['product'],
+            'variant': line['variant'],
+            'quantity': quantity,
+            'created_at': created_at,
+            'updated_at': parse_datetime(fields[f'upd:{item_id}']) if f'upd:{item_id}' in fields else created_at,
+        }
+    return {
+        'id': meta['id'],
+        'user': user_id,
+        'created_at': parse_datetime(meta['created_at']),
+        'updated_at': parse_datetime(fields.get('updated_at') or meta['created_at']),
+        'lines': lines,
+    }
+
+
+class RedisCarts:
+    """Carts kept in Redis and written back by persist_carts"""
+
+    def __init__(self, client):
+        self.client = client
+
+    def _hydrate(self, user):
+        from redis.exceptions import WatchError
+        from .models import Cart
+
+        cart, _created = Cart.objects.get_or_create(user=user)
+        state = _state_from_db(cart)
+        key = _cart_key(user.pk)
+        with self.client.pipeline(transaction=True) as pipe:
+            try:
+                pipe.watch(key)
+                loaded = _decode(user.pk, pipe.hgetall(key))
+                if loaded is not None:
+                    # Another request loaded it first
+                    return loaded
+                pipe.multi()
+                pipe.delete(key)
+                pipe.hset(key, mapping=_encode(state))
+                pipe.expire(key, settings.CART_STORE_TTL)
+                pipe.execute()
+            except WatchError:
+                return self.load(user)
+        return state
+
+    def load(self, user):
+        key = _cart_key(user.pk)
+        with self.client.pipeline(transaction=False) as pipe:
+            pipe.hgetall(key)
+            pipe.expire(key, settings.CART_STORE_TTL)
+            raw, _expired = pipe.execute()
+        state = _decode(user.pk, raw)
+        return state if state is not None else self._hydrate(user)
+
+    def _touch(self, pipe, key, user_id, now):
+        pipe.hset(key, 'updated_at', now)
+        pipe.expire(key, settings.CART_STORE_TTL)
+        pipe.sadd(DIRTY_KEY, user_id)
+
+    def _line(self, user, item_id):
+        key = _cart_key(user.pk)
+        with self.client.pipeline(transaction=False) as pipe:
+            pipe.exists(key)
+            pipe.hget(key, f'line:{item_id}')
+            exists, line = pipe.execute()
+        if not exists:
+            self._hydrate(user)
+            line = self.client.hget(key, f'line:{item_id}')
+        if line is None:
+            raise CartItemNotFound(item_id)
+        return json.loads(line)
+
+    def add(self, user, product_id, variant_id, quantity):
+        key = _cart_key(user.pk)
+        ref = _ref(product_id, variant_id)
+        with self.client.pipeline(transaction=False) as pipe:
+            pipe.exists(key)
+            pipe.hget(key, ref)
+            exists, item_id = pipe.execute()
+        if not exists:
+            self._hydrate(user)
+            item_id = self.client.hget(key, ref)
+
+        now = timezone.now().isoformat()
+        if item_id is None:
+            # Line first, then the ref: a request that finds the ref always finds the line
+            new_id = _allocate_item_id()
+            with self.client.pipeline(transaction=True) as pipe:
+                pipe.hset(key, f'line:{new_id}', json.dumps({
+                    'product': product_id, 'variant': variant_id, 'created_at': now,
+                }))
+                pipe.hsetnx(key, ref, new_id)
+                _set, claimed = pipe.execute()
+            if claimed:
+                item_id = new_id
+            else:
+                self.client.hdel(key, f'line:{new_id}')
+                item_id = self.client.hget(key, ref)
+        item_id = int(item_id)
+
+        with self.client.pipeline(transaction=True) as pipe:
+            pipe.hincrby(key, f'qty:{item_id}', quantity)
+            pipe.hset(key, f'upd:{item_id}', now)
+            pipe.hget(key, f'line:{item_id}')
+            self._touch(pipe, key, user.pk, now)
+            total, _updated, line = pipe.execute()[:3]
+        line = json.loads(line)
+        return item_id, {
+            'product': product_id,
+            'variant': variant_id,
+            'quantity': total,
+            'created_at': parse_datetime(line['created_at']),
+            'updated_at': parse_datetime(now),
+        }
+
+    def set_quantity(self, user, item_id, quantity):
+        line = self._line(user, item_id)
+        key = _cart_key(user.pk)
+        now = timezone.now().isoformat()
+        with self.client.pipeline(transaction=True) as pipe:
+            pipe.hset(key, mapping={f'qty:{item_id}': quantity, f'upd:{item_id}': now})
+            self._touch(pipe, key, user.pk, now)
+            pipe.execute()
+        return {
+            'product': line['product'],
+            'variant': line['variant'],
+            'quantity': quantity,
+            'created_at': parse_datetime(line['created_at']),
+            'updated_at': parse_datetime(now),
+        }
+
+    def remove(self, user, item_id):
+        line = self._line(user, item_id)
+        key = _cart_key(user.pk)
+        with self.client.pipeline(transaction=True) as pipe:
+            pipe.hdel(key, f'line:{item_id}', f'qty:{item_id}', f'upd:{item_id}', _ref(line['product'], line['variant']))
+            self._touch(pipe, key, user.pk, timezone.now().isoformat())
+            pipe.execute()
+
+    def clear(self, user):
+        key = _cart_key(user.pk)
+        meta = self.client.hget(key, 'cart')
+        if meta is None:
+            self._hydrate(user)
+            meta = self.client.hget(key, 'cart')
+        with self.client.pipeline(transaction=True) as pipe:
+            pipe.delete(key)
+            pipe.hset(key, 'cart', meta)
+            self._touch(pipe, key, user.pk, timezone.now().isoformat())
+            pipe.execute()
+
+
+class DatabaseCarts:
+    """Carts read and written in carts/cart_items directly"""
+
+    def _cart(self, user):
+        from .models import Cart
+
+        cart, _created = Cart.objects.get_or_create(user=user)
+        return cart
+
+    def load(self, user):
+        return _state_from_db(self._cart(user))
+
+    def _line(self, item):
+        return {
+            'product': item.product_id,
+            'variant': item.product_variant_id,
+            'quantity': item.quantity,
+            'created_at': item.created_at,
+            'updated_at': item.updated_at,
+        }
+
+    def _item(self, user, item_id):
+        from .models import CartItem
+
+        try:
+            return CartItem.objects.get(id=item_id, cart__user=user)
+        except CartItem.DoesNotExist:
+            raise CartItemNotFound(item_id)
+
+    def add(self, user, product_id, variant_id, quantity):
+        from .models import CartItem
+
+        item, created = CartItem.objects.get_or_create(
+            cart=self._cart(user), product_id=product_id, product_variant_id=variant_id,
+            defaults={'quantity': quantity},
+        )
+        if not created:
+            item.quantity += quantity
+            item.save()
+        return item.pk, self._line(item)
+
+    def set_quantity(self, user, item_id, quantity):
+        item = self._item(user, item_id)
+        item.quantity = quantity
+        item.save()
+        return self._line(item)
+
+    def remove(self, user, item_id):
+        self._item(user, item_id).delete()
+
+    def clear(self, user):
+        self._cart(user).items.all().delete()
+
+
+def _store_call(method, user, *args):
+    from redis.exceptions import RedisError
+
+    if connection.vendor != 'postgresql':
+        # No sequence to take item ids from (see _allocate_item_id)
+        return getattr(DatabaseCarts(), method)(user, *args)
+    try:
+        return getattr(RedisCarts(_redis()), method)(user, *args)
+    except RedisError as e:
+        logger.warning("Cart store unavailable, using the database for user %s: %s", user.pk, e)
+        return getattr(DatabaseCarts(), method)(user, *args)
+
+
+# Representation (the shape CartSerializer and CartItemSerializer produced)
+
+def _present_line(item_id, line, snapshot):
+    variant_price = snapshot['variants'].get(line['variant']) if line['variant'] else None
+    price = variant_price if variant_price is not None else snapshot['price']
+    return {
+        'id': item_id,
+        'product': line['product'],
+        'product_name': snapshot['name'],
+        'product_image': snapshot['image'],
+        'product_price': snapshot['price'],
+        'product_variant': line['variant'],
+        'quantity': line['quantity'],
+        'total_price': None if price is None else price * line['quantity'],
+        'created_at': line['created_at'],
+        'updated_at': line['updated_at'],
+    }
+
+
+def _present(state):
+    from products.cache import product_snapshots
+
+    snapshots = product_snapshots(line['product'] for line in state['lines'].values())
+    items = []
+    total_items = 0
+    total_amount = 0
+    for item_id in sorted(state['lines']):
+        line = state['lines'][item_id]
+        snapshot = snapshots.get(line['product'])
+        if snapshot is None:
+            # Product deleted since it was added; the write-back drops the line
+            continue
+        item = _present_line(item_id, line, snapshot)
+        items.append(item)
+        total_items += item['quantity']
+        if item['total_price'] is not None:
+            total_amount += item['total_price']
+    return {
+        'id': state['id'],
+        'user': state['user'],
+        'items': items,
+        'total_items': total_items,
+        'total_amount': total_amount,
+        'created_at': state['created_at'],
+        'updated_at': state['updated_at'],
+    }
+
+
+# Cart operations
+
+def cart_contents(user):
+    """
+    The user's cart with priced lines and totals
+    """
+    return _present(_store_call('load', user))
+
+
+def add_item(user, product_id, variant_id=None, quantity=1):
+    """
+    Add `quantity` of a product (or one of its variants) and return the priced line.
+    Raises serializers.ValidationError for unknown products and variants.
+    """
+    from products.cache import product_snapshots
+
+    snapshot = product_snapshots([product_id]).get(product_id)
+    if snapshot is None:
+        raise serializers.ValidationError({'product': [f'Invalid pk "{product_id}" - object does not exist.']})
+    if variant_id is not None and variant_id not in snapshot['variants']:
+        raise serializers.ValidationError({'product_variant': [f'Invalid pk "{variant_id}" - object does not exist.']})
+
+    item_id, line = _store_call('add', user, product_id, variant_id, quantity)
+    return _present_line(item_id, line, snapshot)
+
+
+def update_item(user, item_id, quantity):
+    """
+    Set a line's quantity and return the priced line; a quantity below 1
+    removes it and returns None. Raises CartItemNotFound.
+    """
+    from products.cache import product_snapshots
+
+    if quantity < 1:
+        remove_item(user, item_id)
+        return None
+    line = _store_call('set_quantity', user, item_id, quantity)
+    snapshot = product_snapshots([line['product']]).get(line['product'])
+    if snapshot is None:
+        raise CartItemNotFound(item_id)
+    return _present_line(item_id, line, snapshot)
+
+
+def remove_item(user, item_id):
+    """Raises CartItemNotFound"""
+    _store_call('remove', user, item_id)
+
+
+def clear(user):
+    _store_call('clear', user)
+
+
+def checkout_lines(user):
+    """
+    (cart id, [{'product_id', 'quantity'}]) of the user's cart, for orders.checkout.place_order
+    """
+    state = _store_call('load', user)
+    lines = [
+        {'product_id': line['product'], 'quantity': line['quantity']}
+        for _item_id, line in sorted(state['lines'].items())
+    ]
+    return state['id'], lines
+
+
+def clear_after_checkout(user, cart_id):
+    """
+    Inside the order's transaction: empty the stored cart with the order and
+    the live cart once it commits
+    """
+    from .models import CartItem
+
+    CartItem.objects.filter(cart_id=cart_id).delete()
+    transaction.on_commit(lambda: clear(user))
+
+
+# Write-behind
+
+def _write_cart(state):
+    """
+    Make cart_items match the cart; returns False when the cart row is gone
+    """
+    from products.models import Product, ProductVariant
+    from .models import Cart, CartItem
+
+    lines = state['lines']
+    with transaction.atomic():
+        if not Cart.objects.filter(pk=state['id']).update(updated_at=state['updated_at']):
+            return False
+
+        products = set(Product.objects.filter(
+            pk__in={line['product'] for line in lines.values()}
+        ).values_list('pk', flat=True))
+        variants = set(ProductVariant.objects.filter(
+            pk__in={line['variant'] for line in lines.values() if line['variant']}
+        ).values_list('pk', flat=True))
+
+        CartItem.objects.filter(cart_id=state['id']).exclude(pk__in=list(lines)).delete()
+        rows = [
+            CartItem(
+                id=item_id,
+                cart_id=state['id'],
+                product_id=line['product'],
+                product_variant_id=line['variant'] if line['variant'] in variants else None,
+                quantity=line['quantity'],
+                created_at=line['created_at'],
+            )
+            for item_id, line in lines.items() if line['product'] in products
+        ]
+        CartItem.objects.bulk_create(
+            rows, update_conflicts=True, unique_fields=['id'],
+            update_fields=['product_variant', 'quantity', 'updated_at'],
+        )
+    return True
+
+
+def persist_carts():
+    """
+    Write every changed cart back to carts/cart_items; returns how many were written
+    """
+    client = _redis()
+    written = 0
+    for member in client.smembers(DIRTY_KEY):
+        user_id = int(member)
+        # Changes made from here on mark the cart dirty again
+        client.srem(DIRTY_KEY, user_id)
+        state = _decode(user_id, client.hgetall(_cart_key(user_id)))
+        if state is None:
+            continue
+        try:
+            if _write_cart(state):
+                written += 1
+            else:
+                # Cart row deleted: the next request loads a new one
+                client.delete(_cart_key(user_id))
+        except Exception as e:
+            client.sadd(DIRTY_KEY, user_id)
+            logger.error("Could not persist the cart of user %s: %s", user_id, e)
+    return written
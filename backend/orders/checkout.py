@@ -0,0 +1,139 @@
+"""
+Checkout engine
+
+Turns a list of {'product_id', 'quantity'} lines into an Order in a single
+transaction:
+1. Locks every product row with SELECT ... FOR UPDATE in primary-key order, so
+   two checkouts sharing SKUs always lock them in the same order (no deadlocks)
+2. Rejects the order if any line exceeds the locked stock (no oversells)
+3. Inserts the order with totals computed in memory and its items with one bulk_create
+4. Decrements stock for every line with one UPDATE using F() expressions
+"""
+
+import logging
+from collections import OrderedDict
+
+from django.db import transaction
+from django.db.models import Case, F, Value, When
+from django.utils import timezone
+from rest_framework import serializers
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_lines(items_data):
+    """
+    Merge duplicate products and validate quantities; returns {product_id: quantity}
+    """
+    lines = OrderedDict()
+    for item_data in items_data:
+        product_id = item_data.get('product_id')
+        quantity = item_data.get('quantity', 1)
+        try:
+            product_id = int(product_id)
+            quantity = int(quantity)
+        except (TypeError, ValueError):
+            raise serializers.ValidationError(f"Invalid order line: {item_data}")
+        if quantity < 1:
+            raise serializers.ValidationError(f"Quantity for product {product_id} must be at least 1")
+        lines[product_id] = lines.get(product_id, 0) + quantity
+    if not lines:
+        raise serializers.ValidationError("Order must contain at least one item")
+    return lines
+
+
+def lock_products(product_ids):
+    """
+    Lock the given products in a deterministic (primary key) order and return them by id.
+    in_bulk() would drop the ordering, so the dict is built from an ordered queryset.
+    """
+    from products.models import Product
+
+    products = Product.objects.select_for_update().filter(pk__in=product_ids).order_by('pk')
+    return {product.pk: product for product in products}
+
+
+def reserve_stock(products, lines):
+    """
+    Decrement stock for every line in one UPDATE; products that run out become out_of_stock
+    """
+    from products.models import Product
+    from products.cache import TAG_PRODUCTS, TAG_CATEGORY_COUNTS, category_tag, invalidate_on_commit
+
+    depleted = [product_id for product_id, quantity in lines.items() if products[product_id].stock == quantity]
+
+    updates = {
+        'stock': Case(
+            *[When(pk=product_id, then=F('stock') - quantity) for product_id, quantity in lines.items()],
+            default=F('stock'),
+        ),
+        'updated_at': timezone.now(),
+    }
+    if depleted:
+        updates['status'] = Case(When(pk__in=depleted, then=Value('out_of_stock')), default=F('status'))
+    Product.objects.filter(pk__in=list(lines)).update(**updates)
+
+    for product_id, quantity in lines.items():
+        products[product_id].stock -= quantity
+        if product_id in depleted:
+            products[product_id].status = 'out_of_stock'
+
+    # Queryset updates skip the catalog cache signals
+    tags = {TAG_PRODUCTS} | {category_tag(products[product_id].category_id) for product_id in lines}
+    if depleted:
+        tags.add(TAG_CATEGORY_COUNTS)
+    invalidate_on_commit(tags)
+
+
+def place_order(customer, order_fields, items_data):
+    """
+    Create an order for `customer` from `items_data` atomically and return it.
+    Raises serializers.ValidationError for unknown products or insufficient stock.
+    """
+    from .models import Order, OrderItem
+
+    lines = normalize_lines(items_data)
+
+    with transaction.atomic():
+        products = lock_products(sorted(lines))
+
+        missing = [product_id for product_id in lines if product_id not in products]
+        if missing:
+            raise serializers.ValidationError(f"Product with id {missing[0]} does not exist")
+
+        shortages = []
+        for product_id, quantity in lines.items():
+            product = products[product_id]
+            if product.price is None:
+                raise serializers.ValidationError(f"Product {product.name} has no price")
+            if product.stock < quantity:
+                shortages.append(
+                    f"Insufficient stock for {product.name}: {product.stock} available, {quantity} requested"
+                )
+        if shortages:
+            raise serializers.ValidationError({'items': shortages})
+
+        items = [
+            OrderItem(
+                product=products[product_id],
+                product_name=products[product_id].name,
+                product_sku=products[product_id].sku,
+                quantity=quantity,
+                unit_price=products[product_id].price,
+                # bulk_create skips OrderItem.save(), which normally computes this
+                total_price=products[product_id].price * quantity,
+            )
+            for product_id, quantity in lines.items()
+        ]
+
+        order = Order(customer=customer, **order_fields)
+        order.save(items=items)
+
+        for item in items:
+            item.order = order
+        OrderItem.objects.bulk_create(items)
+
+        reserve_stock(products, lines)
+
+    logger.info(f"Order {order.order_number} placed with {len(items)} line(s)")
+    return order
@@ -0,0 +1,53 @@
+"""
+Flat column projections for streaming order and invoice exports (see utils.exports)
+"""
+
+ORDER_EXPORT_COLUMNS = [
+    ('id', 'id', 'int'),
+    ('order_number', 'order_number', 'str'),
+    ('created_at', 'created_at', 'datetime'),
+    ('status', 'status', 'str'),
+    ('payment_status', 'payment_status', 'str'),
+    ('payment_method', 'payment_method', 'str'),
+    ('customer_id', 'customer_id', 'int'),
+    ('customer_name', 'customer_name', 'str'),
+    ('customer_email', 'customer_email', 'str'),
+    ('customer_phone', 'customer_phone', 'str'),
+    ('subtotal', 'subtotal', 'money'),
+    ('tax', 'tax', 'money'),
+    ('delivery_fee', 'delivery_fee', 'money'),
+    ('discount', 'discount', 'money'),
+    ('total_amount', 'total_amount', 'money'),
+    ('is_pickup', 'is_pickup', 'bool'),
+    ('city', 'city', 'str'),
+    ('district', 'district', 'str'),
+    ('country', 'country', 'str'),
+    ('delivery_person_id', 'delivery_person_id', 'int'),
+    ('delivery_person_name', 'delivery_person_name', 'str'),
+    ('actual_delivery_time', 'actual_delivery_time', 'datetime'),
+    ('updated_at', 'updated_at', 'datetime'),
+]
+
+INVOICE_EXPORT_COLUMNS = [
+    ('id', 'id', 'int'),
+    ('invoice_number', 'invoice_number', 'str'),
+    ('created_at', 'created_at', 'datetime'),
+    ('status', 'status', 'str'),
+    ('order_id', 'order_id', 'int'),
+    ('order_number', 'order__order_number', 'str'),
+    ('customer_name', 'customer_name', 'str'),
+    ('customer_email', 'customer_email', 'str'),
+    ('payment_terms', 'payment_terms', 'str'),
+    ('due_date', 'due_date', 'datetime'),
+    ('subtotal', 'subtotal', 'money'),
+    ('tax_amount', 'tax_amount', 'money'),
+    ('delivery_fee', 'delivery_fee', 'money'),
+    ('discount_amount', 'discount_amount', 'money'),
+    ('total_amount', 'total_amount', 'money'),
+    ('amount_paid', 'amount_paid', 'money'),
+    ('balance_due', 'balance_due', 'money'),
+    ('outstanding_amount', 'outstanding_amount', 'money'),
+    ('payment_method', 'payment_method', 'str'),
+    ('sent_at', 'sent_at', 'datetime'),
+    ('paid_at', 'paid_at', 'datetime'),
+]
@@ -0,0 +1,115 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from rest_framework import serializers
+
+from orders.checkout import place_order
+
+
+class Command(BaseCommand):
+    help = 'Run parallel checkouts against one hot SKU and verify that stock is never oversold'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--stock', type=int, default=50, help='Initial stock of the benchmark product')
+        parser.add_argument('--attempts', type=int, default=200, help='Number of checkout attempts')
+        parser.add_argument('--workers', type=int, default=16, help='Number of concurrent checkout threads')
+        parser.add_argument('--quantity', type=int, default=1, help='Units requested per checkout')
+        parser.add_argument(
+            '--keep',
+            action='store_true',
+            help='Keep the benchmark product, user and orders instead of deleting them',
+        )
+
+    def handle(self, *args, **options):
+        from orders.models import Order
+        from products.models import Category, Product
+        from users.models import User
+
+        if connection.vendor != 'postgresql':
+            raise CommandError('The checkout benchmark needs PostgreSQL (row locks are not exercised on SQLite)')
+
+        stock = options['stock']
+        quantity = options['quantity']
+        suffix = str(int(time.time()))
+
+        category, _ = Category.objects.get_or_create(name='Checkout Benchmark')
+        product = Product.objects.create(
+            name=f'Checkout Benchmark {suffix}',
+            sku=f'BENCH-{suffix}',
+            category=category,
+            price=Decimal('10.00'),
+            stock=stock,
+        )
+        customer, _ = User.objects.get_or_create(
+            username='checkout-benchmark',
+            defaults={'email': 'checkout-benchmark@example.com'},
+        )
+
+        results = {'placed': 0, 'rejected': 0, 'errors': 0}
+        latencies = []
+        lock = threading.Lock()
+
+        def attempt(_):
+            started = time.monotonic()
+            try:
+                place_order(
+                    customer,
+                    {'customer_name': 'Checkout Benchmark', 'customer_email': customer.email, 'customer_phone': ''},
+                    [{'product_id': product.pk, 'quantity': quantity}],
+                )
+                outcome = 'placed'
+            except serializers.ValidationError:
+                outcome = 'rejected'
+            except Exception as e:
+                self.stderr.write(f'Checkout failed: {e}')
+                outcome = 'errors'
+            finally:
+                connection.close()
+            with lock:
+                results[outcome] += 1
+                latencies.append(time.monotonic() - started)
+
+        self.stdout.write(
+            f"Running {options['attempts']} checkouts of {quantity} unit(s) with {options['workers']} workers "
+            f"against stock {stock}..."
+        )
+        started = time.monotonic()
+        with ThreadPoolExecutor(max_workers=options['workers']) as executor:
+            list(executor.map(attempt, range(options['attempts'])))
+        duration = time.monotonic() - started
+
+        product.refresh_from_db()
+        orders = Order.objects.filter(items__product=product)
+        expected_placed = min(options['attempts'], stock // quantity)
+        latencies.sort()
+
+        self.stdout.write('\n' + '='*50)
+        self.stdout.write(f"Placed: {results['placed']}  Rejected: {results['rejected']}  Errors: {results['errors']}")
+        self.stdout.write(f'Final stock: {product.stock} (status {product.status})')
+        self.stdout.write(f'Duration: {duration:.2f}s ({options["attempts"] / duration:.1f} checkouts/s)')
+        if latencies:
+            self.stdout.write(
+                f'Latency p50: {latencies[len(latencies) // 2] * 1000:.1f}ms  '
+                f'p95: {latencies[int(len(latencies) * 0.95) - 1] * 1000:.1f}ms'
+            )
+        self.stdout.write('='*50)
+
+        oversold = (
+            product.stock < 0
+            or results['placed'] * quantity + product.stock != stock
+            or orders.count() != results['placed']
+        )
+
+        if not options['keep']:
+            orders.delete()
+            product.delete()
+
+        if oversold:
+            raise CommandError('Stock accounting mismatch: checkout oversold or lost stock')
+        if results['placed'] != expected_placed:
+            raise CommandError(f"Expected {expected_placed} orders to be placed, got {results['placed']}")
+        self.stdout.write(self.style.SUCCESS('No oversells: every unit sold is backed by stock'))
@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = 'Recompute product and driver rating aggregates (sum, count, average) and repair drift'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='Number of drifted rows repaired per transaction',
+        )
+
+    def handle(self, *args, **options):
+        from orders.models import Review
+        from deliveries.models import DeliveryRating
+
+        batch_size = max(options['batch_size'], 1)
+
+        self.stdout.write('Reconciling product ratings...')
+        products = Review.reconcile_product_ratings(batch_size=batch_size)
+        self.stdout.write('Reconciling driver ratings...')
+        drivers = DeliveryRating.reconcile_driver_ratings(batch_size=batch_size)
+
+        self.stdout.write('\n' + '='*50)
+        self.stdout.write(f"Products checked: {products['checked']}  repaired: {len(products['repaired'])}")
+        self.stdout.write(f"Drivers checked: {drivers['checked']}  repaired: {len(drivers['repaired'])}")
+        self.stdout.write('='*50)
+        self.stdout.write(self.style.SUCCESS('Rating aggregates reconciled'))
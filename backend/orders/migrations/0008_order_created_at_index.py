@@ -0,0 +1,17 @@
+# Generated by Django 4.2.7 on 2026-10-16 09:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0007_invoice_delivery_fee'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['created_at'], name='orders_created_at_idx'),
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 4.2.7 on 2026-10-17 12:40
+
+from django.db import migrations
+from django.utils import timezone
+
+from utils.identifiers import create_sequence, drop_sequence
+
+
+def create_identifier_sequences(apps, schema_editor):
+    Order = apps.get_model('orders', 'Order')
+    Invoice = apps.get_model('orders', 'Invoice')
+    OrderReceipt = apps.get_model('orders', 'OrderReceipt')
+    today = timezone.now().strftime('%Y%m%d')
+
+    create_sequence(schema_editor, 'order', Order.objects.filter(
+        order_number__startswith=f'ORD-{today}-'
+    ).values_list('order_number', flat=True))
+    create_sequence(schema_editor, 'invoice', Invoice.objects.filter(
+        invoice_number__startswith=f'INV-{today}-'
+    ).values_list('invoice_number', flat=True))
+    create_sequence(schema_editor, 'order_receipt', OrderReceipt.objects.filter(
+        receipt_number__startswith=f'RCP-{today}-'
+    ).values_list('receipt_number', flat=True))
+
+
+def drop_identifier_sequences(apps, schema_editor):
+    for kind in ('order', 'invoice', 'order_receipt'):
+        drop_sequence(schema_editor, kind)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0009_order_customer_driver_created_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_identifier_sequences, drop_identifier_sequences),
+    ]
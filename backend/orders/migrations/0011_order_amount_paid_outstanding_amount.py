@@ -0,0 +1,60 @@
+# Generated by Django 4.2.7 on 2026-10-17 13:20
+
+from decimal import Decimal
+
+from django.db import migrations, models
+from django.db.models import Case, F, OuterRef, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce, Greatest
+
+OPEN_INVOICE_STATUSES = ['draft', 'sent', 'overdue']
+
+
+def backfill_ledger(apps, schema_editor):
+    """
+    Set-based backfill of the paid/outstanding totals, written with the ORM so
+    it runs on every backend (CI migrates sqlite)
+    """
+    Order = apps.get_model('orders', 'Order')
+    Invoice = apps.get_model('orders', 'Invoice')
+    PaymentTransaction = apps.get_model('payments', 'PaymentTransaction')
+
+    zero = Value(Decimal('0'), output_field=models.DecimalField(max_digits=10, decimal_places=2))
+    paid = PaymentTransaction.objects.filter(
+        order_id=OuterRef('pk'), status__in=['successful', 'paid']
+    ).order_by().values('order_id').annotate(total=Sum('amount')).values('total')
+    Order.objects.update(amount_paid=Coalesce(Subquery(paid), zero))
+    Order.objects.update(outstanding_amount=Greatest(F('total_amount') - F('amount_paid'), zero))
+
+    order = Order.objects.filter(pk=OuterRef('order_id'))
+    order_paid = Subquery(order.values('amount_paid'))
+    is_open = When(status__in=OPEN_INVOICE_STATUSES, then=order_paid)
+    Invoice.objects.update(
+        outstanding_amount=Subquery(order.values('outstanding_amount')),
+        amount_paid=Case(is_open, default=F('amount_paid')),
+        balance_due=Case(
+            When(status__in=OPEN_INVOICE_STATUSES, then=F('total_amount') - order_paid),
+            default=F('balance_due'),
+        ),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0010_identifier_sequences'),
+        ('payments', '0009_identifier_sequences'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='amount_paid',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=10),
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='outstanding_amount',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=10),
+        ),
+        migrations.RunPython(backfill_ledger, migrations.RunPython.noop),
+    ]
@@ -1,4 +1,4 @@
-from django.db import models
+from django.db import models, transaction
 from django.utils import timezone
 from django.core.validators import MinValueValidator
 from decimal import Decimal
@@ -68,18 +68,9 @@ class OrderReceipt(models.Model):
         super().save(*args, **kwargs)
     
     def _generate_receipt_number(self):
-        """Generate unique receipt number"""
-        import random
-        import string
-        
-        while True:
-            # Format: RCP-YYYYMMDD-XXXXX
-            date_part = timezone.now().strftime('%Y%m%d')
-            random_part = ''.join(random.choices(string.ascii_uppercase + string.digits, k=5))
-            receipt_number = f"RCP-{date_part}-{random_part}"
-            
-            if not OrderReceipt.objects.filter(receipt_number=receipt_number).exists():
-                return receipt_number
+        """Generate unique receipt number (RCP-YYYYMMDD-XXXXX)"""
+        from utils.identifiers import allocate
+        return allocate('order_receipt')
     
     @property
     def is_pending_signature(self):
@@ -229,18 +220,9 @@ class Invoice(models.Model):
         super().save(*args, **kwargs)
     
     def _generate_invoice_number(self):
-        """Generate unique invoice number"""
-        import random
-        import string
-        
-        while True:
-            # Format: INV-YYYYMMDD-XXXXX
-            date_part = timezone.now().strftime('%Y%m%d')
-            random_part = ''.join(random.choices(string.ascii_uppercase + string.digits, k=5))
-            invoice_number = f"INV-{date_part}-{random_part}"
-            
-            if not Invoice.objects.filter(invoice_number=invoice_number).exists():
-                return invoice_number
+        """Generate unique invoice number (INV-YYYYMMDD-XXXXX)"""
+        from utils.identifiers import allocate
+        return allocate('invoice')
     
     def _calculate_totals(self):
         """Calculate invoice totals"""
@@ -259,27 +241,8 @@ class Invoice(models.Model):
         self._calculate_outstanding_amount()
     
     def _calculate_outstanding_amount(self):
-        """Calculate outstanding amount based on order payment transactions"""
-        from decimal import Decimal
-        from django.db.models import Sum
-        
-        # Get successful payment transactions for this order
-        from payments.models import PaymentTransaction
-        successful_payments = PaymentTransaction.objects.filter(
-            order=self.order,
-            status='successful'
-        )
-        
-        total_paid = successful_payments.aggregate(
-            total=Sum('amount')
-        )['total'] or Decimal('0')
-        
-        # Calculate outstanding amount
-        order_total = Decimal(str(self.order.total_amount))
-        outstanding_amount = max(Decimal('0'), order_total - total_paid)
-        
-        # Set the outstanding amount
-        self.outstanding_amount = outstanding_amount
+        """Outstanding amount of the order, kept by the payment ledger"""
+        self.outstanding_amount = self.order.outstanding_amount
     
     def _set_due_date(self):
         """Set due date based on payment terms"""
@@ -323,6 +286,7 @@ class Invoice(models.Model):
             self.status = 'sent'
             self.sent_at = timezone.now()
             self.save()
+            self._schedule_pdf_prerender()
     
     def mark_as_paid(self, payment_method=None, transaction_id=None):
         """Mark invoice as paid"""
@@ -335,6 +299,7 @@ class Invoice(models.Model):
             self.payment_date = timezone.now()
             self.paid_at = timezone.now()
             self.save()
+            self._schedule_pdf_prerender()
     
     def apply_payment(self, amount, payment_method=None, transaction_id=None):
         """Apply partial payment to invoice"""
@@ -354,6 +319,14 @@ class Invoice(models.Model):
             self.payment_transaction_id = transaction_id
             self.payment_date = timezone.now()
             self.save()
+            if self.status == 'paid':
+                self._schedule_pdf_prerender()
+    
+    def _schedule_pdf_prerender(self):
+        """Render the PDF in the background so the customer's download is served from the store"""
+        from utils.document_store import schedule_prerender
+        from .tasks import prerender_invoice_pdf
+        schedule_prerender(prerender_invoice_pdf, self.pk)
     
     def cancel_invoice(self):
         """Cancel invoice"""
@@ -365,22 +338,11 @@ class Invoice(models.Model):
     def create_from_order(cls, order, payment_terms='immediate'):
         """Create invoice from order with consideration for partial payments and delivery fees"""
         from decimal import Decimal
-        from django.db.models import Sum
         
-        # Calculate outstanding amount based on payment transactions
-        from payments.models import PaymentTransaction
-        successful_payments = PaymentTransaction.objects.filter(
-            order=order,
-            status='successful'
-        )
-        
-        total_paid = successful_payments.aggregate(
-            total=Sum('amount')
-        )['total'] or Decimal('0')
-        
-        # Calculate outstanding amount
+        # Paid and outstanding amounts as kept by the payment ledger
+        total_paid = order.amount_paid
         order_total = Decimal(str(order.total_amount))
-        outstanding_amount = max(Decimal('0'), order_total - total_paid)
+        outstanding_amount = order.outstanding_amount
         
         # Determine invoice amount based on payment status
         if total_paid > 0:
@@ -409,15 +371,11 @@ class Invoice(models.Model):
             delivery_fee=order.delivery_fee,  # Include delivery fee from order
             discount_amount=order.discount,
             total_amount=order.total_amount,  # Keep original order total (includes delivery fee)
+            amount_paid=total_paid,  # Balance due is then the outstanding amount
             payment_terms=payment_terms,
             notes=notes
         )
         
-        # Set the outstanding amount to the calculated outstanding amount
-        invoice.outstanding_amount = outstanding_amount
-        invoice.balance_due = outstanding_amount  # Balance due should be the outstanding amount
-        invoice.save()
-        
         return invoice
 
 
@@ -472,6 +430,9 @@ class Order(models.Model):
     delivery_fee = models.DecimalField(max_digits=10, decimal_places=2, default=0)
     discount = models.DecimalField(max_digits=10, decimal_places=2, default=0)
     total_amount = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    # Maintained by payments.ledger from the order's settled payment transactions
+    amount_paid = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    outstanding_amount = models.DecimalField(max_digits=10, decimal_places=2, default=0)
     
     # Delivery/Pickup information
     is_pickup = models.BooleanField(default=False)
@@ -504,46 +465,64 @@ class Order(models.Model):
     class Meta:
         db_table = 'orders'
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['created_at'], name='orders_created_at_idx'),
+            models.Index(fields=['customer', 'created_at'], name='orders_customer_created_idx'),
+            models.Index(fields=['delivery_person', 'created_at'], name='orders_driver_created_idx'),
+        ]
     
     def __str__(self):
         return f"Order {self.order_number} - {self.customer_name}"
     
-    def save(self, *args, **kwargs):
+    # Fields whose saves recalculate outstanding_amount against the stored amount_paid
+    LEDGER_FIELDS = {'subtotal', 'tax', 'delivery_fee', 'discount', 'total_amount', 'amount_paid', 'outstanding_amount'}
+    
+    def save(self, *args, items=None, **kwargs):
         # Generate order number if not provided
         if not self.order_number:
             self.order_number = self._generate_order_number()
         
-        # Calculate totals
-        self._calculate_totals()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and not self.LEDGER_FIELDS.intersection(update_fields):
+            # Status, driver and the like: neither the totals nor the ledger are written
+            super().save(*args, **kwargs)
+            return
         
-        super().save(*args, **kwargs)
-    
-    def _generate_order_number(self):
-        """Generate unique order number"""
-        import random
-        import string
+        # Calculate totals (from the given unsaved items when the order is being created with them)
+        self._calculate_totals(items)
         
-        while True:
-            # Format: ORD-YYYYMMDD-XXXXX
-            date_part = timezone.now().strftime('%Y%m%d')
-            random_part = ''.join(random.choices(string.ascii_uppercase + string.digits, k=5))
-            order_number = f"ORD-{date_part}-{random_part}"
-            
-            if not Order.objects.filter(order_number=order_number).exists():
-                return order_number
-    
-    def _calculate_totals(self):
-        """Calculate order totals"""
-        # If the order hasn't been saved yet, we can't access related items
-        if self.pk is None:
-            # Set default values for new orders
-            self.subtotal = Decimal('0.00')
-            self.tax = Decimal('0.00')
-            self.total_amount = self.delivery_fee - self.discount
+        if self._state.adding or self.pk is None:
+            self.outstanding_amount = max(Decimal('0'), self.total_amount - self.amount_paid)
+            super().save(*args, **kwargs)
             return
         
+        with transaction.atomic():
+            # amount_paid belongs to the payment ledger; never write back a stale copy
+            stored = Order.objects.select_for_update().filter(pk=self.pk).values_list('amount_paid', flat=True).first()
+            if stored is not None:
+                self.amount_paid = stored
+            self.outstanding_amount = max(Decimal('0'), self.total_amount - self.amount_paid)
+            super().save(*args, **kwargs)
+    
+    def _generate_order_number(self):
+        """Generate unique order number (ORD-YYYYMMDD-XXXXX)"""
+        from utils.identifiers import allocate
+        return allocate('order')
+    
+    def _calculate_totals(self, items=None):
+        """Calculate order totals, from `items` when given instead of the saved order items"""
+        if items is None:
+            # If the order hasn't been saved yet, we can't access related items
+            if self.pk is None:
+                # Set default values for new orders
+                self.subtotal = Decimal('0.00')
+                self.tax = Decimal('0.00')
+                self.total_amount = self.delivery_fee - self.discount
+                return
+            items = self.items.all()
+        
         # Calculate totals from related items
-        subtotal = sum(item.total_price for item in self.items.all())
+        subtotal = sum((item.total_price for item in items), Decimal('0.00'))
         self.subtotal = subtotal
         
         # Calculate tax (example: 10%)
@@ -601,7 +580,7 @@ class Order(models.Model):
                 OrderReceipt.create_from_order(self)
                 print(f"OrderReceipt created for order {self.order_number}")
         
-        self.save()
+        self.save(update_fields=['status', 'actual_delivery_time', 'updated_at'])
         
         # Log status change
         print(f"Order {self.order_number} status changed from {old_status} to {new_status}")
@@ -727,16 +706,53 @@ class Review(models.Model):
     def __str__(self):
         return f"Review by {self.user.email} for {self.product.name}"
     
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Rating as last persisted, so saves can apply only the difference
+        self._persisted_rating = self.__dict__.get('rating') if self.pk else None
+    
     def save(self, *args, **kwargs):
-        super().save(*args, **kwargs)
-        # Update product average rating
-        self._update_product_rating()
-    
-    def _update_product_rating(self):
-        """Update product's average rating"""
-        reviews = self.product.reviews.all()
-        if reviews.exists():
-            avg_rating = sum(review.rating for review in reviews) / reviews.count()
-            self.product.average_rating = round(avg_rating, 2)
-            self.product.review_count = reviews.count()
-            self.product.save()
+        adding = self._state.adding
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            # Update product average rating
+            if adding:
+                self._update_product_rating(self.rating, 1)
+            elif self._persisted_rating is not None and self.rating != self._persisted_rating:
+                self._update_product_rating(self.rating - self._persisted_rating, 0)
+        self._persisted_rating = self.rating
+    
+    def delete(self, *args, **kwargs):
+        with transaction.atomic():
+            result = super().delete(*args, **kwargs)
+            self._update_product_rating(-(self._persisted_rating or self.rating), -1)
+        return result
+    
+    def _update_product_rating(self, sum_delta, count_delta):
+        """Apply this review's change to the product's running rating aggregates"""
+        from products.models import Product
+        from products.cache import TAG_PRODUCTS, category_tag, invalidate_on_commit
+        from utils.ratings import apply_rating_delta
+
+        apply_rating_delta(
+            Product, self.product_id, sum_delta, count_delta,
+            sum_field='rating_sum', count_field='review_count', average_field='average_rating',
+        )
+        # Queryset updates skip the catalog cache signals
+        invalidate_on_commit([TAG_PRODUCTS, category_tag(self.product.category_id)])
+    
+    @classmethod
+    def reconcile_product_ratings(cls, batch_size=500):
+        """Recompute every product's rating aggregates in one GROUP BY pass and repair drift"""
+        from products.models import Product
+        from products.cache import invalidate_catalog
+        from utils.ratings import reconcile_rating_aggregates
+
+        result = reconcile_rating_aggregates(
+            Product, cls, 'product_id',
+            sum_field='rating_sum', count_field='review_count', average_field='average_rating',
+            batch_size=batch_size,
+        )
+        if result['repaired']:
+            invalidate_catalog()
+        return result
@@ -131,13 +131,13 @@ class OrderDetailSerializer(serializers.ModelSerializer):
             'id', 'order_number', 'customer', 'customer_name', 'customer_email',
             'customer_phone', 'status', 'payment_status', 'payment_method',
             'payment_transaction_id', 'subtotal', 'tax', 'delivery_fee', 'discount',
-            'total_amount', 'is_pickup', 'delivery_address', 'delivery_instructions',
+            'total_amount', 'amount_paid', 'outstanding_amount', 'is_pickup', 'delivery_address', 'delivery_instructions',
             'address_line1', 'address_line2', 'city', 'district', 'state', 
             'postal_code', 'country', 'delivery_person', 'delivery_person_name', 
             'delivery_person_phone', 'estimated_delivery_time', 'actual_delivery_time', 
             'created_at', 'updated_at', 'notes', 'cancellation_reason', 'tracking_data', 'items'
         ]
-        read_only_fields = ['id', 'order_number', 'created_at', 'updated_at']
+        read_only_fields = ['id', 'order_number', 'amount_paid', 'outstanding_amount', 'created_at', 'updated_at']
     
     def get_customer(self, obj):
         from users.serializers import UserSerializer
@@ -165,60 +165,33 @@ class OrderCreateSerializer(serializers.ModelSerializer):
         ]
     
     def create(self, validated_data):
+        from .checkout import place_order
+        
         items_data = validated_data.pop('items')
         customer = self.context['request'].user
         
-        # Create order
-        order = Order.objects.create(
-            customer=customer,
-            customer_name=validated_data.get('customer_name', customer.full_name),
-            customer_email=validated_data.get('customer_email', customer.email),
-            customer_phone=validated_data.get('customer_phone', customer.phone_number),
-            payment_method=validated_data.get('payment_method', 'cash'),
-            is_pickup=validated_data.get('is_pickup', False),
-            delivery_address=validated_data.get('delivery_address'),
-            delivery_instructions=validated_data.get('delivery_instructions'),
-            address_line1=validated_data.get('address_line1'),
-            address_line2=validated_data.get('address_line2'),
-            city=validated_data.get('city'),
-            district=validated_data.get('district'),
-            state=validated_data.get('state'),
-            postal_code=validated_data.get('postal_code'),
-            country=validated_data.get('country'),
-            notes=validated_data.get('notes'),
+        order_fields = {
+            'customer_name': validated_data.get('customer_name', customer.full_name),
+            'customer_email': validated_data.get('customer_email', customer.email),
+            'customer_phone': validated_data.get('customer_phone', customer.phone_number),
+            'payment_method': validated_data.get('payment_method', 'cash'),
+            'is_pickup': validated_data.get('is_pickup', False),
+            'delivery_address': validated_data.get('delivery_address'),
+            'delivery_instructions': validated_data.get('delivery_instructions'),
+            'address_line1': validated_data.get('address_line1'),
+            'address_line2': validated_data.get('address_line2'),
+            'city': validated_data.get('city'),
+            'district': validated_data.get('district'),
+            'state': validated_data.get('state'),
+            'postal_code': validated_data.get('postal_code'),
+            'country': validated_data.get('country'),
+            'notes': validated_data.get('notes'),
             # Store delivery fee if provided (0 by default)
-            delivery_fee=validated_data.get('delivery_fee', 0),
-        )
-        
-        # Create order items
-        for item_data in items_data:
-            product_id = item_data.get('product_id')
-            quantity = item_data.get('quantity', 1)
-            
-            try:
-                from products.models import Product
-                product = Product.objects.get(id=product_id)
-                
-                OrderItem.objects.create(
-                    order=order,
-                    product=product,
-                    product_name=product.name,
-                    product_sku=product.sku,
-                    quantity=quantity,
-                    unit_price=product.price,
-                )
-                
-                # Update product stock
-                product.update_stock(-quantity)
-                
-            except Product.DoesNotExist:
-                raise serializers.ValidationError(f"Product with id {product_id} does not exist")
+            'delivery_fee': validated_data.get('delivery_fee', 0),
+        }
         
-        # Recalculate totals after all items are created
-        order._calculate_totals()
-        order.save()
-        
-        return order
+        # Locks the products, checks stock, creates the order and its items in one transaction
+        return place_order(customer, order_fields, items_data)
 
 
 class OrderUpdateSerializer(serializers.ModelSerializer):
@@ -355,6 +328,38 @@ class CartItemCreateSerializer(serializers.ModelSerializer):
             return CartItem.objects.create(cart=cart, **validated_data)
 
 
+class CartLineSerializer(serializers.Serializer):
+    """A priced line from the cart engine (orders.carts), in CartItemSerializer's shape"""
+    id = serializers.IntegerField()
+    product = serializers.IntegerField()
+    product_name = serializers.CharField()
+    product_image = serializers.CharField()
+    product_price = serializers.DecimalField(max_digits=10, decimal_places=2)
+    product_variant = serializers.IntegerField(allow_null=True)
+    quantity = serializers.IntegerField()
+    total_price = serializers.ReadOnlyField()
+    created_at = serializers.DateTimeField()
+    updated_at = serializers.DateTimeField()
+
+
+class CartContentsSerializer(serializers.Serializer):
+    """A cart from the cart engine (orders.carts), in CartSerializer's shape"""
+    id = serializers.IntegerField()
+    user = serializers.IntegerField()
+    items = CartLineSerializer(many=True)
+    total_items = serializers.ReadOnlyField()
+    total_amount = serializers.ReadOnlyField()
+    created_at = serializers.DateTimeField()
+    updated_at = serializers.DateTimeField()
+
+
+class CartItemAddSerializer(serializers.Serializer):
+    """Input of CartViewSet.add_item; products and variants are checked by the cart engine"""
+    product = serializers.IntegerField()
+    product_variant = serializers.IntegerField(required=False, allow_null=True)
+    quantity = serializers.IntegerField(min_value=1, default=1)
+
+
 class CartItemUpdateSerializer(serializers.ModelSerializer):
     """Serializer for updating cart items"""
     
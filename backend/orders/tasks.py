@@ -0,0 +1,84 @@
+from celery import shared_task
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+@shared_task
+def reconcile_product_ratings():
+    """
+    Celery task to recompute product rating aggregates from the reviews table
+    Reviews keep the running sum/count up to date incrementally; this daily
+    pass repairs drift from deletes that bypass Review.delete().
+    """
+    try:
+        from .models import Review
+
+        result = Review.reconcile_product_ratings()
+
+        logger.info(f"Product rating reconciliation checked {result['checked']}, repaired {len(result['repaired'])}")
+        return {
+            'success': True,
+            'checked': result['checked'],
+            'repaired': len(result['repaired'])
+        }
+
+    except Exception as e:
+        logger.error(f"Error reconciling product ratings: {e}")
+        return {
+            'success': False,
+            'error': str(e)
+        }
+
+
+@shared_task
+def prerender_invoice_pdf(invoice_id):
+    """
+    Celery task to render an invoice PDF into the document store ahead of its download
+    Queued when an invoice is sent or paid.
+    """
+    try:
+        from .models import Invoice
+        from utils.document_store import get_document
+
+        invoice = Invoice.objects.filter(pk=invoice_id).first()
+        if invoice is None:
+            return {'success': False, 'error': f'Invoice {invoice_id} not found'}
+
+        document = get_document('invoice', invoice)
+        return {
+            'success': True,
+            'digest': document.digest
+        }
+
+    except Exception as e:
+        logger.error(f"Error pre-rendering invoice {invoice_id} PDF: {e}")
+        return {
+            'success': False,
+            'error': str(e)
+        }
+
+
+@shared_task
+def persist_carts():
+    """
+    Celery task to write carts changed in the cart store back to carts/cart_items
+    """
+    try:
+        from .carts import persist_carts as write_carts
+
+        written = write_carts()
+
+        if written:
+            logger.info("Persisted %s cart(s)", written)
+        return {
+            'success': True,
+            'written': written
+        }
+
+    except Exception as e:
+        logger.error("Error persisting carts: %s", e)
+        return {
+            'success': False,
+            'error': str(e)
+        }
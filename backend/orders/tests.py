@@ -1,3 +1,219 @@
-from django.test import TestCase
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from products.models import Category, Product, ProductVariant
+
+from . import carts
+from .models import Cart, CartItem, Invoice, Order, OrderReceipt
+from .views import customer_delivery_stats, invoice_stats, order_stats
+
+
+class StatsQueryCountTests(TestCase):
+    """
+    Each stats computation is a single conditional aggregate
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.customer = get_user_model().objects.create_user(username='stats', email='stats@example.com', password='x')
+        # Without items an order's total is its delivery fee
+        orders = [
+            cls.order('delivered', '100.00', payment_status='paid'),
+            cls.order('delivered', '50.00'),
+            cls.order('pending', '30.00', is_pickup=True),
+            cls.order('cancelled', '10.00'),
+        ]
+        cls.invoice(orders[0], 'draft', '100.00')
+        cls.invoice(orders[1], 'sent', '40.00', amount_paid='10.00')
+        cls.invoice(orders[1], 'paid', '20.00', amount_paid='20.00')
+        cls.invoice(orders[3], 'overdue', '10.00')
+
+    @classmethod
+    def order(cls, order_status, fee, **fields):
+        return Order.objects.create(
+            customer=cls.customer, customer_name='Stats', customer_email='stats@example.com', customer_phone='1',
+            status=order_status, delivery_fee=Decimal(fee), **fields,
+        )
+
+    @classmethod
+    def invoice(cls, order, invoice_status, subtotal, amount_paid='0'):
+        return Invoice.objects.create(
+            order=order, customer_name='Stats', customer_email='stats@example.com', customer_phone='1',
+            status=invoice_status, subtotal=Decimal(subtotal), amount_paid=Decimal(amount_paid),
+        )
+
+    def test_order_stats(self):
+        with self.assertNumQueries(1):
+            stats = order_stats()
+        self.assertEqual(
+            (stats['total_orders'], stats['pending_orders'], stats['completed_orders'], stats['cancelled_orders']),
+            (4, 1, 2, 1),
+        )
+        self.assertEqual(stats['total_revenue'], Decimal('100.00'))
+        self.assertEqual(stats['avg_order_value'], Decimal('75.00'))
+
+    def test_invoice_stats(self):
+        with self.assertNumQueries(1):
+            stats = invoice_stats()
+        self.assertEqual(
+            (stats['total_invoices'], stats['draft_invoices'], stats['sent_invoices'],
+             stats['paid_invoices'], stats['overdue_invoices']),
+            (4, 1, 1, 1, 1),
+        )
+        self.assertEqual(stats['total_amount'], Decimal('170.00'))
+        self.assertEqual(stats['total_paid'], Decimal('30.00'))
+        # Balance due of the sent and overdue invoices only
+        self.assertEqual(stats['total_outstanding'], Decimal('40.00'))
+
+    def test_customer_delivery_stats(self):
+        with self.assertNumQueries(1):
+            stats = customer_delivery_stats(self.customer.pk)
+        # The pickup order is not a delivery
+        self.assertEqual(stats['total_deliveries'], 3)
+        self.assertEqual((stats['delivered'], stats['cancelled'], stats['pending']), (2, 1, 0))
+
+
+class OrderSaveTests(TestCase):
+    """
+    Only saves that write totals re-read the ledger's amount_paid
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        user = get_user_model().objects.create_user(username='ledger', email='ledger@example.com', password='x')
+        cls.order = Order.objects.create(
+            customer=user, customer_name='Ledger', customer_email='ledger@example.com', customer_phone='1',
+        )
+
+    def test_status_save_is_one_update(self):
+        self.order.status = 'confirmed'
+        with self.assertNumQueries(1):
+            self.order.save(update_fields=['status', 'updated_at'])
+
+    def test_full_save_keeps_stored_amount_paid(self):
+        Order.objects.filter(pk=self.order.pk).update(amount_paid=Decimal('5.00'))
+        self.order.delivery_fee = Decimal('20.00')
+        self.order.save()
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.amount_paid, Decimal('5.00'))
+        self.assertEqual(self.order.outstanding_amount, Decimal('15.00'))
+
+
+
+class DocumentPrerenderTests(TestCase):
+    """
+    Sending a document queues a PDF pre-render only where a renderer exists
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        user = get_user_model().objects.create_user(username='docs', email='docs@example.com', password='x')
+        cls.order = Order.objects.create(
+            customer=user, customer_name='Docs', customer_email='docs@example.com', customer_phone='1',
+        )
+
+    @mock.patch('orders.tasks.prerender_invoice_pdf.delay')
+    def test_sending_receipt_queues_nothing(self, delay):
+        receipt = OrderReceipt.objects.create(
+            order=self.order, customer_name='Docs', customer_email='docs@example.com', customer_phone='1',
+        )
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            self.assertTrue(receipt.send_to_customer())
+        receipt.refresh_from_db()
+        self.assertEqual(receipt.status, 'sent')
+        self.assertEqual(callbacks, [])
+        delay.assert_not_called()
+
+    @mock.patch('orders.tasks.prerender_invoice_pdf.delay')
+    def test_sending_invoice_queues_prerender(self, delay):
+        invoice = Invoice.objects.create(
+            order=self.order, customer_name='Docs', customer_email='docs@example.com', customer_phone='1',
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            invoice.send_invoice()
+        self.assertEqual(invoice.status, 'sent')
+        delay.assert_called_once_with(invoice.pk)
+
+# Off PostgreSQL, or with nothing listening on port 1, carts are kept in the database
+@override_settings(
+    CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}},
+    CART_STORE_URL='redis://localhost:1/0',
+)
+class CartEngineTests(TestCase):
+    """
+    Cart lines are priced from product snapshots and totalled in one pass
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user(username='cart', email='cart@example.com', password='x')
+        category = Category.objects.create(name='Wine')
+        cls.red = Product.objects.create(name='Red', sku='CART-1', category=category, price=Decimal('10.00'), stock=10)
+        cls.white = Product.objects.create(name='White', sku='CART-2', category=category, price=Decimal('8.00'), stock=10)
+        cls.magnum = ProductVariant.objects.create(product=cls.white, name='Magnum', sku='CART-2-M', price=Decimal('15.00'))
+
+    def setUp(self):
+        cache.clear()
+
+    def test_lines_merge_and_totals(self):
+        carts.add_item(self.user, self.red.pk)
+        line = carts.add_item(self.user, self.red.pk, quantity=2)
+        self.assertEqual(line['quantity'], 3)
+        self.assertEqual(line['total_price'], Decimal('30.00'))
+        carts.add_item(self.user, self.white.pk, self.magnum.pk)
+
+        contents = carts.cart_contents(self.user)
+        self.assertEqual(len(contents['items']), 2)
+        self.assertEqual(contents['total_items'], 4)
+        self.assertEqual(contents['total_amount'], Decimal('45.00'))
+
+    def test_priced_without_product_queries(self):
+        carts.add_item(self.user, self.red.pk)
+        carts.add_item(self.user, self.white.pk)
+        carts.cart_contents(self.user)
+        # Cart and items only: products come from their snapshots
+        with self.assertNumQueries(2):
+            carts.cart_contents(self.user)
+
+    def test_unknown_product_or_variant(self):
+        from rest_framework import serializers
+
+        with self.assertRaises(serializers.ValidationError):
+            carts.add_item(self.user, 0)
+        with self.assertRaises(serializers.ValidationError):
+            carts.add_item(self.user, self.red.pk, self.magnum.pk)
+
+    def test_update_and_remove(self):
+        line = carts.add_item(self.user, self.red.pk)
+        self.assertEqual(carts.update_item(self.user, line['id'], 5)['quantity'], 5)
+        self.assertIsNone(carts.update_item(self.user, line['id'], 0))
+        with self.assertRaises(carts.CartItemNotFound):
+            carts.remove_item(self.user, line['id'])
+
+    def test_checkout_lines(self):
+        carts.add_item(self.user, self.red.pk, quantity=2)
+        cart_id, lines = carts.checkout_lines(self.user)
+        self.assertEqual(cart_id, Cart.objects.get(user=self.user).pk)
+        self.assertEqual(lines, [{'product_id': self.red.pk, 'quantity': 2}])
+
+    def test_write_back(self):
+        cart = Cart.objects.create(user=self.user)
+        stale = CartItem.objects.create(cart=cart, product=self.red, quantity=1)
+        now = timezone.now()
+        state = {
+            'id': cart.pk, 'user': self.user.pk, 'created_at': now, 'updated_at': now,
+            'lines': {
+                stale.pk + 100: {'product': self.white.pk, 'variant': self.magnum.pk, 'quantity': 3,
+                                 'created_at': now, 'updated_at': now},
+            },
+        }
+        self.assertTrue(carts._write_cart(state))
+        self.assertEqual(
+            list(cart.items.values_list('id', 'product_variant_id', 'quantity')),
+            [(stale.pk + 100, self.magnum.pk, 3)],
+        )
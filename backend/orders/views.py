@@ -1,26 +1,88 @@
 from django.shortcuts import render
-from rest_framework import viewsets, status, permissions
+from rest_framework import viewsets, status, permissions, serializers
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.views import APIView
+from django.db import transaction
 from django.db.models import Q, Sum, Avg, Count
 from django.utils import timezone
 from datetime import timedelta
 from drf_yasg.utils import swagger_auto_schema
 from drf_yasg import openapi
+from django.conf import settings
 import logging
 
 logger = logging.getLogger(__name__)
 
-from .models import Order, OrderItem, Cart, CartItem, Wishlist, Review, OrderReceipt, Invoice
+from .models import Order, OrderItem, Cart, Wishlist, Review, OrderReceipt, Invoice
 from .serializers import (
     OrderSerializer, OrderDetailSerializer, OrderCreateSerializer, OrderUpdateSerializer,
-    OrderItemSerializer, CartSerializer, CartItemSerializer, CartItemCreateSerializer,
-    CartItemUpdateSerializer, WishlistSerializer, ReviewSerializer, ReviewCreateSerializer,
+    OrderItemSerializer, CartSerializer,
+    CartItemUpdateSerializer, CartContentsSerializer, CartLineSerializer, CartItemAddSerializer, WishlistSerializer, ReviewSerializer, ReviewCreateSerializer,
     OrderStatsSerializer, OrderFilterSerializer, OrderReceiptSerializer, OrderReceiptDetailSerializer,
     OrderReceiptCreateSerializer, OrderReceiptUpdateSerializer, InvoiceSerializer, InvoiceCreateSerializer,
     InvoiceDetailSerializer, InvoicePaymentSerializer, InvoiceStatsSerializer
 )
+from utils.pagination import OrderKeysetPagination
+from . import carts
+from deliveries.locations import forget_tracking_groups, latest_position
+from deliveries.dispatch import describe_candidates, offer_order, order_pickup_point, rank_drivers
+from utils.stats import cached_stats
+
+
+def _start_of_day(day):
+    """Aware datetime for midnight at the start of `day` in the current timezone"""
+    from datetime import datetime, time
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def _filter_created_between(queryset, start_day, end_day=None):
+    """
+    Filter on created_at falling on start_day..end_day (inclusive) with a plain range
+    predicate; created_at__date wraps the column in a cast and cannot use an index
+    """
+    queryset = queryset.filter(created_at__gte=_start_of_day(start_day))
+    if end_day is not None:
+        queryset = queryset.filter(created_at__lt=_start_of_day(end_day + timedelta(days=1)))
+    return queryset
+
+
+def order_stats():
+    """Order counts and revenue in one scan of orders"""
+    return Order.objects.aggregate(
+        total_orders=Count('id'),
+        pending_orders=Count('id', filter=Q(status='pending')),
+        completed_orders=Count('id', filter=Q(status='delivered')),
+        cancelled_orders=Count('id', filter=Q(status='cancelled')),
+        total_revenue=Sum('total_amount', filter=Q(status='delivered', payment_status='paid')),
+        avg_order_value=Avg('total_amount', filter=Q(status='delivered')),
+    )
+
+
+def invoice_stats():
+    """Invoice counts and amounts in one scan of invoices"""
+    return Invoice.objects.aggregate(
+        total_invoices=Count('id'),
+        draft_invoices=Count('id', filter=Q(status='draft')),
+        sent_invoices=Count('id', filter=Q(status='sent')),
+        paid_invoices=Count('id', filter=Q(status='paid')),
+        overdue_invoices=Count('id', filter=Q(status='overdue')),
+        total_amount=Sum('total_amount'),
+        total_paid=Sum('amount_paid'),
+        total_outstanding=Sum('balance_due', filter=Q(status__in=['sent', 'overdue'])),
+    )
+
+
+def customer_delivery_stats(user_id):
+    """Delivery order counts of one customer in one query"""
+    return Order.objects.filter(customer_id=user_id, is_pickup=False).aggregate(
+        total_deliveries=Count('id'),
+        pending=Count('id', filter=Q(status='confirmed')),
+        processing=Count('id', filter=Q(status='processing')),
+        out_for_delivery=Count('id', filter=Q(status='out_for_delivery')),
+        delivered=Count('id', filter=Q(status='delivered')),
+        cancelled=Count('id', filter=Q(status='cancelled')),
+    )
 
 
 class OrderViewSet(viewsets.ModelViewSet):
@@ -52,17 +114,14 @@ class OrderViewSet(viewsets.ModelViewSet):
         """Update order with enhanced status validation"""
         try:
             order = self.get_object()
-            print(f"Partial update request for order {order.order_number}")
-            print(f"Request data: {request.data}")
+            logger.debug("Partial update of order %s: fields %s", order.order_number, sorted(request.data))
             
             # Check if status is being updated
             if 'status' in request.data:
                 new_status = request.data['status']
-                print(f"Status update requested: {order.status} -> {new_status}")
-                
                 # Validate status transition
                 if not order.can_transition_to(new_status):
-                    print(f"Invalid transition: {order.status} -> {new_status}")
+                    logger.debug("Invalid transition for order %s: %s -> %s", order.order_number, order.status, new_status)
                     return Response(
                         {
                             'error': f'Invalid status transition from {order.status} to {new_status}',
@@ -74,25 +133,23 @@ class OrderViewSet(viewsets.ModelViewSet):
                 
                 # Use the model's update_status method
                 try:
-                    print(f"Calling update_status: {order.status} -> {new_status}")
                     order.update_status(new_status, user=request.user)
-                    print(f"Status updated successfully: {order.status}")
+                    logger.debug("Order %s status updated to %s", order.order_number, order.status)
                     # Return the updated order
                     serializer = self.get_serializer(order)
                     return Response(serializer.data)
                 except ValueError as e:
-                    print(f"ValueError in update_status: {str(e)}")
+                    logger.warning("Order %s status update rejected: %s", order.order_number, e)
                     return Response(
                         {'error': str(e)},
                         status=status.HTTP_400_BAD_REQUEST
                     )
             
             # Continue with normal partial update for non-status changes
-            print("Proceeding with normal partial update")
             return super().partial_update(request, *args, **kwargs)
             
         except Exception as e:
-            print(f"Exception in partial_update: {str(e)}")
+            logger.exception("Exception in partial_update: %s", e)
             return Response(
                 {'error': f'Failed to update order: {str(e)}'},
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
@@ -111,13 +168,27 @@ class OrderViewSet(viewsets.ModelViewSet):
             return OrderDetailSerializer
         return OrderSerializer
     
+    @property
+    def paginator(self):
+        """
+        Admin and driver feeds can opt into keyset pagination with ?pagination=cursor
+        (or by following a cursor link); everyone else keeps page numbers
+        """
+        if not hasattr(self, '_paginator'):
+            user = self.request.user
+            params = self.request.query_params
+            wants_cursor = 'cursor' in params or params.get('pagination') == 'cursor'
+            if (self.action == 'list' and wants_cursor and user.is_authenticated
+                    and (getattr(user, 'is_admin_user', False) or getattr(user, 'is_driver', False))):
+                self._paginator = OrderKeysetPagination()
+            else:
+                self._paginator = super().paginator
+        return self._paginator
+    
     def get_queryset(self):
         """
         Filter orders based on user type and permissions with advanced date filtering
         """
-        import logging
-        logger = logging.getLogger(__name__)
-        
         # For drf_yasg schema generation
         if getattr(self, 'swagger_fake_view', False):
             return Order.objects.none()
@@ -127,22 +198,19 @@ class OrderViewSet(viewsets.ModelViewSet):
             logger.warning("User not authenticated")
             return Order.objects.none()
         
-        logger.info(f"Processing request for user: {user.email} (type: {user.user_type})")
+        logger.debug("Processing order list for user %s (type: %s)", user.email, user.user_type)
         
         # Start with base queryset based on user type
         if hasattr(user, 'user_type') and user.user_type == 'web':
             # WebUser is for anonymous access - return no orders
-            logger.info("WebUser detected - returning no orders for anonymous access")
+            logger.debug("WebUser detected - returning no orders for anonymous access")
             queryset = Order.objects.none()
         elif user.is_customer:
             queryset = Order.objects.filter(customer=user)
-            logger.info(f"Customer queryset: {queryset.count()} orders")
         elif user.is_driver:
             queryset = Order.objects.filter(delivery_person=user)
-            logger.info(f"Driver queryset: {queryset.count()} orders")
         elif user.is_admin_user:
             queryset = Order.objects.all()
-            logger.info(f"Admin queryset: {queryset.count()} orders")
         else:
             logger.warning(f"Unknown user type: {user.user_type}")
             queryset = Order.objects.none()
@@ -150,18 +218,17 @@ class OrderViewSet(viewsets.ModelViewSet):
         # Apply date filtering
         queryset = self._apply_date_filters(queryset)
         
-        logger.info(f"Final queryset count: {queryset.count()}")
+        # Row counts are full scans on large tables: only in DEBUG with debug logging on
+        if settings.DEBUG and logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Order queryset for %s: %s rows", user.email, queryset.count())
         return queryset
     
     def _apply_date_filters(self, queryset):
         """
-        Apply date filtering based on query parameters
+        Apply date filtering based on query parameters.
+        Days are turned into created_at ranges so the (customer|delivery_person, created_at) indexes apply.
         """
         from datetime import datetime, timedelta
-        from django.utils import timezone
-        import logging
-        
-        logger = logging.getLogger(__name__)
         
         # Get date filter parameters
         date_filter = self.request.query_params.get('date_filter', '')
@@ -169,77 +236,82 @@ class OrderViewSet(viewsets.ModelViewSet):
         end_date = self.request.query_params.get('end_date', '')
         specific_date = self.request.query_params.get('specific_date', '')
         
-        # Debug logging
-        logger.info(f"Date filter parameters received: date_filter='{date_filter}', start_date='{start_date}', end_date='{end_date}', specific_date='{specific_date}'")
-        logger.info(f"All query params: {dict(self.request.query_params)}")
+        logger.debug(
+            "Date filter parameters: date_filter=%r start_date=%r end_date=%r specific_date=%r",
+            date_filter, start_date, end_date, specific_date
+        )
         
         # Apply specific date filter
         if specific_date:
             try:
                 date_obj = datetime.strptime(specific_date, '%Y-%m-%d').date()
-                queryset = queryset.filter(created_at__date=date_obj)
-                logger.info(f"Applied specific date filter: {date_obj}")
+                queryset = _filter_created_between(queryset, date_obj, date_obj)
             except ValueError as e:
-                logger.error(f"Invalid specific_date format: {specific_date}, error: {e}")
-                pass
+                logger.warning(f"Invalid specific_date format: {specific_date}, error: {e}")
         
         # Apply date range filter
         elif start_date and end_date:
             try:
                 start_obj = datetime.strptime(start_date, '%Y-%m-%d').date()
                 end_obj = datetime.strptime(end_date, '%Y-%m-%d').date()
-                queryset = queryset.filter(created_at__date__range=[start_obj, end_obj])
-                logger.info(f"Applied date range filter: {start_obj} to {end_obj}")
+                queryset = _filter_created_between(queryset, start_obj, end_obj)
             except ValueError as e:
-                logger.error(f"Invalid date range format: start_date='{start_date}', end_date='{end_date}', error: {e}")
-                pass
+                logger.warning(f"Invalid date range format: start_date='{start_date}', end_date='{end_date}', error: {e}")
         
         # Apply predefined date filters
         elif date_filter:
-            now = timezone.now()
-            logger.info(f"Applying predefined date filter: {date_filter}")
+            today = timezone.localdate()
             
             if date_filter == 'today':
-                queryset = queryset.filter(created_at__date=now.date())
-                logger.info(f"Applied today filter: {now.date()}")
+                queryset = _filter_created_between(queryset, today, today)
             elif date_filter == 'yesterday':
-                yesterday = now.date() - timedelta(days=1)
-                queryset = queryset.filter(created_at__date=yesterday)
-                logger.info(f"Applied yesterday filter: {yesterday}")
+                yesterday = today - timedelta(days=1)
+                queryset = _filter_created_between(queryset, yesterday, yesterday)
             elif date_filter == 'week':
-                week_ago = now.date() - timedelta(days=7)
-                queryset = queryset.filter(created_at__date__gte=week_ago)
-                logger.info(f"Applied week filter: >= {week_ago}")
+                queryset = _filter_created_between(queryset, today - timedelta(days=7))
             elif date_filter == 'month':
-                month_ago = now.date() - timedelta(days=30)
-                queryset = queryset.filter(created_at__date__gte=month_ago)
-                logger.info(f"Applied month filter: >= {month_ago}")
+                queryset = _filter_created_between(queryset, today - timedelta(days=30))
             elif date_filter == 'year':
-                year_ago = now.date() - timedelta(days=365)
-                queryset = queryset.filter(created_at__date__gte=year_ago)
-                logger.info(f"Applied year filter: >= {year_ago}")
+                queryset = _filter_created_between(queryset, today - timedelta(days=365))
             elif date_filter == 'this_week':
                 # Get start of current week (Monday)
-                days_since_monday = now.weekday()
-                start_of_week = now.date() - timedelta(days=days_since_monday)
-                queryset = queryset.filter(created_at__date__gte=start_of_week)
-                logger.info(f"Applied this_week filter: >= {start_of_week}")
+                queryset = _filter_created_between(queryset, today - timedelta(days=today.weekday()))
             elif date_filter == 'this_month':
                 # Get start of current month
-                start_of_month = now.date().replace(day=1)
-                queryset = queryset.filter(created_at__date__gte=start_of_month)
-                logger.info(f"Applied this_month filter: >= {start_of_month}")
+                queryset = _filter_created_between(queryset, today.replace(day=1))
             elif date_filter == 'this_year':
                 # Get start of current year
-                start_of_year = now.date().replace(month=1, day=1)
-                queryset = queryset.filter(created_at__date__gte=start_of_year)
-                logger.info(f"Applied this_year filter: >= {start_of_year}")
+                queryset = _filter_created_between(queryset, today.replace(month=1, day=1))
             else:
                 logger.warning(f"Unknown date_filter value: {date_filter}")
         
-        logger.info(f"Final queryset count after date filtering: {queryset.count()}")
         return queryset
     
+    @swagger_auto_schema(
+        tags=['orders'],
+        operation_description="Stream orders as CSV, NDJSON or Parquet with the list filters plus status/customer (Admin only)"
+    )
+    @action(detail=False, methods=['get'])
+    def export(self, request):
+        """Stream orders matching the list filters (export_format=csv|ndjson|parquet)"""
+        from utils.exports import ExportError, apply_export_filters, export_response
+        from .exports import ORDER_EXPORT_COLUMNS
+        
+        if not request.user.is_staff:
+            return Response(
+                {'error': 'Admin permissions required'},
+                status=status.HTTP_403_FORBIDDEN
+            )
+        
+        try:
+            # get_queryset already applies the list endpoint's date filters
+            queryset = apply_export_filters(self.get_queryset(), request.query_params, dates=False)
+            return export_response(
+                'orders', queryset, ORDER_EXPORT_COLUMNS, request.query_params.get('export_format', 'csv')
+            )
+        except ExportError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    
     @swagger_auto_schema(
         tags=['orders'],
         operation_description="Get current user's orders"
@@ -269,7 +341,7 @@ class OrderViewSet(viewsets.ModelViewSet):
         cancellation_reason = request.data.get('reason', 'Cancelled by customer')
         order.status = 'cancelled'
         order.cancellation_reason = cancellation_reason
-        order.save()
+        order.save(update_fields=['status', 'cancellation_reason', 'updated_at'])
         
         # Restore product stock
         for item in order.items.all():
@@ -292,13 +364,13 @@ class OrderViewSet(viewsets.ModelViewSet):
         
         order = self.get_object()
         order.status = 'confirmed'
-        order.save()
+        order.save(update_fields=['status', 'updated_at'])
         
         return Response({'message': 'Order confirmed successfully'})
     
     @swagger_auto_schema(
         tags=['orders'],
-        operation_description="Assign a driver to an order (admin only)"
+        operation_description="Assign a driver to an order (admin only); without driver_id the nearest available driver is assigned"
     )
     @action(detail=True, methods=['post'])
     def assign_driver(self, request, pk=None):
@@ -312,13 +384,24 @@ class OrderViewSet(viewsets.ModelViewSet):
         order = self.get_object()
         driver_id = request.data.get('driver_id')
         
+        if not driver_id:
+            # No driver picked: take the best available driver near the store
+            candidates = rank_drivers(*order_pickup_point(), limit=1)
+            if not candidates:
+                return Response(
+                    {'error': 'No available driver nearby'}, 
+                    status=status.HTTP_409_CONFLICT
+                )
+            driver_id = candidates[0]['driver_id']
+        
         try:
             from users.models import User
             driver = User.objects.get(id=driver_id, user_type='driver')
             order.delivery_person = driver
             order.delivery_person_name = driver.full_name
             order.delivery_person_phone = driver.phone_number
-            order.save()
+            order.save(update_fields=['delivery_person', 'delivery_person_name', 'delivery_person_phone', 'updated_at'])
+            forget_tracking_groups(driver.id)
             
             return Response({'message': 'Driver assigned successfully'})
         except User.DoesNotExist:
@@ -327,6 +410,60 @@ class OrderViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_404_NOT_FOUND
             )
     
+    @swagger_auto_schema(
+        tags=['orders'],
+        operation_description="Rank available drivers for an order by distance to the store and current load (admin only)"
+    )
+    @action(detail=True, methods=['get'])
+    def dispatch_candidates(self, request, pk=None):
+        """Nearest available drivers for an order, best first"""
+        if not request.user.is_admin_user:
+            return Response(
+                {'error': 'Admin access required'}, 
+                status=status.HTTP_403_FORBIDDEN
+            )
+        
+        self.get_object()
+        try:
+            limit = min(max(int(request.query_params.get('limit', 5)), 1), 20)
+        except (TypeError, ValueError):
+            return Response(
+                {'error': 'limit must be an integer'}, 
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        candidates = rank_drivers(*order_pickup_point(), limit=limit)
+        return Response({'candidates': describe_candidates(candidates)})
+    
+    @swagger_auto_schema(
+        tags=['orders'],
+        operation_description="Offer an order to the nearest available drivers (admin only)"
+    )
+    @action(detail=True, methods=['post'])
+    def offer_drivers(self, request, pk=None):
+        """Notify the best drivers for an order; the first to accept is assigned"""
+        if not request.user.is_admin_user:
+            return Response(
+                {'error': 'Admin access required'}, 
+                status=status.HTTP_403_FORBIDDEN
+            )
+        
+        order = self.get_object()
+        if order.is_pickup or order.delivery_person_id:
+            return Response(
+                {'error': 'Order is not waiting for a driver'}, 
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        try:
+            count = min(max(int(request.data.get('count', 3)), 1), 10)
+        except (TypeError, ValueError):
+            return Response(
+                {'error': 'count must be an integer'}, 
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        candidates = offer_order(order, count)
+        return Response({'offered': describe_candidates(candidates)})
+    
     @swagger_auto_schema(
         tags=['orders'],
         operation_description="Get order statistics"
@@ -340,38 +477,14 @@ class OrderViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_401_UNAUTHORIZED
             )
         
-        today = timezone.now().date()
-        
-        # Get order counts
-        total_orders = Order.objects.count()
-        pending_orders = Order.objects.filter(status='pending').count()
-        completed_orders = Order.objects.filter(status='delivered').count()
-        cancelled_orders = Order.objects.filter(status='cancelled').count()
-        
-        # Get revenue
-        total_revenue = Order.objects.filter(
-            status='delivered', 
-            payment_status='paid'
-        ).aggregate(total=Sum('total_amount'))['total'] or 0
-        
-        avg_order_value = Order.objects.filter(
-            status='delivered'
-        ).aggregate(avg=Avg('total_amount'))['avg'] or 0
+        stats = dict(cached_stats('orders', order_stats))
+        stats['total_revenue'] = stats['total_revenue'] or 0
+        stats['avg_order_value'] = stats['avg_order_value'] or 0
         
         # Calculate conversion rate (simplified)
-        conversion_rate = 0
-        if total_orders > 0:
-            conversion_rate = (completed_orders / total_orders) * 100
-        
-        stats = {
-            'total_orders': total_orders,
-            'pending_orders': pending_orders,
-            'completed_orders': completed_orders,
-            'cancelled_orders': cancelled_orders,
-            'total_revenue': total_revenue,
-            'avg_order_value': avg_order_value,
-            'conversion_rate': conversion_rate,
-        }
+        stats['conversion_rate'] = 0
+        if stats['total_orders'] > 0:
+            stats['conversion_rate'] = (stats['completed_orders'] / stats['total_orders']) * 100
         
         serializer = OrderStatsSerializer(stats)
         return Response(serializer.data)
@@ -389,22 +502,13 @@ class OrderViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_401_UNAUTHORIZED
             )
         
-        # Get basic order counts
-        total_orders = Order.objects.count()
-        pending_orders = Order.objects.filter(status='pending').count()
-        delivered_orders = Order.objects.filter(status='delivered').count()
-        
-        # Get basic revenue
-        total_revenue = Order.objects.filter(
-            status='delivered', 
-            payment_status='paid'
-        ).aggregate(total=Sum('total_amount'))['total'] or 0
-        
+        # Same cached computation as stats
+        stats = cached_stats('orders', order_stats)
         basic_stats = {
-            'total_orders': total_orders,
-            'pending_orders': pending_orders,
-            'delivered_orders': delivered_orders,
-            'total_revenue': total_revenue,
+            'total_orders': stats['total_orders'],
+            'pending_orders': stats['pending_orders'],
+            'delivered_orders': stats['completed_orders'],
+            'total_revenue': stats['total_revenue'] or 0,
         }
         
         return Response(basic_stats)
@@ -419,17 +523,13 @@ class OrderViewSet(viewsets.ModelViewSet):
         try:
             order = self.get_object()
             
-            # Get successful payment transactions for this order
-            from payments.models import PaymentTransaction
-            successful_payments = PaymentTransaction.objects.filter(
-                order=order,
-                status='successful'
-            )
+            # Paid total and balance as kept by the payment ledger
+            from payments.ledger import SETTLED_STATUSES
+            successful_payments = list(order.payments.filter(
+                status__in=SETTLED_STATUSES
+            ).select_related('payment_method'))
             
-            # Calculate total paid amount
-            total_paid = successful_payments.aggregate(
-                total=Sum('amount')
-            )['total'] or 0
+            total_paid = order.amount_paid
             
             # Calculate balance
             order_total = float(order.total_amount)
@@ -445,9 +545,10 @@ class OrderViewSet(viewsets.ModelViewSet):
                 'order_total': order_total,
                 'total_paid': float(total_paid),
                 'balance': balance,
+                'outstanding_amount': float(order.outstanding_amount),
                 'is_fully_paid': is_fully_paid,
                 'is_partially_paid': is_partially_paid,
-                'payment_transactions_count': successful_payments.count(),
+                'payment_transactions_count': len(successful_payments),
                 'payment_transactions': [
                     {
                         'id': payment.id,
@@ -472,6 +573,9 @@ class OrderViewSet(viewsets.ModelViewSet):
 class CartViewSet(viewsets.ModelViewSet):
     """
     ViewSet for cart management
+    The current user's cart (my_cart, the item actions and checkout) is served
+    by the cart engine (orders.carts); the carts/cart_items rows it writes back
+    are what the model endpoints list.
     """
     serializer_class = CartSerializer
     permission_classes = [permissions.IsAuthenticated]
@@ -504,7 +608,7 @@ class CartViewSet(viewsets.ModelViewSet):
         # For drf_yasg schema generation
         if getattr(self, 'swagger_fake_view', False):
             return Cart.objects.none()
-        return Cart.objects.filter(user=self.request.user)
+        return Cart.objects.filter(user=self.request.user).prefetch_related('items__product', 'items__product_variant')
     
     @swagger_auto_schema(
         tags=['orders'],
@@ -528,10 +632,7 @@ class CartViewSet(viewsets.ModelViewSet):
                 'updated_at': None
             })
         
-        # For authenticated users, get or create cart
-        cart, created = Cart.objects.get_or_create(user=user)
-        serializer = CartSerializer(cart)
-        return Response(serializer.data)
+        return Response(CartContentsSerializer(carts.cart_contents(user)).data)
     
     @swagger_auto_schema(
         tags=['orders'],
@@ -540,11 +641,19 @@ class CartViewSet(viewsets.ModelViewSet):
     @action(detail=False, methods=['post'])
     def add_item(self, request):
         """Add item to cart"""
-        serializer = CartItemCreateSerializer(data=request.data, context={'request': request})
-        if serializer.is_valid():
-            cart_item = serializer.save()
-            return Response(CartItemSerializer(cart_item).data)
-        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        serializer = CartItemAddSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            line = carts.add_item(
+                request.user,
+                serializer.validated_data['product'],
+                serializer.validated_data.get('product_variant'),
+                serializer.validated_data['quantity'],
+            )
+        except serializers.ValidationError as e:
+            return Response(e.detail, status=status.HTTP_400_BAD_REQUEST)
+        return Response(CartLineSerializer(line).data)
     
     @swagger_auto_schema(
         tags=['orders'],
@@ -553,24 +662,22 @@ class CartViewSet(viewsets.ModelViewSet):
     @action(detail=False, methods=['post'])
     def update_item(self, request):
         """Update cart item quantity"""
-        item_id = request.data.get('item_id')
-        quantity = request.data.get('quantity')
-        
         try:
-            cart_item = CartItem.objects.get(
-                id=item_id, 
-                cart__user=request.user
+            item_id = int(request.data.get('item_id'))
+            quantity = int(request.data.get('quantity'))
+        except (TypeError, ValueError):
+            return Response(
+                {'error': 'item_id and quantity must be integers'}, 
+                status=status.HTTP_400_BAD_REQUEST
             )
-            
-            if quantity <= 0:
-                cart_item.delete()
+        
+        try:
+            line = carts.update_item(request.user, item_id, quantity)
+            if line is None:
                 return Response({'message': 'Item removed from cart'})
-            else:
-                cart_item.quantity = quantity
-                cart_item.save()
-                return Response(CartItemSerializer(cart_item).data)
+            return Response(CartLineSerializer(line).data)
                 
-        except CartItem.DoesNotExist:
+        except carts.CartItemNotFound:
             return Response(
                 {'error': 'Cart item not found'}, 
                 status=status.HTTP_404_NOT_FOUND
@@ -583,16 +690,10 @@ class CartViewSet(viewsets.ModelViewSet):
     @action(detail=False, methods=['post'])
     def remove_item(self, request):
         """Remove item from cart"""
-        item_id = request.data.get('item_id')
-        
         try:
-            cart_item = CartItem.objects.get(
-                id=item_id, 
-                cart__user=request.user
-            )
-            cart_item.delete()
+            carts.remove_item(request.user, int(request.data.get('item_id')))
             return Response({'message': 'Item removed from cart'})
-        except CartItem.DoesNotExist:
+        except (TypeError, ValueError, carts.CartItemNotFound):
             return Response(
                 {'error': 'Cart item not found'}, 
                 status=status.HTTP_404_NOT_FOUND
@@ -605,8 +706,7 @@ class CartViewSet(viewsets.ModelViewSet):
     @action(detail=False, methods=['post'])
     def clear(self, request):
         """Clear cart"""
-        cart, created = Cart.objects.get_or_create(user=request.user)
-        cart.items.all().delete()
+        carts.clear(request.user)
         return Response({'message': 'Cart cleared'})
     
     @swagger_auto_schema(
@@ -618,44 +718,27 @@ class CartViewSet(viewsets.ModelViewSet):
         """Checkout cart and create order"""
         user = request.user
         
-        # Debug logging for user authentication
-        logger.info(f"Checkout request from user: {user} (type: {getattr(user, 'user_type', 'unknown')}, authenticated: {user.is_authenticated if hasattr(user, 'is_authenticated') else 'unknown'})")
-        
         # Handle anonymous/unauthenticated users - return error for anonymous checkout
         if not user or user.is_anonymous or (hasattr(user, 'user_type') and user.user_type == 'web'):
-            logger.info("Anonymous user detected - checkout not allowed for anonymous users")
+            logger.debug("Anonymous user detected - checkout not allowed for anonymous users")
             return Response(
                 {'error': 'Checkout requires user authentication. Please sign in to complete your order.'}, 
                 status=status.HTTP_401_UNAUTHORIZED
             )
         
-        try:
-            cart = Cart.objects.get(user=user)
-        except Cart.DoesNotExist:
-            return Response(
-                {'error': 'Cart not found'}, 
-                status=status.HTTP_404_NOT_FOUND
-            )
-        
-        if not cart.items.exists():
+        # Lines of the live cart (orders.carts), not the written-back rows
+        cart_id, cart_items = carts.checkout_lines(user)
+        if not cart_items:
             return Response(
                 {'error': 'Cart is empty'}, 
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        # Get cart items and prepare order data
-        cart_items = cart.items.all()
-        logger.info(f"Processing checkout for user {user.email} with {cart_items.count()} items")
+        logger.debug("Processing checkout for user %s with %s items", user.id, len(cart_items))
         
         # Create order data with proper structure
         order_data = {
-            'items': [
-                {
-                    'product_id': item.product.id,
-                    'quantity': item.quantity
-                }
-                for item in cart_items
-            ],
+            'items': cart_items,
             'customer_name': getattr(user, 'full_name', user.email),
             'customer_email': user.email,
             'customer_phone': request.data.get('customer_phone', getattr(user, 'phone_number', '')),
@@ -667,32 +750,34 @@ class CartViewSet(viewsets.ModelViewSet):
             'notes': request.data.get('notes', '')
         }
         
-        logger.info(f"Order data prepared: {order_data}")
-        
         # Create order using serializer
         serializer = OrderCreateSerializer(data=order_data, context={'request': request})
         if serializer.is_valid():
             try:
-                order = serializer.save()
-                logger.info(f"Order created successfully: {order.order_number}")
-                
-                # Clear cart after successful order creation
-                cart.items.all().delete()
-                logger.info(f"Cart cleared for user {user.email}")
+                # Order creation, stock reservation and clearing the cart commit together
+                with transaction.atomic():
+                    order = serializer.save()
+                    logger.info("Order %s created for user %s", order.order_number, user.id)
+                    
+                    # Clear cart after successful order creation
+                    carts.clear_after_checkout(user, cart_id)
                 
                 return Response({
                     'message': 'Order created successfully',
                     'order': OrderSerializer(order).data
                 }, status=status.HTTP_201_CREATED)
                 
+            except serializers.ValidationError as e:
+                logger.warning("Checkout rejected for user %s: %s", user.id, e.detail)
+                return Response(e.detail, status=status.HTTP_400_BAD_REQUEST)
             except Exception as e:
-                logger.error(f"Error creating order: {str(e)}")
+                logger.exception("Error creating order: %s", e)
                 return Response(
                     {'error': f'Failed to create order: {str(e)}'}, 
                     status=status.HTTP_500_INTERNAL_SERVER_ERROR
                 )
         else:
-            logger.error(f"Order serializer validation failed: {serializer.errors}")
+            logger.warning("Order serializer validation failed: %s", serializer.errors)
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
@@ -781,16 +866,7 @@ class WishlistViewSet(viewsets.ModelViewSet):
             )
             
             # Add to cart
-            cart, created = Cart.objects.get_or_create(user=request.user)
-            cart_item, created = CartItem.objects.get_or_create(
-                cart=cart,
-                product=wishlist_item.product,
-                defaults={'quantity': 1}
-            )
-            
-            if not created:
-                cart_item.quantity += 1
-                cart_item.save()
+            carts.add_item(request.user, wishlist_item.product_id)
             
             return Response({'message': 'Item added to cart'})
             
@@ -1041,13 +1117,7 @@ class InvoiceViewSet(viewsets.ModelViewSet):
     
     @swagger_auto_schema(tags=['orders'])
     def list(self, request, *args, **kwargs):
-        import logging
-        logger = logging.getLogger(__name__)
-        
-        logger.info(f"Invoice list request from user: {request.user.email}")
-        response = super().list(request, *args, **kwargs)
-        logger.info(f"Invoice list response count: {len(response.data.get('results', []))}")
-        return response
+        return super().list(request, *args, **kwargs)
     
     @swagger_auto_schema(tags=['orders'])
     def create(self, request, *args, **kwargs):
@@ -1093,9 +1163,6 @@ class InvoiceViewSet(viewsets.ModelViewSet):
         """
         Filter invoices based on user type and permissions
         """
-        import logging
-        logger = logging.getLogger(__name__)
-        
         # For drf_yasg schema generation
         if getattr(self, 'swagger_fake_view', False):
             return Invoice.objects.none()
@@ -1105,183 +1172,55 @@ class InvoiceViewSet(viewsets.ModelViewSet):
             logger.warning("User not authenticated for invoice access")
             return Invoice.objects.none()
         
-        logger.info(f"Processing invoice request for user: {user.email} (type: {user.user_type})")
-        
         if user.is_customer:
             queryset = Invoice.objects.filter(order__customer=user)
-            logger.info(f"Customer invoice queryset: {queryset.count()} invoices")
         elif user.is_driver:
             queryset = Invoice.objects.filter(order__delivery_person=user)
-            logger.info(f"Driver invoice queryset: {queryset.count()} invoices")
         elif user.is_admin_user:
             queryset = Invoice.objects.all()
-            logger.info(f"Admin invoice queryset: {queryset.count()} invoices")
         else:
-            logger.warning(f"Unknown user type for invoice access: {user.user_type}")
+            logger.warning("Unknown user type for invoice access: %s", user.user_type)
             return Invoice.objects.none()
         
-        logger.info(f"Final invoice queryset count: {queryset.count()}")
+        # Row counts are full scans on large tables: only in DEBUG with debug logging on
+        if settings.DEBUG and logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Invoice queryset for %s: %s rows", user.email, queryset.count())
         return queryset
 
     @swagger_auto_schema(tags=['orders'])
     @action(detail=True, methods=['get'])
     def download_pdf(self, request, pk=None):
         """Download branded invoice PDF"""
-        from io import BytesIO
-        from reportlab.lib.pagesizes import A4
-        from reportlab.pdfgen import canvas
-        from reportlab.lib import colors
-        from django.conf import settings
+        from utils.document_store import document_response, get_document
         invoice = self.get_object()
-
-        buffer = BytesIO()
-        p = canvas.Canvas(buffer, pagesize=A4)
-        width, height = A4
-
-        # Branding (needed for watermark and header)
-        company = getattr(settings, 'SITE_NAME', 'Company')
-        address = getattr(settings, 'SITE_ADDRESS', '')
-        email = getattr(settings, 'SITE_EMAIL', '')
-        phone = getattr(settings, 'SITE_PHONE', '')
-        logo_path = getattr(settings, 'SITE_LOGO_PATH', '')
-        logo_url = getattr(settings, 'SITE_LOGO_URL', '')
-
-        # Watermark
+        document = get_document('invoice', invoice)
+        return document_response(request, document, f"{invoice.invoice_number}.pdf")
+    
+    @swagger_auto_schema(
+        tags=['orders'],
+        operation_description="Stream invoices as CSV, NDJSON or Parquet filtered by date range, status and customer (Admin only)"
+    )
+    @action(detail=False, methods=['get'])
+    def export(self, request):
+        """Stream invoices (export_format=csv|ndjson|parquet)"""
+        from utils.exports import ExportError, apply_export_filters, export_response
+        from .exports import INVOICE_EXPORT_COLUMNS
+        
+        if not request.user.is_staff:
+            return Response(
+                {'error': 'Admin permissions required'},
+                status=status.HTTP_403_FORBIDDEN
+            )
+        
         try:
-            from reportlab.lib.utils import ImageReader
-            wm_src = None
-            if logo_path:
-                wm_src = ImageReader(logo_path)
-            elif logo_url:
-                wm_src = ImageReader(logo_url)
-            if wm_src:
-                p.saveState()
-                try:
-                    p.setFillAlpha(0.08)
-                except Exception:
-                    pass
-                wm_w_target = width * 0.6
-                wm_h_target = height * 0.6
-                p.drawImage(wm_src, (width - wm_w_target) / 2, (height - wm_h_target) / 2,
-                            width=wm_w_target, height=wm_h_target,
-                            preserveAspectRatio=True, mask='auto')
-                p.restoreState()
-        except Exception:
-            pass
-
-        # Header band
-        p.setFillColorRGB(0.95, 0.95, 0.95)
-        p.rect(0, height - 90, width, 90, stroke=0, fill=1)
-        p.setFillColor(colors.black)
-
-        # Logo (scaled to fit within 110x50 while preserving aspect ratio)
-        def _draw_header_logo(img_src):
-            try:
-                iw, ih = img_src.getSize()
-                target_w, target_h = 110.0, 50.0
-                scale = min(target_w / float(iw), target_h / float(ih))
-                draw_w, draw_h = iw * scale, ih * scale
-                p.drawImage(
-                    img_src,
-                    40,
-                    height - 80,  # baseline area for the band
-                    width=draw_w,
-                    height=draw_h,
-                    preserveAspectRatio=True,
-                    mask='auto'
-                )
-            except Exception:
-                pass
-
-        if logo_path or logo_url:
-            try:
-                from reportlab.lib.utils import ImageReader
-                img_src = ImageReader(logo_path) if logo_path else ImageReader(logo_url)
-                _draw_header_logo(img_src)
-            except Exception:
-                # best-effort; ignore if not drawable
-                pass
-
-        # Company details
-        y = height - 35
-        p.setFont('Helvetica-Bold', 18)
-        p.drawString(150, y, company)
-        p.setFont('Helvetica', 9)
-        y -= 14
-        if address:
-            p.drawString(150, y, address)
-            y -= 12
-        if email or phone:
-            p.drawString(150, y, f"{email}{'  |  ' if email and phone else ''}{phone}")
-
-        # Invoice meta
-        p.setFont('Helvetica-Bold', 16)
-        p.drawRightString(width - 40, height - 35, 'Invoice')
-        p.setFont('Helvetica', 10)
-        p.drawRightString(width - 40, height - 50, f"Invoice #: {invoice.invoice_number}")
-        if getattr(invoice, 'created_at', None):
-            p.drawRightString(width - 40, height - 64, f"Date: {invoice.created_at.strftime('%Y-%m-%d %H:%M')}")
-        if getattr(invoice, 'due_date', None):
-            p.drawRightString(width - 40, height - 78, f"Due: {invoice.due_date.strftime('%Y-%m-%d %H:%M')}")
-
-        # Divider
-        p.setStrokeColorRGB(0.85, 0.85, 0.85)
-        p.setLineWidth(1)
-        p.line(40, height - 100, width - 40, height - 100)
-
-        # Bill to
-        y = height - 130
-        p.setFont('Helvetica-Bold', 12)
-        p.drawString(40, y, 'Bill To')
-        p.setFont('Helvetica', 10)
-        y -= 16
-        p.drawString(40, y, f"{invoice.customer_name}")
-        y -= 14
-        p.drawString(40, y, f"{invoice.customer_email}")
-        if getattr(invoice, 'customer_phone', None):
-            y -= 14
-            p.drawString(40, y, f"{invoice.customer_phone}")
-
-        # Summary (no line items detail available here)
-        y -= 28
-        p.setFont('Helvetica-Bold', 11)
-        p.drawRightString(width - 120, y, 'Subtotal:')
-        p.setFont('Helvetica', 10)
-        p.drawRightString(width - 40, y, f"{invoice.subtotal}")
-        y -= 14
-        p.setFont('Helvetica-Bold', 11)
-        p.drawRightString(width - 120, y, 'Tax:')
-        p.setFont('Helvetica', 10)
-        p.drawRightString(width - 40, y, f"{invoice.tax_amount}")
-        y -= 14
-        p.setFont('Helvetica-Bold', 11)
-        p.drawRightString(width - 120, y, 'Delivery:')
-        p.setFont('Helvetica', 10)
-        p.drawRightString(width - 40, y, f"{invoice.delivery_fee}")
-        y -= 14
-        p.setFont('Helvetica-Bold', 11)
-        p.drawRightString(width - 120, y, 'Discount:')
-        p.setFont('Helvetica', 10)
-        p.drawRightString(width - 40, y, f"{invoice.discount_amount}")
-        y -= 16
-        p.setFont('Helvetica-Bold', 12)
-        p.drawRightString(width - 120, y, 'Total:')
-        p.setFont('Helvetica-Bold', 12)
-        p.drawRightString(width - 40, y, f"{invoice.total_amount}")
-
-        # Footer
-        p.setStrokeColorRGB(0.9, 0.9, 0.9)
-        p.line(40, 60, width - 40, 60)
-        p.setFont('Helvetica', 9)
-        p.setFillColor(colors.grey)
-        p.drawCentredString(width / 2, 45, f"Thank you for your business • {company}")
-
-        p.save()
-        buffer.seek(0)
-        from django.http import HttpResponse
-        response = HttpResponse(buffer.getvalue(), content_type='application/pdf')
-        response['Content-Disposition'] = f'attachment; filename="{invoice.invoice_number}.pdf"'
-        return response
+            queryset = apply_export_filters(
+                self.get_queryset(), request.query_params, customer_field='order__customer'
+            )
+            return export_response(
+                'invoices', queryset, INVOICE_EXPORT_COLUMNS, request.query_params.get('export_format', 'csv')
+            )
+        except ExportError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
     
     @swagger_auto_schema(
         tags=['orders'],
@@ -1417,29 +1356,8 @@ class InvoiceViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_401_UNAUTHORIZED
             )
         
-        # Get invoice counts
-        total_invoices = Invoice.objects.count()
-        draft_invoices = Invoice.objects.filter(status='draft').count()
-        sent_invoices = Invoice.objects.filter(status='sent').count()
-        paid_invoices = Invoice.objects.filter(status='paid').count()
-        overdue_invoices = Invoice.objects.filter(status='overdue').count()
-        
-        # Get amounts
-        total_amount = Invoice.objects.aggregate(total=Sum('total_amount'))['total'] or 0
-        total_paid = Invoice.objects.aggregate(total=Sum('amount_paid'))['total'] or 0
-        total_outstanding = Invoice.objects.filter(status__in=['sent', 'overdue']).aggregate(
-            total=Sum('balance_due')
-        )['total'] or 0
-        
         stats = {
-            'total_invoices': total_invoices,
-            'draft_invoices': draft_invoices,
-            'sent_invoices': sent_invoices,
-            'paid_invoices': paid_invoices,
-            'overdue_invoices': overdue_invoices,
-            'total_amount': total_amount,
-            'total_paid': total_paid,
-            'total_outstanding': total_outstanding,
+            name: value or 0 for name, value in cached_stats('invoices', invoice_stats).items()
         }
         
         serializer = InvoiceStatsSerializer(stats)
@@ -1489,20 +1407,10 @@ class DeliveryTrackingViewSet(viewsets.ReadOnlyModelViewSet):
             return Response(sample_data)
         
         # For Firebase authentication, calculate real stats
-        user_orders = Order.objects.filter(
-            customer=request.user,
-            is_pickup=False
+        stats = cached_stats(
+            'customer-deliveries', lambda: customer_delivery_stats(request.user.id), vary=[request.user.id]
         )
         
-        stats = {
-            'total_deliveries': user_orders.count(),
-            'pending': user_orders.filter(status='confirmed').count(),
-            'processing': user_orders.filter(status='processing').count(),
-            'out_for_delivery': user_orders.filter(status='out_for_delivery').count(),
-            'delivered': user_orders.filter(status='delivered').count(),
-            'cancelled': user_orders.filter(status='cancelled').count()
-        }
-        
         return Response(stats)
     
     @swagger_auto_schema(
@@ -1587,8 +1495,11 @@ class DeliveryTrackingViewSet(viewsets.ReadOnlyModelViewSet):
                 order_number=order_number,
                 is_pickup=False
             )
-            serializer = OrderSerializer(order)
-            return Response(serializer.data)
+            data = OrderSerializer(order).data
+            # Live updates are pushed over the socket; this is only the starting point
+            data['driver_location'] = latest_position(order.delivery_person_id) if order.delivery_person_id else None
+            data['tracking_socket'] = f"/ws/tracking/orders/{order.order_number}/"
+            return Response(data)
         except Order.DoesNotExist:
             return Response(
                 {'error': 'Order not found'}, 
@@ -1,6 +1,6 @@
 from django.contrib import admin
 from .models import (
-    PaymentMethod, PaymentTransaction, PaymentWebhook, 
+    PaymentMethod, PaymentTransaction, PaymentWebhook, PaymentWebhookEvent,
     PaymentRefund, PaymentPlan, PaymentSubscription, PaymentReceipt
 )
 
@@ -66,6 +66,22 @@ class PaymentWebhookAdmin(admin.ModelAdmin):
     ordering = ['-received_at']
 
 
+@admin.register(PaymentWebhookEvent)
+class PaymentWebhookEventAdmin(admin.ModelAdmin):
+    list_display = ['id', 'tx_ref', 'event_type', 'status', 'attempts', 'received_at', 'processed_at']
+    list_filter = ['status', 'event_type', 'received_at']
+    search_fields = ['tx_ref', 'dedup_key']
+    readonly_fields = ['dedup_key', 'payload', 'received_at', 'processed_at']
+    ordering = ['-received_at']
+    actions = ['replay_events']
+    
+    @admin.action(description='Replay selected webhook events')
+    def replay_events(self, request, queryset):
+        from .webhooks import replay_events
+        count = replay_events(queryset.exclude(status='processed'))
+        self.message_user(request, f'{count} webhook event(s) requeued')
+
+
 @admin.register(PaymentRefund)
 class PaymentRefundAdmin(admin.ModelAdmin):
     list_display = ['refund_id', 'original_transaction', 'amount', 'status', 'created_at']
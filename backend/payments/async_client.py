@@ -0,0 +1,50 @@
+"""
+Async Flutterwave clients
+
+Each class wraps its sync client and exposes the same methods; the provider
+flows (see payments.provider_calls) become coroutines that wait on the API
+through the shared async HTTP client, everything else (validation helpers,
+constants, the service's settings) is passed through unchanged:
+
+    mobile_money = AsyncFlutterwaveMobileMoney()
+    result = await mobile_money.complete_mobile_money_flow(payment_data)
+"""
+
+from .provider_calls import BoundFlow
+
+
+class AsyncProviderClient:
+    """Async view of a Flutterwave client"""
+
+    def __init__(self, client):
+        self.client = client
+
+    def __getattr__(self, name):
+        attribute = getattr(self.client, name)
+        if isinstance(attribute, BoundFlow):
+            return attribute.arun
+        return attribute
+
+
+class AsyncFlutterwaveService(AsyncProviderClient):
+    def __init__(self, client=None):
+        from .services import get_flutterwave_service
+        super().__init__(client if client is not None else get_flutterwave_service())
+
+
+class AsyncFlutterwaveMobileMoney(AsyncProviderClient):
+    def __init__(self, client=None):
+        from .mobile_money import FlutterwaveMobileMoney
+        super().__init__(client if client is not None else FlutterwaveMobileMoney())
+
+
+class AsyncFlutterwaveCardPayments(AsyncProviderClient):
+    def __init__(self, client=None):
+        from .card_payments import FlutterwaveCardPayments
+        super().__init__(client if client is not None else FlutterwaveCardPayments())
+
+
+class AsyncFlutterwaveGeneralFlow(AsyncProviderClient):
+    def __init__(self, client=None):
+        from .general_flow import FlutterwaveGeneralFlow
+        super().__init__(client if client is not None else FlutterwaveGeneralFlow())
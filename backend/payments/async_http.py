@@ -0,0 +1,68 @@
+"""
+Shared async HTTP client for outbound Flutterwave API calls
+The async counterpart of payments.http_client: one httpx.AsyncClient, and so
+one keep-alive connection pool, per event loop. An ASGI worker runs a single
+loop, so all of its concurrent payment requests share the pool; waiting on
+the provider holds a socket, not a thread.
+"""
+
+import asyncio
+import logging
+import threading
+import weakref
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+_clients = weakref.WeakKeyDictionary()
+_clients_lock = threading.Lock()
+
+
+def build_async_http_client():
+    """
+    Build an httpx.AsyncClient with a pooled transport
+
+    Configured through settings:
+        FLUTTERWAVE_ASYNC_HTTP_MAX_CONNECTIONS: open connections per worker
+        FLUTTERWAVE_HTTP_POOL_MAXSIZE: connections kept alive between calls
+        FLUTTERWAVE_HTTP_MAX_RETRIES: retries when a connection cannot be established
+
+    Like the sync session, requests are only retried when the connection
+    failed, so a POST is never sent twice.
+    """
+    import httpx
+
+    limits = httpx.Limits(
+        max_connections=getattr(settings, 'FLUTTERWAVE_ASYNC_HTTP_MAX_CONNECTIONS', 100),
+        max_keepalive_connections=getattr(settings, 'FLUTTERWAVE_HTTP_POOL_MAXSIZE', 20),
+    )
+    transport = httpx.AsyncHTTPTransport(
+        limits=limits,
+        retries=getattr(settings, 'FLUTTERWAVE_HTTP_MAX_RETRIES', 2),
+    )
+    return httpx.AsyncClient(transport=transport, timeout=30)
+
+
+def get_async_http_client():
+    """
+    Get the HTTP client of the running event loop, creating it on first use
+    """
+    loop = asyncio.get_running_loop()
+    client = _clients.get(loop)
+    if client is None:
+        with _clients_lock:
+            client = _clients.get(loop)
+            if client is None:
+                client = _clients[loop] = build_async_http_client()
+                logger.debug("Created shared async Flutterwave HTTP client")
+    return client
+
+
+async def close_async_http_client():
+    """
+    Close and drop the client of the running event loop
+    """
+    client = _clients.pop(asyncio.get_running_loop(), None)
+    if client is not None:
+        await client.aclose()
@@ -0,0 +1,454 @@
+"""
+Async payment endpoints
+
+The endpoints that wait on Flutterwave are served by these async views when
+PAYMENTS_ASYNC_VIEWS is on (see payments.urls), at the same URLs and with the
+same request and response bodies as the PaymentTransactionViewSet and
+FlutterwaveUtilityViewSet actions they replace:
+
+    POST transactions/initiate_payment/
+    POST transactions/<pk>/verify_payment/
+    GET  flutterwave/banks/
+    POST flutterwave/validate_bank_account/
+    POST flutterwave/complete_mobile_money_payment/
+    POST flutterwave/complete_card_payment/
+
+Under ASGI (tanna_backend.asgi) a request waiting on the provider holds no
+thread: API calls go through the async clients (payments.async_client) and
+database access through the async ORM. DRF authentication and serializer
+validation, which may query, run in a worker thread. Under WSGI Django runs
+these views in its own event loop per request, so they behave like the sync
+actions.
+"""
+
+import functools
+import logging
+
+from asgiref.sync import sync_to_async
+from django.http import JsonResponse
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.authentication import SessionAuthentication
+from rest_framework.exceptions import APIException
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
+
+from .async_client import (
+    AsyncFlutterwaveCardPayments, AsyncFlutterwaveMobileMoney, AsyncFlutterwaveService
+)
+from .models import PaymentMethod, PaymentTransaction
+from .serializers import (
+    BankAccountValidationSerializer, PaymentInitiateSerializer, PaymentTransactionSerializer
+)
+from .views import transactions_visible_to
+from users.authentication import FirebaseAuthentication
+
+logger = logging.getLogger(__name__)
+
+TRANSACTION_AUTHENTICATION = [FirebaseAuthentication, SessionAuthentication]
+
+
+def _authenticate(request, authentication_classes):
+    """DRF authentication and body parsing for a plain Django request"""
+    drf_request = Request(
+        request,
+        parsers=[parser() for parser in api_settings.DEFAULT_PARSER_CLASSES],
+        authenticators=[authentication() for authentication in authentication_classes],
+    )
+    user = drf_request.user
+    data = drf_request.data if request.method == 'POST' else {}
+    return user, data
+
+
+def async_endpoint(method, authentication_classes=None):
+    """
+    Async view for an authenticated JSON endpoint. The view is called as
+    view(request, data, ...) with request.user set and `data` the parsed body.
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        async def wrapper(request, *args, **kwargs):
+            if request.method != method:
+                return JsonResponse(
+                    {'detail': f'Method "{request.method}" not allowed.'},
+                    status=status.HTTP_405_METHOD_NOT_ALLOWED
+                )
+
+            try:
+                user, data = await sync_to_async(_authenticate)(
+                    request, authentication_classes or api_settings.DEFAULT_AUTHENTICATION_CLASSES
+                )
+            except APIException as e:
+                return JsonResponse({'detail': str(e.detail)}, status=e.status_code)
+
+            if not user or not user.is_authenticated:
+                return JsonResponse(
+                    {'detail': 'Authentication credentials were not provided.'},
+                    status=status.HTTP_401_UNAUTHORIZED
+                )
+
+            request.user = user
+            return await view(request, data, *args, **kwargs)
+
+        # DRF's SessionAuthentication enforces CSRF itself, as for APIView
+        wrapper.csrf_exempt = True
+        return wrapper
+    return decorator
+
+
+def _error(message, status_code=status.HTTP_400_BAD_REQUEST):
+    return JsonResponse({'success': False, 'error': message}, status=status_code)
+
+
+async def _validate(serializer):
+    # Validation may look up related rows (e.g. the payment method limits)
+    return await sync_to_async(serializer.is_valid)()
+
+
+@async_endpoint('POST', TRANSACTION_AUTHENTICATION)
+async def initiate_payment(request, data):
+    """Initiate a new payment"""
+    from events.models import Event
+    from orders.models import Invoice, Order, OrderReceipt
+
+    serializer = PaymentInitiateSerializer(data=data)
+    if not await _validate(serializer):
+        return JsonResponse(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+    validated = serializer.validated_data
+    user = request.user
+
+    try:
+        amount = validated['amount']
+        transaction_data = {
+            'transaction_type': validated['transaction_type'],
+            'amount': amount,
+            'currency': validated['currency'],
+            'customer': user,
+            'customer_name': user.get_full_name() or user.email,
+            'customer_email': user.email,
+            'customer_phone': getattr(user, 'phone', '') or '0000000000',
+            'description': validated.get('description', ''),
+            'redirect_url': validated.get('redirect_url', ''),
+            'callback_url': validated.get('callback_url', ''),
+            'metadata': validated.get('metadata', {}),
+            'net_amount': amount  # Fees are calculated later
+        }
+
+        if validated.get('payment_details'):
+            transaction_data['metadata']['payment_details'] = validated['payment_details']
+
+        # Link to related entity
+        for field, model, key, label in [
+            ('order_id', Order, 'order', 'Order'),
+            ('invoice_id', Invoice, 'invoice', 'Invoice'),
+            ('event_id', Event, 'event', 'Event'),
+            ('receipt_id', OrderReceipt, 'receipt', 'Receipt'),
+        ]:
+            if validated.get(field):
+                try:
+                    transaction_data[key] = await model.objects.aget(id=validated[field])
+                except model.DoesNotExist:
+                    return _error(f'{label} with ID {validated[field]} does not exist')
+                break
+
+        if validated.get('payment_method_id'):
+            try:
+                payment_method = await PaymentMethod.objects.aget(id=validated['payment_method_id'])
+            except PaymentMethod.DoesNotExist:
+                return _error(f'Payment method with ID {validated["payment_method_id"]} does not exist')
+            transaction_data['payment_method'] = payment_method
+
+            # Cash payments need no Flutterwave call and are confirmed immediately
+            if payment_method.payment_type == 'cash':
+                transaction = await PaymentTransaction.objects.acreate(**transaction_data)
+                transaction.status = 'successful'
+                transaction.paid_at = timezone.now()
+                await transaction.asave()
+
+                return JsonResponse({
+                    'success': True,
+                    'transaction': PaymentTransactionSerializer(transaction).data,
+                    'payment_url': None,
+                    'message': 'Cash payment confirmed. Order will be processed for delivery.'
+                })
+
+        transaction = await PaymentTransaction.objects.acreate(**transaction_data)
+        result = await AsyncFlutterwaveService().create_payment_link(transaction)
+
+        if result['success']:
+            return JsonResponse({
+                'success': True,
+                'transaction': PaymentTransactionSerializer(transaction).data,
+                'payment_url': result['payment_url']
+            })
+
+        await transaction.adelete()
+        return _error(result['error'])
+
+    except Exception as e:
+        return _error(str(e))
+
+
+@async_endpoint('POST', TRANSACTION_AUTHENTICATION)
+async def verify_payment(request, data, pk):
+    """Verify payment status"""
+    try:
+        transaction = await transactions_visible_to(request.user).select_related('payment_method').aget(pk=pk)
+    except PaymentTransaction.DoesNotExist:
+        return JsonResponse({'detail': 'Not found.'}, status=status.HTTP_404_NOT_FOUND)
+
+    try:
+        result = await AsyncFlutterwaveService().verify_payment(transaction.flutterwave_reference)
+
+        if result['success'] and result['verified']:
+            if result['status'] == 'successful':
+                await sync_to_async(transaction.mark_as_paid)()
+
+            return JsonResponse({
+                'success': True,
+                'transaction': PaymentTransactionSerializer(transaction).data,
+                'verification': result
+            })
+        return _error(result.get('error', 'Payment verification failed'))
+
+    except Exception as e:
+        return _error(str(e))
+
+
+@async_endpoint('GET')
+async def banks(request, data):
+    """Get list of banks"""
+    country = request.GET.get('country', 'NG')
+
+    try:
+        result = await AsyncFlutterwaveService().get_banks(country)
+        if result['success']:
+            return JsonResponse({'success': True, 'banks': result['banks']})
+        return _error(result['error'])
+    except Exception as e:
+        return _error(str(e))
+
+
+@async_endpoint('POST')
+async def validate_bank_account(request, data):
+    """Validate bank account"""
+    serializer = BankAccountValidationSerializer(data=data)
+    if not await _validate(serializer):
+        return JsonResponse(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+    try:
+        result = await AsyncFlutterwaveService().validate_bank_account(
+            serializer.validated_data['account_number'],
+            serializer.validated_data['account_bank']
+        )
+        if result['success']:
+            return JsonResponse({'success': True, 'account_name': result['account_name']})
+        return _error(result['error'])
+    except Exception as e:
+        return _error(str(e))
+
+
+def _missing_field(data, required_fields):
+    for field in required_fields:
+        if field not in data:
+            return f'Missing required field: {field}'
+    return None
+
+
+async def _record_flow_transaction(request, data, result, payment_type, method_defaults, fields):
+    """
+    Store the PaymentTransaction of a completed Flutterwave flow; returns it,
+    or None when it could not be stored (the provider result still stands)
+    """
+    from events.models import Event
+    from orders.models import Invoice, Order, OrderReceipt
+
+    customer_data = data['customer_data']
+    charge_data = data['charge_data']
+    try:
+        payment_method, _created = await PaymentMethod.objects.aget_or_create(
+            payment_type=payment_type, defaults=method_defaults
+        )
+        transaction_data = {
+            'customer': request.user,
+            'customer_name': f"{customer_data.get('name', {}).get('first', '')} {customer_data.get('name', {}).get('last', '')}".strip(),
+            'customer_email': customer_data['email'],
+            'amount': charge_data['amount'],
+            'currency': charge_data['currency'],
+            'payment_method': payment_method,
+            'status': 'pending',
+            'reference': charge_data['reference'],
+            'flutterwave_reference': charge_data['reference'],
+            'flutterwave_charge_id': result.get('charge_id'),
+            'flutterwave_customer_id': result.get('customer_id'),
+            'flutterwave_payment_method_id': result.get('payment_method_id'),
+            **fields
+        }
+
+        # Add entity references if provided
+        for field, model, key in [
+            ('order_id', Order, 'order'),
+            ('invoice_id', Invoice, 'invoice'),
+            ('event_id', Event, 'event'),
+            ('receipt_id', OrderReceipt, 'receipt'),
+        ]:
+            if field in data:
+                try:
+                    transaction_data[key] = await model.objects.aget(id=data[field])
+                except model.DoesNotExist:
+                    pass
+
+        return await PaymentTransaction.objects.acreate(**transaction_data)
+    except Exception as db_error:
+        logger.error(f"Error creating PaymentTransaction record: {db_error}")
+        return None
+
+
+def _flow_response(result, transaction, message, keys):
+    body = {
+        'success': True,
+        'message': result.get('message', message),
+        'data': {key: result.get(key) for key in keys}
+    }
+    if transaction is not None:
+        body['data'] = {'transaction_id': transaction.id, **body['data']}
+    else:
+        body['message'] = result.get('message', f'{message} (Flutterwave only)')
+        body['warning'] = 'Payment recorded with Flutterwave but local database record creation failed'
+    return JsonResponse(body)
+
+
+@async_endpoint('POST')
+async def complete_mobile_money_payment(request, data):
+    """Complete mobile money payment flow with all Flutterwave steps"""
+    try:
+        missing = _missing_field(data, ['customer_data', 'mobile_money_data', 'charge_data'])
+        if missing:
+            return _error(missing)
+
+        customer_data = data.get('customer_data', {})
+        if not customer_data.get('email'):
+            return _error('Customer email is required')
+
+        mobile_money_data = data.get('mobile_money_data', {})
+        if not mobile_money_data.get('country_code') or not mobile_money_data.get('network') or not mobile_money_data.get('phone_number'):
+            return _error('Mobile money data must include country_code, network, and phone_number')
+
+        charge_data = data.get('charge_data', {})
+        if not charge_data.get('amount') or not charge_data.get('currency'):
+            return _error('Charge data must include amount and currency')
+
+        mobile_money_service = AsyncFlutterwaveMobileMoney()
+        validation_result = mobile_money_service.validate_country_network(
+            mobile_money_data['country_code'],
+            mobile_money_data['network']
+        )
+        if not validation_result['valid']:
+            return _error(validation_result['error'])
+
+        payment_data = {
+            'customer_data': customer_data,
+            'mobile_money_data': mobile_money_data,
+            'charge_data': charge_data
+        }
+        if 'scenario' in data:
+            payment_data['scenario'] = data['scenario']
+
+        result = await mobile_money_service.complete_mobile_money_flow(payment_data)
+        if not result['success']:
+            return _error(result.get('error', 'Mobile money payment failed'))
+
+        network = mobile_money_data['network'].upper()
+        transaction = await _record_flow_transaction(
+            request, data, result, 'mobile_money',
+            method_defaults={
+                'name': f"{network} Mobile Money",
+                'description': f"{network} Mobile Money for {mobile_money_data['country_code']}",
+                'is_active': True,
+                'min_amount': 100,
+                'max_amount': 7000000
+            },
+            fields={
+                'customer_phone': mobile_money_data['phone_number'],
+                'transaction_type': 'mobile_money',
+                'description': f"Mobile money payment via {network}",
+                'metadata': {
+                    'network': mobile_money_data['network'],
+                    'phone_number': mobile_money_data['phone_number'],
+                    'country_code': mobile_money_data['country_code'],
+                    'flutterwave_response': result
+                }
+            }
+        )
+        return _flow_response(
+            result, transaction, 'Mobile money payment flow completed',
+            ['customer_id', 'payment_method_id', 'charge_id', 'status', 'next_action',
+             'redirect_url', 'instructions', 'note']
+        )
+
+    except Exception as e:
+        return _error(str(e), status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+@async_endpoint('POST')
+async def complete_card_payment(request, data):
+    """Complete card payment flow with all Flutterwave steps"""
+    try:
+        missing = _missing_field(data, ['customer_data', 'card_data', 'charge_data'])
+        if missing:
+            return _error(missing)
+
+        customer_data = data.get('customer_data', {})
+        if not customer_data.get('email'):
+            return _error('Customer email is required')
+
+        card_data = data.get('card_data', {})
+        for field in ['encrypted_card_number', 'encrypted_expiry_month', 'encrypted_expiry_year', 'encrypted_cvv', 'nonce']:
+            if not card_data.get(field):
+                return _error(f'Card data must include {field}')
+
+        charge_data = data.get('charge_data', {})
+        if not charge_data.get('amount') or not charge_data.get('currency'):
+            return _error('Charge data must include amount and currency')
+
+        payment_data = {
+            'customer_data': customer_data,
+            'card_data': card_data,
+            'charge_data': charge_data
+        }
+        if 'scenario' in data:
+            payment_data['scenario'] = data['scenario']
+
+        result = await AsyncFlutterwaveCardPayments().complete_card_payment_flow(payment_data)
+        if not result['success']:
+            return _error(result.get('error', 'Card payment failed'))
+
+        transaction = await _record_flow_transaction(
+            request, data, result, 'card',
+            method_defaults={
+                'name': 'Credit/Debit Card',
+                'description': 'Credit and debit card payments',
+                'is_active': True,
+                'min_amount': 100,
+                'max_amount': 1000000
+            },
+            fields={
+                'transaction_type': 'card',
+                'description': 'Card payment',
+                'metadata': {
+                    'card_last4': card_data.get('last4', '****'),
+                    'card_brand': card_data.get('brand', 'unknown'),
+                    'authorization_required': result.get('authorization_required', False),
+                    'auth_type': result.get('auth_type'),
+                    'flutterwave_response': result
+                }
+            }
+        )
+        return _flow_response(
+            result, transaction, 'Card payment flow completed',
+            ['customer_id', 'payment_method_id', 'charge_id', 'status', 'next_action',
+             'redirect_url', 'authorization_required', 'auth_type']
+        )
+
+    except Exception as e:
+        return _error(str(e), status.HTTP_500_INTERNAL_SERVER_ERROR)
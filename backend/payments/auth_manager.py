@@ -1,27 +1,106 @@
 import os
-import requests
+import time
+import threading
 from datetime import datetime, timedelta
 from django.conf import settings
+from django.core.cache import caches
 import logging
 
+from .http_client import get_http_session
+
 logger = logging.getLogger(__name__)
 
+# OAuth token shared by every FlutterwaveAuthManager in this process
+_token_state = {
+    'access_token': None,
+    'expiry': None,
+    'token_type': None,
+}
+_token_lock = threading.Lock()
+
 
 class FlutterwaveAuthManager:
     """
     OAuth 2.0 Authentication Manager for Flutterwave API
+
+    The access token is shared process-wide and mirrored into the Django cache
+    (FLUTTERWAVE_TOKEN_CACHE_ALIAS) so other workers can reuse it. Refreshes are
+    single-flight: one thread per process, and one process per cache, calls the IdP.
     """
     
+    TOKEN_URL = 'https://idp.flutterwave.com/realms/flutterwave/protocol/openid-connect/token'
+    TOKEN_CACHE_KEY = 'flutterwave:oauth:token'
+    TOKEN_LOCK_KEY = 'flutterwave:oauth:token:lock'
+    TOKEN_LOCK_TIMEOUT = 10  # seconds
+    REFRESH_MARGIN = timedelta(minutes=1)
+    
     def __init__(self):
         self.client_id = getattr(settings, 'FLW_CLIENT_ID', '')
         self.client_secret = getattr(settings, 'FLW_CLIENT_SECRET', '')
-        self.access_token = None
-        self.expiry = None
-        self.token_type = None
         
         if not self.client_id or not self.client_secret:
             logger.warning("Flutterwave OAuth credentials not configured - using fallback API key authentication")
     
+    @property
+    def access_token(self):
+        return _token_state['access_token']
+    
+    @property
+    def expiry(self):
+        return _token_state['expiry']
+    
+    @property
+    def token_type(self):
+        return _token_state['token_type']
+    
+    def _get_cache(self):
+        return caches[getattr(settings, 'FLUTTERWAVE_TOKEN_CACHE_ALIAS', 'default')]
+    
+    def _set_token(self, access_token, expiry, token_type):
+        _token_state['access_token'] = access_token
+        _token_state['expiry'] = expiry
+        _token_state['token_type'] = token_type
+    
+    def _token_is_fresh(self):
+        expiry = _token_state['expiry']
+        return bool(_token_state['access_token'] and expiry and expiry - datetime.now() >= self.REFRESH_MARGIN)
+    
+    def _load_cached_token(self):
+        """
+        Adopt a token published by another worker, if it is still fresh
+        """
+        try:
+            cached = self._get_cache().get(self.TOKEN_CACHE_KEY)
+        except Exception as e:
+            logger.warning(f"Flutterwave token cache unavailable: {e}")
+            return False
+        
+        if not cached:
+            return False
+        
+        expiry = datetime.fromtimestamp(cached['expires_at'])
+        if expiry - datetime.now() < self.REFRESH_MARGIN:
+            return False
+        
+        self._set_token(cached['access_token'], expiry, cached.get('token_type', 'Bearer'))
+        return True
+    
+    def _publish_token(self):
+        """
+        Store the current token in the shared cache until shortly before it expires
+        """
+        timeout = int((self.expiry - datetime.now() - self.REFRESH_MARGIN).total_seconds())
+        if timeout <= 0:
+            return
+        try:
+            self._get_cache().set(self.TOKEN_CACHE_KEY, {
+                'access_token': self.access_token,
+                'expires_at': self.expiry.timestamp(),
+                'token_type': self.token_type,
+            }, timeout=timeout)
+        except Exception as e:
+            logger.warning(f"Failed to share Flutterwave token via cache: {e}")
+    
     def generate_access_token(self):
         """
         Generate OAuth 2.0 access token from Flutterwave
@@ -31,8 +110,6 @@ class FlutterwaveAuthManager:
                 logger.error("OAuth credentials not configured")
                 return False
             
-            url = 'https://idp.flutterwave.com/realms/flutterwave/protocol/openid-connect/token'
-            
             headers = {
                 'Content-Type': 'application/x-www-form-urlencoded'
             }
@@ -43,14 +120,17 @@ class FlutterwaveAuthManager:
                 'grant_type': 'client_credentials'
             }
             
-            response = requests.post(url, headers=headers, data=data, timeout=30)
+            response = get_http_session().post(self.TOKEN_URL, headers=headers, data=data, timeout=30)
             
             if response.status_code == 200:
                 response_data = response.json()
                 
-                self.access_token = response_data.get('access_token')
-                self.expiry = datetime.now() + timedelta(seconds=response_data.get('expires_in', 600))
-                self.token_type = response_data.get('token_type', 'Bearer')
+                self._set_token(
+                    response_data.get('access_token'),
+                    datetime.now() + timedelta(seconds=response_data.get('expires_in', 600)),
+                    response_data.get('token_type', 'Bearer'),
+                )
+                self._publish_token()
                 
                 logger.info("OAuth 2.0 access token generated successfully")
                 return True
@@ -62,20 +142,47 @@ class FlutterwaveAuthManager:
             logger.error(f"Error generating access token: {e}")
             return False
     
+    def _refresh_token(self):
+        """
+        Refresh the token, letting only one worker at a time call the IdP
+        """
+        try:
+            owns_lock = self._get_cache().add(self.TOKEN_LOCK_KEY, 1, timeout=self.TOKEN_LOCK_TIMEOUT)
+        except Exception:
+            owns_lock = True  # No shared cache, refresh locally
+        
+        if not owns_lock:
+            # Another worker is refreshing; wait for it to publish the new token
+            deadline = time.monotonic() + self.TOKEN_LOCK_TIMEOUT
+            while time.monotonic() < deadline:
+                time.sleep(0.1)
+                if self._load_cached_token():
+                    return True
+        
+        try:
+            return self.generate_access_token()
+        finally:
+            if owns_lock:
+                try:
+                    self._get_cache().delete(self.TOKEN_LOCK_KEY)
+                except Exception:
+                    pass
+    
     def get_access_token(self):
         """
         Get current access token, generate new one if expired or not available
         """
-        # Check if token exists and is not expired
-        if self.access_token and self.expiry:
-            # Refresh token if it expires in less than 1 minute
-            if self.expiry - datetime.now() < timedelta(minutes=1):
-                logger.info("Access token expiring soon, generating new token")
-                self.generate_access_token()
-        else:
-            # No token available, generate new one
-            logger.info("No access token available, generating new token")
-            self.generate_access_token()
+        # Fast path: token is valid for at least another minute
+        if self._token_is_fresh():
+            return self.access_token
+        
+        with _token_lock:
+            # Another thread may have refreshed while we waited for the lock
+            if self._token_is_fresh() or self._load_cached_token():
+                return self.access_token
+            
+            logger.info("Access token missing or expiring soon, generating new token")
+            self._refresh_token()
         
         return self.access_token
     
@@ -4,12 +4,13 @@ Follows the official Flutterwave v4 API documentation for card payments
 """
 
 import logging
-import requests
 import time
 from typing import Dict, Any, Optional, List
 from django.conf import settings
 from django.utils import timezone
 
+from .provider_calls import Call, Headers, provider_flow
+
 logger = logging.getLogger(__name__)
 
 
@@ -20,10 +21,11 @@ class FlutterwaveCardPayments:
     """
     
     def __init__(self):
-        from .services import FlutterwaveService
-        self.service = FlutterwaveService()
+        from .services import get_flutterwave_service
+        self.service = get_flutterwave_service()
         self.logger = logging.getLogger(__name__)
     
+    @provider_flow
     def create_customer(self, customer_data: Dict[str, Any]) -> Dict[str, Any]:
         """
         Step 1: Create a Customer
@@ -68,8 +70,8 @@ class FlutterwaveCardPayments:
             }
             
             # Make API request
-            headers = self.service._get_headers(include_idempotency=True, include_trace=True)
-            response = requests.post(
+            headers = yield Headers(include_idempotency=True, include_trace=True)
+            response = yield Call.post(
                 f'{self.service.base_url}/customers',
                 headers=headers,
                 json=payload,
@@ -104,6 +106,7 @@ class FlutterwaveCardPayments:
                 'error': str(e)
             }
     
+    @provider_flow
     def create_card_payment_method(self, card_data: Dict[str, Any], customer_id: str = None) -> Dict[str, Any]:
         """
         Step 2: Create Card Payment Method
@@ -147,12 +150,12 @@ class FlutterwaveCardPayments:
                 payload['customer_id'] = customer_id
             
             # Make API request
-            headers = self.service._get_headers(include_idempotency=True, include_trace=True)
+            headers = yield Headers(include_idempotency=True, include_trace=True)
             
             # Log the payload for debugging
             self.logger.info(f"Card payment method payload: {payload}")
             
-            response = requests.post(
+            response = yield Call.post(
                 f'{self.service.base_url}/payment-methods',
                 headers=headers,
                 json=payload,
@@ -187,6 +190,7 @@ class FlutterwaveCardPayments:
                 'error': str(e)
             }
     
+    @provider_flow
     def initiate_card_charge(self, charge_data: Dict[str, Any]) -> Dict[str, Any]:
         """
         Step 3: Initiate Card Charge
@@ -228,12 +232,12 @@ class FlutterwaveCardPayments:
             }
             
             # Make API request
-            headers = self.service._get_headers(include_idempotency=True, include_trace=True)
+            headers = yield Headers(include_idempotency=True, include_trace=True)
             
             # Log the payload for debugging
             self.logger.info(f"Card charge payload: {payload}")
             
-            response = requests.post(
+            response = yield Call.post(
                 f'{self.service.base_url}/charges',
                 headers=headers,
                 json=payload,
@@ -270,6 +274,7 @@ class FlutterwaveCardPayments:
                 'error': str(e)
             }
     
+    @provider_flow
     def authorize_card_payment(self, charge_id: str, authorization_data: Dict[str, Any]) -> Dict[str, Any]:
         """
         Step 4: Authorize Card Payment
@@ -304,12 +309,12 @@ class FlutterwaveCardPayments:
             }
             
             # Make API request using PUT method as per Flutterwave docs
-            headers = self.service._get_headers(include_idempotency=True, include_trace=True)
+            headers = yield Headers(include_idempotency=True, include_trace=True)
             
             # Log the payload for debugging
             self.logger.info(f"Card authorization payload: {payload}")
             
-            response = requests.put(
+            response = yield Call.put(
                 f'{self.service.base_url}/charges/{charge_id}',
                 headers=headers,
                 json=payload,
@@ -346,6 +351,7 @@ class FlutterwaveCardPayments:
                 'error': str(e)
             }
     
+    @provider_flow
     def verify_card_payment(self, charge_id: str) -> Dict[str, Any]:
         """
         Step 5: Verify Card Payment
@@ -364,8 +370,8 @@ class FlutterwaveCardPayments:
                 }
             
             # Make API request
-            headers = self.service._get_headers(include_idempotency=False, include_trace=True)
-            response = requests.get(
+            headers = yield Headers(include_idempotency=False, include_trace=True)
+            response = yield Call.get(
                 f'{self.service.base_url}/charges/{charge_id}',
                 headers=headers,
                 timeout=30
@@ -403,6 +409,7 @@ class FlutterwaveCardPayments:
                 'error': str(e)
             }
     
+    @provider_flow
     def complete_card_payment_flow(self, payment_data: Dict[str, Any]) -> Dict[str, Any]:
         """
         Complete the entire card payment flow
@@ -421,7 +428,7 @@ class FlutterwaveCardPayments:
             self.logger.info("Starting complete card payment flow")
             
             # Step 1: Create Customer
-            customer_result = self.create_customer(payment_data.get('customer_data', {}))
+            customer_result = yield from self.create_customer.steps(payment_data.get('customer_data', {}))
             if not customer_result['success']:
                 return customer_result
             
@@ -431,7 +438,7 @@ class FlutterwaveCardPayments:
             # Step 2: Create Card Payment Method
             card_data = payment_data.get('card_data', {})
             
-            payment_method_result = self.create_card_payment_method(card_data, customer_id)
+            payment_method_result = yield from self.create_card_payment_method.steps(card_data, customer_id)
             if not payment_method_result['success']:
                 return payment_method_result
             
@@ -443,7 +450,7 @@ class FlutterwaveCardPayments:
             charge_data['customer_id'] = customer_id
             charge_data['payment_method_id'] = payment_method_id
             
-            charge_result = self.initiate_card_charge(charge_data)
+            charge_result = yield from self.initiate_card_charge.steps(charge_data)
             if not charge_result['success']:
                 return charge_result
             
@@ -499,7 +506,7 @@ class FlutterwaveCardPayments:
                                 'next_action': next_action
                             }
                     
-                    auth_result = self.authorize_card_payment(charge_id, authorization_data)
+                    auth_result = yield from self.authorize_card_payment.steps(charge_id, authorization_data)
                     if not auth_result['success']:
                         return auth_result
                     
@@ -538,7 +545,7 @@ class FlutterwaveCardPayments:
                     }
             
             # Step 5: Verify Card Payment
-            verification_result = self.verify_card_payment(charge_id)
+            verification_result = yield from self.verify_card_payment.steps(charge_id)
             if not verification_result['success']:
                 return verification_result
             
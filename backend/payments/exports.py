@@ -0,0 +1,27 @@
+"""
+Flat column projection for streaming payment transaction exports (see utils.exports)
+"""
+
+PAYMENT_EXPORT_COLUMNS = [
+    ('id', 'id', 'int'),
+    ('transaction_id', 'transaction_id', 'str'),
+    ('reference', 'reference', 'str'),
+    ('flutterwave_reference', 'flutterwave_reference', 'str'),
+    ('created_at', 'created_at', 'datetime'),
+    ('transaction_type', 'transaction_type', 'str'),
+    ('status', 'status', 'str'),
+    ('amount', 'amount', 'money'),
+    ('currency', 'currency', 'str'),
+    ('fee', 'fee', 'money'),
+    ('net_amount', 'net_amount', 'money'),
+    ('payment_method', 'payment_method__name', 'str'),
+    ('payment_type', 'payment_type', 'str'),
+    ('order_id', 'order_id', 'int'),
+    ('invoice_id', 'invoice_id', 'int'),
+    ('event_id', 'event_id', 'int'),
+    ('customer_id', 'customer_id', 'int'),
+    ('customer_name', 'customer_name', 'str'),
+    ('customer_email', 'customer_email', 'str'),
+    ('customer_phone', 'customer_phone', 'str'),
+    ('paid_at', 'paid_at', 'datetime'),
+]
@@ -4,12 +4,13 @@ Implements the 5-step payment flow: Customer → Payment Method → Charge → A
 """
 
 import logging
-import requests
 import time
 from typing import Dict, Any, Optional, List, Tuple
 from django.conf import settings
 from django.utils import timezone
 
+from .provider_calls import Call, Headers, provider_flow
+
 logger = logging.getLogger(__name__)
 
 
@@ -20,10 +21,11 @@ class FlutterwaveGeneralFlow:
     """
     
     def __init__(self):
-        from .services import FlutterwaveService
-        self.service = FlutterwaveService()
+        from .services import get_flutterwave_service
+        self.service = get_flutterwave_service()
         self.logger = logging.getLogger(__name__)
     
+    @provider_flow
     def create_customer(self, customer_data: Dict[str, Any]) -> Dict[str, Any]:
         """
         Step 1: Create a Customer
@@ -68,8 +70,8 @@ class FlutterwaveGeneralFlow:
             }
             
             # Make API request
-            headers = self.service._get_headers(include_idempotency=True, include_trace=True)
-            response = requests.post(
+            headers = yield Headers(include_idempotency=True, include_trace=True)
+            response = yield Call.post(
                 f'{self.service.base_url}/customers',
                 headers=headers,
                 json=payload,
@@ -104,6 +106,7 @@ class FlutterwaveGeneralFlow:
                 'error': str(e)
             }
     
+    @provider_flow
     def create_payment_method(self, payment_method_data: Dict[str, Any]) -> Dict[str, Any]:
         """
         Step 2: Create a Payment Method
@@ -161,12 +164,12 @@ class FlutterwaveGeneralFlow:
                 payload['mobile_money'] = payment_method_data['mobile_money']
             
             # Make API request
-            headers = self.service._get_headers(include_idempotency=True, include_trace=True)
+            headers = yield Headers(include_idempotency=True, include_trace=True)
             
             # Log the payload for debugging
             self.logger.info(f"Payment method payload: {payload}")
             
-            response = requests.post(
+            response = yield Call.post(
                 f'{self.service.base_url}/payment-methods',
                 headers=headers,
                 json=payload,
@@ -201,6 +204,7 @@ class FlutterwaveGeneralFlow:
                 'error': str(e)
             }
     
+    @provider_flow
     def initiate_charge(self, charge_data: Dict[str, Any]) -> Dict[str, Any]:
         """
         Step 3: Initiate a Charge
@@ -241,12 +245,12 @@ class FlutterwaveGeneralFlow:
             }
             
             # Make API request
-            headers = self.service._get_headers(include_idempotency=True, include_trace=True)
+            headers = yield Headers(include_idempotency=True, include_trace=True)
             
             # Log the payload for debugging
             self.logger.info(f"Charge payload: {payload}")
             
-            response = requests.post(
+            response = yield Call.post(
                 f'{self.service.base_url}/charges',
                 headers=headers,
                 json=payload,
@@ -283,6 +287,7 @@ class FlutterwaveGeneralFlow:
                 'error': str(e)
             }
     
+    @provider_flow
     def authorize_charge(self, charge_id: str, authorization_data: Dict[str, Any]) -> Dict[str, Any]:
         """
         Step 4: Authorize a Charge
@@ -317,8 +322,8 @@ class FlutterwaveGeneralFlow:
             }
             
             # Make API request using PUT method as per Flutterwave docs
-            headers = self.service._get_headers(include_idempotency=True, include_trace=True)
-            response = requests.put(
+            headers = yield Headers(include_idempotency=True, include_trace=True)
+            response = yield Call.put(
                 f'{self.service.base_url}/charges/{charge_id}',
                 headers=headers,
                 json=payload,
@@ -355,6 +360,7 @@ class FlutterwaveGeneralFlow:
                 'error': str(e)
             }
     
+    @provider_flow
     def verify_payment(self, charge_id: str) -> Dict[str, Any]:
         """
         Step 5: Verify Payment Status
@@ -373,8 +379,8 @@ class FlutterwaveGeneralFlow:
                 }
             
             # Make API request
-            headers = self.service._get_headers(include_idempotency=False, include_trace=True)
-            response = requests.get(
+            headers = yield Headers(include_idempotency=False, include_trace=True)
+            response = yield Call.get(
                 f'{self.service.base_url}/charges/{charge_id}',
                 headers=headers,
                 timeout=30
@@ -412,6 +418,7 @@ class FlutterwaveGeneralFlow:
                 'error': str(e)
             }
     
+    @provider_flow
     def complete_payment_flow(self, payment_data: Dict[str, Any]) -> Dict[str, Any]:
         """
         Complete the entire 5-step payment flow
@@ -430,7 +437,7 @@ class FlutterwaveGeneralFlow:
             self.logger.info("Starting complete payment flow")
             
             # Step 1: Create Customer
-            customer_result = self.create_customer(payment_data.get('customer_data', {}))
+            customer_result = yield from self.create_customer.steps(payment_data.get('customer_data', {}))
             if not customer_result['success']:
                 return customer_result
             
@@ -442,7 +449,7 @@ class FlutterwaveGeneralFlow:
             payment_method_data['customer_id'] = customer_id  # Link to customer
             
             self.logger.info(f"Creating payment method for customer: {customer_id}")
-            payment_method_result = self.create_payment_method(payment_method_data)
+            payment_method_result = yield from self.create_payment_method.steps(payment_method_data)
             if not payment_method_result['success']:
                 return payment_method_result
             
@@ -454,7 +461,7 @@ class FlutterwaveGeneralFlow:
             charge_data['customer_id'] = customer_id
             charge_data['payment_method_id'] = payment_method_id
             
-            charge_result = self.initiate_charge(charge_data)
+            charge_result = yield from self.initiate_charge.steps(charge_data)
             if not charge_result['success']:
                 return charge_result
             
@@ -510,7 +517,7 @@ class FlutterwaveGeneralFlow:
                                 'next_action': next_action
                             }
                     
-                    auth_result = self.authorize_charge(charge_id, authorization_data)
+                    auth_result = yield from self.authorize_charge.steps(charge_id, authorization_data)
                     if not auth_result['success']:
                         return auth_result
                     
@@ -549,7 +556,7 @@ class FlutterwaveGeneralFlow:
                     }
             
             # Step 5: Verify Payment
-            verification_result = self.verify_payment(charge_id)
+            verification_result = yield from self.verify_payment.steps(charge_id)
             if not verification_result['success']:
                 return verification_result
             
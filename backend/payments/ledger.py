@@ -0,0 +1,145 @@
+"""
+Payment ledger totals
+
+Order.amount_paid / Order.outstanding_amount and the matching Invoice fields
+are stored rather than summed from payment_transactions on every read:
+
+- amount_paid is the sum of the order's settled transactions
+  (SETTLED_STATUSES); outstanding_amount is what remains of the order total,
+  never below zero. Every invoice of the order carries the same
+  outstanding_amount; open invoices also mirror amount_paid and balance_due.
+- Totals are rewritten from the order's transactions whenever a transaction
+  is created, deleted, or changes status, amount or order (see
+  payments.signals), inside the transaction that made the change. The order
+  rows are locked first, so concurrent payments for one order serialize and
+  the last writer always sees every committed payment.
+- Order.save keeps outstanding_amount in step with total_amount, and
+  Invoice.save derives its outstanding_amount from the order.
+
+reconcile_totals() (management command reconcile_payment_ledger) finds and
+repairs drift left by writes that bypass the model, such as raw SQL.
+"""
+
+import logging
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import DecimalField, F, OuterRef, Q, Subquery, Sum, Value
+from django.db.models.functions import Coalesce, Greatest
+
+logger = logging.getLogger(__name__)
+
+SETTLED_STATUSES = ['successful', 'paid']
+
+MONEY = DecimalField(max_digits=10, decimal_places=2)
+ZERO = Value(Decimal('0.00'), output_field=MONEY)
+
+# Invoices whose paid amount is still driven by the order's payments
+OPEN_INVOICE_STATUSES = ['draft', 'sent', 'overdue']
+
+
+def ledger_state(payment):
+    """The fields of a transaction that affect ledger totals"""
+    return (payment.__dict__.get('order_id'), payment.__dict__.get('status'), payment.__dict__.get('amount'))
+
+
+def remember(payment):
+    """Record the transaction's current state as the one the totals reflect"""
+    payment._ledger_state = ledger_state(payment)
+
+
+def affected_order_ids(payment, deleted=False):
+    """
+    Orders whose totals change with this save (or delete) of `payment`
+    """
+    previous = getattr(payment, '_ledger_state', None)
+    current = ledger_state(payment)
+    if deleted:
+        order_id, status, _amount = previous or current
+        return {order_id} - {None} if status in SETTLED_STATUSES else set()
+    if previous == current:
+        return set()
+    order_ids = set()
+    if previous is not None and previous[1] in SETTLED_STATUSES:
+        order_ids.add(previous[0])
+    if current[1] in SETTLED_STATUSES:
+        order_ids.add(current[0])
+    return order_ids - {None}
+
+
+def _paid_subquery():
+    from .models import PaymentTransaction
+
+    return Subquery(
+        PaymentTransaction.objects.filter(
+            order_id=OuterRef('pk'), status__in=SETTLED_STATUSES
+        ).order_by().values('order_id').annotate(total=Sum('amount')).values('total')[:1],
+        output_field=MONEY,
+    )
+
+
+def refresh_order_totals(order_ids):
+    """
+    Rewrite the stored totals of the given orders and their invoices from
+    their transactions. Runs in (or opens) a transaction and locks the orders.
+    """
+    from orders.models import Invoice, Order
+
+    order_ids = sorted(set(order_ids) - {None})
+    if not order_ids:
+        return 0
+
+    with transaction.atomic():
+        list(Order.objects.select_for_update().filter(id__in=order_ids).order_by('id').values_list('id', flat=True))
+
+        paid = Coalesce(_paid_subquery(), ZERO)
+        updated = Order.objects.filter(id__in=order_ids).update(
+            amount_paid=paid,
+            outstanding_amount=Greatest(F('total_amount') - paid, ZERO),
+        )
+
+        order_totals = Order.objects.filter(pk=OuterRef('order_id'))
+        order_paid = Subquery(order_totals.values('amount_paid')[:1], output_field=MONEY)
+        Invoice.objects.filter(order_id__in=order_ids).update(
+            outstanding_amount=Subquery(order_totals.values('outstanding_amount')[:1], output_field=MONEY),
+        )
+        Invoice.objects.filter(order_id__in=order_ids, status__in=OPEN_INVOICE_STATUSES).update(
+            amount_paid=order_paid,
+            balance_due=F('total_amount') - order_paid,
+        )
+    return updated
+
+
+def drifted_orders(queryset=None):
+    """
+    Orders (ids) whose stored totals disagree with their transactions, or
+    that have an invoice disagreeing with them
+    """
+    from orders.models import Invoice, Order
+
+    queryset = Order.objects.all() if queryset is None else queryset
+    paid = Coalesce(_paid_subquery(), ZERO)
+    drifted = set(queryset.annotate(ledger_paid=paid).filter(
+        ~Q(amount_paid=F('ledger_paid'))
+        | ~Q(outstanding_amount=Greatest(F('total_amount') - F('ledger_paid'), ZERO))
+    ).values_list('id', flat=True))
+
+    drifted.update(Invoice.objects.filter(order__in=queryset).filter(
+        ~Q(outstanding_amount=F('order__outstanding_amount'))
+        | (Q(status__in=OPEN_INVOICE_STATUSES) & ~Q(amount_paid=F('order__amount_paid')))
+    ).values_list('order_id', flat=True).distinct())
+    return sorted(drifted)
+
+
+def reconcile_totals(queryset=None, repair=True, batch_size=500):
+    """
+    Check stored totals against the transactions and, with repair, rewrite the
+    drifted orders in batches. Returns the ids of the drifted orders.
+    """
+    drifted = drifted_orders(queryset)
+    if drifted:
+        logger.warning(f"Payment ledger drift on {len(drifted)} order(s)")
+    if repair:
+        for start in range(0, len(drifted), batch_size):
+            refresh_order_totals(drifted[start:start + batch_size])
+    return drifted
@@ -0,0 +1,142 @@
+import asyncio
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from payments.async_client import AsyncFlutterwaveService
+from payments.async_http import close_async_http_client
+from payments.services import FlutterwaveService
+
+VERIFIED = json.dumps({
+    'status': 'success',
+    'data': {'status': 'successful', 'amount': 1000, 'currency': 'UGX'},
+}).encode()
+
+
+class StubProvider:
+    """
+    Keep-alive HTTP server on localhost answering every request like a
+    successful verification after `latency` seconds; counts requests in flight
+    """
+
+    def __init__(self, latency):
+        self.latency = latency
+        self.in_flight = 0
+        self.peak = 0
+        self.loop = asyncio.new_event_loop()
+        self.server = self.loop.run_until_complete(asyncio.start_server(self.handle, '127.0.0.1', 0))
+        self.url = 'http://127.0.0.1:%d' % self.server.sockets[0].getsockname()[1]
+        self.thread = threading.Thread(target=self.loop.run_forever, daemon=True)
+
+    async def handle(self, reader, writer):
+        try:
+            while True:
+                head = await reader.readuntil(b'\r\n\r\n')
+                length = 0
+                for line in head.split(b'\r\n'):
+                    if line.lower().startswith(b'content-length:'):
+                        length = int(line.split(b':', 1)[1])
+                if length:
+                    await reader.readexactly(length)
+
+                self.in_flight += 1
+                self.peak = max(self.peak, self.in_flight)
+                await asyncio.sleep(self.latency)
+                self.in_flight -= 1
+
+                writer.write(
+                    b'HTTP/1.1 200 OK\r\nContent-Type: application/json\r\n'
+                    b'Content-Length: %d\r\n\r\n' % len(VERIFIED) + VERIFIED
+                )
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionResetError):
+            pass
+        finally:
+            writer.close()
+
+    def reset(self):
+        self.peak = 0
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.loop.call_soon_threadsafe(self.server.close)
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join(timeout=5)
+
+
+class Command(BaseCommand):
+    help = (
+        'Verify payments against a local stub provider with artificial latency, through the '
+        'sync client on a pool of worker threads and through the async client on one event loop, '
+        'and compare how many provider calls one worker keeps in flight'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=400, help='Payments verified per client')
+        parser.add_argument('--latency-ms', type=float, default=250, help='Stub provider response time')
+        parser.add_argument('--threads', type=int, default=20, help='Worker threads for the sync client (a gthread worker)')
+        parser.add_argument('--concurrency', type=int, default=400, help='Requests the async worker accepts at once')
+
+    def build_service(self, base_url):
+        service = FlutterwaveService()
+        service.base_url = base_url
+        # No OAuth round trip to the real provider
+        service._get_headers = lambda **kwargs: {'Authorization': 'Bearer benchmark', 'Content-Type': 'application/json'}
+        return service
+
+    def run_sync(self, service, references, threads):
+        with ThreadPoolExecutor(max_workers=threads) as pool:
+            return list(pool.map(service.verify_payment, references))
+
+    async def run_async(self, service, references, concurrency):
+        client = AsyncFlutterwaveService(service)
+        gate = asyncio.Semaphore(concurrency)
+
+        async def verify(reference):
+            async with gate:
+                return await client.verify_payment(reference)
+
+        try:
+            return await asyncio.gather(*(verify(reference) for reference in references))
+        finally:
+            await close_async_http_client()
+
+    def handle(self, *args, **options):
+        try:
+            import httpx  # noqa: F401
+        except ImportError:
+            raise CommandError('The async payment benchmark needs httpx (see requirements.txt)')
+
+        references = [f'BENCH-{number}' for number in range(options['requests'])]
+        rows = []
+        with StubProvider(options['latency_ms'] / 1000) as provider:
+            service = self.build_service(provider.url)
+            for label, run in [
+                (f"sync, {options['threads']} threads", lambda: self.run_sync(service, references, options['threads'])),
+                ('async, 1 loop', lambda: asyncio.run(self.run_async(service, references, options['concurrency']))),
+            ]:
+                provider.reset()
+                started = time.perf_counter()
+                results = run()
+                elapsed = time.perf_counter() - started
+                failed = sum(1 for result in results if not result.get('verified'))
+                rows.append((label, elapsed, len(results) / elapsed, provider.peak, failed))
+
+        self.stdout.write('\n' + '='*50)
+        self.stdout.write(f"{'client':<20}{'seconds':>8}{'req/s':>8}{'in flight':>10}{'failed':>8}")
+        for label, elapsed, throughput, peak, failed in rows:
+            self.stdout.write(f"{label:<20}{elapsed:>8.2f}{throughput:>8.1f}{peak:>10}{failed:>8}")
+        self.stdout.write('='*50)
+        self.stdout.write(
+            f"{options['requests']} verifications at {options['latency_ms']:.0f}ms provider latency; "
+            f"async connections capped at {getattr(settings, 'FLUTTERWAVE_ASYNC_HTTP_MAX_CONNECTIONS', 100)} "
+            f"(FLUTTERWAVE_ASYNC_HTTP_MAX_CONNECTIONS)"
+        )
+        self.stdout.write(self.style.SUCCESS('Async payment benchmark complete'))
@@ -0,0 +1,48 @@
+from django.core.management.base import BaseCommand
+from orders.models import Order
+from payments.ledger import reconcile_totals
+
+
+class Command(BaseCommand):
+    help = 'Verify stored order and invoice payment totals against payment transactions and repair drift'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--order-id',
+            type=int,
+            help='Check a specific order ID',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Report drifted orders without repairing them',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='Orders repaired per transaction',
+        )
+
+    def handle(self, *args, **options):
+        orders = Order.objects.all()
+        if options['order_id']:
+            orders = orders.filter(id=options['order_id'])
+
+        dry_run = options['dry_run']
+        drifted = reconcile_totals(orders, repair=not dry_run, batch_size=options['batch_size'])
+
+        self.stdout.write('='*50)
+        self.stdout.write('PAYMENT LEDGER RECONCILIATION')
+        self.stdout.write('='*50)
+        self.stdout.write(f'Orders checked: {orders.count()}')
+        self.stdout.write(f'Orders with drift: {len(drifted)}')
+        if drifted:
+            self.stdout.write(f'Drifted order IDs: {", ".join(str(order_id) for order_id in drifted[:50])}'
+                              + (' ...' if len(drifted) > 50 else ''))
+        self.stdout.write('='*50)
+
+        if dry_run:
+            self.stdout.write(self.style.WARNING('DRY RUN - No totals were repaired'))
+        else:
+            self.stdout.write(self.style.SUCCESS(f'Repaired totals of {len(drifted)} order(s)'))
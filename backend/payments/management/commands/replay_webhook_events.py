@@ -0,0 +1,49 @@
+from django.core.management.base import BaseCommand, CommandError
+from payments.models import PaymentWebhookEvent
+from payments.webhooks import WebhookConsumer, replay_events
+
+
+class Command(BaseCommand):
+    help = 'Requeue dead-lettered (or failed) Flutterwave webhook events and optionally process them now'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--id', type=int, action='append', dest='ids', help='Event id to replay (repeatable)')
+        parser.add_argument('--tx-ref', help='Replay the events of one transaction reference')
+        parser.add_argument(
+            '--include-failed',
+            action='store_true',
+            help='Also requeue events that are still retrying, not only dead-lettered ones',
+        )
+        parser.add_argument(
+            '--now',
+            action='store_true',
+            help='Process the requeued events in this process instead of waiting for the Celery consumer',
+        )
+
+    def handle(self, *args, **options):
+        statuses = ['dead', 'failed'] if options['include_failed'] else ['dead']
+        queryset = PaymentWebhookEvent.objects.filter(status__in=statuses)
+
+        if options['ids']:
+            queryset = queryset.filter(pk__in=options['ids'])
+        if options['tx_ref']:
+            queryset = queryset.filter(tx_ref=options['tx_ref'])
+        if not (options['ids'] or options['tx_ref'] or options['include_failed']):
+            self.stdout.write('Replaying all dead-lettered webhook events...')
+
+        tx_refs = set(queryset.values_list('tx_ref', flat=True))
+        count = replay_events(queryset)
+        if not count:
+            raise CommandError('No matching webhook events to replay')
+        self.stdout.write(f'Requeued {count} webhook event(s) across {len(tx_refs)} transaction reference(s)')
+
+        if options['now']:
+            consumer = WebhookConsumer()
+            for tx_ref in tx_refs:
+                metrics = consumer.run(tx_ref=tx_ref)
+                self.stdout.write(
+                    f"{tx_ref or '(no tx_ref)'}: processed={metrics['processed']} failed={metrics['failed']} "
+                    f"dead={metrics['dead']} locked={metrics['locked']}"
+                )
+
+        self.stdout.write(self.style.SUCCESS('Replay completed'))
@@ -1,5 +1,4 @@
 from django.core.management.base import BaseCommand
-from django.db.models import Sum
 from orders.models import Order, Invoice
 from payments.models import PaymentTransaction
 from payments.services import update_invoice_status_on_order_payment, create_receipt_for_successful_payment
@@ -128,16 +127,8 @@ class Command(BaseCommand):
     def _process_order(self, order, dry_run):
         """Process a single order and update its invoices if needed"""
         try:
-            # Get all successful payment transactions for this order
-            successful_payments = PaymentTransaction.objects.filter(
-                order=order,
-                status__in=['successful', 'paid']
-            )
-            
-            # Calculate total amount paid from payment transactions
-            total_paid = successful_payments.aggregate(
-                total=Sum('amount')
-            )['total'] or 0
+            # Total amount paid as kept by the payment ledger
+            total_paid = order.amount_paid
             
             # Use the order's total_amount (which is calculated as subtotal + tax + delivery_fee - discount)
             total_order_amount = order.total_amount
@@ -0,0 +1,38 @@
+# Generated by Django 4.2.7 on 2026-10-17 10:40
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payments', '0007_paymenttransaction_status_expiry_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PaymentWebhookEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('dedup_key', models.CharField(max_length=64, unique=True)),
+                ('tx_ref', models.CharField(blank=True, default='', max_length=100)),
+                ('event_type', models.CharField(blank=True, default='', max_length=50)),
+                ('payload', models.JSONField()),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('processed', 'Processed'), ('failed', 'Failed'), ('dead', 'Dead Letter')], default='pending', max_length=20)),
+                ('attempts', models.PositiveIntegerField(default=0)),
+                ('last_error', models.TextField(blank=True, null=True)),
+                ('next_attempt_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('received_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('processed_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'db_table': 'payment_webhook_events',
+                'ordering': ['received_at', 'id'],
+                'indexes': [
+                    models.Index(fields=['status', 'next_attempt_at'], name='payment_whevt_status_next_idx'),
+                    models.Index(fields=['tx_ref', 'received_at'], name='payment_whevt_txref_recv_idx'),
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 4.2.7 on 2026-10-17 12:40
+
+from django.db import migrations
+from django.utils import timezone
+
+from utils.identifiers import create_sequence, drop_sequence
+
+
+def create_identifier_sequences(apps, schema_editor):
+    PaymentReceipt = apps.get_model('payments', 'PaymentReceipt')
+    today = timezone.now().strftime('%Y%m%d')
+
+    create_sequence(schema_editor, 'payment_receipt', PaymentReceipt.objects.filter(
+        receipt_number__startswith=f'PAY_RCP_{today}_'
+    ).values_list('receipt_number', flat=True))
+
+
+def drop_identifier_sequences(apps, schema_editor):
+    drop_sequence(schema_editor, 'payment_receipt')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payments', '0008_paymentwebhookevent'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_identifier_sequences, drop_identifier_sequences),
+    ]
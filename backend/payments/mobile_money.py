@@ -4,12 +4,13 @@ Follows the official Flutterwave v4 API documentation for mobile money payments
 """
 
 import logging
-import requests
 import time
 from typing import Dict, Any, Optional, List
 from django.conf import settings
 from django.utils import timezone
 
+from .provider_calls import Call, Headers, provider_flow
+
 logger = logging.getLogger(__name__)
 
 
@@ -74,8 +75,8 @@ class FlutterwaveMobileMoney:
     }
     
     def __init__(self):
-        from .services import FlutterwaveService
-        self.service = FlutterwaveService()
+        from .services import get_flutterwave_service
+        self.service = get_flutterwave_service()
         self.logger = logging.getLogger(__name__)
     
     def validate_country_network(self, country_code: str, network: str) -> Dict[str, Any]:
@@ -109,6 +110,7 @@ class FlutterwaveMobileMoney:
             'region': country_info['region']
         }
     
+    @provider_flow
     def create_customer(self, customer_data: Dict[str, Any]) -> Dict[str, Any]:
         """
         Step 1: Create a Customer or retrieve existing customer
@@ -135,7 +137,7 @@ class FlutterwaveMobileMoney:
             
             # First, try to retrieve existing customer by email
             self.logger.info(f"Checking if customer exists with email: {email}")
-            existing_customer = self._get_customer_by_email(email)
+            existing_customer = yield from self._get_customer_by_email.steps(email)
             
             if existing_customer:
                 self.logger.info(f"Customer already exists: {existing_customer['id']}")
@@ -172,8 +174,8 @@ class FlutterwaveMobileMoney:
             }
             
             # Make API request
-            headers = self.service._get_headers(include_idempotency=True, include_trace=True)
-            response = requests.post(
+            headers = yield Headers(include_idempotency=True, include_trace=True)
+            response = yield Call.post(
                 f'{self.service.base_url}/customers',
                 headers=headers,
                 json=payload,
@@ -209,6 +211,7 @@ class FlutterwaveMobileMoney:
                 'error': str(e)
             }
     
+    @provider_flow
     def _get_customer_by_email(self, email: str) -> Optional[Dict[str, Any]]:
         """
         Retrieve customer by email address
@@ -220,8 +223,8 @@ class FlutterwaveMobileMoney:
             dict: Customer data if found, None otherwise
         """
         try:
-            headers = self.service._get_headers(include_idempotency=False, include_trace=True)
-            response = requests.get(
+            headers = yield Headers(include_idempotency=False, include_trace=True)
+            response = yield Call.get(
                 f'{self.service.base_url}/customers?email={email}',
                 headers=headers,
                 timeout=30
@@ -239,6 +242,7 @@ class FlutterwaveMobileMoney:
             self.logger.error(f"Error retrieving customer by email: {e}")
             return None
     
+    @provider_flow
     def create_mobile_money_payment_method(self, mobile_money_data: Dict[str, Any], customer_id: str = None) -> Dict[str, Any]:
         """
         Step 2: Create Mobile Money Payment Method
@@ -295,12 +299,12 @@ class FlutterwaveMobileMoney:
                 payload['customer_id'] = customer_id
             
             # Make API request
-            headers = self.service._get_headers(include_idempotency=True, include_trace=True)
+            headers = yield Headers(include_idempotency=True, include_trace=True)
             
             # Log the payload for debugging
             self.logger.info(f"Mobile money payment method payload: {payload}")
             
-            response = requests.post(
+            response = yield Call.post(
                 f'{self.service.base_url}/payment-methods',
                 headers=headers,
                 json=payload,
@@ -335,6 +339,7 @@ class FlutterwaveMobileMoney:
                 'error': str(e)
             }
     
+    @provider_flow
     def initiate_mobile_money_charge(self, charge_data: Dict[str, Any]) -> Dict[str, Any]:
         """
         Step 3: Initiate Mobile Money Charge
@@ -376,7 +381,7 @@ class FlutterwaveMobileMoney:
             }
             
             # Make API request
-            headers = self.service._get_headers(include_idempotency=True, include_trace=True)
+            headers = yield Headers(include_idempotency=True, include_trace=True)
             
             # Add scenario key if provided (for testing)
             if 'scenario' in charge_data:
@@ -385,7 +390,7 @@ class FlutterwaveMobileMoney:
             # Log the payload for debugging
             self.logger.info(f"Mobile money charge payload: {payload}")
             
-            response = requests.post(
+            response = yield Call.post(
                 f'{self.service.base_url}/charges',
                 headers=headers,
                 json=payload,
@@ -422,6 +427,7 @@ class FlutterwaveMobileMoney:
                 'error': str(e)
             }
     
+    @provider_flow
     def verify_mobile_money_payment(self, charge_id: str) -> Dict[str, Any]:
         """
         Step 4: Verify Mobile Money Payment
@@ -440,8 +446,8 @@ class FlutterwaveMobileMoney:
                 }
             
             # Make API request
-            headers = self.service._get_headers(include_idempotency=False, include_trace=True)
-            response = requests.get(
+            headers = yield Headers(include_idempotency=False, include_trace=True)
+            response = yield Call.get(
                 f'{self.service.base_url}/charges/{charge_id}',
                 headers=headers,
                 timeout=30
@@ -479,6 +485,7 @@ class FlutterwaveMobileMoney:
                 'error': str(e)
             }
     
+    @provider_flow
     def complete_mobile_money_flow(self, payment_data: Dict[str, Any]) -> Dict[str, Any]:
         """
         Complete the entire mobile money payment flow
@@ -497,7 +504,7 @@ class FlutterwaveMobileMoney:
             self.logger.info("Starting complete mobile money payment flow")
             
             # Step 1: Create Customer
-            customer_result = self.create_customer(payment_data.get('customer_data', {}))
+            customer_result = yield from self.create_customer.steps(payment_data.get('customer_data', {}))
             if not customer_result['success']:
                 return customer_result
             
@@ -507,7 +514,7 @@ class FlutterwaveMobileMoney:
             # Step 2: Create Mobile Money Payment Method
             mobile_money_data = payment_data.get('mobile_money_data', {})
             
-            payment_method_result = self.create_mobile_money_payment_method(mobile_money_data, customer_id)
+            payment_method_result = yield from self.create_mobile_money_payment_method.steps(mobile_money_data, customer_id)
             if not payment_method_result['success']:
                 return payment_method_result
             
@@ -523,7 +530,7 @@ class FlutterwaveMobileMoney:
             if 'scenario' in payment_data:
                 charge_data['scenario'] = payment_data['scenario']
             
-            charge_result = self.initiate_mobile_money_charge(charge_data)
+            charge_result = yield from self.initiate_mobile_money_charge.steps(charge_data)
             if not charge_result['success']:
                 return charge_result
             
@@ -561,7 +568,7 @@ class FlutterwaveMobileMoney:
                     }
             
             # Step 5: Verify Mobile Money Payment
-            verification_result = self.verify_mobile_money_payment(charge_id)
+            verification_result = yield from self.verify_mobile_money_payment.steps(charge_id)
             if not verification_result['success']:
                 return verification_result
             
@@ -1,4 +1,4 @@
-from django.db import models
+from django.db import models, transaction
 from django.utils import timezone
 from django.core.validators import MinValueValidator
 from decimal import Decimal
@@ -134,6 +134,9 @@ class PaymentTransaction(models.Model):
     class Meta:
         db_table = 'payment_transactions'
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['status', 'expired_at'], name='payment_tx_status_expiry_idx'),
+        ]
     
     def __str__(self):
         return f"{self.transaction_id} - {self.customer_name} ({self.amount} {self.currency})"
@@ -162,7 +165,20 @@ class PaymentTransaction(models.Model):
             from datetime import timedelta
             self.expired_at = timezone.now() + timedelta(minutes=30)
         
-        super().save(*args, **kwargs)
+        # Ledger totals of the order are updated by a post_save receiver in this transaction
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+    
+    def delete(self, *args, **kwargs):
+        with transaction.atomic():
+            return super().delete(*args, **kwargs)
+    
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        from .ledger import remember
+        instance = super().from_db(db, field_names, values)
+        remember(instance)
+        return instance
     
     def _validate_payment_method_requirements(self):
         """Validate that required fields are provided based on payment type"""
@@ -309,6 +325,45 @@ class PaymentWebhook(models.Model):
         return f"Webhook {self.webhook_id} - {self.event_type}"
 
 
+class PaymentWebhookEvent(models.Model):
+    """
+    Raw Flutterwave webhook deliveries, acknowledged immediately and processed by a Celery consumer
+    """
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('processed', 'Processed'),
+        ('failed', 'Failed'),
+        ('dead', 'Dead Letter'),
+    ]
+    
+    # Provider event identity; duplicate deliveries map to the same key
+    dedup_key = models.CharField(max_length=64, unique=True)
+    tx_ref = models.CharField(max_length=100, blank=True, default='')
+    event_type = models.CharField(max_length=50, blank=True, default='')
+    payload = models.JSONField()
+    
+    # Processing state
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    attempts = models.PositiveIntegerField(default=0)
+    last_error = models.TextField(blank=True, null=True)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    
+    # Timestamps
+    received_at = models.DateTimeField(default=timezone.now)
+    processed_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        db_table = 'payment_webhook_events'
+        ordering = ['received_at', 'id']
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at'], name='payment_whevt_status_next_idx'),
+            models.Index(fields=['tx_ref', 'received_at'], name='payment_whevt_txref_recv_idx'),
+        ]
+    
+    def __str__(self):
+        return f"Webhook event {self.pk} - {self.event_type} ({self.tx_ref or 'no tx_ref'})"
+
+
 class PaymentRefund(models.Model):
     """
     Payment refund model
@@ -409,19 +464,18 @@ class PaymentReceipt(models.Model):
         # Generate receipt number if not provided
         if not self.receipt_number:
             self.receipt_number = self._generate_receipt_number()
+        adding = self._state.adding
         super().save(*args, **kwargs)
+        if adding:
+            # Render the PDF in the background so the customer's download is served from the store
+            from utils.document_store import schedule_prerender
+            from .tasks import prerender_payment_receipt_pdf
+            schedule_prerender(prerender_payment_receipt_pdf, self.pk)
 
     def _generate_receipt_number(self):
-        """Generate unique payment receipt number"""
-        import random
-        import string
-
-        while True:
-            date_part = timezone.now().strftime('%Y%m%d')
-            random_part = ''.join(random.choices(string.ascii_uppercase + string.digits, k=5))
-            receipt_number = f"PAY_RCP_{date_part}_{random_part}"
-            if not PaymentReceipt.objects.filter(receipt_number=receipt_number).exists():
-                return receipt_number
+        """Generate unique payment receipt number (PAY_RCP_YYYYMMDD_XXXXX)"""
+        from utils.identifiers import allocate
+        return allocate('payment_receipt')
 
 class PaymentPlan(models.Model):
     """
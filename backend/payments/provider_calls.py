@@ -0,0 +1,157 @@
+"""
+Provider calls that run both blocking and async
+
+Every Flutterwave client method that talks to the API (FlutterwaveService,
+FlutterwaveMobileMoney, FlutterwaveCardPayments, FlutterwaveGeneralFlow) is
+written once, as a generator decorated with @provider_flow. Instead of doing
+I/O itself, the method yields what it needs and is sent the result back:
+
+    headers = yield Headers(include_idempotency=True)
+    response = yield Call.post(f'{self.service.base_url}/charges', headers=headers, json=payload, timeout=30)
+    refund = yield Blocking(PaymentRefund.objects.create, amount=amount, ...)
+    customer = yield from self.create_customer.steps(customer_data)
+
+A driver performs each step:
+
+- Calling the method as before (client.verify_payment(ref)) runs the steps
+  on the calling thread through the shared requests session
+  (payments.http_client), so existing sync callers are unchanged.
+- client.verify_payment.arun(ref), or the same method on the Async* clients
+  in payments.async_client, awaits the steps: API calls go through the shared
+  httpx.AsyncClient of the event loop (payments.async_http) without holding a
+  thread; header building (which may refresh the OAuth token) and ORM work
+  run in a worker thread.
+
+Errors raised while performing a step are thrown back into the method at the
+yield, so the methods' own try/except blocks handle transport errors exactly
+as they did around the direct requests calls.
+"""
+
+import functools
+
+from asgiref.sync import sync_to_async
+
+
+class Call:
+    """An HTTP request to the provider; the driver sends back the response"""
+
+    def __init__(self, method, url, **kwargs):
+        self.method = method
+        self.url = url
+        self.kwargs = kwargs
+
+    @classmethod
+    def get(cls, url, **kwargs):
+        return cls('GET', url, **kwargs)
+
+    @classmethod
+    def post(cls, url, **kwargs):
+        return cls('POST', url, **kwargs)
+
+    @classmethod
+    def put(cls, url, **kwargs):
+        return cls('PUT', url, **kwargs)
+
+    def perform(self, service):
+        return service.session.request(self.method, self.url, **self.kwargs)
+
+    async def aperform(self, service):
+        from utils.metrics import upstream
+        from .async_http import get_async_http_client
+        with upstream('flutterwave'):
+            return await get_async_http_client().request(self.method, self.url, **self.kwargs)
+
+
+class Headers:
+    """Request headers from service._get_headers (may fetch an OAuth token)"""
+
+    def __init__(self, **kwargs):
+        self.kwargs = kwargs
+
+    def perform(self, service):
+        return service._get_headers(**self.kwargs)
+
+    async def aperform(self, service):
+        return await sync_to_async(service._get_headers, thread_sensitive=False)(**self.kwargs)
+
+
+class Blocking:
+    """Any other blocking call, such as a save; run in a thread when async"""
+
+    def __init__(self, func, *args, **kwargs):
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+
+    def perform(self, service):
+        return self.func(*self.args, **self.kwargs)
+
+    async def aperform(self, service):
+        return await sync_to_async(self.func)(*self.args, **self.kwargs)
+
+
+def run(steps, service):
+    """Perform every step of a flow on this thread and return its result"""
+    value, error = None, None
+    while True:
+        try:
+            step = steps.send(value) if error is None else steps.throw(error)
+        except StopIteration as stop:
+            return stop.value
+        value, error = None, None
+        try:
+            value = step.perform(service)
+        except Exception as e:
+            error = e
+
+
+async def arun(steps, service):
+    """Await every step of a flow and return its result"""
+    value, error = None, None
+    while True:
+        try:
+            step = steps.send(value) if error is None else steps.throw(error)
+        except StopIteration as stop:
+            return stop.value
+        value, error = None, None
+        try:
+            value = await step.aperform(service)
+        except Exception as e:
+            error = e
+
+
+class BoundFlow:
+    """A provider flow bound to a client instance"""
+
+    def __init__(self, func, client):
+        self.func = func
+        self.client = client
+        functools.update_wrapper(self, func)
+
+    @property
+    def service(self):
+        # FlutterwaveService is its own service; the flow clients wrap one
+        return getattr(self.client, 'service', self.client)
+
+    def steps(self, *args, **kwargs):
+        """The flow's steps, for `yield from` inside another flow"""
+        return self.func(self.client, *args, **kwargs)
+
+    def __call__(self, *args, **kwargs):
+        return run(self.steps(*args, **kwargs), self.service)
+
+    async def arun(self, *args, **kwargs):
+        return await arun(self.steps(*args, **kwargs), self.service)
+
+
+class provider_flow:
+    """Decorator turning a generator method into a provider flow (see module docstring)"""
+
+    def __init__(self, func):
+        self.func = func
+        functools.update_wrapper(self, func)
+
+    def __get__(self, instance, owner=None):
+        if instance is None:
+            return self
+        return BoundFlow(self.func, instance)
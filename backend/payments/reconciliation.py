@@ -0,0 +1,254 @@
+"""
+Batch reconciliation of pending payment transactions
+
+Replaces the serial verify-then-save loop of check_expired_payments with a
+sweep that:
+1. Holds a cache lease so overlapping sweeps (slow run + next beat tick) skip
+2. Claims pending rows in batches with SELECT ... FOR UPDATE SKIP LOCKED in a
+   short transaction that stamps their updated_at and commits
+3. Verifies each batch against Flutterwave in a bounded thread pool, with no
+   transaction open and no row locked
+4. Applies the results only to rows still pending and untouched since the
+   claim (a webhook that settled a payment meanwhile wins): expiries with one
+   UPDATE, each payment with its post_save chain in its own transaction, so a
+   failing receiver costs that payment only
+"""
+
+import logging
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction as db_transaction
+from django.db.models.signals import post_save
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+
+class PaymentReconciler:
+    """
+    Reconcile pending PaymentTransaction rows against Flutterwave
+    """
+
+    LEASE_KEY = 'payments:reconciliation:lease'
+    METRICS_KEY = 'payments:reconciliation:last_sweep'
+
+    def __init__(self, force=False, batch_size=None, max_workers=None, lease_seconds=None, max_runtime=None):
+        self.force = force
+        self.batch_size = batch_size or getattr(settings, 'PAYMENT_RECONCILIATION_BATCH_SIZE', 50)
+        self.max_workers = max_workers or getattr(settings, 'PAYMENT_RECONCILIATION_MAX_WORKERS', 8)
+        self.lease_seconds = lease_seconds or getattr(settings, 'PAYMENT_RECONCILIATION_LEASE_SECONDS', 600)
+        # Stop claiming new batches after this many seconds so a sweep ends before the next beat tick
+        self.max_runtime = max_runtime or getattr(settings, 'PAYMENT_RECONCILIATION_MAX_RUNTIME', 240)
+        self._lease_token = None
+
+    # Lease handling
+
+    def acquire_lease(self):
+        """
+        Take the sweep lease; returns False if another sweep holds it
+        """
+        token = uuid.uuid4().hex
+        if cache.add(self.LEASE_KEY, token, timeout=self.lease_seconds):
+            self._lease_token = token
+            return True
+        return False
+
+    def renew_lease(self):
+        if self._lease_token:
+            cache.touch(self.LEASE_KEY, timeout=self.lease_seconds)
+
+    def release_lease(self):
+        # Only drop the lease if it is still ours (it may have expired and been re-taken)
+        if self._lease_token and cache.get(self.LEASE_KEY) == self._lease_token:
+            cache.delete(self.LEASE_KEY)
+        self._lease_token = None
+
+    # Sweep
+
+    def get_candidates(self):
+        """
+        Pending transactions eligible for reconciliation, oldest expiry first
+        """
+        from .models import PaymentTransaction
+
+        queryset = PaymentTransaction.objects.filter(status='pending')
+        if not self.force:
+            queryset = queryset.filter(expired_at__lt=timezone.now())
+        return queryset.order_by('expired_at', 'id')
+
+    def run(self, dry_run=False):
+        """
+        Run one sweep and return its metrics
+        """
+        metrics = {
+            'skipped': False,
+            'claimed': 0,
+            'paid': 0,
+            'expired': 0,
+            'still_pending': 0,
+            'errors': 0,
+            'batches': 0,
+            'duration_seconds': 0.0,
+            'throughput_per_second': 0.0,
+            'started_at': timezone.now().isoformat(),
+        }
+
+        if dry_run:
+            candidates = list(self.get_candidates().values_list('transaction_id', flat=True)[:self.batch_size * 10])
+            metrics['claimed'] = len(candidates)
+            metrics['dry_run_transactions'] = candidates
+            return metrics
+
+        if not self.acquire_lease():
+            logger.info("Payment reconciliation already running elsewhere, skipping this sweep")
+            metrics['skipped'] = True
+            return metrics
+
+        started = time.monotonic()
+        seen_ids = set()
+        try:
+            with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='payment-reconcile') as executor:
+                while time.monotonic() - started < self.max_runtime:
+                    batch_metrics = self._process_batch(executor, seen_ids)
+                    if batch_metrics is None:
+                        break
+                    metrics['batches'] += 1
+                    for key, value in batch_metrics.items():
+                        metrics[key] += value
+                    self.renew_lease()
+        finally:
+            self.release_lease()
+
+        duration = time.monotonic() - started
+        metrics['duration_seconds'] = round(duration, 3)
+        if duration > 0:
+            metrics['throughput_per_second'] = round(metrics['claimed'] / duration, 2)
+
+        cache.set(self.METRICS_KEY, metrics, timeout=None)
+        logger.info(
+            "Payment reconciliation sweep: claimed=%(claimed)s paid=%(paid)s expired=%(expired)s "
+            "pending=%(still_pending)s errors=%(errors)s batches=%(batches)s "
+            "duration=%(duration_seconds)ss throughput=%(throughput_per_second)s/s",
+            metrics
+        )
+        return metrics
+
+    def _claim(self, seen_ids):
+        """
+        Lock the next batch just long enough to stamp it; returns (batch, claim time)
+        """
+        from .models import PaymentTransaction
+
+        with db_transaction.atomic():
+            batch = list(
+                self.get_candidates()
+                .exclude(pk__in=seen_ids)
+                .select_for_update(skip_locked=True, of=('self',))
+                .select_related('order', 'invoice', 'event', 'payment_method')[:self.batch_size]
+            )
+            claimed_at = timezone.now()
+            if batch:
+                PaymentTransaction.objects.filter(pk__in=[txn.pk for txn in batch]).update(updated_at=claimed_at)
+        seen_ids.update(txn.pk for txn in batch)
+        return batch, claimed_at
+
+    def _process_batch(self, executor, seen_ids):
+        """
+        Claim, verify and update one batch. Returns None when there is nothing left to claim.
+        """
+        from .services import get_flutterwave_service
+
+        service = get_flutterwave_service()
+
+        batch, claimed_at = self._claim(seen_ids)
+        if not batch:
+            return None
+
+        # Verification is HTTP-only, so it can run outside the DB connection's thread
+        to_verify = [txn for txn in batch if txn.flutterwave_reference]
+        results = dict(zip(
+            (txn.pk for txn in to_verify),
+            executor.map(lambda txn: self._verify(service, txn), to_verify)
+        ))
+
+        paid, expired, errors = [], [], 0
+        for txn in batch:
+            result = results.get(txn.pk)
+            if result is not None and result.get('exception'):
+                errors += 1
+                logger.error(f"Error verifying transaction {txn.transaction_id}: {result['exception']}")
+                continue
+            if result is not None and result['success'] and result.get('verified'):
+                paid.append(txn)
+            elif txn.is_expired:
+                expired.append(txn)
+
+        paid_count, expired_count, apply_errors = self._apply(paid, expired, claimed_at)
+        errors += apply_errors
+
+        return {
+            'claimed': len(batch),
+            'paid': paid_count,
+            'expired': expired_count,
+            'still_pending': len(batch) - paid_count - expired_count - errors,
+            'errors': errors,
+        }
+
+    def _verify(self, service, txn):
+        try:
+            return service.verify_payment(txn.flutterwave_reference)
+        except Exception as e:
+            return {'success': False, 'exception': str(e)}
+
+    def _apply(self, paid, expired, claimed_at):
+        """
+        Write the status changes of rows unchanged since `claimed_at` and run the
+        post-payment signal chain for paid rows; returns (paid, expired, errors)
+        """
+        from .models import PaymentTransaction
+
+        now = timezone.now()
+        unchanged = PaymentTransaction.objects.filter(status='pending', updated_at=claimed_at)
+        paid_count, expired_count, errors = 0, 0, 0
+
+        if expired:
+            try:
+                expired_count = unchanged.filter(pk__in=[txn.pk for txn in expired]).update(
+                    status='expired', updated_at=now
+                )
+            except Exception as e:
+                errors += len(expired)
+                logger.error(f"Error expiring {len(expired)} transactions: {str(e)}")
+
+        for txn in paid:
+            try:
+                with db_transaction.atomic():
+                    if not unchanged.filter(pk=txn.pk).update(status='successful', paid_at=now, updated_at=now):
+                        # Settled or changed since the claim; the next sweep sees its current state
+                        continue
+                    txn.status = 'successful'
+                    txn.paid_at = now
+                    txn.updated_at = now
+                    # Ledger totals, receipts, invoice and order status updates hang off post_save
+                    post_save.send(
+                        sender=PaymentTransaction, instance=txn, created=False,
+                        update_fields=frozenset(['status', 'paid_at', 'updated_at']),
+                        raw=False, using=db_transaction.get_connection().alias
+                    )
+                paid_count += 1
+            except Exception as e:
+                errors += 1
+                logger.error(f"Error applying payment of transaction {txn.transaction_id}: {str(e)}")
+
+        return paid_count, expired_count, errors
+
+
+def get_last_sweep_metrics():
+    """
+    Metrics of the most recent completed sweep, if any
+    """
+    return cache.get(PaymentReconciler.METRICS_KEY)
@@ -1,15 +1,59 @@
-import requests
 import json
 import hashlib
 import hmac
+import threading
 from django.conf import settings
 from django.utils import timezone
 from datetime import datetime, timedelta
 from decimal import Decimal
 import logging
 
+from .provider_calls import Blocking, Call, Headers, provider_flow
+
 logger = logging.getLogger(__name__)
 
+_shared_service = None
+_shared_service_lock = threading.Lock()
+
+
+def verify_webhook_signature(webhook_data, signature):
+    """
+    Verify webhook signature from Flutterwave (no service or OAuth setup needed)
+    """
+    try:
+        # Get the secret hash from settings
+        secret_hash = getattr(settings, 'FLUTTERWAVE_SECRET_HASH', '')
+        if not secret_hash:
+            logger.warning("Flutterwave secret hash not configured")
+            return True  # Skip verification if not configured
+        
+        # Create expected signature
+        expected_signature = hmac.new(
+            secret_hash.encode(),
+            json.dumps(webhook_data, separators=(',', ':')).encode(),
+            hashlib.sha256
+        ).hexdigest()
+        
+        return hmac.compare_digest(signature, expected_signature)
+        
+    except Exception as e:
+        logger.error(f"Error verifying webhook signature: {e}")
+        return False
+
+
+def get_flutterwave_service():
+    """
+    Get the process-wide FlutterwaveService, creating it on first use.
+    The service is stateless between calls, so sharing it lets every request
+    reuse the cached OAuth token and pooled HTTP connections.
+    """
+    global _shared_service
+    if _shared_service is None:
+        with _shared_service_lock:
+            if _shared_service is None:
+                _shared_service = FlutterwaveService()
+    return _shared_service
+
 
 class FlutterwaveService:
     """
@@ -19,8 +63,12 @@ class FlutterwaveService:
     def __init__(self):
         # OAuth 2.0 Authentication Manager
         from .auth_manager import FlutterwaveAuthManager
+        from .http_client import get_http_session
         self.auth_manager = FlutterwaveAuthManager()
         
+        # Pooled keep-alive HTTP session shared by the whole process
+        self.session = get_http_session()
+        
         # Environment configuration
         self.environment = getattr(settings, 'FLUTTERWAVE_ENVIRONMENT', 'sandbox')
         
@@ -125,6 +173,7 @@ class FlutterwaveService:
             logger.error(f"Encryption failed: {e}")
             return payload
     
+    @provider_flow
     def create_payment_link(self, transaction):
         """
         Create a payment link for the transaction
@@ -153,7 +202,7 @@ class FlutterwaveService:
                 'meta': {
                     'transaction_id': transaction.transaction_id,
                     'transaction_type': transaction.transaction_type,
-                    'customer_id': transaction.customer.id
+                    'customer_id': transaction.customer_id
                 },
                 'payment_options': 'card,mobile_money,mpesa,bank transfer,cash'
             }
@@ -161,7 +210,7 @@ class FlutterwaveService:
             # Use v4 API headers with idempotency and trace
             # Use transaction reference as idempotency key for consistency
             idempotency_key = f"payment_{transaction.reference}"
-            headers = self._get_headers(
+            headers = yield Headers(
                 include_idempotency=True,
                 include_trace=True,
                 custom_idempotency_key=idempotency_key
@@ -233,7 +282,7 @@ class FlutterwaveService:
                         'payment_details': payment_details
                     }
                 }
-                transaction.save()
+                yield Blocking(transaction.save)
                 
                 return {
                     'success': True,
@@ -258,7 +307,7 @@ class FlutterwaveService:
                 }
             
             # Real API call when secret key is available
-            response = requests.post(
+            response = yield Call.post(
                 f'{self.base_url}/payments',
                 headers=headers,
                 json=compatible_payload,
@@ -282,7 +331,7 @@ class FlutterwaveService:
                     transaction.flutterwave_reference = payment_data.get('reference')
                     transaction.flutterwave_response = data
                     transaction.idempotency_cache_hit = cache_hit
-                    transaction.save()
+                    yield Blocking(transaction.save)
                     
                     return {
                         'success': True,
@@ -315,18 +364,19 @@ class FlutterwaveService:
                 'error': str(e)
             }
     
+    @provider_flow
     def verify_payment(self, transaction_id):
         """
         Verify payment status with Flutterwave
         """
         try:
             # Use v4 API headers for verification
-            headers = self._get_headers(
+            headers = yield Headers(
                 include_idempotency=False,  # GET requests don't need idempotency
                 include_trace=True
             )
             
-            response = requests.get(
+            response = yield Call.get(
                 f'{self.base_url}/transactions/{transaction_id}/verify',
                 headers=headers,
                 timeout=30
@@ -372,7 +422,8 @@ class FlutterwaveService:
     
     def process_webhook(self, webhook_data, signature):
         """
-        Process incoming webhook from Flutterwave
+        Process incoming webhook from Flutterwave synchronously.
+        The webhook endpoint queues deliveries instead (see payments.webhooks).
         """
         try:
             # Verify webhook signature
@@ -382,19 +433,15 @@ class FlutterwaveService:
                     'error': 'Invalid webhook signature'
                 }
             
-            # Parse webhook data
-            event_type = webhook_data.get('event')
-            payment_data = webhook_data.get('data', {})
-            
             # Find transaction by reference
-            reference = payment_data.get('tx_ref')
+            reference = webhook_data.get('data', {}).get('tx_ref')
             if not reference:
                 return {
                     'success': False,
                     'error': 'No transaction reference found'
                 }
             
-            from .models import PaymentTransaction, PaymentWebhook
+            from .models import PaymentTransaction
             
             try:
                 transaction = PaymentTransaction.objects.get(reference=reference)
@@ -404,30 +451,11 @@ class FlutterwaveService:
                     'error': f'Transaction not found: {reference}'
                 }
             
-            # Create webhook record
-            webhook = PaymentWebhook.objects.create(
-                webhook_id=f"WEBHOOK-{timezone.now().strftime('%Y%m%d')}-{transaction.reference}",
-                transaction=transaction,
-                event_type=event_type,
-                webhook_data=webhook_data
+            return self.apply_webhook_event(
+                transaction,
+                webhook_data,
+                f"WEBHOOK-{timezone.now().strftime('%Y%m%d')}-{transaction.reference}"
             )
-            
-            # Process based on event type
-            if event_type == 'charge.completed':
-                return self._handle_payment_success(transaction, payment_data, webhook)
-            elif event_type == 'charge.failed':
-                return self._handle_payment_failed(transaction, payment_data, webhook)
-            elif event_type == 'transfer.completed':
-                return self._handle_transfer_completed(transaction, payment_data, webhook)
-            else:
-                webhook.processed = True
-                webhook.processed_at = timezone.now()
-                webhook.save()
-                
-                return {
-                    'success': True,
-                    'message': f'Webhook processed: {event_type}'
-                }
                 
         except Exception as e:
             logger.error(f"Error processing webhook: {e}")
@@ -436,29 +464,63 @@ class FlutterwaveService:
                 'error': str(e)
             }
     
+    def apply_webhook_event(self, transaction, webhook_data, webhook_id):
+        """
+        Apply a verified webhook to its transaction. Idempotent: the audit record is
+        keyed by webhook_id and events that would not change a settled transaction
+        are recorded without re-running the payment signal chain.
+        """
+        from .models import PaymentWebhook
+        
+        event_type = webhook_data.get('event')
+        payment_data = webhook_data.get('data', {})
+        
+        webhook, created = PaymentWebhook.objects.get_or_create(
+            webhook_id=webhook_id,
+            defaults={
+                'transaction': transaction,
+                'event_type': event_type,
+                'webhook_data': webhook_data,
+            }
+        )
+        if webhook.processed:
+            return {
+                'success': True,
+                'message': f'Webhook already processed: {webhook_id}'
+            }
+        
+        # Late or duplicate deliveries must not re-settle or downgrade a settled payment
+        if transaction.status in ['successful', 'paid'] and event_type in ['charge.completed', 'charge.failed']:
+            webhook.processed = True
+            webhook.processed_at = timezone.now()
+            webhook.save()
+            return {
+                'success': True,
+                'message': f'Transaction already settled, {event_type} ignored'
+            }
+        
+        # Process based on event type
+        if event_type == 'charge.completed':
+            return self._handle_payment_success(transaction, payment_data, webhook)
+        elif event_type == 'charge.failed':
+            return self._handle_payment_failed(transaction, payment_data, webhook)
+        elif event_type == 'transfer.completed':
+            return self._handle_transfer_completed(transaction, payment_data, webhook)
+        else:
+            webhook.processed = True
+            webhook.processed_at = timezone.now()
+            webhook.save()
+            
+            return {
+                'success': True,
+                'message': f'Webhook processed: {event_type}'
+            }
+    
     def _verify_webhook_signature(self, webhook_data, signature):
         """
         Verify webhook signature from Flutterwave
         """
-        try:
-            # Get the secret hash from settings
-            secret_hash = getattr(settings, 'FLUTTERWAVE_SECRET_HASH', '')
-            if not secret_hash:
-                logger.warning("Flutterwave secret hash not configured")
-                return True  # Skip verification if not configured
-            
-            # Create expected signature
-            expected_signature = hmac.new(
-                secret_hash.encode(),
-                json.dumps(webhook_data, separators=(',', ':')).encode(),
-                hashlib.sha256
-            ).hexdigest()
-            
-            return hmac.compare_digest(signature, expected_signature)
-            
-        except Exception as e:
-            logger.error(f"Error verifying webhook signature: {e}")
-            return False
+        return verify_webhook_signature(webhook_data, signature)
     
     def _handle_payment_success(self, transaction, payment_data, webhook):
         """
@@ -475,7 +537,7 @@ class FlutterwaveService:
             if transaction.transaction_type == 'order' and transaction.order:
                 transaction.order.payment_status = 'paid'
                 transaction.order.payment_transaction_id = transaction.transaction_id
-                transaction.order.save()
+                transaction.order.save(update_fields=['payment_status', 'payment_transaction_id', 'updated_at'])
             
             elif transaction.transaction_type == 'invoice' and transaction.invoice:
                 transaction.invoice.mark_as_paid()
@@ -563,6 +625,7 @@ class FlutterwaveService:
                 'error': str(e)
             }
     
+    @provider_flow
     def create_refund(self, transaction, amount, reason):
         """
         Create a refund for a transaction
@@ -574,9 +637,9 @@ class FlutterwaveService:
                 'reason': reason
             }
             
-            response = requests.post(
+            response = yield Call.post(
                 f'{self.base_url}/refunds',
-                headers=self._get_headers(),
+                headers=(yield Headers()),
                 json=payload,
                 timeout=30
             )
@@ -588,7 +651,8 @@ class FlutterwaveService:
                     
                     from .models import PaymentRefund
                     
-                    refund = PaymentRefund.objects.create(
+                    refund = yield Blocking(
+                        PaymentRefund.objects.create,
                         original_transaction=transaction,
                         amount=amount,
                         reason=reason,
@@ -619,14 +683,15 @@ class FlutterwaveService:
                 'error': str(e)
             }
     
+    @provider_flow
     def get_banks(self, country='NG'):
         """
         Get list of banks for bank transfer
         """
         try:
-            response = requests.get(
+            response = yield Call.get(
                 f'{self.base_url}/banks/{country}',
-                headers=self._get_headers(),
+                headers=(yield Headers()),
                 timeout=30
             )
             
@@ -655,6 +720,7 @@ class FlutterwaveService:
                 'error': str(e)
             }
     
+    @provider_flow
     def validate_bank_account(self, account_number, account_bank):
         """
         Validate bank account number
@@ -665,9 +731,9 @@ class FlutterwaveService:
                 'account_bank': account_bank
             }
             
-            response = requests.post(
+            response = yield Call.post(
                 f'{self.base_url}/accounts/resolve',
-                headers=self._get_headers(),
+                headers=(yield Headers()),
                 json=payload,
                 timeout=30
             )
@@ -705,16 +771,13 @@ def update_invoice_status_on_order_payment(order_id):
     This service is called when payment transactions are created or updated.
     
     The function:
-    1. Gets all successful/paid payment transactions for the order
-    2. Calculates total amount paid from transactions
-    3. Uses order.total_amount (which includes subtotal + tax + delivery_fee - discount)
-    4. Only marks invoices as paid if total_paid >= total_order_amount
-    5. Also updates order status from 'pending' to 'confirmed' if fully paid
+    1. Reads the total paid for the order as kept by the payment ledger
+       (payments.ledger, refreshed in the same transaction as each payment change)
+    2. Uses order.total_amount (which includes subtotal + tax + delivery_fee - discount)
+    3. Only marks invoices as paid if total_paid >= total_order_amount
+    4. Also updates order status from 'pending' to 'confirmed' if fully paid
     """
-    from django.db.models import Sum
     from orders.models import Order, Invoice
-    from payments.models import PaymentTransaction
-    from decimal import Decimal
     import logging
     
     logger = logging.getLogger(__name__)
@@ -723,16 +786,8 @@ def update_invoice_status_on_order_payment(order_id):
         # Get the order
         order = Order.objects.get(id=order_id)
         
-        # Get all successful payment transactions for this order
-        successful_payments = PaymentTransaction.objects.filter(
-            order_id=order_id,
-            status__in=['successful', 'paid']
-        )
-        
-        # Calculate total amount paid from payment transactions
-        total_paid = successful_payments.aggregate(
-            total=Sum('amount')
-        )['total'] or 0
+        # Total amount paid from settled payment transactions
+        total_paid = order.amount_paid
         
         # Use the order's total_amount (which is calculated as subtotal + tax + delivery_fee - discount)
         total_order_amount = order.total_amount
@@ -770,7 +825,7 @@ def update_invoice_status_on_order_payment(order_id):
             if order.status == 'pending':
                 order.status = 'confirmed'
                 order.payment_status = 'paid'
-                order.save()
+                order.save(update_fields=['status', 'payment_status', 'updated_at'])
                 order_status_updated = True
                 logger.info(f"Order {order.order_number} status updated from 'pending' to 'confirmed'")
             
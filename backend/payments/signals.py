@@ -1,13 +1,32 @@
-from django.db.models.signals import post_save
+from django.db.models.signals import post_delete, post_save
 from django.dispatch import receiver
 from django.utils import timezone
 from .models import PaymentTransaction
+from .ledger import affected_order_ids, refresh_order_totals, remember
 from .services import update_invoice_status_on_order_payment, create_receipt_for_successful_payment
 import logging
 
 logger = logging.getLogger(__name__)
 
 
+@receiver(post_save, sender=PaymentTransaction)
+def update_payment_ledger(sender, instance, created, **kwargs):
+    """
+    Keep the order's stored paid/outstanding totals in step with its transactions.
+    Connected before handle_payment_transaction_update, which reads them; errors
+    propagate so the transaction save rolls back with the totals.
+    """
+    order_ids = affected_order_ids(instance)
+    if order_ids:
+        refresh_order_totals(order_ids)
+    remember(instance)
+
+
+@receiver(post_delete, sender=PaymentTransaction)
+def remove_from_payment_ledger(sender, instance, **kwargs):
+    refresh_order_totals(affected_order_ids(instance, deleted=True))
+
+
 @receiver(post_save, sender=PaymentTransaction)
 def handle_payment_transaction_update(sender, instance, created, **kwargs):
     """
@@ -1,27 +1,30 @@
 from celery import shared_task
+from tanna_backend.celery import InstrumentedTask
 from django.utils import timezone
-from django.core.management import call_command
 import logging
 
 logger = logging.getLogger(__name__)
 
 
-@shared_task
+@shared_task(base=InstrumentedTask)
 def check_expired_payments():
     """
     Celery task to check for expired payments and update their status
-    This task runs every 5 minutes to check for expired payments
+    This task runs every 5 minutes to check for expired payments.
+    Overlapping runs are skipped via the reconciler's lease.
     """
     try:
+        from .reconciliation import PaymentReconciler
+        
         logger.info("Starting automatic payment status check...")
         
-        # Call the management command
-        call_command('check_expired_payments')
+        metrics = PaymentReconciler().run()
         
         logger.info("Payment status check completed successfully")
         return {
             'success': True,
-            'message': 'Payment status check completed'
+            'message': 'Payment status check completed',
+            'metrics': metrics
         }
         
     except Exception as e:
@@ -32,22 +35,24 @@ def check_expired_payments():
         }
 
 
-@shared_task
+@shared_task(base=InstrumentedTask)
 def force_check_all_payments():
     """
     Celery task to force check all pending payments regardless of expiration time
     This can be used for manual intervention or system recovery
     """
     try:
+        from .reconciliation import PaymentReconciler
+        
         logger.info("Starting forced payment status check...")
         
-        # Call the management command with force flag
-        call_command('check_expired_payments', force=True)
+        metrics = PaymentReconciler(force=True).run()
         
         logger.info("Forced payment status check completed successfully")
         return {
             'success': True,
-            'message': 'Forced payment status check completed'
+            'message': 'Forced payment status check completed',
+            'metrics': metrics
         }
         
     except Exception as e:
@@ -58,14 +63,38 @@ def force_check_all_payments():
         }
 
 
-@shared_task
+@shared_task(base=InstrumentedTask)
+def process_webhook_events(tx_ref=None):
+    """
+    Celery task to apply queued Flutterwave webhook deliveries in order per tx_ref.
+    Enqueued on ingestion for the delivery's tx_ref and run periodically as a sweep
+    for retries and deliveries whose enqueue failed.
+    """
+    try:
+        from .webhooks import WebhookConsumer
+        
+        metrics = WebhookConsumer().run(tx_ref=tx_ref)
+        return {
+            'success': True,
+            'metrics': metrics
+        }
+        
+    except Exception as e:
+        logger.error(f"Error in webhook processing task: {e}")
+        return {
+            'success': False,
+            'error': str(e)
+        }
+
+
+@shared_task(base=InstrumentedTask)
 def cleanup_old_payment_webhooks():
     """
     Celery task to cleanup old webhook data
     This task runs daily to remove webhook data older than 30 days
     """
     try:
-        from .models import PaymentWebhook
+        from .models import PaymentWebhook, PaymentWebhookEvent
         from datetime import timedelta
         
         # Delete webhooks older than 30 days
@@ -74,6 +103,11 @@ def cleanup_old_payment_webhooks():
             received_at__lt=cutoff_date
         ).delete()[0]
         
+        # Processed queue entries too; failed and dead-lettered ones are kept for replay
+        deleted_count += PaymentWebhookEvent.objects.filter(
+            status='processed', received_at__lt=cutoff_date
+        ).delete()[0]
+        
         logger.info(f"Cleaned up {deleted_count} old payment webhooks")
         return {
             'success': True,
@@ -89,7 +123,7 @@ def cleanup_old_payment_webhooks():
         }
 
 
-@shared_task
+@shared_task(base=InstrumentedTask)
 def verify_payment_status(transaction_id):
     """
     Celery task to verify a specific payment status
@@ -97,7 +131,7 @@ def verify_payment_status(transaction_id):
     """
     try:
         from .models import PaymentTransaction
-        from .services import FlutterwaveService
+        from .services import get_flutterwave_service
         
         # Get the transaction
         try:
@@ -118,7 +152,7 @@ def verify_payment_status(transaction_id):
             }
         
         # Verify with Flutterwave
-        flutterwave_service = FlutterwaveService()
+        flutterwave_service = get_flutterwave_service()
         
         if transaction.flutterwave_reference:
             verification_result = flutterwave_service.verify_payment(transaction.flutterwave_reference)
@@ -166,4 +200,32 @@ def verify_payment_status(transaction_id):
         return {
             'success': False,
             'error': str(e)
-        } 
\ No newline at end of file
+        } 
+
+
+@shared_task(base=InstrumentedTask)
+def prerender_payment_receipt_pdf(receipt_id):
+    """
+    Celery task to render a payment receipt PDF into the document store ahead of its download
+    Queued when a receipt is issued.
+    """
+    try:
+        from .models import PaymentReceipt
+        from utils.document_store import get_document
+
+        receipt = PaymentReceipt.objects.filter(pk=receipt_id).first()
+        if receipt is None:
+            return {'success': False, 'error': f'Payment receipt {receipt_id} not found'}
+
+        document = get_document('payment_receipt', receipt)
+        return {
+            'success': True,
+            'digest': document.digest
+        }
+
+    except Exception as e:
+        logger.error(f"Error pre-rendering payment receipt {receipt_id} PDF: {e}")
+        return {
+            'success': False,
+            'error': str(e)
+        }
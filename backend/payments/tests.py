@@ -1,3 +1,148 @@
-from django.test import TestCase
+import asyncio
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+
+from .models import PaymentRefund, PaymentTransaction
+from .provider_calls import Call, Headers, provider_flow
+from .reconciliation import PaymentReconciler
+from .views import payment_stats
+
+
+class StatsQueryCountTests(TestCase):
+    """
+    Transactions and refunds are each scanned once
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        customer = get_user_model().objects.create_user(username='payer', email='payer@example.com', password='x')
+        transactions = [
+            PaymentTransaction.objects.create(
+                transaction_type='order', amount=Decimal(amount), fee=Decimal(fee), status=transaction_status,
+                customer=customer, customer_email='payer@example.com', customer_name='Payer',
+            )
+            for transaction_status, amount, fee in [
+                ('successful', '100.00', '2.00'),
+                ('paid', '50.00', '1.00'),
+                ('failed', '20.00', '0'),
+                ('pending', '30.00', '0'),
+            ]
+        ]
+        PaymentRefund.objects.create(original_transaction=transactions[0], amount=Decimal('15.00'), reason='Damaged')
+
+    def test_payment_stats(self):
+        with self.assertNumQueries(2):
+            stats = payment_stats()
+        self.assertEqual(
+            (stats['total_transactions'], stats['successful_transactions'],
+             stats['failed_transactions'], stats['pending_transactions']),
+            (4, 2, 1, 1),
+        )
+        self.assertEqual(stats['total_amount'], Decimal('200.00'))
+        self.assertEqual(stats['total_fees'], Decimal('3.00'))
+        self.assertEqual(stats['net_amount'], Decimal('197.00'))
+        self.assertEqual((stats['refunds_count'], stats['refunds_amount']), (1, Decimal('15.00')))
+
+
+class FakeResponse:
+    def __init__(self, url):
+        self.url = url
+
+
+class FakeSession:
+    def request(self, method, url, **kwargs):
+        if url.endswith('/down'):
+            raise ConnectionError('provider unreachable')
+        return FakeResponse(url)
+
+
+class FakeAsyncClient:
+    async def request(self, method, url, **kwargs):
+        return FakeSession().request(method, url, **kwargs)
+
+
+class FakeService:
+    session = FakeSession()
+
+    def _get_headers(self, **kwargs):
+        return {'Authorization': 'Bearer test'}
+
+    @provider_flow
+    def fetch(self, path):
+        try:
+            headers = yield Headers(include_idempotency=False)
+            response = yield Call.get(f'https://provider/{path}', headers=headers, timeout=30)
+            return {'success': True, 'url': response.url}
+        except Exception as e:
+            return {'success': False, 'error': str(e)}
+
+    @provider_flow
+    def fetch_both(self, first, second):
+        return [(yield from self.fetch.steps(first)), (yield from self.fetch.steps(second))]
+
+
+class ProviderFlowTests(SimpleTestCase):
+    """
+    A provider flow gives the same result run blocking or awaited, and
+    transport errors reach the flow's own error handling
+    """
+
+    expected = [
+        {'success': True, 'url': 'https://provider/banks'},
+        {'success': False, 'error': 'provider unreachable'},
+    ]
+
+    def test_sync(self):
+        self.assertEqual(FakeService().fetch_both('banks', 'down'), self.expected)
+
+    def test_async(self):
+        with mock.patch('payments.async_http.get_async_http_client', return_value=FakeAsyncClient()):
+            result = asyncio.run(FakeService().fetch_both.arun('banks', 'down'))
+        self.assertEqual(result, self.expected)
+
+
+class FakeVerifier:
+    def verify_payment(self, reference):
+        return {'success': True, 'verified': reference.startswith('paid')}
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class ReconciliationTests(TestCase):
+    """
+    Verified results are applied row by row: a failing post_save receiver
+    costs its own payment only
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        customer = get_user_model().objects.create_user(username='sweep', email='sweep@example.com', password='x')
+        for reference in ['paid-1', 'paid-2', 'unpaid-1']:
+            PaymentTransaction.objects.create(
+                transaction_type='order', amount=Decimal('10.00'), flutterwave_reference=reference,
+                expired_at=timezone.now() - timedelta(minutes=5),
+                customer=customer, customer_email='sweep@example.com', customer_name='Sweep',
+            )
+
+    def test_receiver_error_is_isolated(self):
+        failures = iter([RuntimeError('receiver failed')])
+
+        def affected_order_ids(payment, deleted=False):
+            error = next(failures, None)
+            if error is not None:
+                raise error
+            return set()
+
+        with mock.patch('payments.services.get_flutterwave_service', return_value=FakeVerifier()), \
+                mock.patch('payments.signals.affected_order_ids', side_effect=affected_order_ids):
+            metrics = PaymentReconciler(batch_size=10).run()
+
+        self.assertEqual((metrics['claimed'], metrics['paid'], metrics['expired'], metrics['errors']), (3, 1, 1, 1))
+        statuses = dict(PaymentTransaction.objects.values_list('flutterwave_reference', 'status'))
+        self.assertEqual(sorted(statuses.values()), ['expired', 'pending', 'successful'])
+        self.assertEqual(statuses['unpaid-1'], 'expired')
@@ -1,3 +1,4 @@
+from django.conf import settings
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 from . import views
@@ -28,6 +29,21 @@ router.register(r'payment_receipts', views.PaymentReceiptViewSet, basename='paym
 # Flutterwave utilities
 router.register(r'flutterwave', views.FlutterwaveUtilityViewSet, basename='flutterwave')
 
-urlpatterns = [
+urlpatterns = []
+
+# Provider-bound endpoints served by async views, ahead of the router actions
+if settings.PAYMENTS_ASYNC_VIEWS:
+    from . import async_views
+
+    urlpatterns += [
+        path('transactions/initiate_payment/', async_views.initiate_payment),
+        path('transactions/<int:pk>/verify_payment/', async_views.verify_payment),
+        path('flutterwave/banks/', async_views.banks),
+        path('flutterwave/validate_bank_account/', async_views.validate_bank_account),
+        path('flutterwave/complete_mobile_money_payment/', async_views.complete_mobile_money_payment),
+        path('flutterwave/complete_card_payment/', async_views.complete_card_payment),
+    ]
+
+urlpatterns += [
     path('', include(router.urls)),
-] 
\ No newline at end of file
+]
@@ -22,8 +22,28 @@ from .serializers import (
     PaymentInitiateSerializer, PaymentVerifySerializer, PaymentWebhookSerializer,
     BankAccountValidationSerializer, PaymentStatsSerializer, PaymentReceiptSerializer
 )
-from .services import FlutterwaveService
+from .services import get_flutterwave_service, verify_webhook_signature
+from .webhooks import ingest_webhook
 from users.authentication import FirebaseAuthentication
+from utils.stats import cached_stats
+
+
+def payment_stats():
+    """Transaction and refund totals in one scan of each table"""
+    stats = PaymentTransaction.objects.aggregate(
+        total_transactions=Count('id'),
+        successful_transactions=Count('id', filter=Q(status__in=['successful', 'paid'])),
+        failed_transactions=Count('id', filter=Q(status='failed')),
+        pending_transactions=Count('id', filter=Q(status='pending')),
+        total_amount=Sum('amount'),
+        total_fees=Sum('fee'),
+        net_amount=Sum('net_amount'),
+    )
+    stats.update(PaymentRefund.objects.aggregate(
+        refunds_count=Count('id'),
+        refunds_amount=Sum('amount'),
+    ))
+    return {name: value or 0 for name, value in stats.items()}
 
 
 class PaymentMethodViewSet(viewsets.ModelViewSet):
@@ -59,6 +79,27 @@ class PaymentMethodViewSet(viewsets.ModelViewSet):
         return Response(serializer.data)
 
 
+def transactions_visible_to(user):
+    """
+    Payment transactions a user may see: their own for customers, those of
+    the orders they deliver for drivers, all for admins
+    """
+    if not user.is_authenticated:
+        return PaymentTransaction.objects.none()
+        
+    if user.is_customer:
+        return PaymentTransaction.objects.filter(customer=user)
+    elif user.is_driver:
+        return PaymentTransaction.objects.filter(
+            Q(order__delivery_person=user) | 
+            Q(invoice__order__delivery_person=user)
+        )
+    elif user.is_admin_user:
+        return PaymentTransaction.objects.all()
+    else:
+        return PaymentTransaction.objects.none()
+
+
 class PaymentTransactionViewSet(viewsets.ModelViewSet):
     """
     ViewSet for payment transactions
@@ -85,21 +126,7 @@ class PaymentTransactionViewSet(viewsets.ModelViewSet):
         if getattr(self, 'swagger_fake_view', False):
             return PaymentTransaction.objects.none()
             
-        user = self.request.user
-        if not user.is_authenticated:
-            return PaymentTransaction.objects.none()
-            
-        if user.is_customer:
-            return PaymentTransaction.objects.filter(customer=user)
-        elif user.is_driver:
-            return PaymentTransaction.objects.filter(
-                Q(order__delivery_person=user) | 
-                Q(invoice__order__delivery_person=user)
-            )
-        elif user.is_admin_user:
-            return PaymentTransaction.objects.all()
-        else:
-            return PaymentTransaction.objects.none()
+        return transactions_visible_to(self.request.user)
     
     @swagger_auto_schema(tags=['payments'])
     def list(self, request, *args, **kwargs):
@@ -134,11 +161,11 @@ class PaymentTransactionViewSet(viewsets.ModelViewSet):
         """Initiate a new payment"""
         import logging
         logger = logging.getLogger(__name__)
-        logger.info(f"DEBUG: Received payment data: {request.data}")
+        # Field names only: the body can carry card and account details
+        logger.debug("Payment initiation with fields %s", sorted(request.data))
         
         serializer = PaymentInitiateSerializer(data=request.data)
         if serializer.is_valid():
-            logger.info(f"DEBUG: Serializer is valid, validated data: {serializer.validated_data}")
             try:
                 # Create transaction
                 amount = serializer.validated_data['amount']
@@ -231,7 +258,7 @@ class PaymentTransactionViewSet(viewsets.ModelViewSet):
                 transaction = PaymentTransaction.objects.create(**transaction_data)
                 
                 # Create payment link with Flutterwave
-                flutterwave_service = FlutterwaveService()
+                flutterwave_service = get_flutterwave_service()
                 
                 result = flutterwave_service.create_payment_link(transaction)
                 
@@ -267,7 +294,7 @@ class PaymentTransactionViewSet(viewsets.ModelViewSet):
         transaction = self.get_object()
         
         try:
-            flutterwave_service = FlutterwaveService()
+            flutterwave_service = get_flutterwave_service()
             result = flutterwave_service.verify_payment(transaction.flutterwave_reference)
             
             if result['success'] and result['verified']:
@@ -292,6 +319,30 @@ class PaymentTransactionViewSet(viewsets.ModelViewSet):
                 'error': str(e)
             }, status=status.HTTP_400_BAD_REQUEST)
     
+    @swagger_auto_schema(
+        tags=['payments'],
+        operation_description="Stream payment transactions as CSV, NDJSON or Parquet filtered by date range, status and customer (Admin only)"
+    )
+    @action(detail=False, methods=['get'])
+    def export(self, request):
+        """Stream payment transactions (export_format=csv|ndjson|parquet)"""
+        from utils.exports import ExportError, apply_export_filters, export_response
+        from .exports import PAYMENT_EXPORT_COLUMNS
+        
+        if not request.user.is_staff:
+            return Response(
+                {'error': 'Admin permissions required'},
+                status=status.HTTP_403_FORBIDDEN
+            )
+        
+        try:
+            queryset = apply_export_filters(self.get_queryset(), request.query_params)
+            return export_response(
+                'payments', queryset, PAYMENT_EXPORT_COLUMNS, request.query_params.get('export_format', 'csv')
+            )
+        except ExportError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    
     @swagger_auto_schema(
         tags=['payments'],
         operation_description="Get user's payment transactions"
@@ -316,32 +367,7 @@ class PaymentTransactionViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_401_UNAUTHORIZED
             )
         
-        # Get transaction counts
-        total_transactions = PaymentTransaction.objects.count()
-        successful_transactions = PaymentTransaction.objects.filter(status__in=['successful', 'paid']).count()
-        failed_transactions = PaymentTransaction.objects.filter(status='failed').count()
-        pending_transactions = PaymentTransaction.objects.filter(status='pending').count()
-        
-        # Get amounts
-        total_amount = PaymentTransaction.objects.aggregate(total=Sum('amount'))['total'] or 0
-        total_fees = PaymentTransaction.objects.aggregate(total=Sum('fee'))['total'] or 0
-        net_amount = PaymentTransaction.objects.aggregate(total=Sum('net_amount'))['total'] or 0
-        
-        # Get refunds
-        refunds_count = PaymentRefund.objects.count()
-        refunds_amount = PaymentRefund.objects.aggregate(total=Sum('amount'))['total'] or 0
-        
-        stats = {
-            'total_transactions': total_transactions,
-            'successful_transactions': successful_transactions,
-            'failed_transactions': failed_transactions,
-            'pending_transactions': pending_transactions,
-            'total_amount': total_amount,
-            'total_fees': total_fees,
-            'net_amount': net_amount,
-            'refunds_count': refunds_count,
-            'refunds_amount': refunds_amount,
-        }
+        stats = cached_stats('payments', payment_stats)
         
         serializer = PaymentStatsSerializer(stats)
         return Response(serializer.data)
@@ -497,7 +523,7 @@ class PaymentTransactionViewSet(viewsets.ModelViewSet):
     def auth_status(self, request):
         """Check Flutterwave authentication status"""
         try:
-            from .services import FlutterwaveService
+            from .services import get_flutterwave_service
             
             # Check if user has admin permissions
             if not request.user.is_staff:
@@ -507,7 +533,7 @@ class PaymentTransactionViewSet(viewsets.ModelViewSet):
                 )
             
             # Initialize service to check auth status
-            flutterwave_service = FlutterwaveService()
+            flutterwave_service = get_flutterwave_service()
             auth_info = flutterwave_service.auth_manager.get_token_info()
             
             return Response({
@@ -521,13 +547,33 @@ class PaymentTransactionViewSet(viewsets.ModelViewSet):
                 'environment': flutterwave_service.environment,
                 'base_url': flutterwave_service.base_url
             })
-            
+
         except Exception as e:
             return Response({
                 'success': False,
                 'error': str(e)
             }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
+    @swagger_auto_schema(
+        tags=['payments'],
+        operation_description="Get metrics of the last pending-payment reconciliation sweep"
+    )
+    @action(detail=False, methods=['get'])
+    def reconciliation_status(self, request):
+        """Get metrics of the last reconciliation sweep (admin only)"""
+        from .reconciliation import get_last_sweep_metrics
+
+        if not request.user.is_staff:
+            return Response(
+                {'error': 'Admin permissions required'},
+                status=status.HTTP_403_FORBIDDEN
+            )
+
+        return Response({
+            'success': True,
+            'last_sweep': get_last_sweep_metrics()
+        })
+
     @swagger_auto_schema(
         tags=['payments'],
         operation_description="Test payment initiation (no auth required)"
@@ -717,23 +763,25 @@ class PaymentWebhookViewSet(viewsets.ModelViewSet):
     )
     @action(detail=False, methods=['post'], permission_classes=[permissions.AllowAny])
     def flutterwave_webhook(self, request):
-        """Process Flutterwave webhook"""
+        """Acknowledge a Flutterwave webhook; processing happens in the webhook consumer task"""
         try:
             # Get webhook data
             webhook_data = request.data
             signature = request.headers.get('verif-hash', '')
             
-            # Process webhook
-            flutterwave_service = FlutterwaveService()
-            result = flutterwave_service.process_webhook(webhook_data, signature)
-            
-            if result['success']:
-                return Response({'status': 'success'}, status=status.HTTP_200_OK)
-            else:
+            if not verify_webhook_signature(webhook_data, signature):
                 return Response({
                     'status': 'error',
-                    'message': result['error']
+                    'message': 'Invalid webhook signature'
                 }, status=status.HTTP_400_BAD_REQUEST)
+            
+            # Persist the raw delivery (deduplicated) and queue it
+            event, created = ingest_webhook(webhook_data)
+            
+            return Response({
+                'status': 'success',
+                'duplicate': not created
+            }, status=status.HTTP_200_OK)
                 
         except Exception as e:
             return Response({
@@ -783,7 +831,7 @@ class PaymentRefundViewSet(viewsets.ModelViewSet):
                 )
                 
                 # Create refund with Flutterwave
-                flutterwave_service = FlutterwaveService()
+                flutterwave_service = get_flutterwave_service()
                 result = flutterwave_service.create_refund(
                     transaction,
                     serializer.validated_data['amount'],
@@ -861,176 +909,10 @@ class PaymentReceiptViewSet(viewsets.ReadOnlyModelViewSet):
     @action(detail=True, methods=['get'])
     def download_pdf(self, request, pk=None):
         """Download payment receipt as PDF with branding"""
-        from io import BytesIO
-        from reportlab.lib.pagesizes import A4
-        from reportlab.pdfgen import canvas
-        from reportlab.lib import colors
-        from django.conf import settings
+        from utils.document_store import document_response, get_document
         receipt = self.get_object()
-
-        buffer = BytesIO()
-        p = canvas.Canvas(buffer, pagesize=A4)
-        width, height = A4
-
-        # Company branding settings (needed for watermark and header)
-        company = getattr(settings, 'SITE_NAME', 'Company')
-        address = getattr(settings, 'SITE_ADDRESS', '')
-        email = getattr(settings, 'SITE_EMAIL', '')
-        phone = getattr(settings, 'SITE_PHONE', '')
-        logo_url = getattr(settings, 'SITE_LOGO_URL', '')
-        logo_path = getattr(settings, 'SITE_LOGO_PATH', '')
-
-        # Watermark (draw first so other content sits on top)
-        wm_drawn = False
-        try:
-            from reportlab.lib.utils import ImageReader
-            wm_src = None
-            if logo_path:
-                wm_src = ImageReader(logo_path)
-            elif logo_url:
-                wm_src = ImageReader(logo_url)
-            if wm_src:
-                p.saveState()
-                # Transparency (if supported)
-                try:
-                    p.setFillAlpha(0.08)
-                except Exception:
-                    pass
-                # Scale watermark to ~50% page width preserving aspect ratio
-                iw, ih = wm_src.getSize()
-                wm_w_target = width * 0.5
-                scale = wm_w_target / float(iw)
-                wm_h_target = ih * scale
-                # Draw centered
-                p.drawImage(wm_src, (width - wm_w_target) / 2, (height - wm_h_target) / 2,
-                            width=wm_w_target, height=wm_h_target,
-                            preserveAspectRatio=True, mask='auto')
-                p.restoreState()
-                wm_drawn = True
-        except Exception:
-            pass
-
-        # Header band
-        p.setFillColorRGB(0.95, 0.95, 0.95)
-        p.rect(0, height - 90, width, 90, stroke=0, fill=1)
-        p.setFillColor(colors.black)
-
-        y = height - 35
-        # Try to draw logo if configured (scaled nicely)
-        def _draw_header_logo(img_src):
-            try:
-                iw, ih = img_src.getSize()
-                target_w, target_h = 110.0, 50.0
-                scale = min(target_w / float(iw), target_h / float(ih))
-                draw_w, draw_h = iw * scale, ih * scale
-                p.drawImage(img_src, 40, height - 80, width=draw_w, height=draw_h,
-                            preserveAspectRatio=True, mask='auto')
-            except Exception:
-                pass
-
-        if logo_path or logo_url:
-            try:
-                from reportlab.lib.utils import ImageReader
-                img_src = ImageReader(logo_path) if logo_path else ImageReader(logo_url)
-                _draw_header_logo(img_src)
-            except Exception:
-                pass
-
-        p.setFont('Helvetica-Bold', 18)
-        p.drawString(150, y, company)
-        p.setFont('Helvetica', 9)
-        y -= 14
-        if address:
-            p.drawString(150, y, address)
-            y -= 12
-        if email or phone:
-            p.drawString(150, y, f"{email}{'  |  ' if email and phone else ''}{phone}")
-
-        # Receipt title and meta
-        p.setFont('Helvetica-Bold', 16)
-        p.drawRightString(width - 40, height - 35, 'Payment Receipt')
-        p.setFont('Helvetica', 10)
-        p.drawRightString(width - 40, height - 50, f"Receipt #: {receipt.receipt_number}")
-        p.drawRightString(width - 40, height - 64, f"Date: {receipt.created_at.strftime('%Y-%m-%d %H:%M')}")
-
-        # Horizontal divider
-        p.setStrokeColorRGB(0.85, 0.85, 0.85)
-        p.setLineWidth(1)
-        p.line(40, height - 100, width - 40, height - 100)
-
-        # Bill to
-        y = height - 130
-        p.setFont('Helvetica-Bold', 12)
-        p.drawString(40, y, 'Bill To')
-        p.setFont('Helvetica', 10)
-        y -= 16
-        p.drawString(40, y, f"{receipt.customer_name}")
-        y -= 14
-        p.drawString(40, y, f"{receipt.customer_email}")
-        if receipt.customer_phone:
-            y -= 14
-            p.drawString(40, y, f"{receipt.customer_phone}")
-
-        # Payment details box
-        y -= 28
-        p.setFont('Helvetica-Bold', 12)
-        p.drawString(40, y, 'Payment Details')
-        y -= 18
-        p.setFont('Helvetica', 10)
-        p.drawString(50, y, f"Amount Paid:")
-        p.setFont('Helvetica-Bold', 12)
-        p.drawString(150, y, f"{receipt.amount} {receipt.currency}")
-        p.setFont('Helvetica', 10)
-        y -= 16
-        if receipt.payment_method_name:
-            p.drawString(50, y, f"Payment Method: {receipt.payment_method_name}")
-            y -= 14
-        if receipt.payment_type:
-            p.drawString(50, y, f"Payment Type: {receipt.payment_type}")
-            y -= 14
-        if receipt.paid_at:
-            p.drawString(50, y, f"Paid At: {receipt.paid_at.strftime('%Y-%m-%d %H:%M')}")
-            y -= 14
-        if receipt.order_id:
-            p.drawString(50, y, f"Order ID: {receipt.order_id}")
-            y -= 14
-        if receipt.invoice_id:
-            p.drawString(50, y, f"Invoice ID: {receipt.invoice_id}")
-            y -= 14
-        if receipt.event_id:
-            p.drawString(50, y, f"Event ID: {receipt.event_id}")
-            y -= 14
-
-        # Notes
-        if receipt.notes:
-            y -= 12
-            p.setFont('Helvetica-Bold', 12)
-            p.drawString(40, y, 'Notes')
-            y -= 16
-            p.setFont('Helvetica', 10)
-            for line in str(receipt.notes).split('\n'):
-                p.drawString(50, y, line[:110])
-                y -= 12
-                if y < 60:
-                    p.showPage()
-                    y = height - 60
-
-        # Footer
-        if y < 80:
-            p.showPage()
-            y = height - 60
-        p.setStrokeColorRGB(0.9, 0.9, 0.9)
-        p.line(40, 60, width - 40, 60)
-        p.setFont('Helvetica', 9)
-        p.setFillColor(colors.grey)
-        p.drawCentredString(width / 2, 45, f"Thank you for your business • {company}")
-
-        p.save()
-        buffer.seek(0)
-        from django.http import HttpResponse
-        response = HttpResponse(buffer.getvalue(), content_type='application/pdf')
-        response['Content-Disposition'] = f'attachment; filename="{receipt.receipt_number}.pdf"'
-        return response
+        document = get_document('payment_receipt', receipt)
+        return document_response(request, document, f"{receipt.receipt_number}.pdf")
 
     @swagger_auto_schema(
         tags=['payments'],
@@ -1157,7 +1039,7 @@ class FlutterwaveUtilityViewSet(viewsets.ViewSet):
         country = request.query_params.get('country', 'NG')
         
         try:
-            flutterwave_service = FlutterwaveService()
+            flutterwave_service = get_flutterwave_service()
             result = flutterwave_service.get_banks(country)
             
             if result['success']:
@@ -1187,7 +1069,7 @@ class FlutterwaveUtilityViewSet(viewsets.ViewSet):
         serializer = BankAccountValidationSerializer(data=request.data)
         if serializer.is_valid():
             try:
-                flutterwave_service = FlutterwaveService()
+                flutterwave_service = get_flutterwave_service()
                 result = flutterwave_service.validate_bank_account(
                     serializer.validated_data['account_number'],
                     serializer.validated_data['account_bank']
@@ -0,0 +1,237 @@
+"""
+Asynchronous Flutterwave webhook ingestion
+
+The webhook endpoint only verifies the signature, stores the raw delivery in
+PaymentWebhookEvent under a dedup key and returns 200, so provider bursts never
+tie up request threads and retried deliveries are absorbed as duplicates.
+
+WebhookConsumer (run by the process_webhook_events Celery task) then:
+1. Picks the tx_refs with due events, oldest first, in batches
+2. Holds a cache lease per tx_ref so only one worker handles a tx_ref at a time
+3. Applies that tx_ref's events strictly in arrival order; a failing event
+   blocks the later ones until it succeeds or is dead-lettered
+4. Retries failures with exponential backoff and moves events that exhaust
+   their attempts to the dead letter status, from where they can be replayed
+"""
+
+import hashlib
+import json
+import logging
+import time
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction as db_transaction
+from django.db.models import Min
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+
+def dedup_key_for(webhook_data):
+    """
+    Identity of a provider event: event type, provider id, status and tx_ref when
+    present, otherwise the canonical payload itself
+    """
+    data = webhook_data.get('data') or {}
+    if data.get('id'):
+        identity = '|'.join(str(part) for part in (
+            webhook_data.get('event', ''), data.get('id'), data.get('status', ''), data.get('tx_ref', '')
+        ))
+    else:
+        identity = json.dumps(webhook_data, sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.sha256(identity.encode('utf-8')).hexdigest()
+
+
+def ingest_webhook(webhook_data):
+    """
+    Persist a verified delivery and schedule its processing.
+    Returns (event, created); duplicates return the existing event with created=False.
+    """
+    from .models import PaymentWebhookEvent
+
+    data = webhook_data.get('data') or {}
+    # get_or_create absorbs the IntegrityError of a concurrent duplicate delivery
+    event, created = PaymentWebhookEvent.objects.get_or_create(
+        dedup_key=dedup_key_for(webhook_data),
+        defaults={
+            'tx_ref': str(data.get('tx_ref') or '')[:100],
+            'event_type': str(webhook_data.get('event') or '')[:50],
+            'payload': webhook_data,
+        }
+    )
+
+    if created:
+        db_transaction.on_commit(lambda: enqueue_processing(event.tx_ref))
+    return event, created
+
+
+def enqueue_processing(tx_ref=None):
+    """
+    Kick the consumer; if the broker is unavailable the periodic sweep picks the event up
+    """
+    try:
+        from .tasks import process_webhook_events
+        process_webhook_events.delay(tx_ref)
+    except Exception as e:
+        logger.warning(f"Could not enqueue webhook processing for {tx_ref or 'all'}: {str(e)}")
+
+
+class WebhookConsumer:
+    """
+    Process queued PaymentWebhookEvent rows in order per tx_ref
+    """
+
+    LEASE_PREFIX = 'payments:webhooks:lease:'
+
+    def __init__(self, batch_size=None, max_attempts=None, lease_seconds=None, retry_base_seconds=None):
+        self.batch_size = batch_size or getattr(settings, 'PAYMENT_WEBHOOK_BATCH_SIZE', 100)
+        self.max_attempts = max_attempts or getattr(settings, 'PAYMENT_WEBHOOK_MAX_ATTEMPTS', 8)
+        self.lease_seconds = lease_seconds or getattr(settings, 'PAYMENT_WEBHOOK_LEASE_SECONDS', 120)
+        self.retry_base_seconds = retry_base_seconds or getattr(settings, 'PAYMENT_WEBHOOK_RETRY_BASE_SECONDS', 30)
+
+    def due_events(self):
+        from .models import PaymentWebhookEvent
+
+        return PaymentWebhookEvent.objects.filter(
+            status__in=['pending', 'failed'],
+            next_attempt_at__lte=timezone.now(),
+        )
+
+    def run(self, tx_ref=None):
+        """
+        Process one batch of tx_refs and return metrics
+        """
+        from .models import PaymentTransaction
+
+        metrics = {'tx_refs': 0, 'processed': 0, 'failed': 0, 'dead': 0, 'locked': 0, 'duration_seconds': 0.0}
+        started = time.monotonic()
+
+        due = self.due_events()
+        if tx_ref is not None:
+            due = due.filter(tx_ref=tx_ref)
+        tx_refs = list(
+            due.values('tx_ref')
+            .annotate(first_received=Min('received_at'))
+            .order_by('first_received')
+            .values_list('tx_ref', flat=True)[:self.batch_size]
+        )
+        if not tx_refs:
+            return metrics
+
+        # One query for every transaction referenced by the batch
+        transactions = PaymentTransaction.objects.select_related('order', 'invoice', 'event').in_bulk(
+            [ref for ref in tx_refs if ref], field_name='reference'
+        )
+
+        for ref in tx_refs:
+            lease_token = self._acquire_lease(ref)
+            if lease_token is None:
+                metrics['locked'] += 1
+                continue
+            try:
+                group_metrics = self._process_tx_ref(ref, transactions.get(ref))
+            finally:
+                self._release_lease(ref, lease_token)
+            metrics['tx_refs'] += 1
+            for key, value in group_metrics.items():
+                metrics[key] += value
+
+        metrics['duration_seconds'] = round(time.monotonic() - started, 3)
+        logger.info(
+            "Webhook consumer: tx_refs=%(tx_refs)s processed=%(processed)s failed=%(failed)s "
+            "dead=%(dead)s locked=%(locked)s duration=%(duration_seconds)ss",
+            metrics
+        )
+        return metrics
+
+    def _acquire_lease(self, tx_ref):
+        token = uuid.uuid4().hex
+        if cache.add(f'{self.LEASE_PREFIX}{tx_ref}', token, timeout=self.lease_seconds):
+            return token
+        return None
+
+    def _release_lease(self, tx_ref, token):
+        key = f'{self.LEASE_PREFIX}{tx_ref}'
+        if cache.get(key) == token:
+            cache.delete(key)
+
+    def _process_tx_ref(self, tx_ref, payment_transaction):
+        from .models import PaymentWebhookEvent
+
+        metrics = {'processed': 0, 'failed': 0, 'dead': 0}
+        now = timezone.now()
+        events = PaymentWebhookEvent.objects.filter(
+            tx_ref=tx_ref, status__in=['pending', 'failed']
+        ).order_by('received_at', 'id')
+
+        for event in events:
+            if event.next_attempt_at > now:
+                # An earlier event is backing off: keep later ones queued behind it
+                break
+
+            error = self._apply(event, payment_transaction)
+            if error is None:
+                event.status = 'processed'
+                event.processed_at = timezone.now()
+                event.last_error = None
+                event.save(update_fields=['status', 'processed_at', 'last_error'])
+                metrics['processed'] += 1
+                continue
+
+            event.attempts += 1
+            event.last_error = error
+            if event.attempts >= self.max_attempts:
+                event.status = 'dead'
+                event.save(update_fields=['status', 'attempts', 'last_error'])
+                logger.error(f"Webhook event {event.pk} ({tx_ref}) dead-lettered after {event.attempts} attempts: {error}")
+                metrics['dead'] += 1
+                continue
+
+            event.status = 'failed'
+            event.next_attempt_at = timezone.now() + timedelta(
+                seconds=self.retry_base_seconds * (2 ** (event.attempts - 1))
+            )
+            event.save(update_fields=['status', 'attempts', 'last_error', 'next_attempt_at'])
+            logger.warning(f"Webhook event {event.pk} ({tx_ref}) failed, attempt {event.attempts}: {error}")
+            metrics['failed'] += 1
+            break
+
+        return metrics
+
+    def _apply(self, event, payment_transaction):
+        """
+        Apply one event; returns None on success or an error message
+        """
+        from .services import get_flutterwave_service
+
+        if not event.tx_ref:
+            return 'No transaction reference found'
+        if payment_transaction is None:
+            return f'Transaction not found: {event.tx_ref}'
+
+        try:
+            with db_transaction.atomic():
+                result = get_flutterwave_service().apply_webhook_event(
+                    payment_transaction, event.payload, f'WEBHOOK-EVT-{event.pk}'
+                )
+        except Exception as e:
+            result = {'success': False, 'error': str(e)}
+        if not result['success']:
+            # Drop any in-memory changes the failed handler made before the next event uses it
+            payment_transaction.refresh_from_db()
+            return result.get('error', 'Unknown error')
+        return None
+
+
+def replay_events(queryset):
+    """
+    Requeue dead-lettered or failed events for processing; returns the number requeued
+    """
+    tx_refs = set(queryset.values_list('tx_ref', flat=True))
+    count = queryset.update(status='pending', attempts=0, next_attempt_at=timezone.now(), last_error=None)
+    for tx_ref in tx_refs:
+        db_transaction.on_commit(lambda tx_ref=tx_ref: enqueue_processing(tx_ref))
+    return count
@@ -0,0 +1,315 @@
+"""
+Response cache for the public catalog endpoints
+
+Cached responses are keyed by endpoint + host + normalized query params (which
+include the page), and every key embeds the current version of the tags the
+endpoint depends on:
+
+- ``products``          any product, measurement, image or variant change
+- ``categories``        any category change
+- ``category_counts``   the number of active products in some category changed
+- ``category:<id>``     the products listed under one category changed
+
+Saves and deletes bump the affected tag versions (see products.signals), so
+stale entries are never read again and simply expire. Tag versions are
+nanosecond timestamps, which also gives every response a Last-Modified value.
+
+Carts price their lines from product snapshots (name, image, price and
+variant prices) cached per product rather than per response: checkouts
+bump the products tag on every stock change, which prices do not depend on.
+A product's snapshot is dropped when it or one of its variants is saved or
+deleted and otherwise expires after CART_PRODUCT_SNAPSHOT_TIMEOUT.
+"""
+
+import hashlib
+import json
+import logging
+import time
+from functools import wraps
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.utils.http import http_date, parse_http_date_safe, quote_etag
+from rest_framework import status
+from rest_framework.response import Response
+
+logger = logging.getLogger(__name__)
+
+TAG_PRODUCTS = 'products'
+TAG_CATEGORIES = 'categories'
+TAG_CATEGORY_COUNTS = 'category_counts'
+
+KEY_PREFIX = 'catalog'
+STATS_ENDPOINTS_KEY = f'{KEY_PREFIX}:stats:endpoints'
+
+
+def category_tag(category_id):
+    return f'category:{category_id}'
+
+
+def _timeout():
+    return getattr(settings, 'CATALOG_CACHE_TIMEOUT', 600)
+
+
+def _tag_key(tag):
+    return f'{KEY_PREFIX}:tag:{tag}'
+
+
+# Tag versions
+
+def get_tag_versions(tags):
+    """
+    Current version of each tag, initializing the ones that are missing
+    """
+    keys = {tag: _tag_key(tag) for tag in tags}
+    found = cache.get_many(keys.values())
+    versions = {}
+    for tag, key in keys.items():
+        version = found.get(key)
+        if version is None:
+            version = time.time_ns()
+            # Another worker may have initialized it in the meantime; theirs wins
+            if not cache.add(key, version, timeout=None):
+                version = cache.get(key, version)
+        versions[tag] = version
+    return versions
+
+
+def bump_tags(tags):
+    """
+    Invalidate every cached response that depends on any of the given tags
+    """
+    version = time.time_ns()
+    try:
+        cache.set_many({_tag_key(tag): version for tag in set(tags)}, timeout=None)
+    except Exception as e:
+        logger.error(f"Failed to invalidate catalog cache tags {sorted(set(tags))}: {str(e)}")
+
+
+def invalidate_on_commit(tags):
+    """
+    Bump tags once the surrounding transaction commits, so a concurrent reader
+    cannot repopulate the cache from rows that are about to change
+    """
+    tags = set(tags)
+    transaction.on_commit(lambda: bump_tags(tags))
+
+
+def invalidate_catalog():
+    """
+    Drop every cached catalog response (for bulk updates that bypass signals)
+    """
+    invalidate_on_commit([TAG_PRODUCTS, TAG_CATEGORIES, TAG_CATEGORY_COUNTS])
+
+
+# Hit/miss counters
+
+def _record(endpoint, outcome):
+    key = f'{KEY_PREFIX}:stats:{endpoint}:{outcome}'
+    try:
+        try:
+            cache.incr(key)
+        except ValueError:
+            if not cache.add(key, 1, timeout=None):
+                cache.incr(key)
+            endpoints = cache.get(STATS_ENDPOINTS_KEY) or []
+            if endpoint not in endpoints:
+                cache.set(STATS_ENDPOINTS_KEY, sorted(set(endpoints) | {endpoint}), timeout=None)
+    except Exception as e:
+        logger.debug(f"Could not record catalog cache {outcome} for {endpoint}: {str(e)}")
+
+
+def get_cache_stats():
+    """
+    Hit/miss counters per cached endpoint since the counters were last reset
+    """
+    endpoints = cache.get(STATS_ENDPOINTS_KEY) or []
+    keys = [
+        f'{KEY_PREFIX}:stats:{endpoint}:{outcome}'
+        for endpoint in endpoints for outcome in ('hit', 'miss')
+    ]
+    values = cache.get_many(keys) if keys else {}
+
+    stats = {'endpoints': {}, 'hits': 0, 'misses': 0, 'hit_ratio': 0.0}
+    for endpoint in endpoints:
+        hits = values.get(f'{KEY_PREFIX}:stats:{endpoint}:hit', 0)
+        misses = values.get(f'{KEY_PREFIX}:stats:{endpoint}:miss', 0)
+        total = hits + misses
+        stats['endpoints'][endpoint] = {
+            'hits': hits,
+            'misses': misses,
+            'hit_ratio': round(hits / total, 4) if total else 0.0,
+        }
+        stats['hits'] += hits
+        stats['misses'] += misses
+
+    total = stats['hits'] + stats['misses']
+    if total:
+        stats['hit_ratio'] = round(stats['hits'] / total, 4)
+    return stats
+
+
+def reset_cache_stats():
+    endpoints = cache.get(STATS_ENDPOINTS_KEY) or []
+    cache.delete_many(
+        [f'{KEY_PREFIX}:stats:{endpoint}:{outcome}' for endpoint in endpoints for outcome in ('hit', 'miss')]
+        + [STATS_ENDPOINTS_KEY]
+    )
+
+
+# Response caching
+
+def _normalized_query(request):
+    """
+    Query string with keys and repeated values sorted, so ?b=1&a=2 and ?a=2&b=1 share an entry
+    """
+    params = sorted(
+        (key, value)
+        for key in request.query_params.keys()
+        for value in request.query_params.getlist(key)
+    )
+    return urlencode(params)
+
+
+def _response_key(endpoint, request, versions, view_kwargs):
+    # Host is part of the key because paginated responses embed absolute next/previous links
+    raw = '|'.join([
+        request.get_host(),
+        json.dumps(view_kwargs, sort_keys=True, default=str),
+        _normalized_query(request),
+        ','.join(f'{tag}={versions[tag]}' for tag in sorted(versions)),
+    ])
+    digest = hashlib.md5(raw.encode('utf-8')).hexdigest()
+    return f'{KEY_PREFIX}:response:{endpoint}:{digest}'
+
+
+def _etag_for(data):
+    payload = json.dumps(data, cls=DjangoJSONEncoder, sort_keys=True)
+    return quote_etag(hashlib.md5(payload.encode('utf-8')).hexdigest())
+
+
+def _not_modified(request, etag, last_modified):
+    if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+    if if_none_match:
+        candidates = [value.strip() for value in if_none_match.split(',')]
+        return '*' in candidates or etag in candidates or f'W/{etag}' in candidates
+
+    if_modified_since = parse_http_date_safe(request.META.get('HTTP_IF_MODIFIED_SINCE', ''))
+    return if_modified_since is not None and last_modified <= if_modified_since
+
+
+def _finalize(request, response, etag, last_modified, outcome):
+    if _not_modified(request, etag, last_modified):
+        response = Response(status=status.HTTP_304_NOT_MODIFIED)
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+    response['X-Catalog-Cache'] = outcome.upper()
+    return response
+
+
+def cached_catalog_response(endpoint, tags):
+    """
+    Cache the successful responses of a catalog view method.
+
+    ``tags`` is either an iterable of tag names or a callable receiving the
+    view kwargs (e.g. ``pk``) and returning them. Only GET responses with
+    status 200 are stored; the cache is bypassed if it is unavailable.
+    """
+    def decorator(view_method):
+        @wraps(view_method)
+        def wrapper(self, request, *args, **kwargs):
+            if request.method != 'GET':
+                return view_method(self, request, *args, **kwargs)
+
+            endpoint_tags = tags(**kwargs) if callable(tags) else tags
+            try:
+                versions = get_tag_versions(endpoint_tags)
+                # Whole seconds: Last-Modified has no finer resolution
+                last_modified = max(versions.values()) // 1_000_000_000
+                key = _response_key(endpoint, request, versions, kwargs)
+                entry = cache.get(key)
+            except Exception as e:
+                logger.warning(f"Catalog cache unavailable for {endpoint}: {str(e)}")
+                return view_method(self, request, *args, **kwargs)
+
+            if entry is not None:
+                _record(endpoint, 'hit')
+                return _finalize(request, Response(entry['data']), entry['etag'], last_modified, 'hit')
+
+            _record(endpoint, 'miss')
+            response = view_method(self, request, *args, **kwargs)
+            if response.status_code != status.HTTP_200_OK:
+                return response
+
+            etag = _etag_for(response.data)
+            try:
+                cache.set(key, {'data': response.data, 'etag': etag}, timeout=_timeout())
+            except Exception as e:
+                logger.warning(f"Could not store catalog response for {endpoint}: {str(e)}")
+            return _finalize(request, response, etag, last_modified, 'miss')
+
+        return wrapper
+    return decorator
+
+
+# Product snapshots
+
+def _snapshot_key(product_id):
+    return f'{KEY_PREFIX}:snapshot:{product_id}'
+
+
+def product_snapshots(product_ids):
+    """
+    {product_id: {'name', 'image', 'price', 'variants': {variant_id: price}}}
+    for the given products that exist; cached snapshots are read in one round
+    trip and the missing ones loaded with two queries
+    """
+    from .models import Product, ProductVariant
+
+    keys = {_snapshot_key(product_id): product_id for product_id in set(product_ids)}
+    if not keys:
+        return {}
+    try:
+        found = cache.get_many(keys)
+    except Exception as e:
+        logger.warning("Product snapshot cache unavailable: %s", e)
+        found = {}
+    snapshots = {keys[key]: snapshot for key, snapshot in found.items()}
+
+    missing = set(keys.values()) - snapshots.keys()
+    if missing:
+        loaded = {
+            product_id: {'name': name, 'image': image or '', 'price': price, 'variants': {}}
+            for product_id, name, image, price in Product.objects.filter(pk__in=missing).values_list(
+                'pk', 'name', 'image', 'price'
+            )
+        }
+        for variant_id, product_id, price in ProductVariant.objects.filter(product_id__in=list(loaded)).values_list(
+            'pk', 'product_id', 'price'
+        ):
+            loaded[product_id]['variants'][variant_id] = price
+        try:
+            cache.set_many(
+                {_snapshot_key(product_id): snapshot for product_id, snapshot in loaded.items()},
+                timeout=getattr(settings, 'CART_PRODUCT_SNAPSHOT_TIMEOUT', 300),
+            )
+        except Exception as e:
+            logger.warning("Could not store product snapshots: %s", e)
+        snapshots.update(loaded)
+    return snapshots
+
+
+def forget_product_snapshot(product_id):
+    """
+    Drop a product's snapshot once the surrounding transaction commits
+    """
+    def forget():
+        try:
+            cache.delete(_snapshot_key(product_id))
+        except Exception as e:
+            logger.error("Failed to drop the snapshot of product %s: %s", product_id, e)
+
+    transaction.on_commit(forget)
@@ -0,0 +1,80 @@
+import statistics
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Q
+
+from products.models import Product
+from products.search import facet_counts, order_results, search_products
+
+DEFAULT_QUERIES = ['cabernet', 'single malt', 'bordeaux 2015', 'smoky', 'SYN-0042', 'cabernet sauvignnon', 'chateu laurnt']
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare the full-text/trigram product search with the legacy ILIKE search. '
+        'Seed a large catalog first: manage.py seed_demo_products --synthetic 100000'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--query', action='append', dest='queries', help='Query to run (repeatable)')
+        parser.add_argument('--repeat', type=int, default=5, help='Runs per query and engine')
+        parser.add_argument('--page-size', type=int, default=20, help='Results fetched per search')
+
+    def legacy_search(self, query, page_size):
+        # The ProductViewSet.search path before the search subsystem
+        queryset = Product.objects.filter(
+            Q(name__icontains=query) |
+            Q(description__icontains=query) |
+            Q(sku__icontains=query) |
+            Q(tags__contains=[query])
+        ).order_by('-created_at')
+        total = queryset.count()
+        ids = list(queryset.values_list('id', flat=True)[:page_size])
+        return total, ids
+
+    def ranked_search(self, query, page_size):
+        matched = search_products(Product.objects.all(), query)
+        facets = facet_counts(matched)
+        ids = list(order_results(matched, None, ranked=True).values_list('id', flat=True)[:page_size])
+        return facets['total'], ids
+
+    def time_engine(self, engine, query, repeat, page_size):
+        timings = []
+        total = 0
+        for _ in range(repeat):
+            started = time.perf_counter()
+            total, _ids = engine(query, page_size)
+            timings.append((time.perf_counter() - started) * 1000)
+        return total, statistics.median(timings)
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError('The search benchmark needs PostgreSQL')
+
+        queries = options['queries'] or DEFAULT_QUERIES
+        repeat = max(options['repeat'], 1)
+        page_size = options['page_size']
+        catalog_size = Product.objects.count()
+
+        self.stdout.write(f'Catalog: {catalog_size} products, {repeat} run(s) per query, page size {page_size}')
+        self.stdout.write('\n' + '='*50)
+        self.stdout.write(f"{'query':<24}{'legacy ms':>10}{'hits':>8}{'search ms':>11}{'hits':>8}")
+
+        legacy_times, search_times = [], []
+        for query in queries:
+            legacy_total, legacy_ms = self.time_engine(self.legacy_search, query, repeat, page_size)
+            search_total, search_ms = self.time_engine(self.ranked_search, query, repeat, page_size)
+            legacy_times.append(legacy_ms)
+            search_times.append(search_ms)
+            self.stdout.write(
+                f'{query[:23]:<24}{legacy_ms:>10.1f}{legacy_total:>8}{search_ms:>11.1f}{search_total:>8}'
+            )
+
+        self.stdout.write('='*50)
+        self.stdout.write(
+            f'Median over queries: legacy {statistics.median(legacy_times):.1f}ms, '
+            f'search (page + facets) {statistics.median(search_times):.1f}ms'
+        )
+        self.stdout.write(self.style.SUCCESS('Search benchmark complete'))
@@ -1,5 +1,6 @@
 import io
 import os
+import random
 from urllib.parse import urlparse
 
 import requests
@@ -7,6 +8,7 @@ from django.core.files.base import ContentFile
 from django.core.management.base import BaseCommand
 from django.db import transaction
 
+from products.cache import invalidate_catalog
 from products.models import Category, Product, ProductMeasurement
 
 
@@ -80,9 +82,39 @@ def download_image(url: str) -> ContentFile | None:
         return None
 
 
+SYNTHETIC_BRANDS = [
+    'Château Laurent', 'Domaine Rivière', 'Bodega Alta', 'Casa Verde', 'Glen Arden', 'Highland Cask',
+    'Old Harbor', 'Kampala Gold', 'Nile Spirit', 'Vieux Moulin', 'Stellen Ridge', 'Barossa Creek',
+]
+SYNTHETIC_STYLES = {
+    'Red Wine': ['Cabernet Sauvignon', 'Merlot', 'Pinot Noir', 'Syrah', 'Malbec', 'Tempranillo'],
+    'Champagne': ['Brut', 'Blanc de Blancs', 'Rosé', 'Extra Brut', 'Demi-Sec'],
+    'Whisky': ['Single Malt 12 Year', 'Single Malt 18 Year', 'Blended Scotch', 'Bourbon', 'Rye'],
+}
+SYNTHETIC_REGIONS = [
+    'Bordeaux', 'Burgundy', 'Champagne', 'Rioja', 'Mendoza', 'Napa Valley', 'Barossa', 'Stellenbosch',
+    'Speyside', 'Islay', 'Kentucky', 'Highlands',
+]
+SYNTHETIC_TAGS = ['oak', 'dry', 'fruity', 'smoky', 'spicy', 'vanilla', 'citrus', 'gift', 'organic', 'limited']
+
+
 class Command(BaseCommand):
     help = "Seed demo categories and products used by the web frontend"
 
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--synthetic',
+            type=int,
+            default=0,
+            help='Also create this many synthetic products (SKU SYN-*) for search/load benchmarks, e.g. 100000',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=2000,
+            help='Rows per bulk insert when creating synthetic products',
+        )
+
     @transaction.atomic
     def handle(self, *args, **options):
         self.stdout.write(self.style.NOTICE('Seeding demo products...'))
@@ -143,3 +175,38 @@ class Command(BaseCommand):
 
         self.stdout.write(self.style.SUCCESS(f'Seed complete. Created: {created}, Updated: {updated}'))
 
+        if options['synthetic'] > 0:
+            self.seed_synthetic(name_to_category, options['synthetic'], max(options['batch_size'], 1))
+
+    def seed_synthetic(self, name_to_category, count, batch_size):
+        """Bulk-create deterministic synthetic products; re-running skips SKUs that already exist"""
+        rng = random.Random(42)
+        categories = list(name_to_category.items())
+        for start in range(0, count, batch_size):
+            batch = []
+            for i in range(start, min(start + batch_size, count)):
+                category_name, category = categories[i % len(categories)]
+                brand = rng.choice(SYNTHETIC_BRANDS)
+                style = rng.choice(SYNTHETIC_STYLES.get(category_name, ['Reserve']))
+                region = rng.choice(SYNTHETIC_REGIONS)
+                vintage = str(rng.randint(1990, 2022)) if category_name != 'Whisky' else ''
+                price = round(rng.uniform(8, 900), 2)
+                batch.append(Product(
+                    name=f'{brand} {style} {vintage}'.strip(),
+                    sku=f'SYN-{i:07d}',
+                    category=category,
+                    description=f'{style} from {region} by {brand}. Notes of {", ".join(rng.sample(SYNTHETIC_TAGS, 2))}.',
+                    region=region,
+                    vintage=vintage or None,
+                    price=price,
+                    stock=rng.randint(0, 200),
+                    tags=rng.sample(SYNTHETIC_TAGS, 3),
+                    status='active',
+                ))
+            Product.objects.bulk_create(batch, ignore_conflicts=True)
+            self.stdout.write(f'  {min(start + batch_size, count)}/{count} synthetic products...')
+
+        # bulk_create skips the catalog cache signals
+        invalidate_catalog()
+        self.stdout.write(self.style.SUCCESS(f'Synthetic products seeded: {count}'))
+
@@ -0,0 +1,36 @@
+# Generated by Django 4.2.7 on 2026-10-17 09:10
+
+from decimal import Decimal, ROUND_HALF_UP
+
+from django.db import migrations, models
+from django.db.models import Count, Sum
+
+
+def backfill_rating_sum(apps, schema_editor):
+    Product = apps.get_model('products', 'Product')
+    Review = apps.get_model('orders', 'Review')
+
+    totals = Review.objects.order_by().values('product_id').annotate(total=Sum('rating'), count=Count('id'))
+    for row in totals.iterator():
+        Product.objects.filter(pk=row['product_id']).update(
+            rating_sum=row['total'],
+            review_count=row['count'],
+            average_rating=(Decimal(row['total']) / row['count']).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP),
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0006_change_quantity_to_charfield'),
+        ('orders', '0009_order_customer_driver_created_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='rating_sum',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_rating_sum, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,93 @@
+# Generated by Django 4.2.7 on 2026-10-17 10:05
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations
+
+
+SEARCH_VECTOR_FUNCTION = """
+CREATE OR REPLACE FUNCTION products_search_vector_update() RETURNS trigger AS $$
+BEGIN
+    NEW.search_vector :=
+        setweight(to_tsvector('english', coalesce(NEW.name, '')), 'A') ||
+        setweight(to_tsvector('english', coalesce(NEW.sku, '') || ' ' || coalesce((
+            SELECT string_agg(tag, ' ')
+            FROM jsonb_array_elements_text(
+                CASE WHEN jsonb_typeof(NEW.tags) = 'array' THEN NEW.tags ELSE '[]'::jsonb END
+            ) AS tag
+        ), '')), 'B') ||
+        setweight(to_tsvector('english', coalesce(NEW.description, '')), 'C');
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER products_search_vector_trigger
+    BEFORE INSERT OR UPDATE OF name, sku, tags, description ON products
+    FOR EACH ROW EXECUTE FUNCTION products_search_vector_update();
+
+-- Fire the trigger once for existing rows
+UPDATE products SET name = name;
+"""
+
+DROP_SEARCH_VECTOR_FUNCTION = """
+DROP TRIGGER IF EXISTS products_search_vector_trigger ON products;
+DROP FUNCTION IF EXISTS products_search_vector_update();
+"""
+
+SEARCH_INDEXES = [
+    django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='products_search_vector_idx'),
+    django.contrib.postgres.indexes.GinIndex(fields=['name'], name='products_name_trgm_idx', opclasses=['gin_trgm_ops']),
+]
+
+
+# Full-text search is PostgreSQL only: other backends (sqlite in CI) get the
+# column but neither the trigger nor the GIN indexes
+
+def create_search_trigger(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(SEARCH_VECTOR_FUNCTION)
+
+
+def drop_search_trigger(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(DROP_SEARCH_VECTOR_FUNCTION)
+
+
+def add_search_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        Product = apps.get_model('products', 'Product')
+        for index in SEARCH_INDEXES:
+            schema_editor.add_index(Product, index)
+
+
+def remove_search_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        Product = apps.get_model('products', 'Product')
+        for index in SEARCH_INDEXES:
+            schema_editor.remove_index(Product, index)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0007_product_rating_sum'),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.AddField(
+            model_name='product',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.RunPython(create_search_trigger, drop_search_trigger),
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.AddIndex(model_name='product', index=index) for index in SEARCH_INDEXES
+            ],
+            database_operations=[
+                migrations.RunPython(add_search_indexes, remove_search_indexes),
+            ],
+        ),
+    ]
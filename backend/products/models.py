@@ -1,3 +1,5 @@
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
 from django.db import models
 from django.utils import timezone
 from django.core.validators import MinValueValidator, MaxValueValidator
@@ -27,6 +29,9 @@ class Category(models.Model):
     
     @property
     def product_count(self):
+        # Annotated by CategorySerializer.setup_eager_loading
+        if hasattr(self, 'active_product_count'):
+            return self.active_product_count
         return self.products.filter(status='active').count()
 
 
@@ -77,6 +82,7 @@ class Product(models.Model):
     # Ratings and reviews
     average_rating = models.DecimalField(max_digits=3, decimal_places=2, null=True, blank=True)
     review_count = models.IntegerField(default=0)
+    rating_sum = models.IntegerField(default=0)
     
     # Additional information
     tags = models.JSONField(default=list, blank=True)
@@ -90,9 +96,16 @@ class Product(models.Model):
     created_at = models.DateTimeField(default=timezone.now)
     updated_at = models.DateTimeField(auto_now=True)
     
+    # Weighted name/sku/tags/description vector, maintained by a database trigger (see products.search)
+    search_vector = SearchVectorField(null=True, editable=False)
+    
     class Meta:
         db_table = 'products'
         ordering = ['-created_at']
+        indexes = [
+            GinIndex(fields=['search_vector'], name='products_search_vector_idx'),
+            GinIndex(fields=['name'], name='products_name_trgm_idx', opclasses=['gin_trgm_ops']),
+        ]
     
     def __str__(self):
         return self.name
@@ -105,6 +118,13 @@ class Product(models.Model):
     def current_price(self):
         # Get the lowest price from measurements, fallback to legacy price
         from decimal import Decimal
+        # Annotated by ProductSerializer.setup_eager_loading
+        if hasattr(self, 'min_active_price'):
+            return self.min_active_price if self.min_active_price is not None else (self.price or Decimal('0'))
+        # Measurements already loaded through prefetch_related
+        if 'measurements' in getattr(self, '_prefetched_objects_cache', {}):
+            prices = [m.price for m in self.measurements.all() if m.is_active]
+            return min(prices) if prices else (self.price or Decimal('0'))
         measurements = self.measurements.filter(is_active=True).order_by('price')
         if measurements.exists():
             return measurements.first().price
@@ -0,0 +1,219 @@
+"""
+Product search
+
+Matching runs entirely on indexes instead of ILIKE '%...%' scans:
+1. products.search_vector, a weighted tsvector kept up to date by a database
+   trigger (name A, SKU and tags B, description C) and indexed with GIN
+2. A trigram GIN index on name for typo tolerance: a query matches when it is
+   word-similar to the name even if no lexeme matches ("jonnie walkr")
+
+Results are ranked by text rank plus name similarity. Facet counts (category,
+region, vintage, price range) for the whole match set are computed in one
+GROUPING SETS query, and each search is buffered for SearchAnalytics (see analytics.ingest).
+
+Other database backends (sqlite in development and CI) have neither the
+vector nor the trigram index: they fall back to unranked substring matching
+and one GROUP BY query per facet.
+"""
+
+import logging
+
+from django.contrib.postgres.search import SearchQuery, SearchRank, TrigramWordSimilarity
+from django.db import connection, transaction
+from django.db.models import Case, Count, F, FloatField, IntegerField, Q, Value, When
+from django.db.models.expressions import ExpressionWrapper
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+# Must match the configuration used by the products_search_vector_update() trigger
+SEARCH_CONFIG = 'english'
+
+# Weights for D, C, B, A (description, -, sku/tags, name)
+RANK_WEIGHTS = [0.1, 0.2, 0.4, 1.0]
+SIMILARITY_WEIGHT = 0.5
+
+PRICE_RANGES = [
+    {'label': 'Under $25', 'min': 0, 'max': 25},
+    {'label': '$25 - $50', 'min': 25, 'max': 50},
+    {'label': '$50 - $100', 'min': 50, 'max': 100},
+    {'label': '$100 - $250', 'min': 100, 'max': 250},
+    {'label': '$250 - $500', 'min': 250, 'max': 500},
+    {'label': '$500+', 'min': 500, 'max': 1000000},
+]
+
+
+def search_products(queryset, text):
+    """
+    Filter `queryset` to products matching `text` and annotate `search_rank`
+    """
+    text = (text or '').strip()
+    if not text:
+        return queryset
+
+    if connection.vendor != 'postgresql':
+        return queryset.filter(
+            Q(name__icontains=text) | Q(sku__icontains=text) | Q(description__icontains=text)
+        ).annotate(search_rank=Value(0.0, output_field=FloatField()))
+
+    query = SearchQuery(text, config=SEARCH_CONFIG, search_type='websearch')
+    return queryset.filter(
+        Q(search_vector=query) | Q(name__trigram_word_similar=text)
+    ).annotate(
+        search_rank=ExpressionWrapper(
+            SearchRank(F('search_vector'), query, weights=RANK_WEIGHTS)
+            + TrigramWordSimilarity(text, 'name') * SIMILARITY_WEIGHT,
+            output_field=FloatField(),
+        )
+    )
+
+
+def apply_filters(queryset, filters):
+    """
+    Apply the structured filters of a search request (validated ProductSearchSerializer data)
+    """
+    category = filters.get('category')
+    if category:
+        if str(category).isdigit():
+            queryset = queryset.filter(category_id=int(category))
+        else:
+            queryset = queryset.filter(category__name=category)
+    if filters.get('region'):
+        queryset = queryset.filter(region=filters['region'])
+    if filters.get('vintage'):
+        queryset = queryset.filter(vintage=filters['vintage'])
+    if filters.get('min_price') is not None:
+        queryset = queryset.filter(price__gte=filters['min_price'])
+    if filters.get('max_price') is not None:
+        queryset = queryset.filter(price__lte=filters['max_price'])
+    if filters.get('status'):
+        queryset = queryset.filter(status=filters['status'])
+    if filters.get('unit'):
+        queryset = queryset.filter(unit=filters['unit'])
+    if filters.get('is_featured'):
+        queryset = queryset.filter(is_featured=True)
+    if filters.get('is_new'):
+        queryset = queryset.filter(is_new=True)
+    if filters.get('is_on_sale'):
+        queryset = queryset.filter(is_on_sale=True)
+    return queryset
+
+
+def order_results(queryset, sort_by, ranked):
+    """
+    Sort by the requested field, or by relevance when searching without an explicit sort
+    """
+    if sort_by == 'name':
+        return queryset.order_by('name', 'id')
+    if sort_by == 'price':
+        return queryset.order_by('price', 'id')
+    if sort_by == 'rating':
+        return queryset.order_by('-average_rating', 'id')
+    if ranked and sort_by in (None, '', 'relevance'):
+        return queryset.order_by('-search_rank', '-id')
+    return queryset.order_by('-created_at', '-id')
+
+
+def price_bucket_expression():
+    return Case(
+        *[When(price__lt=bucket['max'], then=Value(index)) for index, bucket in enumerate(PRICE_RANGES[:-1])],
+        When(price__isnull=False, then=Value(len(PRICE_RANGES) - 1)),
+        default=Value(None),
+        output_field=IntegerField(),
+    )
+
+
+def facet_counts(queryset):
+    """
+    Category, region, vintage and price range counts plus the total for the
+    match set, in a single GROUPING SETS query
+    """
+    matched = queryset.order_by().annotate(
+        category_name=F('category__name'),
+        price_bucket=price_bucket_expression(),
+    ).values('category_id', 'category_name', 'region', 'vintage', 'price_bucket')
+    if connection.vendor == 'postgresql':
+        sql, params = matched.query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"""
+                SELECT GROUPING(category_id), GROUPING(region), GROUPING(vintage), GROUPING(price_bucket),
+                       category_id, category_name, region, vintage, price_bucket, COUNT(*)
+                FROM ({sql}) AS matched
+                GROUP BY GROUPING SETS ((category_id, category_name), (region), (vintage), (price_bucket), ())
+                """,
+                params,
+            )
+            rows = cursor.fetchall()
+    else:
+        rows = _grouped_facet_rows(matched)
+
+    facets = {'total': 0, 'categories': [], 'regions': [], 'vintages': [], 'price_ranges': []}
+    for g_category, g_region, g_vintage, g_price, category_id, category_name, region, vintage, bucket, count in rows:
+        if g_category and g_region and g_vintage and g_price:
+            facets['total'] = count
+        elif not g_category:
+            facets['categories'].append({'id': category_id, 'name': category_name, 'count': count})
+        elif not g_region:
+            if region:
+                facets['regions'].append({'value': region, 'count': count})
+        elif not g_vintage:
+            if vintage:
+                facets['vintages'].append({'value': vintage, 'count': count})
+        elif bucket is not None:
+            facets['price_ranges'].append(dict(PRICE_RANGES[bucket], count=count))
+
+    facets['categories'].sort(key=lambda item: (-item['count'], item['name'] or ''))
+    facets['regions'].sort(key=lambda item: (-item['count'], item['value']))
+    facets['vintages'].sort(key=lambda item: item['value'])
+    facets['price_ranges'].sort(key=lambda item: item['min'])
+    return facets
+
+
+def _grouped_facet_rows(matched):
+    """
+    The rows of the GROUPING SETS query, from one GROUP BY query per facet
+    """
+    rows = [(1, 1, 1, 1, None, None, None, None, None, matched.count())]
+    for row in matched.values('category_id', 'category_name').annotate(count=Count('id')):
+        rows.append((0, 1, 1, 1, row['category_id'], row['category_name'], None, None, None, row['count']))
+    for row in matched.values('region').annotate(count=Count('id')):
+        rows.append((1, 0, 1, 1, None, None, row['region'], None, None, row['count']))
+    for row in matched.values('vintage').annotate(count=Count('id')):
+        rows.append((1, 1, 0, 1, None, None, None, row['vintage'], None, row['count']))
+    for row in matched.values('price_bucket').annotate(count=Count('id')):
+        rows.append((1, 1, 1, 0, None, None, None, None, row['price_bucket'], row['count']))
+    return rows
+
+
+def log_search(query, user, results_count, search_time, filters):
+    """
+    Buffer the search for SearchAnalytics; it is written in bulk off the request thread
+    """
+    from analytics.ingest import buffer_records
+
+    if not query:
+        return
+
+    price_filter = None
+    if filters.get('min_price') is not None or filters.get('max_price') is not None:
+        price_filter = f"{filters.get('min_price') or ''}-{filters.get('max_price') or ''}"[:50]
+
+    payload = {
+        'query': query[:500],
+        'user_id': user.pk if user is not None and user.is_authenticated else None,
+        'results_count': results_count,
+        'search_time': round(search_time, 3),
+        'category_filter': str(filters['category'])[:100] if filters.get('category') else None,
+        'price_filter': price_filter,
+        'sort_by': filters.get('sort_by') or None,
+        'created_at': timezone.now().isoformat(),
+    }
+
+    def enqueue():
+        try:
+            buffer_records('searches', [payload])
+        except Exception as e:
+            logger.warning(f"Could not record search analytics for '{query[:50]}': {str(e)}")
+
+    transaction.on_commit(enqueue)
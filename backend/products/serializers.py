@@ -1,3 +1,4 @@
+from django.db.models import Count, OuterRef, Prefetch, Q, Subquery
 from rest_framework import serializers
 from .models import Category, Product, ProductVariant, ProductImage, InventoryLog, ProductMeasurement
 
@@ -13,6 +14,13 @@ class CategorySerializer(serializers.ModelSerializer):
             'sort_order', 'product_count', 'created_at', 'updated_at'
         ]
         read_only_fields = ['id', 'created_at', 'updated_at']
+    
+    @staticmethod
+    def setup_eager_loading(queryset):
+        """Annotate the active product count so product_count needs no query per row"""
+        return queryset.annotate(
+            active_product_count=Count('products', filter=Q(products__status='active'))
+        )
 
 
 class CategoryCreateSerializer(serializers.ModelSerializer):
@@ -132,6 +140,25 @@ class ProductSerializer(serializers.ModelSerializer):
             'measurements', 'current_price'
         ]
         read_only_fields = ['id', 'created_at', 'updated_at']
+    
+    @staticmethod
+    def setup_eager_loading(queryset):
+        """
+        Load everything the serializer touches in a fixed number of queries:
+        the category (with its annotated product count) and measurements are
+        prefetched, variants too, and current_price is annotated in SQL.
+        The search vector is never serialized, so it is not loaded.
+        """
+        active_prices = ProductMeasurement.objects.filter(
+            product=OuterRef('pk'), is_active=True
+        ).order_by('price').values('price')[:1]
+        return queryset.defer('search_vector').annotate(
+            min_active_price=Subquery(active_prices)
+        ).prefetch_related(
+            Prefetch('category', queryset=CategorySerializer.setup_eager_loading(Category.objects.all())),
+            Prefetch('measurements', queryset=ProductMeasurement.objects.order_by('sort_order', 'price')),
+            'variants',
+        )
 
 
 class ProductDetailSerializer(serializers.ModelSerializer):
@@ -252,8 +279,11 @@ class InventoryLogSerializer(serializers.ModelSerializer):
 
 class ProductSearchSerializer(serializers.Serializer):
     """Serializer for product search"""
-    query = serializers.CharField(max_length=200, required=False)
+    query = serializers.CharField(max_length=200, required=False, allow_blank=True)
     category = serializers.CharField(max_length=100, required=False)
+    region = serializers.CharField(max_length=100, required=False)
+    vintage = serializers.CharField(max_length=20, required=False)
+    unit = serializers.CharField(max_length=20, required=False)
     min_price = serializers.DecimalField(max_digits=10, decimal_places=2, required=False)
     max_price = serializers.DecimalField(max_digits=10, decimal_places=2, required=False)
     status = serializers.CharField(max_length=20, required=False)
@@ -262,6 +292,7 @@ class ProductSearchSerializer(serializers.Serializer):
     is_featured = serializers.BooleanField(required=False)
     is_new = serializers.BooleanField(required=False)
     is_on_sale = serializers.BooleanField(required=False)
+    facets = serializers.BooleanField(required=False, default=True)
 
 
 class ProductFilterSerializer(serializers.Serializer):
@@ -0,0 +1,83 @@
+from django.db.models.signals import post_init, post_save, post_delete
+from django.dispatch import receiver
+from .models import Category, Product, ProductMeasurement, ProductImage, ProductVariant
+from .cache import (
+    TAG_PRODUCTS, TAG_CATEGORIES, TAG_CATEGORY_COUNTS, category_tag, forget_product_snapshot, invalidate_on_commit
+)
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+@receiver(post_init, sender=Product)
+def remember_product_catalog_state(sender, instance, **kwargs):
+    """
+    Keep the loaded category/status so a save can tell whether category listings changed.
+    Read from __dict__ so deferred fields are not fetched.
+    """
+    instance._catalog_state = (instance.__dict__.get('category_id'), instance.__dict__.get('status'))
+
+
+@receiver(post_save, sender=Product)
+def invalidate_catalog_on_product_save(sender, instance, created, **kwargs):
+    """
+    Invalidate cached product listings, the product's category listing and, when
+    the product moved or changed status, the category product counts
+    """
+    old_category_id, old_status = getattr(instance, '_catalog_state', (None, None))
+    tags = {TAG_PRODUCTS, category_tag(instance.category_id)}
+
+    if created or old_category_id != instance.category_id or old_status != instance.status:
+        tags.add(TAG_CATEGORY_COUNTS)
+        if old_category_id and old_category_id != instance.category_id:
+            tags.add(category_tag(old_category_id))
+
+    invalidate_on_commit(tags)
+    instance._catalog_state = (instance.category_id, instance.status)
+
+
+@receiver(post_delete, sender=Product)
+def invalidate_catalog_on_product_delete(sender, instance, **kwargs):
+    invalidate_on_commit({TAG_PRODUCTS, TAG_CATEGORY_COUNTS, category_tag(instance.category_id)})
+
+
+@receiver(post_save, sender=ProductMeasurement)
+@receiver(post_delete, sender=ProductMeasurement)
+@receiver(post_save, sender=ProductImage)
+@receiver(post_delete, sender=ProductImage)
+@receiver(post_save, sender=ProductVariant)
+@receiver(post_delete, sender=ProductVariant)
+def invalidate_catalog_on_product_detail_change(sender, instance, **kwargs):
+    """
+    Measurements, images and variants are nested in every product listing
+    """
+    tags = {TAG_PRODUCTS}
+    # Look the category up by id: during a cascading delete the product row is already gone
+    category_id = Product.objects.filter(pk=instance.product_id).values_list('category_id', flat=True).first()
+    if category_id:
+        tags.add(category_tag(category_id))
+    invalidate_on_commit(tags)
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def forget_snapshot_on_product_change(sender, instance, **kwargs):
+    """
+    Carts price their lines from the product snapshot
+    """
+    forget_product_snapshot(instance.pk)
+
+
+@receiver(post_save, sender=ProductVariant)
+@receiver(post_delete, sender=ProductVariant)
+def forget_snapshot_on_variant_change(sender, instance, **kwargs):
+    forget_product_snapshot(instance.product_id)
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def invalidate_catalog_on_category_change(sender, instance, **kwargs):
+    """
+    Categories are nested in product listings, the tree and the filter options
+    """
+    invalidate_on_commit({TAG_CATEGORIES, category_tag(instance.pk)})
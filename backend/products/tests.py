@@ -1,3 +1,147 @@
-from django.test import TestCase
+from decimal import Decimal
+from unittest import skipUnless
 
-# Create your tests here.
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, override_settings
+
+from .models import Category, Product, ProductMeasurement, ProductVariant
+from .search import facet_counts, order_results, search_products
+from .serializers import CategorySerializer, ProductSerializer
+from .views import product_stats
+
+
+class ProductSerializerQueryCountTests(TestCase):
+    """
+    Listing serialization must cost the same number of queries whatever the page size
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        categories = [
+            Category.objects.create(name='Wine', sort_order=1),
+            Category.objects.create(name='Spirits', sort_order=2),
+        ]
+        for i in range(30):
+            product = Product.objects.create(
+                name=f'Product {i}',
+                sku=f'SKU-{i:03d}',
+                category=categories[i % 2],
+                price=Decimal('50.00'),
+                stock=10,
+            )
+            ProductMeasurement.objects.create(product=product, measurement='bottle', price=Decimal('40.00'))
+            ProductMeasurement.objects.create(product=product, measurement='case', price=Decimal('30.00'), is_active=False)
+            ProductMeasurement.objects.create(product=product, measurement='shot', price=Decimal('45.00'))
+            ProductVariant.objects.create(product=product, name='Standard', sku=f'VAR-{i:03d}', price=Decimal('40.00'))
+
+    def serialize_page(self, size):
+        queryset = ProductSerializer.setup_eager_loading(Product.objects.all())[:size]
+        return ProductSerializer(queryset, many=True).data
+
+    def test_constant_query_count_per_page_size(self):
+        # products, categories (with counts), measurements, variants
+        for size in (1, 10, 30):
+            with self.assertNumQueries(4):
+                data = self.serialize_page(size)
+            self.assertEqual(len(data), size)
+
+    def test_preloaded_values_match_properties(self):
+        data = self.serialize_page(30)
+        for item in data:
+            product = Product.objects.get(pk=item['id'])
+            self.assertEqual(Decimal(str(item['current_price'])), product.current_price)
+            self.assertEqual(Decimal(str(item['current_price'])), Decimal('40.00'))
+            self.assertEqual(item['category']['product_count'], product.category.product_count)
+            self.assertEqual(len(item['measurements']), 3)
+
+    def test_category_tree_query_count(self):
+        with self.assertNumQueries(1):
+            data = CategorySerializer(
+                CategorySerializer.setup_eager_loading(Category.objects.all()), many=True
+            ).data
+        self.assertEqual([item['product_count'] for item in data], [15, 15])
+
+
+class ProductSearchTests(TestCase):
+    """
+    Ranked full-text search with typo tolerance and single-query facets
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        wine = Category.objects.create(name='Wine')
+        whisky = Category.objects.create(name='Whisky')
+        Product.objects.create(
+            name='Opus One Cabernet Sauvignon', sku='OPUS-18', category=wine, price=Decimal('549.00'),
+            region='Napa Valley', vintage='2018', description='Bold red blend', tags=['gift'],
+        )
+        Product.objects.create(
+            name='Stellen Ridge Merlot', sku='SR-20', category=wine, price=Decimal('19.00'),
+            region='Stellenbosch', vintage='2020', description='Soft merlot, pairs with cabernet lovers',
+        )
+        Product.objects.create(
+            name='Glen Arden Single Malt', sku='GA-12', category=whisky, price=Decimal('75.00'),
+            region='Speyside', description='Smoky and rich', tags=['smoky'],
+        )
+
+    def search(self, text):
+        matched = search_products(Product.objects.all(), text)
+        return list(order_results(matched, None, ranked=True).values_list('sku', flat=True))
+
+    @skipUnless(connection.vendor == 'postgresql', 'ranked full-text search needs PostgreSQL')
+    def test_name_matches_rank_above_description_matches(self):
+        self.assertEqual(self.search('cabernet'), ['OPUS-18', 'SR-20'])
+
+    @skipUnless(connection.vendor == 'postgresql', 'ranked full-text search needs PostgreSQL')
+    def test_tags_and_typos_match(self):
+        self.assertEqual(self.search('smoky'), ['GA-12'])
+        self.assertIn('OPUS-18', self.search('cabernet sauvignnon'))
+
+    def test_facets_in_one_query(self):
+        # One GROUP BY per facet plus the total where GROUPING SETS is unavailable
+        with self.assertNumQueries(1 if connection.vendor == 'postgresql' else 5):
+            facets = facet_counts(search_products(Product.objects.all(), 'cabernet'))
+        self.assertEqual(facets['total'], 2)
+        self.assertEqual(facets['categories'], [{'id': Category.objects.get(name='Wine').id, 'name': 'Wine', 'count': 2}])
+        self.assertEqual([item['value'] for item in facets['vintages']], ['2018', '2020'])
+        self.assertEqual([item['label'] for item in facets['price_ranges']], ['Under $25', '$500+'])
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class ProductStatsTests(TestCase):
+    """
+    Stats come from one scan of products (plus the category count) and are cached
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name='Wine')
+        Product.objects.create(name='Red', sku='ST-1', category=category, price=Decimal('10.00'), stock=2,
+                               min_stock_level=5, is_featured=True)
+        Product.objects.create(name='White', sku='ST-2', category=category, price=Decimal('10.00'), stock=50,
+                               is_on_sale=True)
+        Product.objects.create(name='Rose', sku='ST-3', category=category, price=Decimal('10.00'), stock=0,
+                               status='out_of_stock')
+
+    def setUp(self):
+        cache.clear()
+
+    def test_two_queries(self):
+        with self.assertNumQueries(2):
+            stats = product_stats()
+        self.assertEqual(stats['total_products'], 3)
+        self.assertEqual(stats['out_of_stock_products'], 1)
+        self.assertEqual(stats['featured_products'], 1)
+        self.assertEqual(stats['on_sale_products'], 1)
+        self.assertEqual(stats['low_stock_products'], 1)
+        self.assertEqual(stats['total_categories'], 1)
+
+    def test_cached_between_requests(self):
+        from utils.stats import cached_stats
+
+        with self.assertNumQueries(2):
+            first = cached_stats('products', product_stats)
+        with self.assertNumQueries(0):
+            second = cached_stats('products', product_stats)
+        self.assertEqual(first, second)
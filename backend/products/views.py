@@ -20,7 +20,29 @@ from .serializers import (
 )
 from utils.image_utils import validate_image_file, resize_image
 from utils.pagination import PreserveStatePagination
+from .cache import (
+    cached_catalog_response, category_tag, get_cache_stats,
+    TAG_PRODUCTS, TAG_CATEGORIES, TAG_CATEGORY_COUNTS
+)
+from .search import PRICE_RANGES, apply_filters, facet_counts, log_search, order_results, search_products
+from utils.stats import cached_stats
 import json
+import time
+
+
+def product_stats():
+    """Product counts in one scan of products, plus the category count"""
+    stats = Product.objects.aggregate(
+        total_products=Count('id'),
+        active_products=Count('id', filter=Q(status='active')),
+        out_of_stock_products=Count('id', filter=Q(status='out_of_stock')),
+        featured_products=Count('id', filter=Q(is_featured=True)),
+        new_products=Count('id', filter=Q(is_new=True)),
+        on_sale_products=Count('id', filter=Q(is_on_sale=True)),
+        low_stock_products=Count('id', filter=Q(stock__lte=F('min_stock_level'), stock__gt=0)),
+    )
+    stats['total_categories'] = Category.objects.count()
+    return stats
 
 
 class CategoryViewSet(viewsets.ModelViewSet):
@@ -130,7 +152,7 @@ class CategoryViewSet(viewsets.ModelViewSet):
         return Response(serializer.data, status=status.HTTP_201_CREATED, headers=headers)
     
     def get_queryset(self):
-        queryset = Category.objects.all()
+        queryset = CategorySerializer.setup_eager_loading(Category.objects.all())
         
         # Filter by active status
         is_active = self.request.query_params.get('is_active', None)
@@ -152,9 +174,12 @@ class CategoryViewSet(viewsets.ModelViewSet):
         operation_description="Get category tree structure"
     )
     @action(detail=False, methods=['get'])
+    @cached_catalog_response('category_tree', [TAG_CATEGORIES, TAG_CATEGORY_COUNTS])
     def tree(self, request):
         """Get category tree structure"""
-        categories = Category.objects.filter(parent__isnull=True, is_active=True)
+        categories = CategorySerializer.setup_eager_loading(
+            Category.objects.filter(parent__isnull=True, is_active=True)
+        )
         serializer = CategorySerializer(categories, many=True)
         return Response(serializer.data)
     
@@ -163,10 +188,11 @@ class CategoryViewSet(viewsets.ModelViewSet):
         operation_description="Get products in a specific category"
     )
     @action(detail=True, methods=['get'])
+    @cached_catalog_response('category_products', lambda pk=None: [TAG_CATEGORIES, category_tag(pk)])
     def products(self, request, pk=None):
         """Get products in a category"""
         category = self.get_object()
-        products = Product.objects.filter(category=category, status='active')
+        products = ProductSerializer.setup_eager_loading(Product.objects.filter(category=category, status='active'))
         serializer = ProductSerializer(products, many=True)
         return Response(serializer.data)
     
@@ -540,7 +566,7 @@ class ProductViewSet(viewsets.ModelViewSet):
         return paginator.get_paginated_response(serializer.data, deleted_count=deleted_count)
     
     def get_queryset(self):
-        queryset = Product.objects.select_related('category').prefetch_related('variants', 'product_images')
+        queryset = ProductSerializer.setup_eager_loading(Product.objects.all())
         
         # Filter by status
         status_filter = self.request.query_params.get('status', None)
@@ -591,18 +617,16 @@ class ProductViewSet(viewsets.ModelViewSet):
         if max_price:
             queryset = queryset.filter(price__lte=max_price)
         
-        # Search by name or description
+        # Full-text search over name, sku, tags and description (typo tolerant on name)
         search = self.request.query_params.get('search', None)
         if search:
-            queryset = queryset.filter(
-                Q(name__icontains=search) |
-                Q(description__icontains=search) |
-                Q(sku__icontains=search)
-            )
+            queryset = search_products(queryset, search)
         
-        # Sort by
+        # Sort by (relevance when searching without an explicit sort)
         sort_by = self.request.query_params.get('sort_by', 'created_at')
-        if sort_by == 'name':
+        if search and search.strip() and 'sort_by' not in self.request.query_params:
+            queryset = queryset.order_by('-search_rank', '-id')
+        elif sort_by == 'name':
             queryset = queryset.order_by('name')
         elif sort_by == 'price':
             queryset = queryset.order_by('price')
@@ -615,67 +639,50 @@ class ProductViewSet(viewsets.ModelViewSet):
         
         return queryset
     
-    @action(detail=False, methods=['post'])
+    @swagger_auto_schema(
+        method='get',
+        tags=['products'],
+        query_serializer=ProductSearchSerializer,
+        operation_description="Ranked, typo-tolerant product search with facet counts (paginated)"
+    )
+    @swagger_auto_schema(
+        method='post',
+        tags=['products'],
+        request_body=ProductSearchSerializer,
+        operation_description="Ranked, typo-tolerant product search with facet counts (paginated)"
+    )
+    @action(detail=False, methods=['get', 'post'])
     def search(self, request):
         """Advanced product search"""
-        serializer = ProductSearchSerializer(data=request.data)
-        if serializer.is_valid():
-            queryset = Product.objects.select_related('category').prefetch_related('variants', 'product_images')
-            
-            # Apply search filters
-            if serializer.validated_data.get('query'):
-                query = serializer.validated_data['query']
-                queryset = queryset.filter(
-                    Q(name__icontains=query) |
-                    Q(description__icontains=query) |
-                    Q(sku__icontains=query) |
-                    Q(tags__contains=[query])
-                )
-            
-            if serializer.validated_data.get('category'):
-                queryset = queryset.filter(category__name=serializer.validated_data['category'])
-            
-            if serializer.validated_data.get('min_price'):
-                queryset = queryset.filter(price__gte=serializer.validated_data['min_price'])
-            
-            if serializer.validated_data.get('max_price'):
-                queryset = queryset.filter(price__lte=serializer.validated_data['max_price'])
-            
-            if serializer.validated_data.get('status'):
-                queryset = queryset.filter(status=serializer.validated_data['status'])
-            
-            if serializer.validated_data.get('unit'):
-                queryset = queryset.filter(unit=serializer.validated_data['unit'])
-            
-            if serializer.validated_data.get('is_featured'):
-                queryset = queryset.filter(is_featured=True)
-            
-            if serializer.validated_data.get('is_new'):
-                queryset = queryset.filter(is_new=True)
-            
-            if serializer.validated_data.get('is_on_sale'):
-                queryset = queryset.filter(is_on_sale=True)
-            
-            # Sort results
-            sort_by = serializer.validated_data.get('sort_by', 'created_at')
-            if sort_by == 'name':
-                queryset = queryset.order_by('name')
-            elif sort_by == 'price':
-                queryset = queryset.order_by('price')
-            elif sort_by == 'rating':
-                queryset = queryset.order_by('-average_rating')
-            else:
-                queryset = queryset.order_by('-created_at')
-            
-            serializer_result = ProductSerializer(queryset, many=True)
-            return Response(serializer_result.data)
+        data = request.data if request.method == 'POST' else request.query_params
+        serializer = ProductSearchSerializer(data=data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
         
-        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        filters = serializer.validated_data
+        query = filters.get('query', '').strip()
+        started = time.monotonic()
+        
+        matched = apply_filters(search_products(Product.objects.all(), query), filters)
+        queryset = order_results(
+            ProductSerializer.setup_eager_loading(matched), filters.get('sort_by'), ranked=bool(query)
+        )
+        
+        paginator = self.paginator
+        page = paginator.paginate_queryset(queryset, request)
+        results = ProductSerializer(page, many=True).data
+        response = paginator.get_paginated_response(results)
+        if filters.get('facets', True):
+            response.data['facets'] = facet_counts(matched)
+        
+        log_search(query, request.user, paginator.page.paginator.count, time.monotonic() - started, filters)
+        return response
     
     @action(detail=False, methods=['get'])
+    @cached_catalog_response('featured', [TAG_PRODUCTS, TAG_CATEGORIES])
     def featured(self, request):
         """Get featured products with pagination - Accessible with web token or Firebase auth"""
-        products = Product.objects.select_related('category').prefetch_related('variants', 'product_images').filter(is_featured=True, status='active')
+        products = ProductSerializer.setup_eager_loading(Product.objects.all()).filter(is_featured=True, status='active')
         
         # Apply additional filters if provided
         category = request.query_params.get('category', None)
@@ -700,9 +707,10 @@ class ProductViewSet(viewsets.ModelViewSet):
         return paginator.get_paginated_response(serializer.data)
     
     @action(detail=False, methods=['get'])
+    @cached_catalog_response('new', [TAG_PRODUCTS, TAG_CATEGORIES])
     def new(self, request):
         """Get new products with pagination - Accessible with web token or Firebase auth"""
-        products = Product.objects.select_related('category').prefetch_related('variants', 'product_images').filter(is_new=True, status='active')
+        products = ProductSerializer.setup_eager_loading(Product.objects.all()).filter(is_new=True, status='active')
         
         # Apply additional filters if provided
         category = request.query_params.get('category', None)
@@ -727,9 +735,10 @@ class ProductViewSet(viewsets.ModelViewSet):
         return paginator.get_paginated_response(serializer.data)
     
     @action(detail=False, methods=['get'])
+    @cached_catalog_response('on_sale', [TAG_PRODUCTS, TAG_CATEGORIES])
     def on_sale(self, request):
         """Get products on sale with pagination - Accessible with web token or Firebase auth"""
-        products = Product.objects.select_related('category').prefetch_related('variants', 'product_images').filter(is_on_sale=True, status='active')
+        products = ProductSerializer.setup_eager_loading(Product.objects.all()).filter(is_on_sale=True, status='active')
         
         # Apply additional filters if provided
         category = request.query_params.get('category', None)
@@ -754,6 +763,7 @@ class ProductViewSet(viewsets.ModelViewSet):
         return paginator.get_paginated_response(serializer.data)
     
     @action(detail=False, methods=['get'])
+    @cached_catalog_response('filter_options', [TAG_PRODUCTS, TAG_CATEGORIES])
     def filter_options(self, request):
         """Return dynamic filter options for products page"""
         categories_qs = Category.objects.filter(is_active=True).values('id', 'name').order_by('name')
@@ -774,14 +784,7 @@ class ProductViewSet(viewsets.ModelViewSet):
             .order_by('vintage')
         )
 
-        price_ranges = [
-            { 'label': 'Under $25', 'min': 0, 'max': 25 },
-            { 'label': '$25 - $50', 'min': 25, 'max': 50 },
-            { 'label': '$50 - $100', 'min': 50, 'max': 100 },
-            { 'label': '$100 - $250', 'min': 100, 'max': 250 },
-            { 'label': '$250 - $500', 'min': 250, 'max': 500 },
-            { 'label': '$500+', 'min': 500, 'max': 1000000 },
-        ]
+        price_ranges = PRICE_RANGES
 
         return Response({
             'categories': categories,
@@ -793,6 +796,21 @@ class ProductViewSet(viewsets.ModelViewSet):
             'price_ranges': price_ranges,
         })
 
+    @swagger_auto_schema(
+        tags=['products'],
+        operation_description="Get catalog response cache hit/miss counters (Admin only)"
+    )
+    @action(detail=False, methods=['get'])
+    def cache_stats(self, request):
+        """Catalog response cache hit/miss counters per endpoint"""
+        if not request.user.is_staff:
+            return Response(
+                {'error': 'Admin permissions required'},
+                status=status.HTTP_403_FORBIDDEN
+            )
+
+        return Response(get_cache_stats())
+
     @swagger_auto_schema(
         tags=['stock'],
         operation_description="Get products with low stock levels"
@@ -800,7 +818,7 @@ class ProductViewSet(viewsets.ModelViewSet):
     @action(detail=False, methods=['get'])
     def low_stock(self, request):
         """Get products with low stock"""
-        products = Product.objects.select_related('category').prefetch_related('variants', 'product_images').filter(
+        products = ProductSerializer.setup_eager_loading(Product.objects.all()).filter(
             stock__lte=F('min_stock_level'),
             stock__gt=0
         )
@@ -810,19 +828,7 @@ class ProductViewSet(viewsets.ModelViewSet):
     @action(detail=False, methods=['get'])
     def stats(self, request):
         """Get product statistics"""
-        stats = {
-            'total_products': Product.objects.count(),
-            'active_products': Product.objects.filter(status='active').count(),
-            'out_of_stock_products': Product.objects.filter(status='out_of_stock').count(),
-            'featured_products': Product.objects.filter(is_featured=True).count(),
-            'new_products': Product.objects.filter(is_new=True).count(),
-            'on_sale_products': Product.objects.filter(is_on_sale=True).count(),
-            'total_categories': Category.objects.count(),
-            'low_stock_products': Product.objects.filter(
-                stock__lte=F('min_stock_level'),
-                stock__gt=0
-            ).count(),
-        }
+        stats = cached_stats('products', product_stats)
         
         serializer = ProductStatsSerializer(stats)
         return Response(serializer.data)
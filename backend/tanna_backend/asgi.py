@@ -18,12 +18,13 @@ os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'tanna_backend.settings')
 django_asgi_app = get_asgi_application()
 
 from notifications.routing import websocket_urlpatterns
+from deliveries.routing import websocket_urlpatterns as tracking_urlpatterns
 
 application = ProtocolTypeRouter({
     "http": django_asgi_app,
     "websocket": AllowedHostsOriginValidator(
         AuthMiddlewareStack(
-            URLRouter(websocket_urlpatterns)
+            URLRouter(websocket_urlpatterns + tracking_urlpatterns)
         )
     ),
 })
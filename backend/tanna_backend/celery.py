@@ -1,5 +1,7 @@
 import os
-from celery import Celery
+from celery import Celery, Task
+from celery.exceptions import Retry
+from celery.signals import worker_ready
 from django.conf import settings
 
 # Set the default Django settings module for the 'celery' program.
@@ -20,14 +22,79 @@ def debug_task(self):
     print(f'Request: {self.request!r}')
 
 
+class InstrumentedTask(Task):
+    """
+    Task base recording duration, database queries and upstream calls per
+    run, like requests (utils.metrics): @shared_task(base=InstrumentedTask)
+    """
+
+    def __call__(self, *args, **kwargs):
+        from utils.metrics import current_measurement, measure, record_task
+
+        if current_measurement.get() is not None:
+            # Called directly inside a request or another task: counted there
+            return super().__call__(*args, **kwargs)
+        state = 'failure'
+        with measure() as measurement:
+            try:
+                result = super().__call__(*args, **kwargs)
+                state = 'success'
+                return result
+            except Retry:
+                state = 'retry'
+                raise
+            finally:
+                record_task(self.name, state, measurement, measurement.elapsed)
+
+
+@worker_ready.connect
+def start_metrics_server(**kwargs):
+    if settings.CELERY_METRICS_PORT:
+        from utils.metrics import start_metrics_server
+
+        start_metrics_server(settings.CELERY_METRICS_PORT)
+
+
 # Celery Beat Schedule for periodic tasks
 app.conf.beat_schedule = {
     'check-expired-payments': {
         'task': 'payments.tasks.check_expired_payments',
         'schedule': 300.0,  # Every 5 minutes
     },
+    'process-webhook-events': {
+        'task': 'payments.tasks.process_webhook_events',
+        'schedule': 60.0,  # Every minute (retries and missed enqueues)
+    },
     'cleanup-old-webhooks': {
         'task': 'payments.tasks.cleanup_old_payment_webhooks',
         'schedule': 86400.0,  # Every 24 hours
     },
+    'materialize-daily-metrics': {
+        'task': 'analytics.tasks.materialize_daily_metrics',
+        'schedule': 3600.0,  # Every hour
+    },
+    'flush-analytics-buffers': {
+        'task': 'analytics.tasks.flush_analytics_buffers',
+        'schedule': 5.0,  # Every 5 seconds (size-triggered flushes run in between)
+    },
+    'maintain-event-partitions': {
+        'task': 'analytics.tasks.maintain_event_partitions',
+        'schedule': 86400.0,  # Every 24 hours
+    },
+    'reconcile-product-ratings': {
+        'task': 'orders.tasks.reconcile_product_ratings',
+        'schedule': 86400.0,  # Every 24 hours
+    },
+    'reconcile-driver-ratings': {
+        'task': 'deliveries.tasks.reconcile_driver_ratings',
+        'schedule': 86400.0,  # Every 24 hours
+    },
+    'persist-driver-trails': {
+        'task': 'deliveries.tasks.persist_driver_trails',
+        'schedule': 30.0,  # Every 30 seconds
+    },
+    'persist-carts': {
+        'task': 'orders.tasks.persist_carts',
+        'schedule': 30.0,  # Every 30 seconds
+    },
 }
\ No newline at end of file
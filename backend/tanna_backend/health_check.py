@@ -1,5 +1,28 @@
 
-from django.http import JsonResponse
+
+import hmac
+
+from django.conf import settings
+from django.http import Http404, HttpResponse, JsonResponse
 
 def health_check(request):
     return JsonResponse({"status": "ok"})
+
+
+def metrics(request):
+    """
+    Prometheus metrics (utils.metrics)
+    Scrapers authenticate with `Authorization: Bearer <METRICS_TOKEN>`;
+    without a token configured the endpoint only exists in DEBUG
+    """
+    token = settings.METRICS_TOKEN
+    if token:
+        if not hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}'):
+            return HttpResponse(status=403)
+    elif not settings.DEBUG:
+        raise Http404
+
+    from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
+    from utils.metrics import metrics_registry
+
+    return HttpResponse(generate_latest(metrics_registry()), content_type=CONTENT_TYPE_LATEST)
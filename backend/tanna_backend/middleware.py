@@ -1,10 +1,18 @@
 import logging
-import time
+import re
+import uuid
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
 from django.http import JsonResponse
 from django.conf import settings
 
+from utils.log import request_id_var
+from utils.metrics import measure, record_request
+
 logger = logging.getLogger(__name__)
 
+# Ids accepted from the X-Request-ID header; anything else is replaced
+REQUEST_ID_PATTERN = re.compile(r'[A-Za-z0-9._-]{1,64}')
+
 
 class CORSHeadersMiddleware:
     """
@@ -27,39 +35,95 @@ class CORSHeadersMiddleware:
 class ErrorHandlingMiddleware:
     """
     Custom error handling middleware
+    Sync and async capable, so async views run without a thread under ASGI
     """
+    sync_capable = True
+    async_capable = True
+
     def __init__(self, get_response):
         self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
 
     def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
         try:
             response = self.get_response(request)
             return response
         except Exception as e:
-            logger.error(f"Unhandled exception: {str(e)}")
-            return JsonResponse({
-                'error': 'Internal server error',
-                'message': str(e) if settings.DEBUG else 'Something went wrong'
-            }, status=500)
+            return self.error_response(e)
+
+    async def __acall__(self, request):
+        try:
+            return await self.get_response(request)
+        except Exception as e:
+            return self.error_response(e)
+
+    def error_response(self, e):
+        logger.error(f"Unhandled exception: {str(e)}")
+        return JsonResponse({
+            'error': 'Internal server error',
+            'message': str(e) if settings.DEBUG else 'Something went wrong'
+        }, status=500)
 
 
 class RequestLoggingMiddleware:
     """
-    Log all requests for debugging
+    One access log line per request, tagged with a request id
+    The id comes from the X-Request-ID header (a proxy's) or is generated; it
+    is attached to every record logged while the request runs (utils.log) and
+    returned in the X-Request-ID response header.
+    Database and upstream time are measured (utils.metrics): recorded per
+    view for /metrics, returned in a Server-Timing header when SERVER_TIMING
+    is on and logged in detail for requests slower than SLOW_REQUEST_MS.
+    Sync and async capable, so async views run without a thread under ASGI
     """
+    sync_capable = True
+    async_capable = True
+
     def __init__(self, get_response):
         self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def _request_id(self, request):
+        request_id = request.headers.get('X-Request-ID', '')
+        if not REQUEST_ID_PATTERN.fullmatch(request_id):
+            request_id = uuid.uuid4().hex
+        return request_id
+
+    def _finish(self, request, response, request_id, measurement):
+        elapsed = measurement.elapsed
+        response['X-Request-ID'] = request_id
+        if settings.SERVER_TIMING:
+            response['Server-Timing'] = measurement.server_timing(elapsed)
+        record_request(request, response, measurement, elapsed)
+        logger.info(
+            "%s %s %s %.1fms db=%d/%.1fms",
+            request.method, request.path, response.status_code, elapsed * 1000,
+            measurement.db_count, measurement.db_time * 1000,
+        )
+        return response
 
     def __call__(self, request):
-        start_time = time.time()
-        
-        # Log request
-        logger.info(f"Request: {request.method} {request.path}")
-        
-        response = self.get_response(request)
-        
-        # Log response time
-        duration = time.time() - start_time
-        logger.info(f"Response: {response.status_code} - {duration:.2f}s")
-        
-        return response 
\ No newline at end of file
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        request_id = self._request_id(request)
+        token = request_id_var.set(request_id)
+        try:
+            with measure() as measurement:
+                response = self.get_response(request)
+            return self._finish(request, response, request_id, measurement)
+        finally:
+            request_id_var.reset(token)
+
+    async def __acall__(self, request):
+        request_id = self._request_id(request)
+        token = request_id_var.set(request_id)
+        try:
+            with measure() as measurement:
+                response = await self.get_response(request)
+            return self._finish(request, response, request_id, measurement)
+        finally:
+            request_id_var.reset(token)
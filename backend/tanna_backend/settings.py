@@ -13,8 +13,6 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 from pathlib import Path
 from decouple import config
 import os
-import firebase_admin
-from firebase_admin import credentials
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -41,6 +39,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     
     # Third party apps
     'rest_framework',
@@ -211,6 +210,17 @@ SITE_PHONE = config('SITE_PHONE', default='+256 700 000 000')
 SITE_LOGO_URL = config('SITE_LOGO_URL', default='http://dashboard/assets/picture-CzkPMWkL.png')
 SITE_LOGO_PATH = os.path.join(MEDIA_ROOT, 'branding', 'logo.png')
 
+# Rows per server-side cursor fetch / Parquet row group for streaming exports (utils.exports)
+EXPORT_CHUNK_SIZE = config('EXPORT_CHUNK_SIZE', default=2000, cast=int)
+
+# Rendered invoice/receipt PDFs (utils.document_store)
+PDF_STORE_ROOT = config('PDF_STORE_ROOT', default=os.path.join(MEDIA_ROOT, 'documents'))
+# Internal nginx location aliased to PDF_STORE_ROOT (/media/documents in nginx.prod.conf);
+# empty serves the files from Django
+PDF_ACCEL_REDIRECT_PREFIX = config('PDF_ACCEL_REDIRECT_PREFIX', default='')
+PDF_LOGO_FETCH_TIMEOUT = config('PDF_LOGO_FETCH_TIMEOUT', default=5, cast=int)
+PDF_LOGO_RETRY_SECONDS = config('PDF_LOGO_RETRY_SECONDS', default=300, cast=int)
+
 # Enhanced CORS settings for all platforms
 CORS_ALLOWED_ORIGINS = [
     # Development origins
@@ -267,59 +277,115 @@ CORS_ALLOW_METHODS = [
 # Firebase configuration
 FIREBASE_CREDENTIALS_PATH = config('FIREBASE_CREDENTIALS_PATH', default='')
 FIREBASE_SERVICE_ACCOUNT_KEY_PATH = os.path.join(BASE_DIR, 'firebase', 'booze-nation-94e3f-firebase-adminsdk-gegcg-c4b6679745.json')
+# Service account from the environment (production); the Admin SDK itself is
+# initialized on first use (utils.firebase)
+FIREBASE_PRIVATE_KEY = config('FIREBASE_PRIVATE_KEY', default='')
+FIREBASE_PRIVATE_KEY_ID = config('FIREBASE_PRIVATE_KEY_ID', default='')
+FIREBASE_CLIENT_EMAIL = config('FIREBASE_CLIENT_EMAIL', default='')
+FIREBASE_CLIENT_ID = config('FIREBASE_CLIENT_ID', default='')
+FIREBASE_PROJECT_ID = config('FIREBASE_PROJECT_ID', default='')
+FIREBASE_CLIENT_X509_CERT_URL = config('FIREBASE_CLIENT_X509_CERT_URL', default='')
 
 
 
 # Custom user model
 AUTH_USER_MODEL = 'users.User'
 
-# Logging configuration
+# Logging configuration (utils.log): loggers only enqueue records, a
+# background thread writes them to the console and as JSON lines to
+# logs/django.log. Per-request detail of the hot-path loggers is logged at
+# DEBUG and kept only when LOG_HOT_PATH_LEVEL is DEBUG, sampled at
+# LOG_DEBUG_SAMPLE_RATE.
+LOG_LEVEL = config('LOG_LEVEL', default='INFO')
+LOG_CONSOLE_FORMAT = config('LOG_CONSOLE_FORMAT', default='simple')  # simple, verbose or json
+LOG_HOT_PATH_LEVEL = config('LOG_HOT_PATH_LEVEL', default='INFO')
+LOG_DEBUG_SAMPLE_RATE = config('LOG_DEBUG_SAMPLE_RATE', default=1.0, cast=float)
+LOG_HOT_PATH_LOGGERS = [
+    'users.authentication',
+    'users.mobile_auth',
+    'orders.views',
+    'payments.views',
+    'payments.async_views',
+]
+
 LOGGING = {
     'version': 1,
     'disable_existing_loggers': False,
+    'filters': {
+        'request_id': {
+            '()': 'utils.log.RequestIdFilter',
+        },
+        'sample_debug': {
+            '()': 'utils.log.SamplingFilter',
+            'rate': LOG_DEBUG_SAMPLE_RATE,
+        },
+    },
     'formatters': {
         'verbose': {
-            'format': '{levelname} {asctime} {module} {process:d} {thread:d} {message}',
+            'format': '{levelname} {asctime} {module} {process:d} {thread:d} [{request_id}] {message}',
             'style': '{',
         },
         'simple': {
-            'format': '{levelname} {message}',
+            'format': '{levelname} [{request_id}] {message}',
             'style': '{',
         },
+        'json': {
+            '()': 'utils.log.JsonFormatter',
+        },
     },
     'handlers': {
         'file': {
             'level': 'INFO',
-            'class': 'logging.FileHandler',
-            'filename': 'logs/django.log',
-            'formatter': 'verbose',
+            # Opens logs/django.log (creating logs/) on the first record
+            'class': 'utils.log.DeferredFileHandler',
+            'filename': os.path.join(BASE_DIR, 'logs', 'django.log'),
+            'formatter': 'json',
         },
         'console': {
             'level': 'DEBUG',
             'class': 'logging.StreamHandler',
-            'formatter': 'simple',
+            'formatter': LOG_CONSOLE_FORMAT,
+        },
+        'queue': {
+            '()': 'utils.log.QueueListenerHandler',
+            'handlers': ['console', 'file'],
+            'filters': ['request_id'],
         },
     },
     'root': {
-        'handlers': ['console', 'file'],
-        'level': 'INFO',
+        'handlers': ['queue'],
+        'level': LOG_LEVEL,
     },
     'loggers': {
         'django': {
-            'handlers': ['console', 'file'],
+            'handlers': ['queue'],
             'level': 'INFO',
             'propagate': False,
         },
         'tanna_backend': {
-            'handlers': ['console', 'file'],
+            'handlers': ['queue'],
             'level': 'DEBUG',
             'propagate': False,
         },
+        **{
+            name: {'level': LOG_HOT_PATH_LEVEL, 'filters': ['sample_debug']}
+            for name in LOG_HOT_PATH_LOGGERS
+        },
     },
 }
 
-# Create logs directory if it doesn't exist
-os.makedirs(os.path.join(BASE_DIR, 'logs'), exist_ok=True)
+# Request and task instrumentation (utils.metrics)
+# Bearer token Prometheus scrapes /metrics with; without one /metrics only exists in DEBUG
+METRICS_TOKEN = config('METRICS_TOKEN', default='')
+# Port a Celery worker serves its metrics on (0: off); set PROMETHEUS_MULTIPROC_DIR
+# for the worker so samples from its pool processes are aggregated
+CELERY_METRICS_PORT = config('CELERY_METRICS_PORT', default=0, cast=int)
+# Server-Timing response header with database and upstream time
+SERVER_TIMING = config('SERVER_TIMING', default=DEBUG, cast=bool)
+# Requests and tasks slower than this are logged with their slowest SQL statements (0: off)
+SLOW_REQUEST_MS = config('SLOW_REQUEST_MS', default=1000, cast=int)
+SLOW_TASK_MS = config('SLOW_TASK_MS', default=10000, cast=int)
+SLOW_REQUEST_TOP_QUERIES = config('SLOW_REQUEST_TOP_QUERIES', default=5, cast=int)
 
 # Channels configuration
 ASGI_APPLICATION = 'tanna_backend.asgi.application'
@@ -333,6 +399,24 @@ CHANNEL_LAYERS = {
     },
 }
 
+# Cache configuration (shared by all workers)
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': config('CACHE_URL', default=config('REDIS_URL', default='redis://localhost:6379')),
+        'KEY_PREFIX': 'tanna',
+        'TIMEOUT': 300,
+    },
+}
+
+# Public catalog response cache (products.cache); entries are invalidated on write,
+# the timeout only bounds how long unused entries linger
+CATALOG_CACHE_TIMEOUT = config('CATALOG_CACHE_TIMEOUT', default=600, cast=int)
+
+# Stats endpoints (utils.stats): results are fresh this long, stale copies are served a while longer during recomputation
+STATS_CACHE_TIMEOUT = config('STATS_CACHE_TIMEOUT', default=15, cast=int)
+STATS_STALE_GRACE = config('STATS_STALE_GRACE', default=60, cast=int)
+
 # Celery configuration for background tasks
 CELERY_BROKER_URL = config('REDIS_URL', default='redis://localhost:6379')
 CELERY_RESULT_BACKEND = config('REDIS_URL', default='redis://localhost:6379')
@@ -341,6 +425,42 @@ CELERY_TASK_SERIALIZER = 'json'
 CELERY_RESULT_SERIALIZER = 'json'
 CELERY_TIMEZONE = TIME_ZONE
 
+# Analytics rollups: closed days re-materialized on every run (late payments/deliveries)
+ANALYTICS_ROLLUP_LOOKBACK_DAYS = config('ANALYTICS_ROLLUP_LOOKBACK_DAYS', default=3, cast=int)
+
+# Analytics ingestion: events are buffered in Redis and bulk-inserted by Celery
+ANALYTICS_BUFFER_URL = config('ANALYTICS_BUFFER_URL', default=config('REDIS_URL', default='redis://localhost:6379'))
+ANALYTICS_BUFFER_FLUSH_SIZE = config('ANALYTICS_BUFFER_FLUSH_SIZE', default=500, cast=int)
+ANALYTICS_MAX_BATCH_EVENTS = config('ANALYTICS_MAX_BATCH_EVENTS', default=200, cast=int)
+
+# analytics_events is partitioned by month; older partitions are dropped once rolled up
+ANALYTICS_EVENT_RETENTION_MONTHS = config('ANALYTICS_EVENT_RETENTION_MONTHS', default=13, cast=int)
+ANALYTICS_PARTITIONS_AHEAD = config('ANALYTICS_PARTITIONS_AHEAD', default=2, cast=int)
+
+# Driver locations: latest positions live in Redis, trails are downsampled and persisted in batches
+DRIVER_LOCATION_URL = config('DRIVER_LOCATION_URL', default=config('REDIS_URL', default='redis://localhost:6379'))
+DRIVER_LOCATION_TTL = config('DRIVER_LOCATION_TTL', default=900, cast=int)  # seconds before a silent driver goes stale
+DRIVER_TRAIL_MIN_DISTANCE_METERS = config('DRIVER_TRAIL_MIN_DISTANCE_METERS', default=25, cast=int)
+DRIVER_TRAIL_MIN_INTERVAL_SECONDS = config('DRIVER_TRAIL_MIN_INTERVAL_SECONDS', default=30, cast=int)
+DELIVERY_QUOTE_MAX_TRIPS = config('DELIVERY_QUOTE_MAX_TRIPS', default=500, cast=int)
+
+# Carts: active carts live in Redis, written back to carts/cart_items in batches and on checkout
+CART_STORE_URL = config('CART_STORE_URL', default=config('REDIS_URL', default='redis://localhost:6379'))
+CART_STORE_TTL = config('CART_STORE_TTL', default=7 * 86400, cast=int)  # seconds an idle cart stays in Redis
+CART_PRODUCT_SNAPSHOT_TIMEOUT = config('CART_PRODUCT_SNAPSHOT_TIMEOUT', default=300, cast=int)
+
+# Dispatch: nearest available drivers for a pickup (orders are collected from the store)
+DISPATCH_PICKUP_LATITUDE = config('DISPATCH_PICKUP_LATITUDE', default=0.3476, cast=float)
+DISPATCH_PICKUP_LONGITUDE = config('DISPATCH_PICKUP_LONGITUDE', default=32.5825, cast=float)
+DISPATCH_SEARCH_RADIUS_KM = config('DISPATCH_SEARCH_RADIUS_KM', default=5, cast=float)
+DISPATCH_MAX_RADIUS_KM = config('DISPATCH_MAX_RADIUS_KM', default=40, cast=float)
+DISPATCH_MAX_ACTIVE_DELIVERIES = config('DISPATCH_MAX_ACTIVE_DELIVERIES', default=2, cast=int)
+DISPATCH_LOAD_PENALTY_KM = config('DISPATCH_LOAD_PENALTY_KM', default=2, cast=float)
+DISPATCH_REQUIRE_SCHEDULE = config('DISPATCH_REQUIRE_SCHEDULE', default=True, cast=bool)
+
+# Order/invoice/receipt numbers and tracking codes: sequence values fetched per process at a time
+IDENTIFIER_BLOCK_SIZE = config('IDENTIFIER_BLOCK_SIZE', default=20, cast=int)
+
 # Flutterwave Payment Settings
 # Environment Configuration
 FLUTTERWAVE_ENVIRONMENT = os.environ.get('FLUTTERWAVE_ENVIRONMENT', 'sandbox')  # 'sandbox' or 'production'
@@ -363,6 +483,30 @@ FLUTTERWAVE_SANDBOX_URL = 'https://api.flutterwave.cloud/developersandbox'
 FLUTTERWAVE_PRODUCTION_URL = 'https://api.flutterwave.cloud/f4bexperience'
 FLUTTERWAVE_BASE_URL = os.environ.get('FLUTTERWAVE_BASE_URL', FLUTTERWAVE_SANDBOX_URL)
 
+# Shared Flutterwave HTTP client (one keep-alive pool per worker process)
+FLUTTERWAVE_HTTP_POOL_CONNECTIONS = int(os.environ.get('FLUTTERWAVE_HTTP_POOL_CONNECTIONS', 4))
+FLUTTERWAVE_HTTP_POOL_MAXSIZE = int(os.environ.get('FLUTTERWAVE_HTTP_POOL_MAXSIZE', 20))
+FLUTTERWAVE_HTTP_MAX_RETRIES = int(os.environ.get('FLUTTERWAVE_HTTP_MAX_RETRIES', 2))
+FLUTTERWAVE_HTTP_BACKOFF_FACTOR = float(os.environ.get('FLUTTERWAVE_HTTP_BACKOFF_FACTOR', 0.3))
+# Async client (payments.async_http): connections per worker for concurrent payment requests
+FLUTTERWAVE_ASYNC_HTTP_MAX_CONNECTIONS = int(os.environ.get('FLUTTERWAVE_ASYNC_HTTP_MAX_CONNECTIONS', 100))
+# Serve the provider-bound payment endpoints from async views (payments.async_views)
+PAYMENTS_ASYNC_VIEWS = config('PAYMENTS_ASYNC_VIEWS', default=True, cast=bool)
+# Cache alias used to share the OAuth access token between workers
+FLUTTERWAVE_TOKEN_CACHE_ALIAS = os.environ.get('FLUTTERWAVE_TOKEN_CACHE_ALIAS', 'default')
+
+# Pending payment reconciliation (payments.reconciliation)
+PAYMENT_RECONCILIATION_BATCH_SIZE = int(os.environ.get('PAYMENT_RECONCILIATION_BATCH_SIZE', 50))
+PAYMENT_RECONCILIATION_MAX_WORKERS = int(os.environ.get('PAYMENT_RECONCILIATION_MAX_WORKERS', 8))
+PAYMENT_RECONCILIATION_LEASE_SECONDS = int(os.environ.get('PAYMENT_RECONCILIATION_LEASE_SECONDS', 600))
+PAYMENT_RECONCILIATION_MAX_RUNTIME = int(os.environ.get('PAYMENT_RECONCILIATION_MAX_RUNTIME', 240))
+
+# Queued Flutterwave webhook processing (payments.webhooks)
+PAYMENT_WEBHOOK_BATCH_SIZE = int(os.environ.get('PAYMENT_WEBHOOK_BATCH_SIZE', 100))
+PAYMENT_WEBHOOK_MAX_ATTEMPTS = int(os.environ.get('PAYMENT_WEBHOOK_MAX_ATTEMPTS', 8))
+PAYMENT_WEBHOOK_LEASE_SECONDS = int(os.environ.get('PAYMENT_WEBHOOK_LEASE_SECONDS', 120))
+PAYMENT_WEBHOOK_RETRY_BASE_SECONDS = int(os.environ.get('PAYMENT_WEBHOOK_RETRY_BASE_SECONDS', 30))
+
 # Default Payment Settings
 DEFAULT_PAYMENT_CURRENCY = os.environ.get('DEFAULT_PAYMENT_CURRENCY', 'UGX')
 DEFAULT_PAYMENT_COUNTRY = os.environ.get('DEFAULT_PAYMENT_COUNTRY', 'UG')
@@ -372,42 +516,8 @@ DEFAULT_REDIRECT_URL = os.environ.get('DEFAULT_REDIRECT_URL', 'boozenation://ret
 # Site configuration for payments
 # (Using earlier definitions for SITE_LOGO_URL and SITE_NAME set above.)
 
-# Firebase Admin SDK initialization
-try:
-    # Try environment variables first (for production)
-    firebase_private_key = config('FIREBASE_PRIVATE_KEY', default='')
-    firebase_client_email = config('FIREBASE_CLIENT_EMAIL', default='')
-    firebase_project_id = config('FIREBASE_PROJECT_ID', default='')
-    
-    if firebase_private_key and firebase_client_email and firebase_project_id:
-        # Initialize with environment variables
-        firebase_credentials = {
-            "type": "service_account",
-            "project_id": firebase_project_id,
-            "private_key_id": config('FIREBASE_PRIVATE_KEY_ID', default=''),
-            "private_key": firebase_private_key.replace('\\n', '\n'),
-            "client_email": firebase_client_email,
-            "client_id": config('FIREBASE_CLIENT_ID', default=''),
-            "auth_uri": "https://accounts.google.com/o/oauth2/auth",
-            "token_uri": "https://oauth2.googleapis.com/token",
-            "auth_provider_x509_cert_url": "https://www.googleapis.com/oauth2/v1/certs",
-            "client_x509_cert_url": config('FIREBASE_CLIENT_X509_CERT_URL', default=''),
-            "universe_domain": "googleapis.com"
-        }
-        cred = credentials.Certificate(firebase_credentials)
-        firebase_admin.initialize_app(cred)
-        print("Firebase Admin SDK initialized successfully with environment variables")
-    elif FIREBASE_CREDENTIALS_PATH and os.path.exists(FIREBASE_CREDENTIALS_PATH):
-        # Fallback to file path
-        cred = credentials.Certificate(FIREBASE_CREDENTIALS_PATH)
-        firebase_admin.initialize_app(cred)
-        print("Firebase Admin SDK initialized successfully with custom credentials file")
-    elif os.path.exists(FIREBASE_SERVICE_ACCOUNT_KEY_PATH):
-        # Fallback to default file path
-        cred = credentials.Certificate(FIREBASE_SERVICE_ACCOUNT_KEY_PATH)
-        firebase_admin.initialize_app(cred)
-        print("Firebase Admin SDK initialized successfully with default credentials file")
-    else:
-        print(f"Firebase credentials not found. Check environment variables or file at: {FIREBASE_SERVICE_ACCOUNT_KEY_PATH}")
-except Exception as e:
-    print(f"Failed to initialize Firebase Admin SDK: {e}")
+# Verified Firebase ID token cache (users.token_cache)
+FIREBASE_TOKEN_LRU_SIZE = config('FIREBASE_TOKEN_LRU_SIZE', default=2048, cast=int)
+FIREBASE_TOKEN_CACHE_MAX_TTL = config('FIREBASE_TOKEN_CACHE_MAX_TTL', default=3600, cast=int)
+# Minutes between last_login writes for the same mobile user
+MOBILE_SESSION_UPDATE_INTERVAL = config('MOBILE_SESSION_UPDATE_INTERVAL', default=15, cast=int)
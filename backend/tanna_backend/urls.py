@@ -18,35 +18,54 @@ from django.contrib import admin
 from django.urls import path, include
 from django.conf import settings
 from django.conf.urls.static import static
-from drf_yasg.views import get_schema_view
-from drf_yasg import openapi
 from rest_framework import permissions
 from .api_tags import ALL_TAGS
-from .health_check import health_check
+from .health_check import health_check, metrics
+
+
+def get_docs_schema_view():
+    """Swagger schema view; drf_yasg's generator is only imported when docs are requested"""
+    from drf_yasg.views import get_schema_view
+    from drf_yasg import openapi
+
+    return get_schema_view(
+        openapi.Info(
+            title="BottlePlug API",
+            default_version='v1',
+            description="API documentation for BottlePlug backend - Alcohol delivery and e-commerce platform",
+            terms_of_service="https://www.google.com/policies/terms/",
+            contact=openapi.Contact(email="contact@bottleplug.com"),
+            license=openapi.License(name="BSD License"),
+        ),
+        public=True,
+        permission_classes=(permissions.AllowAny,),
+    )
+
+
+def docs_view(renderer):
+    """Swagger UI / ReDoc page, built on its first request"""
+    view = None
+
+    def lazy_view(request, *args, **kwargs):
+        nonlocal view
+        if view is None:
+            view = get_docs_schema_view().with_ui(renderer, cache_timeout=0)
+        return view(request, *args, **kwargs)
+
+    lazy_view.csrf_exempt = True
+    return lazy_view
 
-# Swagger schema view
-schema_view = get_schema_view(
-    openapi.Info(
-        title="BottlePlug API",
-        default_version='v1',
-        description="API documentation for BottlePlug backend - Alcohol delivery and e-commerce platform",
-        terms_of_service="https://www.google.com/policies/terms/",
-        contact=openapi.Contact(email="contact@bottleplug.com"),
-        license=openapi.License(name="BSD License"),
-    ),
-    public=True,
-    permission_classes=(permissions.AllowAny,),
-)
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     
     # Health check endpoint
     path('api/health/', health_check, name='health_check'),
+    path('metrics', metrics, name='metrics'),
     
     # API documentation
-    path('swagger/', schema_view.with_ui('swagger', cache_timeout=0), name='schema-swagger-ui'),
-    path('redoc/', schema_view.with_ui('redoc', cache_timeout=0), name='schema-redoc'),
+    path('swagger/', docs_view('swagger'), name='schema-swagger-ui'),
+    path('redoc/', docs_view('redoc'), name='schema-redoc'),
     path('api-auth/', include('rest_framework.urls')),
     
     # API endpoints
@@ -1,12 +1,14 @@
-import firebase_admin
-from firebase_admin import auth, credentials
 from django.conf import settings
 from django.contrib.auth import get_user_model
 from rest_framework import authentication
 from rest_framework.exceptions import AuthenticationFailed
 from decouple import config
+from .token_cache import verify_token, remember_user, cached_token_user
+import logging
 import os
 
+logger = logging.getLogger(__name__)
+
 User = get_user_model()
 
 
@@ -22,57 +24,59 @@ class FirebaseAuthentication(authentication.BaseAuthentication):
         user_agent = request.META.get('HTTP_USER_AGENT', '')
         app_version = request.META.get('HTTP_X_APP_VERSION', 'unknown')
         
-        # Enhanced debug logging
-        import logging
-        logger = logging.getLogger(__name__)
-        logger.info(f"[{platform.upper()}] Firebase auth attempt - Header: {auth_header[:50]}... User-Agent: {user_agent[:100]}... App-Version: {app_version}")
+        # Per-request detail is DEBUG (see LOG_HOT_PATH_LOGGERS in settings)
+        logger.debug(
+            "[%s] Firebase auth attempt - Bearer: %s, App-Version: %s, User-Agent: %.100s",
+            platform, auth_header.startswith('Bearer '), app_version, user_agent,
+        )
         
         if not auth_header.startswith('Bearer '):
-            logger.warning(f"[{platform.upper()}] No Bearer token found in Authorization header")
+            logger.debug("[%s] No Bearer token found in Authorization header", platform)
             return None
         
         token = auth_header.split('Bearer ')[1]
         
         if not token:
-            logger.warning(f"[{platform.upper()}] Empty token after Bearer prefix")
+            logger.warning("[%s] Empty token after Bearer prefix", platform)
             return None
         
         # Validate token format (Firebase tokens are JWT tokens that start with 'eyJ')
         if not token.startswith('eyJ'):
-            logger.warning(f"[{platform.upper()}] Invalid token format - doesn't start with 'eyJ'. Token: {token[:20]}...")
+            logger.debug("[%s] Not a Firebase token (length %d)", platform, len(token))
             return None
         
-        logger.info(f"[{platform.upper()}] Token format valid - Length: {len(token)}, Starts with: {token[:20]}...")
-        
         try:
             # Firebase should already be initialized in settings.py
             # No need to re-initialize here
             
-            # Verify the Firebase token
-            logger.info(f"[{platform.upper()}] Attempting Firebase token verification...")
-            decoded_token = auth.verify_id_token(token)
+            # Verify the Firebase token (reuses MobileFirebaseAuthentication's result for this request)
+            token_entry = verify_token(request, token)
+            decoded_token = token_entry['claims']
             firebase_uid = decoded_token['uid']
-            firebase_email = decoded_token.get('email', '')
             is_anonymous = decoded_token.get('firebase', {}).get('sign_in_provider') == 'anonymous'
             
-            logger.info(f"[{platform.upper()}] Token verified successfully - UID: {firebase_uid}, Email: {firebase_email}, Anonymous: {is_anonymous}")
+            logger.debug("[%s] Token verified - UID: %s, Anonymous: %s", platform, firebase_uid, is_anonymous)
             
-            # Get or create user
-            logger.info(f"[{platform.upper()}] Attempting user lookup/creation...")
-            user, created = self._get_or_create_user(decoded_token)
+            user = cached_token_user(token_entry, firebase_uid)
+            created = False
+            if user is None:
+                # Get or create user
+                user, created = self._get_or_create_user(decoded_token)
+                remember_user(request, token, user)
             
-            logger.info(f"[{platform.upper()}] User {'created' if created else 'found'}: {user.username} (ID: {user.id}, Type: {getattr(user, 'user_type', 'unknown')})")
+            logger.debug(
+                "[%s] User %s (ID: %s, Type: %s)",
+                platform, 'created' if created else 'found', user.id, getattr(user, 'user_type', 'unknown'),
+            )
             
             return (user, None)
             
         except Exception as e:
             # Enhanced error logging with specific error types
-            logger.error(f"[{platform.upper()}] Firebase authentication failed - Error: {str(e)}")
-            logger.error(f"[{platform.upper()}] Error type: {type(e).__name__}")
-            
-            # Log specific Firebase errors
-            if hasattr(e, 'code'):
-                logger.error(f"[{platform.upper()}] Firebase error code: {e.code}")
+            logger.warning(
+                "[%s] Firebase authentication failed (%s, code %s): %s",
+                platform, type(e).__name__, getattr(e, 'code', None), e,
+            )
             
             # Don't raise an exception - let other authentication classes try
             # This prevents Firebase auth from blocking JWT auth
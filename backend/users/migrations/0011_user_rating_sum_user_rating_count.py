@@ -0,0 +1,41 @@
+# Generated by Django 4.2.7 on 2026-10-17 09:10
+
+from decimal import Decimal, ROUND_HALF_UP
+
+from django.db import migrations, models
+from django.db.models import Count, Sum
+
+
+def backfill_driver_ratings(apps, schema_editor):
+    User = apps.get_model('users', 'User')
+    DeliveryRating = apps.get_model('deliveries', 'DeliveryRating')
+
+    totals = DeliveryRating.objects.order_by().values('driver_id').annotate(total=Sum('rating'), count=Count('id'))
+    for row in totals.iterator():
+        User.objects.filter(pk=row['driver_id']).update(
+            rating_sum=row['total'],
+            rating_count=row['count'],
+            rating=(Decimal(row['total']) / row['count']).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP),
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0010_remove_user_notes'),
+        ('deliveries', '0002_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='rating_sum',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='rating_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_driver_ratings, migrations.RunPython.noop),
+    ]
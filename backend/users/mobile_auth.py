@@ -1,11 +1,11 @@
-import firebase_admin
-from firebase_admin import auth, credentials
 from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.utils import timezone
+from datetime import timedelta
 from rest_framework import authentication
 from rest_framework.exceptions import AuthenticationFailed
 from decouple import config
+from .token_cache import verify_token, remember_user, cached_token_user
 import os
 import logging
 
@@ -28,55 +28,61 @@ class MobileFirebaseAuthentication(authentication.BaseAuthentication):
         app_version = request.META.get('HTTP_X_APP_VERSION', 'unknown')
         device_id = request.META.get('HTTP_X_DEVICE_ID', 'unknown')
         
-        # Enhanced mobile-specific debug logging
-        logger.info(f"[MOBILE-{platform.upper()}] Auth attempt - App: {app_version}, Device: {device_id}")
-        logger.info(f"[MOBILE-{platform.upper()}] User-Agent: {user_agent[:150]}...")
-        logger.info(f"[MOBILE-{platform.upper()}] Auth header present: {bool(auth_header)}")
+        # Per-request detail is DEBUG (see LOG_HOT_PATH_LOGGERS in settings)
+        logger.debug(
+            "[MOBILE-%s] Auth attempt - App: %s, Device: %s, Auth header present: %s, User-Agent: %.150s",
+            platform, app_version, device_id, bool(auth_header), user_agent,
+        )
         
         if not auth_header:
-            logger.warning(f"[MOBILE-{platform.upper()}] No Authorization header found")
+            logger.warning("[MOBILE-%s] No Authorization header found", platform)
             return None
         
         if not auth_header.startswith('Bearer '):
-            logger.warning(f"[MOBILE-{platform.upper()}] Authorization header doesn't start with 'Bearer'")
+            logger.warning("[MOBILE-%s] Authorization header doesn't start with 'Bearer'", platform)
             return None
         
         token = auth_header.split('Bearer ')[1]
         
         if not token:
-            logger.warning(f"[MOBILE-{platform.upper()}] Empty token after Bearer prefix")
+            logger.warning("[MOBILE-%s] Empty token after Bearer prefix", platform)
             return None
         
         # Validate token format (Firebase tokens are JWT tokens that start with 'eyJ')
         if not token.startswith('eyJ'):
-            logger.warning(f"[MOBILE-{platform.upper()}] Invalid token format - doesn't start with 'eyJ'. Token: {token[:30]}...")
+            logger.warning("[MOBILE-%s] Invalid token format - doesn't start with 'eyJ' (length %d)", platform, len(token))
             return None
         
-        logger.info(f"[MOBILE-{platform.upper()}] Token format valid - Length: {len(token)}")
+        # Token error types; the SDK itself is initialized on first verification
+        from firebase_admin import auth
         
         try:
-            # Verify the Firebase token with enhanced error handling
-            logger.info(f"[MOBILE-{platform.upper()}] Starting Firebase token verification...")
-            decoded_token = auth.verify_id_token(token)
+            # Verify the Firebase token (cached by token hash, at most once per request)
+            token_entry = verify_token(request, token)
+            decoded_token = token_entry['claims']
             
             firebase_uid = decoded_token['uid']
-            firebase_email = decoded_token.get('email', '')
             is_anonymous = decoded_token.get('firebase', {}).get('sign_in_provider') == 'anonymous'
             auth_time = decoded_token.get('auth_time', 0)
             exp_time = decoded_token.get('exp', 0)
             
-            logger.info(f"[MOBILE-{platform.upper()}] Token verified - UID: {firebase_uid}")
-            logger.info(f"[MOBILE-{platform.upper()}] Email: {firebase_email}, Anonymous: {is_anonymous}")
-            logger.info(f"[MOBILE-{platform.upper()}] Auth time: {auth_time}, Exp time: {exp_time}")
+            logger.debug(
+                "[MOBILE-%s] Token verified - UID: %s, Anonymous: %s, Auth time: %s, Exp time: %s",
+                platform, firebase_uid, is_anonymous, auth_time, exp_time,
+            )
             
-            # Get or create user with mobile-specific handling
-            logger.info(f"[MOBILE-{platform.upper()}] Attempting user lookup/creation...")
-            user, created = self._get_or_create_mobile_user(decoded_token, platform, device_id)
+            # Warm token: the user was resolved and synced when the token was first seen
+            user = cached_token_user(token_entry, firebase_uid)
+            created = False
+            if user is None:
+                # Get or create user with mobile-specific handling
+                user, created = self._get_or_create_mobile_user(decoded_token, platform, device_id)
+                remember_user(request, token, user)
             
             if created:
-                logger.info(f"[MOBILE-{platform.upper()}] New mobile user created: {user.username} (ID: {user.id})")
+                logger.info("[MOBILE-%s] New mobile user created (ID: %s)", platform, user.id)
             else:
-                logger.info(f"[MOBILE-{platform.upper()}] Existing mobile user found: {user.username} (ID: {user.id})")
+                logger.debug("[MOBILE-%s] Existing mobile user found (ID: %s)", platform, user.id)
             
             # Update user's mobile session info
             self._update_mobile_session_info(user, platform, device_id, app_version)
@@ -84,21 +90,16 @@ class MobileFirebaseAuthentication(authentication.BaseAuthentication):
             return (user, None)
             
         except auth.InvalidIdTokenError as e:
-            logger.error(f"[MOBILE-{platform.upper()}] Invalid Firebase ID token: {str(e)}")
+            logger.warning("[MOBILE-%s] Invalid Firebase ID token: %s", platform, e)
             return None
         except auth.ExpiredIdTokenError as e:
-            logger.error(f"[MOBILE-{platform.upper()}] Expired Firebase ID token: {str(e)}")
+            logger.warning("[MOBILE-%s] Expired Firebase ID token: %s", platform, e)
             return None
         except auth.RevokedIdTokenError as e:
-            logger.error(f"[MOBILE-{platform.upper()}] Revoked Firebase ID token: {str(e)}")
+            logger.warning("[MOBILE-%s] Revoked Firebase ID token: %s", platform, e)
             return None
         except Exception as e:
-            logger.error(f"[MOBILE-{platform.upper()}] Firebase authentication error: {str(e)}")
-            logger.error(f"[MOBILE-{platform.upper()}] Error type: {type(e).__name__}")
-            
-            # Log additional context for debugging
-            import traceback
-            logger.error(f"[MOBILE-{platform.upper()}] Traceback: {traceback.format_exc()}")
+            logger.exception("[MOBILE-%s] Firebase authentication error (%s): %s", platform, type(e).__name__, e)
             
             return None
     
@@ -114,7 +115,7 @@ class MobileFirebaseAuthentication(authentication.BaseAuthentication):
         # Try to find user by Firebase UID first
         try:
             user = User.objects.get(firebase_uid=firebase_uid)
-            logger.info(f"[MOBILE] User found by Firebase UID: {user.username}")
+            logger.debug("[MOBILE] User found by Firebase UID (ID: %s)", user.id)
             
             # Update user information
             updated = False
@@ -143,18 +144,18 @@ class MobileFirebaseAuthentication(authentication.BaseAuthentication):
             
             if updated:
                 user.save()
-                logger.info(f"[MOBILE] User updated: {user.username}")
+                logger.debug("[MOBILE] User updated (ID: %s)", user.id)
             
             return user, False
             
         except User.DoesNotExist:
-            logger.info(f"[MOBILE] No user found with Firebase UID: {firebase_uid}")
+            logger.debug("[MOBILE] No user found with Firebase UID: %s", firebase_uid)
         
         # Try to find user by email (only for non-anonymous users)
         if firebase_email:
             try:
                 user = User.objects.get(email=firebase_email)
-                logger.info(f"[MOBILE] User found by email: {user.username}")
+                logger.info("[MOBILE] Linked Firebase UID %s to existing user (ID: %s)", firebase_uid, user.id)
                 
                 # Link Firebase UID to existing user
                 user.firebase_uid = firebase_uid
@@ -168,20 +169,17 @@ class MobileFirebaseAuthentication(authentication.BaseAuthentication):
                 return user, False
                 
             except User.DoesNotExist:
-                logger.info(f"[MOBILE] No user found with email: {firebase_email}")
+                logger.debug("[MOBILE] No user found with the token's email")
         
         # Create new mobile user
-        logger.info(f"[MOBILE] Creating new mobile user...")
-        
         # Handle anonymous users (no email)
         if not firebase_email:
             username = f"mobile_anon_{firebase_uid[:8]}"
             email = f"{username}@mobile.bottleplug.com"
-            logger.info(f"[MOBILE] Creating anonymous mobile user: {username}")
+            logger.debug("[MOBILE] Creating anonymous mobile user: %s", username)
         else:
             username = firebase_email
             email = firebase_email
-            logger.info(f"[MOBILE] Creating mobile user with email: {email}")
         
         # Parse name
         first_name, *last_name_parts = name.split(' ', 1) if name else ('', '')
@@ -201,11 +199,11 @@ class MobileFirebaseAuthentication(authentication.BaseAuthentication):
                 is_active=True,
             )
             
-            logger.info(f"[MOBILE] New mobile user created successfully: {user.username} (ID: {user.id})")
+            logger.debug("[MOBILE] New mobile user saved (ID: %s)", user.id)
             return user, True
             
         except Exception as e:
-            logger.error(f"[MOBILE] Failed to create new user: {str(e)}")
+            logger.error("[MOBILE] Failed to create new user: %s", e)
             raise
     
     def _update_mobile_session_info(self, user, platform, device_id, app_version):
@@ -213,8 +211,14 @@ class MobileFirebaseAuthentication(authentication.BaseAuthentication):
         Update user's mobile session information for analytics and support
         """
         try:
+            # Throttled: at most one write per user every MOBILE_SESSION_UPDATE_INTERVAL minutes
+            now = timezone.now()
+            interval = timedelta(minutes=getattr(settings, 'MOBILE_SESSION_UPDATE_INTERVAL', 15))
+            if user.last_login and now - user.last_login < interval:
+                return
+            
             # Update last login time
-            user.last_login = timezone.now()
+            user.last_login = now
             
             # Store mobile session info (if you have these fields)
             if hasattr(user, 'last_platform'):
@@ -226,10 +230,10 @@ class MobileFirebaseAuthentication(authentication.BaseAuthentication):
             
             user.save(update_fields=['last_login'])
             
-            logger.info(f"[MOBILE] Updated session info for user: {user.username}")
+            logger.debug("[MOBILE] Updated session info (ID: %s)", user.id)
             
         except Exception as e:
-            logger.warning(f"[MOBILE] Failed to update session info: {str(e)}")
+            logger.warning("[MOBILE] Failed to update session info: %s", e)
     
     def authenticate_header(self, request):
         return 'Bearer realm="mobile-api"'
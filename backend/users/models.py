@@ -29,6 +29,8 @@ class User(AbstractUser):
     vehicle_number = models.CharField(max_length=20, blank=True, null=True)
     license_number = models.CharField(max_length=50, blank=True, null=True)
     rating = models.DecimalField(max_digits=3, decimal_places=2, null=True, blank=True)
+    rating_sum = models.IntegerField(default=0)
+    rating_count = models.IntegerField(default=0)
     # Additional profile fields
     bio = models.TextField(blank=True, null=True, help_text="User's bio or description")
     first_name = models.CharField(max_length=150, blank=True, null=True)
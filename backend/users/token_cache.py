@@ -0,0 +1,176 @@
+"""
+Verified Firebase ID token cache
+
+Verifying an ID token means an RSA signature check (and, every few hours, a
+certificate download). A client sends the same token on every request until it
+expires, so verified claims are cached by token hash:
+
+1. Per request: the result (claims or error) is memoized on the HttpRequest,
+   so the authentication chain verifies a token at most once
+2. Per process: a small LRU of recently seen tokens
+3. Shared: the Django cache (Redis), so a token verified by one worker is warm
+   for all of them
+
+Entries never outlive the token's own `exp` claim.
+"""
+
+import hashlib
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+
+logger = logging.getLogger(__name__)
+
+CACHE_KEY_PREFIX = 'firebase:idtoken:'
+REQUEST_MEMO_ATTR = '_firebase_token_memo'
+
+_lru = OrderedDict()
+_lru_lock = threading.Lock()
+
+
+def _token_hash(token):
+    return hashlib.sha256(token.encode('utf-8')).hexdigest()
+
+
+def _lru_size():
+    return getattr(settings, 'FIREBASE_TOKEN_LRU_SIZE', 2048)
+
+
+def _max_ttl():
+    return getattr(settings, 'FIREBASE_TOKEN_CACHE_MAX_TTL', 3600)
+
+
+def _lru_get(key):
+    with _lru_lock:
+        entry = _lru.get(key)
+        if entry is None:
+            return None
+        if entry['exp'] <= time.time():
+            del _lru[key]
+            return None
+        _lru.move_to_end(key)
+        return entry
+
+
+def _lru_put(key, entry):
+    with _lru_lock:
+        _lru[key] = entry
+        _lru.move_to_end(key)
+        while len(_lru) > _lru_size():
+            _lru.popitem(last=False)
+
+
+def _store(key, entry):
+    ttl = min(int(entry['exp'] - time.time()), _max_ttl())
+    if ttl <= 0:
+        return
+    _lru_put(key, entry)
+    try:
+        cache.set(CACHE_KEY_PREFIX + key, entry, timeout=ttl)
+    except Exception as e:
+        logger.warning(f"Could not store verified Firebase token in shared cache: {str(e)}")
+
+
+def _lookup(key):
+    entry = _lru_get(key)
+    if entry is not None:
+        return entry
+    try:
+        entry = cache.get(CACHE_KEY_PREFIX + key)
+    except Exception as e:
+        logger.warning(f"Shared Firebase token cache unavailable: {str(e)}")
+        return None
+    if entry is None or entry['exp'] <= time.time():
+        return None
+    _lru_put(key, entry)
+    return entry
+
+
+def _memo(request):
+    # DRF's Request wraps the HttpRequest; memoize on the HttpRequest shared by every auth class
+    http_request = getattr(request, '_request', request)
+    memo = getattr(http_request, REQUEST_MEMO_ATTR, None)
+    if memo is None:
+        memo = {}
+        setattr(http_request, REQUEST_MEMO_ATTR, memo)
+    return memo
+
+
+def verify_token(request, token):
+    """
+    Return the token's cache entry: {'claims': <decoded token>, 'exp': ..., 'user_id': <id or None>}.
+    Raises the firebase_admin verification error for invalid tokens; within one
+    request the same error is re-raised without verifying again.
+    """
+    from utils.firebase import firebase_auth
+    from utils.metrics import upstream
+
+    key = _token_hash(token)
+    memo = _memo(request)
+    if key in memo:
+        result = memo[key]
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    entry = _lookup(key)
+    if entry is None:
+        try:
+            with upstream('firebase'):
+                claims = firebase_auth().verify_id_token(token)
+        except Exception as e:
+            memo[key] = e
+            raise
+        entry = {'claims': claims, 'exp': claims.get('exp', 0), 'user_id': None}
+        _store(key, entry)
+
+    memo[key] = entry
+    return entry
+
+
+def remember_user(request, token, user):
+    """
+    Record which user a verified token resolved to, so warm requests skip the
+    lookup-by-uid and profile sync and load the user by primary key
+    """
+    key = _token_hash(token)
+    entry = _memo(request).get(key)
+    if not isinstance(entry, dict) or entry.get('user_id') == user.pk:
+        return
+    entry = dict(entry, user_id=user.pk)
+    _memo(request)[key] = entry
+    _store(key, entry)
+
+
+def cached_token_user(entry, firebase_uid):
+    """
+    The user a warm token resolved to, or None when it has to be looked up (and synced) again
+    """
+    from django.contrib.auth import get_user_model
+
+    user_id = entry.get('user_id')
+    if not user_id:
+        return None
+    user = get_user_model().objects.filter(pk=user_id).first()
+    if user is None or user.firebase_uid != firebase_uid:
+        return None
+    return user
+
+
+def forget_token(token):
+    """
+    Drop a token from the process and shared caches (e.g. after revocation)
+    """
+    key = _token_hash(token)
+    with _lru_lock:
+        _lru.pop(key, None)
+    cache.delete(CACHE_KEY_PREFIX + key)
+
+
+def clear_local_cache():
+    with _lru_lock:
+        _lru.clear()
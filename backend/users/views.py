@@ -12,8 +12,8 @@ import uuid
 import logging
 from drf_yasg.utils import swagger_auto_schema
 from drf_yasg import openapi
-import firebase_admin
-from firebase_admin import auth as firebase_auth
+from utils.firebase import firebase_auth
+from utils.metrics import upstream
 import jwt
 from django.conf import settings
 
@@ -190,7 +190,8 @@ class FirebaseLoginView(APIView):
             
             # Verify Firebase token
             try:
-                decoded_token = firebase_auth.verify_id_token(id_token)
+                with upstream('firebase'):
+                    decoded_token = firebase_auth().verify_id_token(id_token)
                 firebase_uid = decoded_token['uid']
                 firebase_email = decoded_token.get('email')
             except Exception as e:
@@ -308,7 +309,8 @@ def debug_mobile_auth(request):
     
     if token and has_bearer:
         try:
-            decoded_token = firebase_auth.verify_id_token(token)
+            with upstream('firebase'):
+                decoded_token = firebase_auth().verify_id_token(token)
             token_verification = {
                 'valid': True,
                 'uid': decoded_token.get('uid'),
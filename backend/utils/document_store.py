@@ -0,0 +1,160 @@
+"""
+Content-addressed store for rendered PDFs
+
+Layout under PDF_STORE_ROOT:
+    objects/<aa>/<sha256>.pdf          rendered bytes, named by their digest
+    refs/<kind>/<id>/<version>         digest of the document rendered for that version
+
+A document's version hashes its render context, the branding fingerprint and
+the renderer version, so it changes exactly when the output would. Looking up a
+download is therefore one context build and one small file read; the PDF is only
+rendered on the request thread when nothing was pre-rendered for that version.
+
+Downloads are served from disk with FileResponse, or handed to nginx with
+X-Accel-Redirect when PDF_ACCEL_REDIRECT_PREFIX is set, and carry the digest as
+ETag so repeated downloads are answered with 304.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import tempfile
+
+from django.conf import settings
+from django.db import transaction
+from django.http import FileResponse, HttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+
+from .pdf import DOCUMENT_TYPES, RENDERER_VERSION, get_branding
+
+logger = logging.getLogger(__name__)
+
+
+class StoredDocument:
+
+    def __init__(self, kind, pk, version, digest, path, modified_at):
+        self.kind = kind
+        self.pk = pk
+        self.version = version
+        self.digest = digest
+        self.path = path
+        self.modified_at = modified_at
+
+    @property
+    def relative_path(self):
+        return f'objects/{self.digest[:2]}/{self.digest}.pdf'
+
+
+def _root():
+    return getattr(settings, 'PDF_STORE_ROOT', os.path.join(settings.MEDIA_ROOT, 'documents'))
+
+
+def _object_path(digest):
+    return os.path.join(_root(), 'objects', digest[:2], f'{digest}.pdf')
+
+
+def _ref_dir(kind, pk):
+    return os.path.join(_root(), 'refs', kind, str(pk))
+
+
+def _write_atomic(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.tmp-')
+    try:
+        with os.fdopen(fd, 'wb') as tmp_file:
+            tmp_file.write(data)
+        os.replace(tmp_path, path)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+
+
+def document_version(context, branding):
+    payload = json.dumps([RENDERER_VERSION, branding.fingerprint, context], sort_keys=True)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()[:32]
+
+
+def _read_ref(kind, pk, version):
+    ref_path = os.path.join(_ref_dir(kind, pk), version)
+    try:
+        with open(ref_path, 'r') as ref_file:
+            digest = ref_file.read().strip()
+        modified_at = os.path.getmtime(ref_path)
+    except FileNotFoundError:
+        return None
+    if not digest or not os.path.exists(_object_path(digest)):
+        return None
+    return StoredDocument(kind, pk, version, digest, _object_path(digest), modified_at)
+
+
+def get_document(kind, obj):
+    """
+    Return the stored PDF for `obj`, rendering and storing it first if this version is missing
+    """
+    context_for, render = DOCUMENT_TYPES[kind]
+    branding = get_branding()
+    context = context_for(obj)
+    version = document_version(context, branding)
+
+    document = _read_ref(kind, obj.pk, version)
+    if document is not None:
+        return document
+
+    data = render(context, branding)
+    digest = hashlib.sha256(data).hexdigest()
+    path = _object_path(digest)
+    if not os.path.exists(path):
+        _write_atomic(path, data)
+
+    ref_dir = _ref_dir(kind, obj.pk)
+    _write_atomic(os.path.join(ref_dir, version), digest.encode('ascii'))
+    # Older versions of this document are never served again
+    for name in os.listdir(ref_dir):
+        if name != version and not name.startswith('.tmp-'):
+            try:
+                os.unlink(os.path.join(ref_dir, name))
+            except FileNotFoundError:
+                pass
+
+    logger.debug("Rendered %s %s version %s (%s bytes)", kind, obj.pk, version, len(data))
+    return _read_ref(kind, obj.pk, version)
+
+
+def document_response(request, document, filename):
+    """
+    Serve a stored document with ETag/Last-Modified, answering conditional requests with 304
+    """
+    etag = f'"{document.digest}"'
+    last_modified = int(document.modified_at)
+
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is None:
+        accel_prefix = getattr(settings, 'PDF_ACCEL_REDIRECT_PREFIX', '')
+        if accel_prefix:
+            response = HttpResponse(content_type='application/pdf')
+            response['X-Accel-Redirect'] = f"{accel_prefix.rstrip('/')}/{document.relative_path}"
+        else:
+            response = FileResponse(open(document.path, 'rb'), content_type='application/pdf')
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+    # Documents change when invoices are paid: clients must revalidate, which is cheap
+    response['Cache-Control'] = 'private, no-cache'
+    return response
+
+
+def schedule_prerender(task, pk):
+    """
+    Queue a pre-render task once the surrounding transaction commits
+    """
+    def enqueue():
+        try:
+            task.delay(pk)
+        except Exception as e:
+            logger.warning(f"Could not enqueue PDF pre-render for {pk}: {str(e)}")
+
+    transaction.on_commit(enqueue)
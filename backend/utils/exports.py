@@ -0,0 +1,301 @@
+"""
+Streaming bulk exports (CSV, NDJSON, Parquet)
+
+Exports read flat rows with values_list(...).iterator(chunk_size=...), which on
+PostgreSQL is a server-side cursor, and encode them as they arrive: memory stays
+constant however many rows are exported, and nothing runs COUNT(*) or OFFSET.
+
+Columns are (header, lookup, kind) triples defined next to each model
+(orders.exports, payments.exports, analytics.exports). `kind` drives encoding:
+int, str, bool, money, float, datetime or json.
+
+Used by the admin `export` actions (StreamingHttpResponse) and the export_data
+management command (file or stdout).
+"""
+
+import csv
+import io
+import json
+import logging
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+CSV_ROWS_PER_CHUNK = 500
+
+DATASETS = {
+    'orders': {
+        'model': 'orders.models.Order',
+        'columns': 'orders.exports.ORDER_EXPORT_COLUMNS',
+        'customer_field': 'customer',
+        'status_field': 'status',
+    },
+    'invoices': {
+        'model': 'orders.models.Invoice',
+        'columns': 'orders.exports.INVOICE_EXPORT_COLUMNS',
+        'customer_field': 'order__customer',
+        'status_field': 'status',
+    },
+    'payments': {
+        'model': 'payments.models.PaymentTransaction',
+        'columns': 'payments.exports.PAYMENT_EXPORT_COLUMNS',
+        'customer_field': 'customer',
+        'status_field': 'status',
+    },
+    'analytics_events': {
+        'model': 'analytics.models.AnalyticsEvent',
+        'columns': 'analytics.exports.ANALYTICS_EVENT_EXPORT_COLUMNS',
+        'customer_field': 'user',
+        'status_field': None,
+    },
+}
+
+
+class ExportError(ValueError):
+    """Invalid export request (unknown format or dataset, bad filter value)"""
+
+
+def _chunk_size():
+    return getattr(settings, 'EXPORT_CHUNK_SIZE', 2000)
+
+
+def _parse_day(value, name):
+    try:
+        return datetime.strptime(value, '%Y-%m-%d').date()
+    except ValueError:
+        raise ExportError(f"Invalid {name} '{value}', expected YYYY-MM-DD")
+
+
+def _start_of_day(day):
+    return timezone.make_aware(datetime.combine(day, datetime.min.time()))
+
+
+def apply_export_filters(queryset, params, customer_field='customer', status_field='status', dates=True):
+    """
+    Filters shared by every export: start_date/end_date (inclusive days, as plain
+    created_at range predicates), status and customer id. Pass dates=False when
+    the queryset already went through a list endpoint's own date filtering.
+    """
+    if dates:
+        start_date = params.get('start_date')
+        end_date = params.get('end_date')
+        if start_date:
+            queryset = queryset.filter(created_at__gte=_start_of_day(_parse_day(start_date, 'start_date')))
+        if end_date:
+            end_day = _parse_day(end_date, 'end_date') + timedelta(days=1)
+            queryset = queryset.filter(created_at__lt=_start_of_day(end_day))
+
+    status_value = params.get('status')
+    if status_value and status_field:
+        queryset = queryset.filter(**{status_field: status_value})
+
+    customer = params.get('customer')
+    if customer:
+        if not str(customer).isdigit():
+            raise ExportError(f"Invalid customer '{customer}', expected a user id")
+        queryset = queryset.filter(**{customer_field: int(customer)})
+    return queryset
+
+
+def iter_rows(queryset, columns, chunk_size=None):
+    """
+    Stream value tuples in primary key order through a server-side cursor
+    """
+    lookups = [lookup for _header, lookup, _kind in columns]
+    return queryset.order_by('pk').values_list(*lookups).iterator(chunk_size=chunk_size or _chunk_size())
+
+
+def _text_value(value, kind):
+    if value is None:
+        return ''
+    if kind == 'datetime':
+        return value.isoformat()
+    if kind == 'json':
+        return json.dumps(value, default=str)
+    return str(value)
+
+
+def _json_value(value, kind):
+    if value is None or kind == 'json':
+        return value
+    if kind == 'datetime':
+        return value.isoformat()
+    if kind == 'money':
+        # Strings keep exact decimal amounts
+        return str(value)
+    if kind == 'float':
+        return float(value)
+    return value
+
+
+def render_csv(columns, rows):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow([header for header, _lookup, _kind in columns])
+    kinds = [kind for _header, _lookup, kind in columns]
+
+    pending = 0
+    for row in rows:
+        writer.writerow([_text_value(value, kind) for value, kind in zip(row, kinds)])
+        pending += 1
+        if pending >= CSV_ROWS_PER_CHUNK:
+            yield buffer.getvalue().encode('utf-8')
+            buffer.seek(0)
+            buffer.truncate()
+            pending = 0
+    yield buffer.getvalue().encode('utf-8')
+
+
+def render_ndjson(columns, rows):
+    headers = [header for header, _lookup, _kind in columns]
+    kinds = [kind for _header, _lookup, kind in columns]
+    lines = []
+    for row in rows:
+        record = {header: _json_value(value, kind) for header, value, kind in zip(headers, row, kinds)}
+        lines.append(json.dumps(record, default=str))
+        if len(lines) >= CSV_ROWS_PER_CHUNK:
+            yield ('\n'.join(lines) + '\n').encode('utf-8')
+            lines = []
+    if lines:
+        yield ('\n'.join(lines) + '\n').encode('utf-8')
+
+
+class _ChunkSink(io.RawIOBase):
+    """Write-only file object that hands back what was written since the last drain"""
+
+    def __init__(self):
+        super().__init__()
+        self._chunks = []
+        self._position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def drain(self):
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def render_parquet(columns, rows):
+    """
+    One Parquet row group per chunk of rows; each finished row group is yielded
+    before the next chunk is read, so only one chunk is held in memory
+    """
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise ExportError('Parquet export requires the pyarrow package')
+
+    arrow_types = {
+        'int': pa.int64(),
+        'str': pa.string(),
+        'bool': pa.bool_(),
+        'money': pa.decimal128(18, 2),
+        'float': pa.float64(),
+        'datetime': pa.timestamp('us', tz='UTC'),
+        'json': pa.string(),
+    }
+    schema = pa.schema([(header, arrow_types[kind]) for header, _lookup, kind in columns])
+    kinds = [kind for _header, _lookup, kind in columns]
+    chunk_size = _chunk_size()
+
+    def build_table(batch):
+        arrays = []
+        for index, kind in enumerate(kinds):
+            values = [row[index] for row in batch]
+            if kind == 'json':
+                values = [None if value is None else json.dumps(value, default=str) for value in values]
+            elif kind == 'float':
+                values = [None if value is None else float(value) for value in values]
+            elif kind == 'str':
+                values = [None if value is None else str(value) for value in values]
+            arrays.append(pa.array(values, type=schema.field(index).type))
+        return pa.Table.from_arrays(arrays, schema=schema)
+
+    sink = _ChunkSink()
+    writer = pq.ParquetWriter(sink, schema, compression='snappy')
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= chunk_size:
+            writer.write_table(build_table(batch))
+            batch = []
+            yield sink.drain()
+    if batch:
+        writer.write_table(build_table(batch))
+    writer.close()
+    yield sink.drain()
+
+
+FORMATS = {
+    'csv': ('text/csv; charset=utf-8', 'csv', render_csv),
+    'ndjson': ('application/x-ndjson', 'ndjson', render_ndjson),
+    'parquet': ('application/vnd.apache.parquet', 'parquet', render_parquet),
+}
+
+
+def _renderer(export_format):
+    if export_format not in FORMATS:
+        raise ExportError(f"Unknown export format '{export_format}', expected one of: {', '.join(FORMATS)}")
+    if export_format == 'parquet':
+        # Fail before the response starts rather than mid-stream
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            raise ExportError('Parquet export requires the pyarrow package')
+    return FORMATS[export_format]
+
+
+def export_response(name, queryset, columns, export_format='csv'):
+    """
+    StreamingHttpResponse encoding `queryset` as it is read
+    """
+    content_type, extension, render = _renderer(export_format)
+    filename = f"{name}-{timezone.now().strftime('%Y%m%d-%H%M%S')}.{extension}"
+    response = StreamingHttpResponse(render(columns, iter_rows(queryset, columns)), content_type=content_type)
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    response['Cache-Control'] = 'no-store'
+    logger.info(f"Streaming {name} export as {export_format}")
+    return response
+
+
+def write_export(queryset, columns, export_format, stream, chunk_size=None):
+    """
+    Write an export to a binary stream; returns the number of bytes written
+    """
+    _content_type, _extension, render = _renderer(export_format)
+    written = 0
+    for chunk in render(columns, iter_rows(queryset, columns, chunk_size)):
+        stream.write(chunk)
+        written += len(chunk)
+    return written
+
+
+def dataset(name):
+    """
+    (model, columns, customer_field, status_field) for a DATASETS entry
+    """
+    if name not in DATASETS:
+        raise ExportError(f"Unknown dataset '{name}', expected one of: {', '.join(DATASETS)}")
+    entry = DATASETS[name]
+    return (
+        import_string(entry['model']),
+        import_string(entry['columns']),
+        entry['customer_field'],
+        entry['status_field'],
+    )
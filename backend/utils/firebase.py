@@ -0,0 +1,94 @@
+"""
+Firebase Admin SDK, initialized on first use
+
+Importing firebase_admin (and google-auth, grpc, ...) and parsing the service
+account used to happen in settings.py, so every process paid for it at
+startup: web workers, Celery workers and beat, and every manage.py command.
+Now the default app is created the first time a token is verified or a push
+message is sent, from the first credentials found of:
+
+1. FIREBASE_PRIVATE_KEY, FIREBASE_CLIENT_EMAIL and FIREBASE_PROJECT_ID
+   (production, from the environment)
+2. the file at FIREBASE_CREDENTIALS_PATH
+3. the file at FIREBASE_SERVICE_ACCOUNT_KEY_PATH
+
+Without credentials no app is created and firebase_admin raises as before
+when it is used. Initialization is attempted once per process.
+"""
+
+import logging
+import os
+import threading
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+_attempted = False
+
+
+def _credentials():
+    if settings.FIREBASE_PRIVATE_KEY and settings.FIREBASE_CLIENT_EMAIL and settings.FIREBASE_PROJECT_ID:
+        return 'environment variables', {
+            "type": "service_account",
+            "project_id": settings.FIREBASE_PROJECT_ID,
+            "private_key_id": settings.FIREBASE_PRIVATE_KEY_ID,
+            "private_key": settings.FIREBASE_PRIVATE_KEY.replace('\\n', '\n'),
+            "client_email": settings.FIREBASE_CLIENT_EMAIL,
+            "client_id": settings.FIREBASE_CLIENT_ID,
+            "auth_uri": "https://accounts.google.com/o/oauth2/auth",
+            "token_uri": "https://oauth2.googleapis.com/token",
+            "auth_provider_x509_cert_url": "https://www.googleapis.com/oauth2/v1/certs",
+            "client_x509_cert_url": settings.FIREBASE_CLIENT_X509_CERT_URL,
+            "universe_domain": "googleapis.com"
+        }
+    if settings.FIREBASE_CREDENTIALS_PATH and os.path.exists(settings.FIREBASE_CREDENTIALS_PATH):
+        return 'custom credentials file', settings.FIREBASE_CREDENTIALS_PATH
+    if os.path.exists(settings.FIREBASE_SERVICE_ACCOUNT_KEY_PATH):
+        return 'default credentials file', settings.FIREBASE_SERVICE_ACCOUNT_KEY_PATH
+    return None, None
+
+
+def initialize_firebase():
+    """
+    Create the default Firebase app if it does not exist yet
+    """
+    global _attempted
+    if _attempted:
+        return
+    with _lock:
+        if _attempted:
+            return
+        try:
+            import firebase_admin
+            from firebase_admin import credentials
+
+            if not firebase_admin._apps:
+                source, certificate = _credentials()
+                if certificate is None:
+                    logger.warning(
+                        f"Firebase credentials not found. Check environment variables or file at: "
+                        f"{settings.FIREBASE_SERVICE_ACCOUNT_KEY_PATH}"
+                    )
+                else:
+                    firebase_admin.initialize_app(credentials.Certificate(certificate))
+                    logger.info(f"Firebase Admin SDK initialized successfully with {source}")
+        except Exception as e:
+            logger.error(f"Failed to initialize Firebase Admin SDK: {e}")
+        finally:
+            _attempted = True
+
+
+def firebase_auth():
+    """firebase_admin.auth, with the default app initialized"""
+    initialize_firebase()
+    from firebase_admin import auth
+    return auth
+
+
+def firebase_messaging():
+    """firebase_admin.messaging, with the default app initialized"""
+    initialize_firebase()
+    from firebase_admin import messaging
+    return messaging
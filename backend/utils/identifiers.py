@@ -0,0 +1,151 @@
+"""
+Identifier allocation
+
+Order, invoice and receipt numbers and delivery tracking codes keep their
+formats (ORD-YYYYMMDD-XXXXX, INV-..., RCP-..., PAY_RCP_YYYYMMDD_XXXXX,
+DEL-XXXXXX) but the random part is no longer drawn and checked with a query:
+each kind has its own PostgreSQL sequence and a number is a sequence value,
+permuted and written in base 36.
+
+- Uniqueness needs no lookup. Sequence values are never handed out twice and
+  the permutation (n * MULTIPLIER + offset) mod 36**width is a bijection, so
+  two saves can no longer pick the same number. Dated kinds repeat only after
+  36**5 (60 million) numbers in one day, tracking codes after 36**6.
+- Numbers stay unguessable-looking: consecutive values land far apart.
+- Values are fetched IDENTIFIER_BLOCK_SIZE at a time and handed out from a
+  per-process block, so most inserts make no extra round trip. Blocks are
+  dropped after a fork so child workers never reuse their parent's values.
+  Unused values of a block are simply skipped.
+
+Sequences are created by the orders, payments and deliveries migrations,
+starting past the numbers drawn randomly before (see first_free_value).
+"""
+
+import os
+import secrets
+import string
+import threading
+
+from django.conf import settings
+from django.db import connection
+from django.utils import timezone
+
+ALPHABET = string.digits + string.ascii_uppercase
+
+# Odd and not a multiple of 3, hence coprime with every power of 36
+MULTIPLIER = 25_214_903
+
+# kind: (sequence, format, width, dated, offset)
+KINDS = {
+    'order': ('orders_order_number_seq', 'ORD-{date}-{code}', 5, True, 2_744_137),
+    'invoice': ('orders_invoice_number_seq', 'INV-{date}-{code}', 5, True, 14_032_903),
+    'order_receipt': ('orders_receipt_number_seq', 'RCP-{date}-{code}', 5, True, 37_114_561),
+    'payment_receipt': ('payments_receipt_number_seq', 'PAY_RCP_{date}_{code}', 5, True, 51_370_223),
+    'delivery': ('deliveries_tracking_code_seq', 'DEL-{code}', 6, False, 1_305_427_711),
+}
+
+_blocks = {}
+_blocks_pid = None
+_lock = threading.Lock()
+
+
+def encode(value, width):
+    """`value` in base 36, zero-padded to `width` characters"""
+    digits = []
+    for _position in range(width):
+        value, digit = divmod(value, 36)
+        digits.append(ALPHABET[digit])
+    return ''.join(reversed(digits))
+
+
+def scramble(value, width, offset):
+    """Bijective permutation of [0, 36**width)"""
+    space = 36 ** width
+    return (value * MULTIPLIER + offset) % space
+
+
+def position(kind, identifier):
+    """
+    Sequence value (modulo 36**width) that would produce `identifier`, or None
+    when it is not in the format of `kind`
+    """
+    _sequence, _template, width, _dated, offset = KINDS[kind]
+    code = identifier[-width:].upper()
+    if len(code) != width or any(character not in ALPHABET for character in code):
+        return None
+    space = 36 ** width
+    return ((int(code, 36) - offset) * pow(MULTIPLIER, -1, space)) % space
+
+
+def first_free_value(kind, identifiers):
+    """
+    Start for the sequence of `kind` so that the values it hands out do not
+    reproduce any of the given pre-existing (randomly drawn) identifiers for as
+    long as possible: the start of the longest run of unused values
+    """
+    width = KINDS[kind][2]
+    space = 36 ** width
+    taken = sorted({value for value in (position(kind, identifier) for identifier in identifiers) if value is not None})
+    if not taken:
+        return 1
+    best_start, best_length = 0, -1
+    for current, following in zip(taken, taken[1:] + [taken[0] + space]):
+        if following - current - 1 > best_length:
+            best_start, best_length = current + 1, following - current - 1
+    # Raw values are only used modulo the space, so the run may wrap past it
+    return best_start
+
+
+def create_sequence(schema_editor, kind, identifiers=()):
+    """
+    Create the sequence of `kind` for a migration; `identifiers` are the values
+    already stored (for dated kinds, only those of the current day can clash)
+    """
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    start = first_free_value(kind, identifiers)
+    schema_editor.execute(f"CREATE SEQUENCE IF NOT EXISTS {KINDS[kind][0]} START WITH {start}")
+
+
+def drop_sequence(schema_editor, kind):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(f"DROP SEQUENCE IF EXISTS {KINDS[kind][0]}")
+
+
+def _fetch_block(sequence, size):
+    if connection.vendor != 'postgresql':
+        # No sequences; rely on the unique constraint
+        return [secrets.randbelow(36 ** 6) for _value in range(size)]
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT nextval(%s) FROM generate_series(1, %s)", [sequence, size])
+        return [row[0] for row in cursor.fetchall()]
+
+
+def next_value(kind):
+    """
+    Next raw sequence value for `kind`, from this process's block
+    """
+    global _blocks_pid
+    sequence = KINDS[kind][0]
+    with _lock:
+        if _blocks_pid != os.getpid():
+            _blocks.clear()
+            _blocks_pid = os.getpid()
+        block = _blocks.get(kind)
+        if not block:
+            block = _fetch_block(sequence, max(1, getattr(settings, 'IDENTIFIER_BLOCK_SIZE', 20)))
+            block.reverse()
+            _blocks[kind] = block
+        return block.pop()
+
+
+def allocate(kind):
+    """
+    New identifier of `kind` in its existing format
+    """
+    _sequence, template, width, dated, offset = KINDS[kind]
+    code = encode(scramble(next_value(kind), width, offset), width)
+    if dated:
+        return template.format(date=timezone.now().strftime('%Y%m%d'), code=code)
+    return template.format(code=code)
@@ -1,7 +1,6 @@
 import os
 from django.core.files.storage import default_storage
 from django.core.files.base import ContentFile
-from PIL import Image
 import uuid
 
 
@@ -48,6 +47,8 @@ def resize_image(image_path, max_width=800, max_height=600, quality=85):
     """
     Resize an image to fit within specified dimensions
     """
+    from PIL import Image
+
     try:
         with Image.open(image_path) as img:
             # Convert to RGB if necessary
@@ -75,6 +76,8 @@ def validate_image_file(file):
     """
     Validate uploaded image file
     """
+    from PIL import Image
+
     try:
         # Check file size (max 5MB)
         if file.size > 5 * 1024 * 1024:
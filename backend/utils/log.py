@@ -0,0 +1,148 @@
+"""
+Logging pipeline
+
+Request threads never write log output themselves:
+
+- Loggers hand records to a QueueListenerHandler, which enqueues them
+  without blocking (records are dropped and counted if the queue is full)
+  and a background thread writes them to the real console and file
+  handlers. Messages are formatted on that thread, so lazy %-style
+  arguments cost nothing on the request path (pass plain values, not
+  model instances whose str() could query).
+- Each record carries the id of the request it was logged for
+  (RequestIdFilter; the id is set by tanna_backend.middleware.
+  RequestLoggingMiddleware and echoed in the X-Request-ID header).
+- The file log is one JSON object per line (JsonFormatter).
+- Hot-path loggers (LOG_HOT_PATH_LOGGERS) log their per-request detail at
+  DEBUG. LOG_HOT_PATH_LEVEL decides whether that detail is kept, and
+  LOG_DEBUG_SAMPLE_RATE keeps only a fraction of it (SamplingFilter) when it is.
+"""
+
+import contextvars
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import threading
+from datetime import datetime, timezone
+
+request_id_var = contextvars.ContextVar('request_id', default=None)
+
+
+class DeferredFileHandler(logging.FileHandler):
+    """
+    FileHandler that opens its file, creating the directory, when the first
+    record is written rather than when logging is configured, so processes
+    that never log to it do no file system work at startup
+    """
+
+    def __init__(self, filename, mode='a', encoding=None, errors=None):
+        super().__init__(filename, mode=mode, encoding=encoding, delay=True, errors=errors)
+
+    def _open(self):
+        os.makedirs(os.path.dirname(self.baseFilename), exist_ok=True)
+        return super()._open()
+
+
+class RequestIdFilter(logging.Filter):
+    """Stamp records with the current request id ('-' outside requests)"""
+
+    def filter(self, record):
+        record.request_id = request_id_var.get() or '-'
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Keep `rate` of the records below WARNING; warnings and errors always pass
+    """
+
+    def __init__(self, rate=1.0, name=''):
+        super().__init__(name)
+        self.rate = float(rate)
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING or self.rate >= 1.0:
+            return True
+        return random.random() < self.rate
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record"""
+
+    def format(self, record):
+        entry = {
+            'time': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+            'request_id': getattr(record, 'request_id', '-'),
+            'module': record.module,
+            'process': record.process,
+            'thread': record.thread,
+        }
+        if record.exc_text:
+            entry['exc_info'] = record.exc_text
+        elif record.exc_info:
+            entry['exc_info'] = self.formatException(record.exc_info)
+        if record.stack_info:
+            entry['stack_info'] = self.formatStack(record.stack_info)
+        return json.dumps(entry, default=str)
+
+
+class QueueListenerHandler(logging.handlers.QueueHandler):
+    """
+    Enqueue records for a background thread that passes them to the
+    handlers named in `handlers` (configured in the same LOGGING dict).
+    The thread is started on the first record of each process, so forked
+    workers get their own.
+    """
+
+    def __init__(self, handlers, queue_size=10000):
+        super().__init__(queue.Queue(maxsize=queue_size))
+        self.handler_names = list(handlers)
+        self.dropped = 0
+        self._listener = None
+        self._listener_pid = None
+        self._listener_lock = threading.Lock()
+
+    def _start_listener(self):
+        with self._listener_lock:
+            if self._listener_pid == os.getpid():
+                return
+            if self._listener_pid is not None:
+                # Forked: the parent's queue and its pending records stay with the parent
+                self.queue = queue.Queue(maxsize=self.queue.maxsize)
+            # Named handlers are registered by dictConfig; there is no public lookup before 3.12
+            handlers = [logging._handlers[name] for name in self.handler_names if name in logging._handlers]
+            self._listener = logging.handlers.QueueListener(self.queue, *handlers, respect_handler_level=True)
+            self._listener.start()
+            self._listener_pid = os.getpid()
+
+    def prepare(self, record):
+        # Formatting is left to the listener thread; only the traceback is
+        # rendered now, while the frames are still current
+        if record.exc_info and not record.exc_text:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def emit(self, record):
+        if self._listener_pid != os.getpid():
+            self._start_listener()
+        super().emit(record)
+
+    def close(self):
+        with self._listener_lock:
+            if self._listener is not None and self._listener_pid == os.getpid():
+                self._listener.stop()
+            self._listener = None
+            self._listener_pid = None
+        super().close()
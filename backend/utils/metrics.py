@@ -0,0 +1,270 @@
+"""
+Request and task instrumentation
+
+While a request (tanna_backend.middleware.RequestLoggingMiddleware) or an
+instrumented Celery task (tanna_backend.celery.InstrumentedTask) runs, a
+Measurement collects:
+
+- the number and duration of database queries, from a cursor execute
+  wrapper installed on every connection, and the time per distinct SQL
+  statement, so N+1 query patterns show up as one statement run many times
+- time spent waiting on upstream services: `with upstream('flutterwave')`
+  in the shared HTTP clients and `with upstream('firebase')` around
+  Firebase Admin calls
+
+The measurement lives in a ContextVar, so it follows the request into async
+views and sync_to_async threads. When it ends it is:
+
+- observed in Prometheus histograms labelled by view or task, served at
+  /metrics (tanna_backend.health_check.metrics)
+- returned as a Server-Timing header when SERVER_TIMING is on
+- logged with the SLOW_REQUEST_TOP_QUERIES slowest statements when the
+  request took longer than SLOW_REQUEST_MS (tasks: SLOW_TASK_MS)
+
+prometheus_client is imported when the first sample is recorded. With
+PROMETHEUS_MULTIPROC_DIR set, every process (web workers, Celery pool
+processes) writes its samples there and the exporters aggregate them.
+"""
+
+import contextvars
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+current_measurement = contextvars.ContextVar('measurement', default=None)
+
+# Distinct SQL statements kept per measurement for the slow log
+MAX_STATEMENTS = 200
+
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+
+_signal_connected = False
+_metrics = None
+_metrics_lock = threading.Lock()
+
+
+class Measurement:
+    """Database and upstream time of one request or task"""
+
+    __slots__ = ('started', 'db_count', 'db_time', 'statements', 'upstream')
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.db_count = 0
+        self.db_time = 0.0
+        self.statements = {}  # sql: [executions, seconds]
+        self.upstream = {}  # service: [calls, seconds]
+
+    @property
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+    def add_query(self, sql, duration):
+        self.db_count += 1
+        self.db_time += duration
+        entry = self.statements.get(sql)
+        if entry is None:
+            if len(self.statements) >= MAX_STATEMENTS:
+                return
+            entry = self.statements[sql] = [0, 0.0]
+        entry[0] += 1
+        entry[1] += duration
+
+    def add_upstream(self, service, duration):
+        entry = self.upstream.setdefault(service, [0, 0.0])
+        entry[0] += 1
+        entry[1] += duration
+
+    def top_statements(self, limit):
+        """[(seconds, executions, sql)], the most expensive statements first"""
+        ranked = sorted(
+            ((seconds, count, sql) for sql, (count, seconds) in self.statements.items()),
+            key=lambda entry: entry[0], reverse=True,
+        )
+        return ranked[:limit]
+
+    def server_timing(self, elapsed):
+        """Server-Timing header value"""
+        parts = [f'db;dur={self.db_time * 1000:.1f};desc="{self.db_count} queries"']
+        for service, (count, seconds) in self.upstream.items():
+            parts.append(f'{service};dur={seconds * 1000:.1f};desc="{count} calls"')
+        parts.append(f'total;dur={elapsed * 1000:.1f}')
+        return ', '.join(parts)
+
+
+def _execute_wrapper(execute, sql, params, many, context):
+    measurement = current_measurement.get()
+    if measurement is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        measurement.add_query(sql, time.perf_counter() - started)
+
+
+def _install_wrapper(connection):
+    if _execute_wrapper not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_execute_wrapper)
+
+
+def _on_connection_created(sender, connection, **kwargs):
+    _install_wrapper(connection)
+
+
+def _install_db_instrumentation():
+    global _signal_connected
+    from django.db import connections
+
+    if not _signal_connected:
+        from django.db.backends.signals import connection_created
+
+        # Connections opened later, in any thread (sync_to_async workers included)
+        connection_created.connect(_on_connection_created, dispatch_uid='utils.metrics')
+        _signal_connected = True
+    # Connections of this thread, which may already be open
+    for connection in connections.all():
+        _install_wrapper(connection)
+
+
+@contextmanager
+def measure():
+    """
+    Collect the queries and upstream calls of the enclosed block
+    """
+    _install_db_instrumentation()
+    measurement = Measurement()
+    token = current_measurement.set(measurement)
+    try:
+        yield measurement
+    finally:
+        current_measurement.reset(token)
+
+
+@contextmanager
+def upstream(service):
+    """
+    Time a call to an upstream service (flutterwave, firebase, ...)
+    """
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        duration = time.perf_counter() - started
+        measurement = current_measurement.get()
+        if measurement is not None:
+            measurement.add_upstream(service, duration)
+        get_metrics()['upstream_duration'].labels(service).observe(duration)
+
+
+def get_metrics():
+    """
+    The histograms, created (and prometheus_client imported) on first use
+    """
+    global _metrics
+    if _metrics is None:
+        with _metrics_lock:
+            if _metrics is None:
+                from prometheus_client import Histogram
+
+                _metrics = {
+                    'request_duration': Histogram(
+                        'http_request_duration_seconds', 'Request duration by view',
+                        ['view', 'method', 'status'],
+                    ),
+                    'request_queries': Histogram(
+                        'http_request_db_queries', 'Database queries per request by view',
+                        ['view'], buckets=QUERY_COUNT_BUCKETS,
+                    ),
+                    'request_db': Histogram(
+                        'http_request_db_seconds', 'Database time per request by view', ['view'],
+                    ),
+                    'task_duration': Histogram(
+                        'celery_task_duration_seconds', 'Task duration', ['task', 'state'],
+                    ),
+                    'task_queries': Histogram(
+                        'celery_task_db_queries', 'Database queries per task run',
+                        ['task'], buckets=QUERY_COUNT_BUCKETS,
+                    ),
+                    'task_db': Histogram(
+                        'celery_task_db_seconds', 'Database time per task run', ['task'],
+                    ),
+                    'upstream_duration': Histogram(
+                        'upstream_request_duration_seconds', 'Time waiting on upstream services', ['service'],
+                    ),
+                }
+    return _metrics
+
+
+def metrics_registry():
+    """
+    Registry to export: this process's, or every process's in multiprocess mode
+    """
+    from prometheus_client import REGISTRY, CollectorRegistry, multiprocess
+
+    get_metrics()  # families are listed before their first sample
+    if not os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        return REGISTRY
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    return registry
+
+
+def view_label(request):
+    """URL name of the view that handled `request`, as a low-cardinality label"""
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return '<unmatched>'
+    return match.view_name or match._func_path
+
+
+def log_if_slow(description, measurement, elapsed, threshold_ms):
+    if not threshold_ms or elapsed * 1000 < threshold_ms:
+        return
+    statements = '\n'.join(
+        '  %7.1fms %4dx %.500s' % (seconds * 1000, count, sql)
+        for seconds, count, sql in measurement.top_statements(getattr(settings, 'SLOW_REQUEST_TOP_QUERIES', 5))
+    )
+    upstream_time = ', '.join(
+        '%s %d calls %.1fms' % (service, count, seconds * 1000)
+        for service, (count, seconds) in measurement.upstream.items()
+    )
+    logger.warning(
+        "Slow %s: %.0fms, %d queries in %.0fms, upstream: %s\n%s",
+        description, elapsed * 1000, measurement.db_count, measurement.db_time * 1000,
+        upstream_time or 'none', statements,
+    )
+
+
+def record_request(request, response, measurement, elapsed):
+    view = view_label(request)
+    metrics = get_metrics()
+    metrics['request_duration'].labels(view, request.method, response.status_code).observe(elapsed)
+    metrics['request_queries'].labels(view).observe(measurement.db_count)
+    metrics['request_db'].labels(view).observe(measurement.db_time)
+    log_if_slow(
+        f'request {request.method} {request.path} ({view})', measurement, elapsed,
+        getattr(settings, 'SLOW_REQUEST_MS', 1000),
+    )
+
+
+def record_task(name, state, measurement, elapsed):
+    metrics = get_metrics()
+    metrics['task_duration'].labels(name, state).observe(elapsed)
+    metrics['task_queries'].labels(name).observe(measurement.db_count)
+    metrics['task_db'].labels(name).observe(measurement.db_time)
+    log_if_slow(f'task {name} ({state})', measurement, elapsed, getattr(settings, 'SLOW_TASK_MS', 10000))
+
+
+def start_metrics_server(port):
+    """Serve /metrics from a background thread (Celery workers have no web server)"""
+    from prometheus_client import start_http_server
+
+    start_http_server(port, registry=metrics_registry())
+    logger.info("Serving Prometheus metrics on port %s", port)
@@ -1,4 +1,4 @@
-from rest_framework.pagination import PageNumberPagination
+from rest_framework.pagination import CursorPagination, PageNumberPagination
 from rest_framework.response import Response
 from django.core.paginator import Paginator, EmptyPage, PageNotAnInteger
 
@@ -97,4 +97,16 @@ class PreserveStatePagination(SmartPageNumberPagination):
         """
         if deleted_count is not None:
             return self.get_paginated_response_for_delete(data, deleted_count)
-        return super().get_paginated_response(data) 
\ No newline at end of file
+        return super().get_paginated_response(data) 
+
+
+class OrderKeysetPagination(CursorPagination):
+    """
+    Keyset (cursor) pagination for high-volume order feeds.
+    Each page is an index range scan on created_at instead of OFFSET + COUNT(*),
+    so deep pages cost the same as the first one.
+    """
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    ordering = ('-created_at', '-id')
@@ -0,0 +1,348 @@
+"""
+Branded PDF rendering for invoices and payment receipts
+
+Branding (company details and the decoded logo) is loaded once per process and
+shared by every render; the logo is read from SITE_LOGO_PATH when the file
+exists, otherwise downloaded from SITE_LOGO_URL once. A logo that could not be
+loaded is retried after PDF_LOGO_RETRY_SECONDS.
+
+Each document type turns its model instance into a flat context of display
+strings. The renderer draws only from that context, so the context (plus the
+branding fingerprint) fully determines the output and is used to version the
+stored files (see utils.document_store). Canvases are rendered invariant, so the
+same context always produces the same bytes.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from io import BytesIO
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# Bump when the layout changes so stored documents are re-rendered
+RENDERER_VERSION = 1
+
+
+class Branding:
+    """
+    Company details and decoded logo shared by all renders in this process
+    """
+
+    def __init__(self, company, address, email, phone, logo=None, logo_digest='', retry_at=None):
+        self.company = company
+        self.address = address
+        self.email = email
+        self.phone = phone
+        self.logo = logo
+        self.retry_at = retry_at
+        self.fingerprint = hashlib.sha256(
+            json.dumps([company, address, email, phone, logo_digest]).encode('utf-8')
+        ).hexdigest()
+
+    @property
+    def stale(self):
+        return self.retry_at is not None and time.monotonic() >= self.retry_at
+
+
+_branding = None
+_branding_lock = threading.Lock()
+
+
+def _read_logo_bytes():
+    logo_path = getattr(settings, 'SITE_LOGO_PATH', '')
+    logo_url = getattr(settings, 'SITE_LOGO_URL', '')
+    if logo_path and os.path.exists(logo_path):
+        with open(logo_path, 'rb') as logo_file:
+            return logo_file.read()
+    if logo_url:
+        import requests
+
+        response = requests.get(logo_url, timeout=getattr(settings, 'PDF_LOGO_FETCH_TIMEOUT', 5))
+        response.raise_for_status()
+        return response.content
+    return None
+
+
+def _load_branding():
+    from reportlab.lib.utils import ImageReader
+
+    details = {
+        'company': getattr(settings, 'SITE_NAME', 'Company'),
+        'address': getattr(settings, 'SITE_ADDRESS', ''),
+        'email': getattr(settings, 'SITE_EMAIL', ''),
+        'phone': getattr(settings, 'SITE_PHONE', ''),
+    }
+    try:
+        data = _read_logo_bytes()
+        if not data:
+            return Branding(**details)
+        logo = ImageReader(BytesIO(data))
+        # Decode once here; later renders only read the cached pixel data
+        logo.getSize()
+        logo.getRGBData()
+        return Branding(**details, logo=logo, logo_digest=hashlib.sha256(data).hexdigest())
+    except Exception as e:
+        logger.warning(f"Could not load branding logo for PDFs: {str(e)}")
+        return Branding(
+            **details, retry_at=time.monotonic() + getattr(settings, 'PDF_LOGO_RETRY_SECONDS', 300)
+        )
+
+
+def get_branding():
+    """
+    Process-wide branding, loaded on first use
+    """
+    global _branding
+    branding = _branding
+    if branding is not None and not branding.stale:
+        return branding
+    with _branding_lock:
+        if _branding is None or _branding.stale:
+            _branding = _load_branding()
+        return _branding
+
+
+def clear_branding_cache():
+    global _branding
+    with _branding_lock:
+        _branding = None
+
+
+def _format_datetime(value):
+    return value.strftime('%Y-%m-%d %H:%M') if value else ''
+
+
+def invoice_context(invoice):
+    return {
+        'number': invoice.invoice_number,
+        'created_at': _format_datetime(getattr(invoice, 'created_at', None)),
+        'due_date': _format_datetime(getattr(invoice, 'due_date', None)),
+        'customer_name': f"{invoice.customer_name}",
+        'customer_email': f"{invoice.customer_email}",
+        'customer_phone': getattr(invoice, 'customer_phone', None) or '',
+        'subtotal': f"{invoice.subtotal}",
+        'tax_amount': f"{invoice.tax_amount}",
+        'delivery_fee': f"{invoice.delivery_fee}",
+        'discount_amount': f"{invoice.discount_amount}",
+        'total_amount': f"{invoice.total_amount}",
+    }
+
+
+def payment_receipt_context(receipt):
+    return {
+        'number': receipt.receipt_number,
+        'created_at': _format_datetime(receipt.created_at),
+        'customer_name': f"{receipt.customer_name}",
+        'customer_email': f"{receipt.customer_email}",
+        'customer_phone': receipt.customer_phone or '',
+        'amount': f"{receipt.amount} {receipt.currency}",
+        'payment_method_name': receipt.payment_method_name or '',
+        'payment_type': receipt.payment_type or '',
+        'paid_at': _format_datetime(receipt.paid_at),
+        'order_id': str(receipt.order_id or ''),
+        'invoice_id': str(receipt.invoice_id or ''),
+        'event_id': str(receipt.event_id or ''),
+        'notes': str(receipt.notes or ''),
+    }
+
+
+def _draw_watermark(p, branding, width, height, fraction, fit_width):
+    """
+    Faint centered logo behind the content; fit_width scales it to a fraction of
+    the page width, otherwise it is fitted into a box of that fraction of the page
+    """
+    if branding.logo is None:
+        return
+    try:
+        p.saveState()
+        try:
+            p.setFillAlpha(0.08)
+        except Exception:
+            pass
+        wm_w_target = width * fraction
+        if fit_width:
+            iw, ih = branding.logo.getSize()
+            wm_h_target = ih * (wm_w_target / float(iw))
+        else:
+            wm_h_target = height * fraction
+        p.drawImage(branding.logo, (width - wm_w_target) / 2, (height - wm_h_target) / 2,
+                    width=wm_w_target, height=wm_h_target,
+                    preserveAspectRatio=True, mask='auto')
+        p.restoreState()
+    except Exception:
+        pass
+
+
+def _draw_header(p, branding, width, height, title, meta_lines):
+    from reportlab.lib import colors
+
+    # Header band
+    p.setFillColorRGB(0.95, 0.95, 0.95)
+    p.rect(0, height - 90, width, 90, stroke=0, fill=1)
+    p.setFillColor(colors.black)
+
+    # Logo (scaled to fit within 110x50 while preserving aspect ratio)
+    if branding.logo is not None:
+        try:
+            iw, ih = branding.logo.getSize()
+            scale = min(110.0 / float(iw), 50.0 / float(ih))
+            p.drawImage(branding.logo, 40, height - 80, width=iw * scale, height=ih * scale,
+                        preserveAspectRatio=True, mask='auto')
+        except Exception:
+            # best-effort; ignore if not drawable
+            pass
+
+    # Company details
+    y = height - 35
+    p.setFont('Helvetica-Bold', 18)
+    p.drawString(150, y, branding.company)
+    p.setFont('Helvetica', 9)
+    y -= 14
+    if branding.address:
+        p.drawString(150, y, branding.address)
+        y -= 12
+    if branding.email or branding.phone:
+        p.drawString(150, y, f"{branding.email}{'  |  ' if branding.email and branding.phone else ''}{branding.phone}")
+
+    # Document title and meta
+    p.setFont('Helvetica-Bold', 16)
+    p.drawRightString(width - 40, height - 35, title)
+    p.setFont('Helvetica', 10)
+    meta_y = height - 50
+    for line in meta_lines:
+        p.drawRightString(width - 40, meta_y, line)
+        meta_y -= 14
+
+    # Divider
+    p.setStrokeColorRGB(0.85, 0.85, 0.85)
+    p.setLineWidth(1)
+    p.line(40, height - 100, width - 40, height - 100)
+
+
+def _draw_bill_to(p, context, height):
+    y = height - 130
+    p.setFont('Helvetica-Bold', 12)
+    p.drawString(40, y, 'Bill To')
+    p.setFont('Helvetica', 10)
+    y -= 16
+    p.drawString(40, y, context['customer_name'])
+    y -= 14
+    p.drawString(40, y, context['customer_email'])
+    if context['customer_phone']:
+        y -= 14
+        p.drawString(40, y, context['customer_phone'])
+    return y
+
+
+def _draw_footer(p, branding, width):
+    from reportlab.lib import colors
+
+    p.setStrokeColorRGB(0.9, 0.9, 0.9)
+    p.line(40, 60, width - 40, 60)
+    p.setFont('Helvetica', 9)
+    p.setFillColor(colors.grey)
+    p.drawCentredString(width / 2, 45, f"Thank you for your business • {branding.company}")
+
+
+def _new_canvas(buffer):
+    from reportlab.lib.pagesizes import A4
+    from reportlab.pdfgen import canvas
+
+    # invariant: no timestamps or random ids, so identical input gives identical bytes
+    return canvas.Canvas(buffer, pagesize=A4, invariant=1), A4
+
+
+def render_invoice(context, branding):
+    """Render an invoice context to PDF bytes"""
+    buffer = BytesIO()
+    p, (width, height) = _new_canvas(buffer)
+
+    _draw_watermark(p, branding, width, height, 0.6, fit_width=False)
+    meta_lines = [f"Invoice #: {context['number']}"]
+    if context['created_at']:
+        meta_lines.append(f"Date: {context['created_at']}")
+    if context['due_date']:
+        meta_lines.append(f"Due: {context['due_date']}")
+    _draw_header(p, branding, width, height, 'Invoice', meta_lines)
+    y = _draw_bill_to(p, context, height)
+
+    # Summary (no line items detail available here)
+    y -= 28
+    for label, key in (('Subtotal:', 'subtotal'), ('Tax:', 'tax_amount'),
+                       ('Delivery:', 'delivery_fee'), ('Discount:', 'discount_amount')):
+        p.setFont('Helvetica-Bold', 11)
+        p.drawRightString(width - 120, y, label)
+        p.setFont('Helvetica', 10)
+        p.drawRightString(width - 40, y, context[key])
+        y -= 14
+    y -= 2
+    p.setFont('Helvetica-Bold', 12)
+    p.drawRightString(width - 120, y, 'Total:')
+    p.drawRightString(width - 40, y, context['total_amount'])
+
+    _draw_footer(p, branding, width)
+    p.save()
+    return buffer.getvalue()
+
+
+def render_payment_receipt(context, branding):
+    """Render a payment receipt context to PDF bytes"""
+    buffer = BytesIO()
+    p, (width, height) = _new_canvas(buffer)
+
+    _draw_watermark(p, branding, width, height, 0.5, fit_width=True)
+    _draw_header(p, branding, width, height, 'Payment Receipt', [
+        f"Receipt #: {context['number']}",
+        f"Date: {context['created_at']}",
+    ])
+    y = _draw_bill_to(p, context, height)
+
+    # Payment details box
+    y -= 28
+    p.setFont('Helvetica-Bold', 12)
+    p.drawString(40, y, 'Payment Details')
+    y -= 18
+    p.setFont('Helvetica', 10)
+    p.drawString(50, y, "Amount Paid:")
+    p.setFont('Helvetica-Bold', 12)
+    p.drawString(150, y, context['amount'])
+    p.setFont('Helvetica', 10)
+    y -= 16
+    for label, key in (('Payment Method', 'payment_method_name'), ('Payment Type', 'payment_type'),
+                       ('Paid At', 'paid_at'), ('Order ID', 'order_id'),
+                       ('Invoice ID', 'invoice_id'), ('Event ID', 'event_id')):
+        if context[key]:
+            p.drawString(50, y, f"{label}: {context[key]}")
+            y -= 14
+
+    # Notes
+    if context['notes']:
+        y -= 12
+        p.setFont('Helvetica-Bold', 12)
+        p.drawString(40, y, 'Notes')
+        y -= 16
+        p.setFont('Helvetica', 10)
+        for line in context['notes'].split('\n'):
+            p.drawString(50, y, line[:110])
+            y -= 12
+            if y < 60:
+                p.showPage()
+                y = height - 60
+
+    if y < 80:
+        p.showPage()
+    _draw_footer(p, branding, width)
+    p.save()
+    return buffer.getvalue()
+
+
+DOCUMENT_TYPES = {
+    'invoice': (invoice_context, render_invoice),
+    'payment_receipt': (payment_receipt_context, render_payment_receipt),
+}
@@ -0,0 +1,117 @@
+"""
+Running rating aggregates
+
+Products (reviews) and drivers (delivery ratings) store a running sum and count
+next to their average rating:
+1. Every rating write applies its delta with one UPDATE using F() expressions
+   inside the writer's transaction, so the cost is constant however many ratings
+   the row already has and concurrent ratings never overwrite each other
+2. reconcile_rating_aggregates() recomputes every row in a single GROUP BY pass
+   and repairs drift left by writes that bypass the model (cascading or
+   queryset deletes, raw SQL)
+"""
+
+import logging
+from decimal import Decimal, ROUND_HALF_UP
+
+from django.db import transaction
+from django.db.models import Case, Count, DecimalField, Exists, F, OuterRef, Q, Sum, Value, When
+from django.db.models.functions import Cast
+
+logger = logging.getLogger(__name__)
+
+AVERAGE_OUTPUT_FIELD = DecimalField(max_digits=3, decimal_places=2)
+
+
+def average_for(total, count):
+    """
+    Average rating rounded like the database does (half up, two places)
+    """
+    if not count:
+        return None
+    return (Decimal(total) / count).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
+
+
+def apply_rating_delta(model, pk, sum_delta, count_delta, sum_field, count_field, average_field):
+    """
+    Add a delta to one row's running sum and count and recompute its average in the same UPDATE.
+    Only the three aggregate columns are written.
+    """
+    new_sum = F(sum_field) + sum_delta
+    new_count = F(count_field) + count_delta
+    return model.objects.filter(pk=pk).update(**{
+        sum_field: new_sum,
+        count_field: new_count,
+        average_field: Case(
+            # The condition reads the pre-update count, so compare against the delta
+            When(**{f'{count_field}__gt': -count_delta}, then=Cast(
+                Cast(new_sum, DecimalField(max_digits=12, decimal_places=4)) / new_count,
+                AVERAGE_OUTPUT_FIELD,
+            )),
+            default=Value(None),
+            output_field=AVERAGE_OUTPUT_FIELD,
+        ),
+    })
+
+
+def _grouped_totals(rating_model, fk_field, ids=None):
+    ratings = rating_model.objects.all()
+    if ids is not None:
+        ratings = ratings.filter(**{f'{fk_field}__in': ids})
+    return {
+        row[fk_field]: (row['total'] or 0, row['count'])
+        for row in ratings.order_by().values(fk_field).annotate(total=Sum('rating'), count=Count('pk'))
+    }
+
+
+def reconcile_rating_aggregates(model, rating_model, fk_field, sum_field, count_field, average_field,
+                                batch_size=500):
+    """
+    Recompute running aggregates from the ratings table and repair rows that drifted.
+    Returns {'checked': ..., 'repaired': [pk, ...]}.
+
+    Rows with no ratings and a zero count are left alone, so averages set by hand
+    (e.g. seeded demo products) survive.
+    """
+    totals = _grouped_totals(rating_model, fk_field)
+
+    stored = model.objects.annotate(
+        has_ratings=Exists(rating_model.objects.filter(**{fk_field: OuterRef('pk')}))
+    ).filter(
+        Q(has_ratings=True) | Q(**{f'{count_field}__gt': 0}) | ~Q(**{sum_field: 0})
+    ).values_list('pk', sum_field, count_field)
+
+    checked = 0
+    drifted = []
+    for pk, stored_sum, stored_count in stored.iterator():
+        checked += 1
+        if (stored_sum, stored_count) != totals.get(pk, (0, 0)):
+            drifted.append(pk)
+
+    repaired = []
+    for start in range(0, len(drifted), batch_size):
+        batch = drifted[start:start + batch_size]
+        with transaction.atomic():
+            # Lock first, then re-aggregate: a rating committed meanwhile is either
+            # counted here or applies its delta on top of the repaired row afterwards
+            rows = list(
+                model.objects.select_for_update()
+                .filter(pk__in=batch)
+                .only('pk', sum_field, count_field, average_field)
+                .order_by('pk')
+            )
+            fresh = _grouped_totals(rating_model, fk_field, ids=batch)
+            for row in rows:
+                total, count = fresh.get(row.pk, (0, 0))
+                setattr(row, sum_field, total)
+                setattr(row, count_field, count)
+                setattr(row, average_field, average_for(total, count))
+            model.objects.bulk_update(rows, [sum_field, count_field, average_field])
+        repaired.extend(row.pk for row in rows)
+
+    if repaired:
+        logger.warning(
+            f"Repaired rating aggregates for {len(repaired)} {model._meta.verbose_name_plural} "
+            f"out of {checked} checked"
+        )
+    return {'checked': checked, 'repaired': repaired}
@@ -0,0 +1,29 @@
+"""
+Shared redis-py clients
+
+The cache backend hides its client, so features that need Redis data
+structures (lists, GEO sets) get a process-wide client per URL from here.
+Timeouts are short: callers treat Redis as best-effort and fall back to the
+database when it is unreachable.
+"""
+
+import threading
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def get_redis(url):
+    """
+    Process-wide client for `url`
+    """
+    client = _clients.get(url)
+    if client is None:
+        with _clients_lock:
+            client = _clients.get(url)
+            if client is None:
+                import redis
+
+                client = redis.Redis.from_url(url, socket_timeout=1, socket_connect_timeout=1)
+                _clients[url] = client
+    return client
@@ -0,0 +1,100 @@
+"""
+Cached dashboard statistics
+
+Stats endpoints compute all of their metrics with one conditional aggregate
+per table (Count/Sum/Avg with filter=Q(...)) and serve the result through
+cached_stats(), shared by every worker through the Django cache:
+
+- A result is fresh for STATS_CACHE_TIMEOUT seconds. Admin dashboards poll
+  several endpoints every few seconds, so most requests are one cache read.
+- Stampede protection: once a result goes stale, the first request takes a
+  short lease (cache.add) and recomputes it while every other request keeps
+  serving the stale copy, which is kept STATS_STALE_GRACE seconds longer.
+  With no copy at all, requests that lose the lease wait briefly for the
+  winner's result before computing it themselves.
+- If the cache is unreachable the stats are computed directly.
+"""
+
+import logging
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = 'stats'
+LEASE_TIMEOUT = 30
+WAIT_STEP = 0.05
+
+
+def _timeout():
+    return getattr(settings, 'STATS_CACHE_TIMEOUT', 15)
+
+
+def _grace():
+    return getattr(settings, 'STATS_STALE_GRACE', 60)
+
+
+def stats_key(name, *vary):
+    return ':'.join([KEY_PREFIX, name] + [str(part) for part in vary])
+
+
+def _store(key, value):
+    try:
+        cache.set(key, {'value': value, 'fresh_until': time.time() + _timeout()}, _timeout() + _grace())
+    except Exception as e:
+        logger.warning(f"Could not cache stats {key}: {str(e)}")
+
+
+def _wait_for(key, deadline):
+    while time.monotonic() < deadline:
+        time.sleep(WAIT_STEP)
+        entry = cache.get(key)
+        if entry is not None:
+            return entry
+    return None
+
+
+def cached_stats(name, compute, vary=(), wait=1.0):
+    """
+    Result of compute() for stats `name` (and the `vary` key parts, e.g. a
+    user id or date range), recomputed at most once per STATS_CACHE_TIMEOUT
+    across all workers
+    """
+    key = stats_key(name, *vary)
+    lease_key = f'{key}:lease'
+    try:
+        entry = cache.get(key)
+        if entry is not None and entry['fresh_until'] > time.time():
+            return entry['value']
+        leased = cache.add(lease_key, 1, LEASE_TIMEOUT)
+    except Exception as e:
+        logger.warning(f"Stats cache unavailable, computing {key}: {str(e)}")
+        return compute()
+
+    if not leased:
+        if entry is not None:
+            return entry['value']
+        entry = _wait_for(key, time.monotonic() + wait)
+        if entry is not None:
+            return entry['value']
+        return compute()
+
+    try:
+        value = compute()
+        _store(key, value)
+        return value
+    finally:
+        try:
+            cache.delete(lease_key)
+        except Exception:
+            pass
+
+
+def invalidate_stats(name, *vary):
+    """Drop a cached result so the next request recomputes it"""
+    try:
+        cache.delete(stats_key(name, *vary))
+    except Exception as e:
+        logger.warning(f"Could not invalidate stats {name}: {str(e)}")